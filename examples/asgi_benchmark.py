@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import ssl
+import time
+from typing import Dict, List, cast
+
+from aioquic.asgi import run
+from aioquic.asyncio.client import connect
+from aioquic.asyncio.protocol import QuicConnectionProtocol
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import DataReceived, HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import QuicEvent
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+async def app(scope: Dict, receive, send) -> None:
+    """
+    A trivial ASGI application which always answers "hello".
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"hello"})
+
+
+class BenchmarkClient(QuicConnectionProtocol):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._waiters: Dict[int, asyncio.Future[None]] = {}
+
+    async def get(self, authority: str, path: str) -> None:
+        stream_id = self._quic.get_next_available_stream_id()
+        self._http.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b":method", b"GET"),
+                (b":scheme", b"https"),
+                (b":authority", authority.encode()),
+                (b":path", path.encode()),
+            ],
+            end_stream=True,
+        )
+        waiter = self._loop.create_future()
+        self._waiters[stream_id] = waiter
+        self.transmit()
+        await asyncio.shield(waiter)
+
+    def quic_event_received(self, event: QuicEvent) -> None:
+        for http_event in self._http.handle_event(event):
+            if (
+                isinstance(http_event, (DataReceived, HeadersReceived))
+                and http_event.stream_ended
+            ):
+                waiter = self._waiters.pop(http_event.stream_id, None)
+                if waiter is not None:
+                    waiter.set_result(None)
+
+
+async def run_client(
+    host: str, port: int, concurrency: int, requests: int
+) -> List[float]:
+    configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=True)
+    configuration.verify_mode = ssl.CERT_NONE
+    async with connect(
+        host, port, configuration=configuration, create_protocol=BenchmarkClient
+    ) as client:
+        client = cast(BenchmarkClient, client)
+        authority = "%s:%d" % (host, port)
+        latencies = []
+
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                start = time.perf_counter()
+                await client.get(authority, "/")
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(
+            *[worker(requests // concurrency) for _ in range(concurrency)]
+        )
+        return latencies
+
+
+async def main(
+    host: str, port: int, clients: int, concurrency: int, requests: int
+) -> None:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[run_client(host, port, concurrency, requests) for _ in range(clients)]
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result)
+    print(
+        "%d requests in %.2f s: %.0f requests/s, p50 %.2f ms, p99 %.2f ms"
+        % (
+            len(latencies),
+            elapsed,
+            len(latencies) / elapsed,
+            latencies[len(latencies) // 2] * 1000,
+            latencies[int(len(latencies) * 0.99)] * 1000,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ASGI server benchmark")
+    parser.add_argument(
+        "-c",
+        "--certificate",
+        type=str,
+        required=True,
+        help="load the TLS certificate from the specified file",
+    )
+    parser.add_argument(
+        "-k",
+        "--private-key",
+        type=str,
+        help="load the TLS private key from the specified file",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=4,
+        help="the number of client connections (defaults to 4)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="the number of concurrent requests per connection (defaults to 32)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=4433,
+        help="the port to listen on (defaults to 4433)",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=10000,
+        help="the number of requests per connection (defaults to 10000)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="the number of server worker processes (defaults to 1)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="increase logging verbosity"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+    )
+
+    if uvloop is not None:
+        uvloop.install()
+
+    # start the server in the background
+    configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=False)
+    configuration.load_cert_chain(args.certificate, args.private_key)
+    server = multiprocessing.Process(
+        target=run,
+        args=(app, "127.0.0.1", args.port),
+        kwargs={"configuration": configuration, "workers": args.workers},
+    )
+    server.start()
+    time.sleep(1)
+
+    try:
+        asyncio.run(
+            main(
+                host="127.0.0.1",
+                port=args.port,
+                clients=args.clients,
+                concurrency=args.concurrency,
+                requests=args.requests,
+            )
+        )
+    finally:
+        os.kill(server.pid, signal.SIGINT)
+        server.join()
@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from aioquic.asyncio.server import QuicServer
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.packet import PACKET_TYPE_INITIAL, QuicProtocolVersion
+from aioquic.quic.rate_limit import QuicRateLimiter
+
+UNSUPPORTED_VERSION = 0x1A2A3A4A
+
+
+class CountingTransport:
+    """
+    A datagram transport which only counts what is sent.
+    """
+
+    def __init__(self) -> None:
+        self.bytes_sent = 0
+        self.datagrams_sent = 0
+
+    def close(self) -> None:
+        pass
+
+    def sendto(self, data: bytes, addr) -> None:
+        self.bytes_sent += len(data)
+        self.datagrams_sent += 1
+
+
+def spoofed_datagram(version: int) -> bytes:
+    """
+    Build a token-less Initial packet, padded to 1200 bytes.
+    """
+    return (
+        bytes([PACKET_TYPE_INITIAL])
+        + version.to_bytes(4, "big")
+        + b"\x08"
+        + os.urandom(8)
+        + b"\x08"
+        + os.urandom(8)
+        + b"\x00\x00"
+    ).ljust(1200, b"\x00")
+
+
+def main(count: int, kind: str, prefixes: int, rate_limit: bool) -> None:
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    server = QuicServer(
+        configuration=QuicConfiguration(is_client=False),
+        rate_limiter=QuicRateLimiter() if rate_limit else None,
+        retry=True,
+    )
+    transport = CountingTransport()
+    server.connection_made(transport)
+
+    # prepare the spoofed datagrams and their source addresses
+    version = (
+        UNSUPPORTED_VERSION if kind == "version" else QuicProtocolVersion.VERSION_1
+    )
+    datagrams = [spoofed_datagram(version) for i in range(min(count, 1000))]
+    addrs = [
+        (
+            "10.%d.%d.%d" % (i // 256 % 256, i % 256, random.randint(1, 254)),
+            random.randint(1024, 65535),
+        )
+        for i in range(prefixes)
+    ]
+
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    for i in range(count):
+        server.datagram_received(
+            datagrams[i % len(datagrams)], addrs[random.randrange(prefixes)]
+        )
+    elapsed = time.perf_counter() - start
+    elapsed_cpu = time.process_time() - start_cpu
+
+    print(
+        "%d spoofed packets in %.2f s: %.1f us CPU per packet"
+        % (count, elapsed, elapsed_cpu / count * 1000000)
+    )
+    print(
+        "%d responses sent (%d bytes, %.2f bytes per spoofed byte), %d dropped"
+        % (
+            transport.datagrams_sent,
+            transport.bytes_sent,
+            transport.bytes_sent / (count * 1200),
+            count - transport.datagrams_sent,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the server's handling of spoofed packet floods"
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=100000,
+        help="the number of spoofed packets to send (defaults to 100000)",
+    )
+    parser.add_argument(
+        "--kind",
+        choices=["initial", "version"],
+        default="initial",
+        help="send token-less Initial packets, which trigger a Retry, or packets "
+        "with an unsupported version, which trigger a Version Negotiation",
+    )
+    parser.add_argument(
+        "--no-rate-limit",
+        action="store_true",
+        help="answer every spoofed packet",
+    )
+    parser.add_argument(
+        "--prefixes",
+        type=int,
+        default=1000,
+        help="the number of /24 prefixes the packets appear to come from "
+        "(defaults to 1000)",
+    )
+    args = parser.parse_args()
+
+    main(
+        count=args.count,
+        kind=args.kind,
+        prefixes=args.prefixes,
+        rate_limit=not args.no_rate_limit,
+    )
@@ -0,0 +1,127 @@
+import argparse
+import ssl
+import time
+from typing import List, Optional
+
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.connection import QuicConnection
+from aioquic.tls import EphemeralKeyPool, Group, KeyShareCache
+
+GROUPS = {
+    "secp256r1": Group.SECP256R1,
+    "x25519": Group.X25519,
+    "x448": Group.X448,
+}
+SERVER_ADDR = ("127.0.0.1", 4433)
+CLIENT_ADDR = ("127.0.0.1", 1234)
+
+
+def handshake(
+    client_configuration: QuicConfiguration, server_configuration: QuicConfiguration
+) -> None:
+    """
+    Perform a handshake between two in-memory connections.
+    """
+    now = time.time()
+    client = QuicConnection(configuration=client_configuration)
+    server = QuicConnection(
+        configuration=server_configuration,
+        original_destination_connection_id=client.original_destination_connection_id,
+    )
+
+    client.connect(SERVER_ADDR, now=now)
+    while True:
+        datagrams = client.datagrams_to_send(now=now)
+        for data, addr in datagrams:
+            server.receive_datagram(data, CLIENT_ADDR, now=now)
+        replies = server.datagrams_to_send(now=now)
+        for data, addr in replies:
+            client.receive_datagram(data, SERVER_ADDR, now=now)
+        if not datagrams and not replies:
+            break
+    assert client.tls.state.name == "CLIENT_POST_HANDSHAKE", "handshake failed"
+
+
+def main(
+    certificate: str,
+    private_key: Optional[str],
+    count: int,
+    ephemeral_key_pool: bool,
+    key_share_cache: bool,
+    key_share_groups: Optional[List[int]],
+) -> None:
+    pool = EphemeralKeyPool() if ephemeral_key_pool else None
+    client_configuration = QuicConfiguration(
+        ephemeral_key_pool=pool,
+        is_client=True,
+        key_share_cache=KeyShareCache() if key_share_cache else None,
+        key_share_groups=key_share_groups,
+        server_name="localhost",
+        verify_mode=ssl.CERT_NONE,
+    )
+    server_configuration = QuicConfiguration(ephemeral_key_pool=pool, is_client=False)
+    server_configuration.load_cert_chain(certificate, private_key)
+
+    start = time.perf_counter()
+    for i in range(count):
+        handshake(client_configuration, server_configuration)
+    elapsed = time.perf_counter() - start
+    if pool is not None:
+        pool.close()
+
+    print(
+        "%d handshakes in %.2f s: %.0f handshakes/s" % (count, elapsed, count / elapsed)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QUIC handshake benchmark")
+    parser.add_argument(
+        "-c",
+        "--certificate",
+        type=str,
+        required=True,
+        help="load the TLS certificate from the specified file",
+    )
+    parser.add_argument(
+        "-k",
+        "--private-key",
+        type=str,
+        help="load the TLS private key from the specified file",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=500,
+        help="the number of handshakes to perform (defaults to 500)",
+    )
+    parser.add_argument(
+        "--ephemeral-key-pool",
+        action="store_true",
+        help="generate ephemeral keys in a background thread",
+    )
+    parser.add_argument(
+        "--key-share-cache",
+        action="store_true",
+        help="remember the group selected by the server",
+    )
+    parser.add_argument(
+        "--key-share-groups",
+        type=str,
+        help="a comma-separated list of groups to send key shares for, "
+        "for example x25519",
+    )
+    args = parser.parse_args()
+
+    main(
+        certificate=args.certificate,
+        private_key=args.private_key,
+        count=args.count,
+        ephemeral_key_pool=args.ephemeral_key_pool,
+        key_share_cache=args.key_share_cache,
+        key_share_groups=(
+            [GROUPS[name] for name in args.key_share_groups.split(",")]
+            if args.key_share_groups
+            else None
+        ),
+    )
@@ -35,6 +35,7 @@ except ImportError:
 logger = logging.getLogger("client")
 
 HttpConnection = Union[H0Connection, H3Connection]
+IDEMPOTENT_METHODS = frozenset(["DELETE", "GET", "HEAD", "OPTIONS", "PUT", "TRACE"])
 
 USER_AGENT = "aioquic/" + aioquic.__version__
 
@@ -159,6 +160,9 @@ class HttpClient(QuicConnectionProtocol):
         """
         Open a WebSocket.
         """
+        if self._quic.early_data_available:
+            await self.wait_connected()
+
         request = HttpRequest(method="CONNECT", url=URL(url))
         stream_id = self._quic.get_next_available_stream_id()
         websocket = WebSocket(
@@ -216,6 +220,10 @@ class HttpClient(QuicConnectionProtocol):
                 self.http_event_received(http_event)
 
     async def _request(self, request: HttpRequest) -> Deque[H3Event]:
+        # early data can be replayed, only send idempotent requests as 0-RTT
+        if request.method not in IDEMPOTENT_METHODS and self._quic.early_data_available:
+            await self.wait_connected()
+
         stream_id = self._quic.get_next_available_stream_id()
         self._http.send_headers(
             stream_id=stream_id,
@@ -421,6 +429,8 @@ async def main(
                 for url in urls
             ]
             await asyncio.gather(*coros)
+            if zero_rtt:
+                logger.info("0-RTT accepted: %s", client.early_data_accepted)
 
             # process http pushes
             process_http_pushes(client=client, include=include, output_dir=output_dir)
@@ -515,6 +525,11 @@ if __name__ == "__main__":
         default=defaults.max_datagram_size,
         help="maximum datagram size to send, excluding UDP or IP overhead",
     )
+    parser.add_argument(
+        "--max-discovered-datagram-size",
+        type=int,
+        help="enable path MTU discovery, up to the specified datagram size",
+    )
     parser.add_argument(
         "--zero-rtt", action="store_true", help="try to send requests using 0-RTT"
     )
@@ -535,6 +550,7 @@ if __name__ == "__main__":
         alpn_protocols=H0_ALPN if args.legacy_http else H3_ALPN,
         congestion_control_algorithm=args.congestion_control_algorithm,
         max_datagram_size=args.max_datagram_size,
+        max_discovered_datagram_size=args.max_discovered_datagram_size,
     )
     if args.ca_certs:
         configuration.load_verify_locations(args.ca_certs)
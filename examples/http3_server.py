@@ -1,499 +1,31 @@
 import argparse
-import asyncio
 import importlib
 import logging
-import time
-from collections import deque
-from email.utils import formatdate
-from typing import Callable, Deque, Dict, List, Optional, Union, cast
+from concurrent.futures import ThreadPoolExecutor
 
-import aioquic
-import wsproto
-import wsproto.events
-from aioquic.asyncio import QuicConnectionProtocol, serve
-from aioquic.h0.connection import H0_ALPN, H0Connection
-from aioquic.h3.connection import H3_ALPN, H3Connection
-from aioquic.h3.events import (
-    DatagramReceived,
-    DataReceived,
-    H3Event,
-    HeadersReceived,
-    WebTransportStreamDataReceived,
-)
-from aioquic.h3.exceptions import NoAvailablePushIDError
+from aioquic.asgi import HttpServerProtocol, run
+from aioquic.h0.connection import H0_ALPN
+from aioquic.h3.connection import H3_ALPN
 from aioquic.quic.configuration import QuicConfiguration
-from aioquic.quic.events import DatagramFrameReceived, ProtocolNegotiated, QuicEvent
-from aioquic.quic.logger import QuicFileLogger
-from aioquic.tls import SessionTicket
+from aioquic.quic.events import DatagramFrameReceived, QuicEvent
+from aioquic.quic.logger import QuicFileLogger, QuicStreamingLogger
+from aioquic.tls import ExecutorSigner, SessionTicketSealer
 
 try:
     import uvloop
 except ImportError:
     uvloop = None
 
-AsgiApplication = Callable
-HttpConnection = Union[H0Connection, H3Connection]
 
-SERVER_NAME = "aioquic/" + aioquic.__version__
-
-
-class HttpRequestHandler:
-    def __init__(
-        self,
-        *,
-        authority: bytes,
-        connection: HttpConnection,
-        protocol: QuicConnectionProtocol,
-        scope: Dict,
-        stream_ended: bool,
-        stream_id: int,
-        transmit: Callable[[], None],
-    ) -> None:
-        self.authority = authority
-        self.connection = connection
-        self.protocol = protocol
-        self.queue: asyncio.Queue[Dict] = asyncio.Queue()
-        self.scope = scope
-        self.stream_id = stream_id
-        self.transmit = transmit
-
-        if stream_ended:
-            self.queue.put_nowait({"type": "http.request"})
-
-    def http_event_received(self, event: H3Event) -> None:
-        if isinstance(event, DataReceived):
-            self.queue.put_nowait(
-                {
-                    "type": "http.request",
-                    "body": event.data,
-                    "more_body": not event.stream_ended,
-                }
-            )
-        elif isinstance(event, HeadersReceived) and event.stream_ended:
-            self.queue.put_nowait(
-                {"type": "http.request", "body": b"", "more_body": False}
-            )
-
-    async def run_asgi(self, app: AsgiApplication) -> None:
-        await app(self.scope, self.receive, self.send)
-
-    async def receive(self) -> Dict:
-        return await self.queue.get()
-
-    async def send(self, message: Dict) -> None:
-        if message["type"] == "http.response.start":
-            self.connection.send_headers(
-                stream_id=self.stream_id,
-                headers=[
-                    (b":status", str(message["status"]).encode()),
-                    (b"server", SERVER_NAME.encode()),
-                    (b"date", formatdate(time.time(), usegmt=True).encode()),
-                ]
-                + [(k, v) for k, v in message["headers"]],
-            )
-        elif message["type"] == "http.response.body":
-            self.connection.send_data(
-                stream_id=self.stream_id,
-                data=message.get("body", b""),
-                end_stream=not message.get("more_body", False),
-            )
-        elif message["type"] == "http.response.push" and isinstance(
-            self.connection, H3Connection
-        ):
-            request_headers = [
-                (b":method", b"GET"),
-                (b":scheme", b"https"),
-                (b":authority", self.authority),
-                (b":path", message["path"].encode()),
-            ] + [(k, v) for k, v in message["headers"]]
-
-            # send push promise
-            try:
-                push_stream_id = self.connection.send_push_promise(
-                    stream_id=self.stream_id, headers=request_headers
-                )
-            except NoAvailablePushIDError:
-                return
-
-            # fake request
-            cast(HttpServerProtocol, self.protocol).http_event_received(
-                HeadersReceived(
-                    headers=request_headers, stream_ended=True, stream_id=push_stream_id
-                )
-            )
-        self.transmit()
-
-
-class WebSocketHandler:
-    def __init__(
-        self,
-        *,
-        connection: HttpConnection,
-        scope: Dict,
-        stream_id: int,
-        transmit: Callable[[], None],
-    ) -> None:
-        self.closed = False
-        self.connection = connection
-        self.http_event_queue: Deque[DataReceived] = deque()
-        self.queue: asyncio.Queue[Dict] = asyncio.Queue()
-        self.scope = scope
-        self.stream_id = stream_id
-        self.transmit = transmit
-        self.websocket: Optional[wsproto.Connection] = None
-
-    def http_event_received(self, event: H3Event) -> None:
-        if isinstance(event, DataReceived) and not self.closed:
-            if self.websocket is not None:
-                self.websocket.receive_data(event.data)
-
-                for ws_event in self.websocket.events():
-                    self.websocket_event_received(ws_event)
-            else:
-                # delay event processing until we get `websocket.accept`
-                # from the ASGI application
-                self.http_event_queue.append(event)
-
-    def websocket_event_received(self, event: wsproto.events.Event) -> None:
-        if isinstance(event, wsproto.events.TextMessage):
-            self.queue.put_nowait({"type": "websocket.receive", "text": event.data})
-        elif isinstance(event, wsproto.events.Message):
-            self.queue.put_nowait({"type": "websocket.receive", "bytes": event.data})
-        elif isinstance(event, wsproto.events.CloseConnection):
-            self.queue.put_nowait({"type": "websocket.disconnect", "code": event.code})
-
-    async def run_asgi(self, app: AsgiApplication) -> None:
-        self.queue.put_nowait({"type": "websocket.connect"})
-
-        try:
-            await app(self.scope, self.receive, self.send)
-        finally:
-            if not self.closed:
-                await self.send({"type": "websocket.close", "code": 1000})
-
-    async def receive(self) -> Dict:
-        return await self.queue.get()
-
-    async def send(self, message: Dict) -> None:
-        data = b""
-        end_stream = False
-        if message["type"] == "websocket.accept":
-            subprotocol = message.get("subprotocol")
-
-            self.websocket = wsproto.Connection(wsproto.ConnectionType.SERVER)
-
-            headers = [
-                (b":status", b"200"),
-                (b"server", SERVER_NAME.encode()),
-                (b"date", formatdate(time.time(), usegmt=True).encode()),
-            ]
-            if subprotocol is not None:
-                headers.append((b"sec-websocket-protocol", subprotocol.encode()))
-            self.connection.send_headers(stream_id=self.stream_id, headers=headers)
-
-            # consume backlog
-            while self.http_event_queue:
-                self.http_event_received(self.http_event_queue.popleft())
-
-        elif message["type"] == "websocket.close":
-            if self.websocket is not None:
-                data = self.websocket.send(
-                    wsproto.events.CloseConnection(code=message["code"])
-                )
-            else:
-                self.connection.send_headers(
-                    stream_id=self.stream_id, headers=[(b":status", b"403")]
-                )
-            end_stream = True
-        elif message["type"] == "websocket.send":
-            if message.get("text") is not None:
-                data = self.websocket.send(
-                    wsproto.events.TextMessage(data=message["text"])
-                )
-            elif message.get("bytes") is not None:
-                data = self.websocket.send(
-                    wsproto.events.Message(data=message["bytes"])
-                )
-
-        if data:
-            self.connection.send_data(
-                stream_id=self.stream_id, data=data, end_stream=end_stream
-            )
-        if end_stream:
-            self.closed = True
-        self.transmit()
-
-
-class WebTransportHandler:
-    def __init__(
-        self,
-        *,
-        connection: HttpConnection,
-        scope: Dict,
-        stream_id: int,
-        transmit: Callable[[], None],
-    ) -> None:
-        self.accepted = False
-        self.closed = False
-        self.connection = connection
-        self.http_event_queue: Deque[DataReceived] = deque()
-        self.queue: asyncio.Queue[Dict] = asyncio.Queue()
-        self.scope = scope
-        self.stream_id = stream_id
-        self.transmit = transmit
-
-    def http_event_received(self, event: H3Event) -> None:
-        if not self.closed:
-            if self.accepted:
-                if isinstance(event, DatagramReceived):
-                    self.queue.put_nowait(
-                        {
-                            "data": event.data,
-                            "type": "webtransport.datagram.receive",
-                        }
-                    )
-                elif isinstance(event, WebTransportStreamDataReceived):
-                    self.queue.put_nowait(
-                        {
-                            "data": event.data,
-                            "stream": event.stream_id,
-                            "type": "webtransport.stream.receive",
-                        }
-                    )
-            else:
-                # delay event processing until we get `webtransport.accept`
-                # from the ASGI application
-                self.http_event_queue.append(event)
-
-    async def run_asgi(self, app: AsgiApplication) -> None:
-        self.queue.put_nowait({"type": "webtransport.connect"})
-
-        try:
-            await app(self.scope, self.receive, self.send)
-        finally:
-            if not self.closed:
-                await self.send({"type": "webtransport.close"})
-
-    async def receive(self) -> Dict:
-        return await self.queue.get()
-
-    async def send(self, message: Dict) -> None:
-        data = b""
-        end_stream = False
-
-        if message["type"] == "webtransport.accept":
-            self.accepted = True
-
-            headers = [
-                (b":status", b"200"),
-                (b"server", SERVER_NAME.encode()),
-                (b"date", formatdate(time.time(), usegmt=True).encode()),
-                (b"sec-webtransport-http3-draft", b"draft02"),
-            ]
-            self.connection.send_headers(stream_id=self.stream_id, headers=headers)
-
-            # consume backlog
-            while self.http_event_queue:
-                self.http_event_received(self.http_event_queue.popleft())
-        elif message["type"] == "webtransport.close":
-            if not self.accepted:
-                self.connection.send_headers(
-                    stream_id=self.stream_id, headers=[(b":status", b"403")]
-                )
-            end_stream = True
-        elif message["type"] == "webtransport.datagram.send":
-            self.connection.send_datagram(
-                stream_id=self.stream_id, data=message["data"]
-            )
-        elif message["type"] == "webtransport.stream.send":
-            self.connection._quic.send_stream_data(
-                stream_id=message["stream"], data=message["data"]
-            )
-
-        if data or end_stream:
-            self.connection.send_data(
-                stream_id=self.stream_id, data=data, end_stream=end_stream
-            )
-        if end_stream:
-            self.closed = True
-        self.transmit()
-
-
-Handler = Union[HttpRequestHandler, WebSocketHandler, WebTransportHandler]
-
-
-class HttpServerProtocol(QuicConnectionProtocol):
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._handlers: Dict[int, Handler] = {}
-        self._http: Optional[HttpConnection] = None
-
-    def http_event_received(self, event: H3Event) -> None:
-        if isinstance(event, HeadersReceived) and event.stream_id not in self._handlers:
-            authority = None
-            headers = []
-            http_version = "0.9" if isinstance(self._http, H0Connection) else "3"
-            raw_path = b""
-            method = ""
-            protocol = None
-            for header, value in event.headers:
-                if header == b":authority":
-                    authority = value
-                    headers.append((b"host", value))
-                elif header == b":method":
-                    method = value.decode()
-                elif header == b":path":
-                    raw_path = value
-                elif header == b":protocol":
-                    protocol = value.decode()
-                elif header and not header.startswith(b":"):
-                    headers.append((header, value))
-
-            if b"?" in raw_path:
-                path_bytes, query_string = raw_path.split(b"?", maxsplit=1)
-            else:
-                path_bytes, query_string = raw_path, b""
-            path = path_bytes.decode()
-            self._quic._logger.info("HTTP request %s %s", method, path)
-
-            # FIXME: add a public API to retrieve peer address
-            client_addr = self._http._quic._network_paths[0].addr
-            client = (client_addr[0], client_addr[1])
-
-            handler: Handler
-            scope: Dict
-            if method == "CONNECT" and protocol == "websocket":
-                subprotocols: List[str] = []
-                for header, value in event.headers:
-                    if header == b"sec-websocket-protocol":
-                        subprotocols = [x.strip() for x in value.decode().split(",")]
-                scope = {
-                    "client": client,
-                    "headers": headers,
-                    "http_version": http_version,
-                    "method": method,
-                    "path": path,
-                    "query_string": query_string,
-                    "raw_path": raw_path,
-                    "root_path": "",
-                    "scheme": "wss",
-                    "subprotocols": subprotocols,
-                    "type": "websocket",
-                }
-                handler = WebSocketHandler(
-                    connection=self._http,
-                    scope=scope,
-                    stream_id=event.stream_id,
-                    transmit=self.transmit,
-                )
-            elif method == "CONNECT" and protocol == "webtransport":
-                scope = {
-                    "client": client,
-                    "headers": headers,
-                    "http_version": http_version,
-                    "method": method,
-                    "path": path,
-                    "query_string": query_string,
-                    "raw_path": raw_path,
-                    "root_path": "",
-                    "scheme": "https",
-                    "type": "webtransport",
-                }
-                handler = WebTransportHandler(
-                    connection=self._http,
-                    scope=scope,
-                    stream_id=event.stream_id,
-                    transmit=self.transmit,
-                )
-            else:
-                extensions: Dict[str, Dict] = {}
-                if isinstance(self._http, H3Connection):
-                    extensions["http.response.push"] = {}
-                scope = {
-                    "client": client,
-                    "extensions": extensions,
-                    "headers": headers,
-                    "http_version": http_version,
-                    "method": method,
-                    "path": path,
-                    "query_string": query_string,
-                    "raw_path": raw_path,
-                    "root_path": "",
-                    "scheme": "https",
-                    "type": "http",
-                }
-                handler = HttpRequestHandler(
-                    authority=authority,
-                    connection=self._http,
-                    protocol=self,
-                    scope=scope,
-                    stream_ended=event.stream_ended,
-                    stream_id=event.stream_id,
-                    transmit=self.transmit,
-                )
-            self._handlers[event.stream_id] = handler
-            asyncio.ensure_future(handler.run_asgi(application))
-        elif (
-            isinstance(event, (DataReceived, HeadersReceived))
-            and event.stream_id in self._handlers
-        ):
-            handler = self._handlers[event.stream_id]
-            handler.http_event_received(event)
-        elif isinstance(event, DatagramReceived):
-            handler = self._handlers[event.stream_id]
-            handler.http_event_received(event)
-        elif isinstance(event, WebTransportStreamDataReceived):
-            handler = self._handlers[event.session_id]
-            handler.http_event_received(event)
-
-    def quic_event_received(self, event: QuicEvent) -> None:
-        if isinstance(event, ProtocolNegotiated):
-            if event.alpn_protocol in H3_ALPN:
-                self._http = H3Connection(self._quic, enable_webtransport=True)
-            elif event.alpn_protocol in H0_ALPN:
-                self._http = H0Connection(self._quic)
-        elif isinstance(event, DatagramFrameReceived):
-            if event.data == b"quack":
-                self._quic.send_datagram_frame(b"quack-ack")
-
-        #  pass event to the HTTP layer
-        if self._http is not None:
-            for http_event in self._http.handle_event(event):
-                self.http_event_received(http_event)
-
-
-class SessionTicketStore:
+class DemoServerProtocol(HttpServerProtocol):
     """
-    Simple in-memory store for session tickets.
+    Serves the ASGI application and answers "siduck" datagrams.
     """
 
-    def __init__(self) -> None:
-        self.tickets: Dict[bytes, SessionTicket] = {}
-
-    def add(self, ticket: SessionTicket) -> None:
-        self.tickets[ticket.ticket] = ticket
-
-    def pop(self, label: bytes) -> Optional[SessionTicket]:
-        return self.tickets.pop(label, None)
-
-
-async def main(
-    host: str,
-    port: int,
-    configuration: QuicConfiguration,
-    session_ticket_store: SessionTicketStore,
-    retry: bool,
-) -> None:
-    await serve(
-        host,
-        port,
-        configuration=configuration,
-        create_protocol=HttpServerProtocol,
-        session_ticket_fetcher=session_ticket_store.pop,
-        session_ticket_handler=session_ticket_store.add,
-        retry=retry,
-    )
-    await asyncio.Future()
+    def quic_event_received(self, event: QuicEvent) -> None:
+        if isinstance(event, DatagramFrameReceived) and event.data == b"quack":
+            self._quic.send_datagram_frame(b"quack-ack")
+        super().quic_event_received(event)
 
 
 if __name__ == "__main__":
@@ -550,20 +82,48 @@ if __name__ == "__main__":
         default=defaults.max_datagram_size,
         help="maximum datagram size to send, excluding UDP or IP overhead",
     )
+    parser.add_argument(
+        "--max-discovered-datagram-size",
+        type=int,
+        help="enable path MTU discovery, up to the specified datagram size",
+    )
     parser.add_argument(
         "-q",
         "--quic-log",
         type=str,
         help="log QUIC events to QLOG files in the specified directory",
     )
+    parser.add_argument(
+        "--quic-log-streaming",
+        action="store_true",
+        help="stream QUIC events to rotating JSON-SEQ files instead of writing "
+        "one file per connection when it ends",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics over HTTP on localhost at the specified port",
+    )
     parser.add_argument(
         "--retry",
         action="store_true",
         help="send a retry for new connections",
     )
+    parser.add_argument(
+        "--signer-threads",
+        type=int,
+        help="compute TLS signatures in the specified number of threads, "
+        "instead of on the event loop",
+    )
     parser.add_argument(
         "-v", "--verbose", action="store_true", help="increase logging verbosity"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="run the specified number of worker processes (defaults to 1)",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -577,7 +137,9 @@ if __name__ == "__main__":
     application = getattr(module, attr_str)
 
     # create QUIC logger
-    if args.quic_log:
+    if args.quic_log and args.quic_log_streaming:
+        quic_logger = QuicStreamingLogger(args.quic_log)
+    elif args.quic_log:
         quic_logger = QuicFileLogger(args.quic_log)
     else:
         quic_logger = None
@@ -594,25 +156,30 @@ if __name__ == "__main__":
         is_client=False,
         max_datagram_frame_size=65536,
         max_datagram_size=args.max_datagram_size,
+        max_discovered_datagram_size=args.max_discovered_datagram_size,
         quic_logger=quic_logger,
         secrets_log_file=secrets_log_file,
+        session_ticket_sealer=SessionTicketSealer(),
     )
 
     # load SSL certificate and key
     configuration.load_cert_chain(args.certificate, args.private_key)
+    if args.signer_threads:
+        configuration.certificate_signer = ExecutorSigner(
+            configuration.private_key,
+            ThreadPoolExecutor(max_workers=args.signer_threads),
+        )
 
     if uvloop is not None:
         uvloop.install()
 
-    try:
-        asyncio.run(
-            main(
-                host=args.host,
-                port=args.port,
-                configuration=configuration,
-                session_ticket_store=SessionTicketStore(),
-                retry=args.retry,
-            )
-        )
-    except KeyboardInterrupt:
-        pass
+    run(
+        application,
+        args.host,
+        args.port,
+        configuration=configuration,
+        create_protocol=DemoServerProtocol,
+        metrics_port=args.metrics_port,
+        retry=args.retry,
+        workers=args.workers,
+    )
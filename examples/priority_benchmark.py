@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple, cast
+
+from aioquic.asgi import run
+from aioquic.asyncio.client import connect
+from aioquic.asyncio.protocol import QuicConnectionProtocol
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import DataReceived, HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import QuicEvent
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+CHUNK_SIZE = 65536
+
+
+async def app(scope: Dict, receive, send) -> None:
+    """
+    An ASGI application which answers `/large?size=N` with N bytes and
+    anything else with a small body.
+    """
+    size = 5
+    if scope["path"] == "/large":
+        size = int(scope["query_string"].split(b"=")[1])
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", str(size).encode())],
+        }
+    )
+    while size > CHUNK_SIZE:
+        await send(
+            {"type": "http.response.body", "body": b"Z" * CHUNK_SIZE, "more_body": True}
+        )
+        size -= CHUNK_SIZE
+    await send({"type": "http.response.body", "body": b"Z" * size})
+
+
+class BenchmarkClient(QuicConnectionProtocol):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._first_byte: Dict[int, asyncio.Future[None]] = {}
+        self._waiters: Dict[int, asyncio.Future[None]] = {}
+
+    async def get(
+        self, authority: str, path: str, priority: Optional[bytes] = None
+    ) -> Tuple[float, float]:
+        """
+        Perform a GET request and return the time to first byte and the
+        total time.
+        """
+        headers = [
+            (b":method", b"GET"),
+            (b":scheme", b"https"),
+            (b":authority", authority.encode()),
+            (b":path", path.encode()),
+        ]
+        if priority is not None:
+            headers.append((b"priority", priority))
+
+        start = time.perf_counter()
+        stream_id = self._quic.get_next_available_stream_id()
+        self._http.send_headers(stream_id=stream_id, headers=headers, end_stream=True)
+        first_byte = self._loop.create_future()
+        waiter = self._loop.create_future()
+        self._first_byte[stream_id] = first_byte
+        self._waiters[stream_id] = waiter
+        self.transmit()
+
+        await asyncio.shield(first_byte)
+        ttfb = time.perf_counter() - start
+        await asyncio.shield(waiter)
+        return ttfb, time.perf_counter() - start
+
+    def quic_event_received(self, event: QuicEvent) -> None:
+        for http_event in self._http.handle_event(event):
+            if isinstance(http_event, DataReceived):
+                first_byte = self._first_byte.pop(http_event.stream_id, None)
+                if first_byte is not None:
+                    first_byte.set_result(None)
+            if (
+                isinstance(http_event, (DataReceived, HeadersReceived))
+                and http_event.stream_ended
+            ):
+                waiter = self._waiters.pop(http_event.stream_id, None)
+                if waiter is not None:
+                    waiter.set_result(None)
+
+
+async def main(host: str, port: int, size: int, prioritize: bool) -> None:
+    configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=True)
+    configuration.verify_mode = ssl.CERT_NONE
+    async with connect(
+        host, port, configuration=configuration, create_protocol=BenchmarkClient
+    ) as client:
+        client = cast(BenchmarkClient, client)
+        authority = "%s:%d" % (host, port)
+
+        # start the large download and let it fill the pipe
+        large = asyncio.ensure_future(
+            client.get(authority, "/large?size=%d" % size, priority=b"u=3")
+        )
+        await asyncio.sleep(0.5)
+
+        # request small resources while the download is in progress
+        small: List[float] = []
+        while not large.done():
+            ttfb, _ = await client.get(
+                authority, "/small", priority=b"u=0" if prioritize else None
+            )
+            small.append(ttfb)
+            await asyncio.sleep(0.1)
+        _, large_elapsed = await large
+
+    small.sort()
+    print(
+        "large: %d bytes in %.2f s, small: %d requests, TTFB p50 %.2f ms, max %.2f ms"
+        % (
+            size,
+            large_elapsed,
+            len(small),
+            small[len(small) // 2] * 1000 if small else 0,
+            small[-1] * 1000 if small else 0,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/3 priorities benchmark")
+    parser.add_argument(
+        "-c",
+        "--certificate",
+        type=str,
+        required=True,
+        help="load the TLS certificate from the specified file",
+    )
+    parser.add_argument(
+        "-k",
+        "--private-key",
+        type=str,
+        help="load the TLS private key from the specified file",
+    )
+    parser.add_argument(
+        "--no-priority",
+        action="store_true",
+        help="do not send a priority header for the small requests",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=4433,
+        help="the port to listen on (defaults to 4433)",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=100 * 1024 * 1024,
+        help="the size of the large response in bytes (defaults to 100 MB)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="increase logging verbosity"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+    )
+
+    if uvloop is not None:
+        uvloop.install()
+
+    # start the server in the background
+    configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=False)
+    configuration.load_cert_chain(args.certificate, args.private_key)
+    server = multiprocessing.Process(
+        target=run,
+        args=(app, "127.0.0.1", args.port),
+        kwargs={"configuration": configuration},
+    )
+    server.start()
+    time.sleep(1)
+
+    try:
+        asyncio.run(
+            main(
+                host="127.0.0.1",
+                port=args.port,
+                size=args.size,
+                prioritize=not args.no_priority,
+            )
+        )
+    finally:
+        os.kill(server.pid, signal.SIGINT)
+        server.join()
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import ssl
+import time
+from typing import Dict, List, Optional, Tuple, cast
+
+from aioquic.asgi import run
+from aioquic.asyncio.client import connect
+from aioquic.asyncio.protocol import QuicConnectionProtocol
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import DataReceived, HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import QuicEvent
+from aioquic.quic.session_cache import SessionCache
+from aioquic.tls import SessionTicket, SessionTicketSealer
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+Address = Tuple[str, int]
+
+
+async def app(scope: Dict, receive, send) -> None:
+    """
+    An ASGI application which answers every request with a small body.
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", b"5")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"hello"})
+
+
+class LinkUpstream(asyncio.DatagramProtocol):
+    def __init__(self, link: "Link", client_addr: Address) -> None:
+        self._client_addr = client_addr
+        self._link = link
+
+    def datagram_received(self, data: bytes, addr: Address) -> None:
+        self._link.delay(self._link.transport.sendto, data, self._client_addr)
+
+
+class Link(asyncio.DatagramProtocol):
+    """
+    A UDP relay which delays datagrams by half the round-trip time in each
+    direction, simulating a link with the given latency.
+    """
+
+    def __init__(self, server_addr: Address, rtt: float) -> None:
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._loop = asyncio.get_event_loop()
+        self._pending: Dict[Address, List[bytes]] = {}
+        self._rtt = rtt
+        self._server_addr = server_addr
+        self._upstreams: Dict[Address, asyncio.DatagramTransport] = {}
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def datagram_received(self, data: bytes, addr: Address) -> None:
+        upstream = self._upstreams.get(addr)
+        if upstream is not None:
+            self.delay(upstream.sendto, data)
+        elif addr in self._pending:
+            self._pending[addr].append(data)
+        else:
+            self._pending[addr] = [data]
+            asyncio.ensure_future(self._open_upstream(addr))
+
+    def delay(self, send, *args) -> None:
+        self._loop.call_later(self._rtt / 2, send, *args)
+
+    async def _open_upstream(self, client_addr: Address) -> None:
+        upstream, _ = await self._loop.create_datagram_endpoint(
+            lambda: LinkUpstream(self, client_addr), remote_addr=self._server_addr
+        )
+        self._upstreams[client_addr] = upstream
+        for data in self._pending.pop(client_addr):
+            self.delay(upstream.sendto, data)
+
+
+class BenchmarkClient(QuicConnectionProtocol):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._waiters: Dict[int, asyncio.Future[None]] = {}
+
+    async def get(self, authority: str, path: str) -> None:
+        """
+        Perform a GET request and wait for the response.
+        """
+        stream_id = self._quic.get_next_available_stream_id()
+        self._http.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b":method", b"GET"),
+                (b":scheme", b"https"),
+                (b":authority", authority.encode()),
+                (b":path", path.encode()),
+            ],
+            end_stream=True,
+        )
+        waiter = self._loop.create_future()
+        self._waiters[stream_id] = waiter
+        self.transmit()
+
+        await asyncio.shield(waiter)
+
+    def quic_event_received(self, event: QuicEvent) -> None:
+        for http_event in self._http.handle_event(event):
+            if (
+                isinstance(http_event, (DataReceived, HeadersReceived))
+                and http_event.stream_ended
+            ):
+                waiter = self._waiters.pop(http_event.stream_id, None)
+                if waiter is not None:
+                    waiter.set_result(None)
+
+
+async def run_requests(
+    host: str, port: int, count: int, zero_rtt: bool
+) -> Tuple[List[float], int]:
+    """
+    Connect `count` times and perform a request over each connection.
+
+    Return the time taken by each request and the number of connections
+    whose early data was accepted.
+    """
+    configuration = QuicConfiguration(
+        alpn_protocols=H3_ALPN,
+        is_client=True,
+        server_name="localhost",
+        session_cache=SessionCache() if zero_rtt else None,
+        verify_mode=ssl.CERT_NONE,
+    )
+    authority = "localhost:%d" % port
+    accepted = 0
+    timings: List[float] = []
+
+    # the first connection obtains a session ticket
+    for i in range(count + 1):
+        ticket_received = asyncio.Event()
+
+        def handle_ticket(ticket: SessionTicket) -> None:
+            ticket_received.set()
+
+        start = time.perf_counter()
+        async with connect(
+            host,
+            port,
+            configuration=configuration,
+            create_protocol=BenchmarkClient,
+            session_ticket_handler=handle_ticket,
+            wait_connected=not zero_rtt,
+        ) as client:
+            client = cast(BenchmarkClient, client)
+            await client.get(authority, "/")
+            if i:
+                timings.append(time.perf_counter() - start)
+            if client.early_data_accepted:
+                accepted += 1
+
+            # keep the ticket for the next connection
+            if zero_rtt:
+                await ticket_received.wait()
+
+    return timings, accepted
+
+
+async def main(server_port: int, link_port: int, count: int, rtt: float) -> None:
+    loop = asyncio.get_event_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: Link(("127.0.0.1", server_port), rtt),
+        local_addr=("127.0.0.1", link_port),
+    )
+
+    try:
+        for zero_rtt in (False, True):
+            timings, accepted = await run_requests(
+                host="127.0.0.1", port=link_port, count=count, zero_rtt=zero_rtt
+            )
+            timings.sort()
+            print(
+                "%s: %d requests, p50 %.1f ms, max %.1f ms, 0-RTT accepted %d times"
+                % (
+                    "0-RTT" if zero_rtt else "1-RTT",
+                    count,
+                    timings[len(timings) // 2] * 1000,
+                    timings[-1] * 1000,
+                    accepted,
+                )
+            )
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/3 0-RTT latency benchmark")
+    parser.add_argument(
+        "-c",
+        "--certificate",
+        type=str,
+        required=True,
+        help="load the TLS certificate from the specified file",
+    )
+    parser.add_argument(
+        "-k",
+        "--private-key",
+        type=str,
+        help="load the TLS private key from the specified file",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=20,
+        help="the number of connections to perform in each mode (defaults to 20)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=4433,
+        help="the port to listen on (defaults to 4433)",
+    )
+    parser.add_argument(
+        "--rtt",
+        type=float,
+        default=100,
+        help="the round-trip time of the simulated link in ms (defaults to 100)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="increase logging verbosity"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+    )
+
+    if uvloop is not None:
+        uvloop.install()
+
+    # start the server in the background
+    configuration = QuicConfiguration(
+        alpn_protocols=H3_ALPN,
+        is_client=False,
+        session_ticket_sealer=SessionTicketSealer(),
+    )
+    configuration.load_cert_chain(args.certificate, args.private_key)
+    server = multiprocessing.Process(
+        target=run,
+        args=(app, "127.0.0.1", args.port),
+        kwargs={"configuration": configuration},
+    )
+    server.start()
+    time.sleep(1)
+
+    try:
+        asyncio.run(
+            main(
+                server_port=args.port,
+                link_port=args.port + 1,
+                count=args.count,
+                rtt=args.rtt / 1000,
+            )
+        )
+    finally:
+        os.kill(server.pid, signal.SIGINT)
+        server.join()
@@ -382,13 +382,68 @@ static PyType_Spec BufferType_spec = {
     BufferType_slots
 };
 
+#define CONNECTION_ID_MAX_SIZE 20
+#define PACKET_LONG_HEADER 0x80
+
+static PyObject *
+peek_quic_header(PyObject *self, PyObject *args)
+{
+    const unsigned char *data;
+    Py_ssize_t data_len, host_cid_length;
+    if (!PyArg_ParseTuple(args, "y#n", &data, &data_len, &host_cid_length))
+        return NULL;
+
+    const unsigned char *end = data + data_len;
+    const unsigned char *pos = data;
+    if (pos + 1 > end) {
+        PyErr_SetString(BufferReadError, "Read out of bounds");
+        return NULL;
+    }
+
+    if (!(*pos & PACKET_LONG_HEADER)) {
+        // short header packet
+        pos += 1;
+        if (host_cid_length < 0 || pos + host_cid_length > end) {
+            PyErr_SetString(BufferReadError, "Read out of bounds");
+            return NULL;
+        }
+        return Py_BuildValue("(OOy#)", Py_False, Py_None, pos, host_cid_length);
+    }
+
+    // long header packet
+    pos += 1;
+    if (pos + 5 > end) {
+        PyErr_SetString(BufferReadError, "Read out of bounds");
+        return NULL;
+    }
+    uint32_t version = (uint32_t)(*pos) << 24 |
+                       (uint32_t)(*(pos + 1)) << 16 |
+                       (uint32_t)(*(pos + 2)) << 8 |
+                       (uint32_t)(*(pos + 3));
+    Py_ssize_t cid_length = *(pos + 4);
+    pos += 5;
+    if (cid_length > CONNECTION_ID_MAX_SIZE) {
+        PyErr_Format(PyExc_ValueError, "Destination CID is too long (%d bytes)", (int)cid_length);
+        return NULL;
+    }
+    if (pos + cid_length > end) {
+        PyErr_SetString(BufferReadError, "Read out of bounds");
+        return NULL;
+    }
+    return Py_BuildValue("(Oky#)", Py_True, (unsigned long)version, pos, cid_length);
+}
+
+static PyMethodDef module_methods[] = {
+    {"peek_quic_header", peek_quic_header, METH_VARARGS, "Parse the fields of a QUIC packet header needed to route it."},
+    {NULL}
+};
 
 static struct PyModuleDef moduledef = {
     PyModuleDef_HEAD_INIT,
     MODULE_NAME,                        /* m_name */
     "Serialization utilities.",         /* m_doc */
     -1,                                 /* m_size */
-    NULL,                               /* m_methods */
+    module_methods,                     /* m_methods */
     NULL,                               /* m_reload */
     NULL,                               /* m_traverse */
     NULL,                               /* m_clear */
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 class BufferReadError(ValueError): ...
 class BufferWriteError(ValueError): ...
@@ -25,3 +25,7 @@ class Buffer:
     def push_uint32(self, v: int) -> None: ...
     def push_uint64(self, v: int) -> None: ...
     def push_uint_var(self, value: int) -> None: ...
+
+def peek_quic_header(
+    data: bytes, host_cid_length: int
+) -> Tuple[bool, Optional[int], bytes]: ...
@@ -0,0 +1,2 @@
+from .protocol import HttpServerProtocol  # noqa
+from .server import run, serve  # noqa
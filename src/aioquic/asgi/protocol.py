@@ -0,0 +1,591 @@
+import asyncio
+import time
+from collections import deque
+from email.utils import formatdate
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple, Union, cast
+
+from .. import __version__
+from ..asyncio import QuicConnectionProtocol
+from ..h0.connection import H0_ALPN, H0Connection
+from ..h3.connection import H3_ALPN, H3Connection
+from ..h3.events import (
+    DatagramReceived,
+    DataReceived,
+    H3Event,
+    HeadersReceived,
+    WebTransportStreamDataReceived,
+)
+from ..h3.exceptions import NoAvailablePushIDError
+from ..quic.events import ProtocolNegotiated, QuicEvent
+
+try:
+    import wsproto
+    import wsproto.events
+except ImportError:  # pragma: no cover
+    wsproto = None
+
+AsgiApplication = Callable
+HttpConnection = Union[H0Connection, H3Connection]
+
+DEFAULT_MAX_QUEUE_SIZE = 65536
+SERVER_NAME = "aioquic/" + __version__
+
+
+class MessageQueue:
+    """
+    A queue of ASGI messages which applies back-pressure to QUIC streams.
+
+    Each message carries the number of stream bytes it represents. Once more
+    than `max_size` bytes are queued for a stream, `pause_reading` is called
+    with the stream ID so that the stream's flow control limit stops being
+    raised. When the application has consumed enough messages for the stream
+    to fall back under `max_size`, `resume_reading` is called.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int,
+        pause_reading: Callable[[int], None],
+        resume_reading: Callable[[int], None],
+    ) -> None:
+        self._buffered: Dict[int, int] = {}
+        self._max_size = max_size
+        self._pause_reading = pause_reading
+        self._paused: Set[int] = set()
+        self._queue: asyncio.Queue[Tuple[Dict, int, int]] = asyncio.Queue()
+        self._resume_reading = resume_reading
+
+    def buffered_size(self, stream_id: int) -> int:
+        """
+        Return the number of bytes queued for the given stream.
+        """
+        return self._buffered.get(stream_id, 0)
+
+    async def get(self) -> Dict:
+        message, stream_id, size = await self._queue.get()
+        if size:
+            buffered = self._buffered[stream_id] - size
+            if buffered:
+                self._buffered[stream_id] = buffered
+            else:
+                del self._buffered[stream_id]
+
+            if stream_id in self._paused and buffered < self._max_size:
+                self._paused.discard(stream_id)
+                self._resume_reading(stream_id)
+        return message
+
+    def put_nowait(self, message: Dict, stream_id: int = -1, size: int = 0) -> None:
+        self._queue.put_nowait((message, stream_id, size))
+        if size:
+            buffered = self._buffered.get(stream_id, 0) + size
+            self._buffered[stream_id] = buffered
+
+            if stream_id not in self._paused and buffered >= self._max_size:
+                self._paused.add(stream_id)
+                self._pause_reading(stream_id)
+
+
+class HttpRequestHandler:
+    def __init__(
+        self,
+        *,
+        authority: bytes,
+        connection: HttpConnection,
+        protocol: "HttpServerProtocol",
+        scope: Dict,
+        stream_ended: bool,
+        stream_id: int,
+        transmit: Callable[[], None],
+    ) -> None:
+        self.authority = authority
+        self.connection = connection
+        self.protocol = protocol
+        self.queue = protocol.create_message_queue()
+        self.scope = scope
+        self.stream_id = stream_id
+        self.transmit = transmit
+
+        if stream_ended:
+            self.queue.put_nowait({"type": "http.request"})
+
+    def http_event_received(self, event: H3Event) -> None:
+        if isinstance(event, DataReceived):
+            self.queue.put_nowait(
+                {
+                    "type": "http.request",
+                    "body": event.data,
+                    "more_body": not event.stream_ended,
+                },
+                stream_id=self.stream_id,
+                size=len(event.data),
+            )
+        elif isinstance(event, HeadersReceived) and event.stream_ended:
+            self.queue.put_nowait(
+                {"type": "http.request", "body": b"", "more_body": False}
+            )
+
+    async def run_asgi(self, app: AsgiApplication) -> None:
+        await app(self.scope, self.receive, self.send)
+
+    async def receive(self) -> Dict:
+        return await self.queue.get()
+
+    async def send(self, message: Dict) -> None:
+        if message["type"] == "http.response.start":
+            self.connection.send_headers(
+                stream_id=self.stream_id,
+                headers=[
+                    (b":status", str(message["status"]).encode()),
+                    (b"server", SERVER_NAME.encode()),
+                    (b"date", formatdate(time.time(), usegmt=True).encode()),
+                ]
+                + [(k, v) for k, v in message["headers"]],
+            )
+        elif message["type"] == "http.response.body":
+            self.connection.send_data(
+                stream_id=self.stream_id,
+                data=message.get("body", b""),
+                end_stream=not message.get("more_body", False),
+            )
+        elif message["type"] == "http.response.push" and isinstance(
+            self.connection, H3Connection
+        ):
+            request_headers = [
+                (b":method", b"GET"),
+                (b":scheme", b"https"),
+                (b":authority", self.authority),
+                (b":path", message["path"].encode()),
+            ] + [(k, v) for k, v in message["headers"]]
+
+            # send push promise
+            try:
+                push_stream_id = self.connection.send_push_promise(
+                    stream_id=self.stream_id, headers=request_headers
+                )
+            except NoAvailablePushIDError:
+                return
+
+            # fake request
+            self.protocol.http_event_received(
+                HeadersReceived(
+                    headers=request_headers, stream_ended=True, stream_id=push_stream_id
+                )
+            )
+        self.transmit()
+
+
+class WebSocketHandler:
+    def __init__(
+        self,
+        *,
+        connection: HttpConnection,
+        protocol: "HttpServerProtocol",
+        scope: Dict,
+        stream_id: int,
+        transmit: Callable[[], None],
+    ) -> None:
+        self.closed = False
+        self.connection = connection
+        self.http_event_queue: Deque[DataReceived] = deque()
+        self.queue = protocol.create_message_queue()
+        self.scope = scope
+        self.stream_id = stream_id
+        self.transmit = transmit
+        self.websocket: Optional["wsproto.Connection"] = None
+
+    def http_event_received(self, event: H3Event) -> None:
+        if isinstance(event, DataReceived) and not self.closed:
+            if self.websocket is not None:
+                self.websocket.receive_data(event.data)
+
+                for ws_event in self.websocket.events():
+                    self.websocket_event_received(ws_event)
+            else:
+                # delay event processing until we get `websocket.accept`
+                # from the ASGI application
+                self.http_event_queue.append(event)
+
+    def websocket_event_received(self, event: "wsproto.events.Event") -> None:
+        if isinstance(event, wsproto.events.TextMessage):
+            self.queue.put_nowait(
+                {"type": "websocket.receive", "text": event.data},
+                stream_id=self.stream_id,
+                size=len(event.data),
+            )
+        elif isinstance(event, wsproto.events.Message):
+            self.queue.put_nowait(
+                {"type": "websocket.receive", "bytes": event.data},
+                stream_id=self.stream_id,
+                size=len(event.data),
+            )
+        elif isinstance(event, wsproto.events.CloseConnection):
+            self.queue.put_nowait({"type": "websocket.disconnect", "code": event.code})
+
+    async def run_asgi(self, app: AsgiApplication) -> None:
+        self.queue.put_nowait({"type": "websocket.connect"})
+
+        try:
+            await app(self.scope, self.receive, self.send)
+        finally:
+            if not self.closed:
+                await self.send({"type": "websocket.close", "code": 1000})
+
+    async def receive(self) -> Dict:
+        return await self.queue.get()
+
+    async def send(self, message: Dict) -> None:
+        data = b""
+        end_stream = False
+        if message["type"] == "websocket.accept":
+            subprotocol = message.get("subprotocol")
+
+            self.websocket = wsproto.Connection(wsproto.ConnectionType.SERVER)
+
+            headers = [
+                (b":status", b"200"),
+                (b"server", SERVER_NAME.encode()),
+                (b"date", formatdate(time.time(), usegmt=True).encode()),
+            ]
+            if subprotocol is not None:
+                headers.append((b"sec-websocket-protocol", subprotocol.encode()))
+            self.connection.send_headers(stream_id=self.stream_id, headers=headers)
+
+            # consume backlog
+            while self.http_event_queue:
+                self.http_event_received(self.http_event_queue.popleft())
+
+        elif message["type"] == "websocket.close":
+            if self.websocket is not None:
+                data = self.websocket.send(
+                    wsproto.events.CloseConnection(code=message["code"])
+                )
+            else:
+                self.connection.send_headers(
+                    stream_id=self.stream_id, headers=[(b":status", b"403")]
+                )
+            end_stream = True
+        elif message["type"] == "websocket.send":
+            if message.get("text") is not None:
+                data = self.websocket.send(
+                    wsproto.events.TextMessage(data=message["text"])
+                )
+            elif message.get("bytes") is not None:
+                data = self.websocket.send(
+                    wsproto.events.Message(data=message["bytes"])
+                )
+
+        if data:
+            self.connection.send_data(
+                stream_id=self.stream_id, data=data, end_stream=end_stream
+            )
+        if end_stream:
+            self.closed = True
+        self.transmit()
+
+
+class WebTransportHandler:
+    def __init__(
+        self,
+        *,
+        connection: H3Connection,
+        protocol: "HttpServerProtocol",
+        scope: Dict,
+        stream_id: int,
+        transmit: Callable[[], None],
+    ) -> None:
+        self.accepted = False
+        self.closed = False
+        self.connection = connection
+        self.http_event_queue: Deque[H3Event] = deque()
+        self.queue = protocol.create_message_queue()
+        self.scope = scope
+        self.stream_id = stream_id
+        self.transmit = transmit
+
+    def http_event_received(self, event: H3Event) -> None:
+        if not self.closed:
+            if self.accepted:
+                if isinstance(event, DatagramReceived):
+                    self.queue.put_nowait(
+                        {
+                            "data": event.data,
+                            "type": "webtransport.datagram.receive",
+                        }
+                    )
+                elif isinstance(event, WebTransportStreamDataReceived):
+                    self.queue.put_nowait(
+                        {
+                            "data": event.data,
+                            "stream": event.stream_id,
+                            "type": "webtransport.stream.receive",
+                        },
+                        stream_id=event.stream_id,
+                        size=len(event.data),
+                    )
+            else:
+                # delay event processing until we get `webtransport.accept`
+                # from the ASGI application
+                self.http_event_queue.append(event)
+
+    async def run_asgi(self, app: AsgiApplication) -> None:
+        self.queue.put_nowait({"type": "webtransport.connect"})
+
+        try:
+            await app(self.scope, self.receive, self.send)
+        finally:
+            if not self.closed:
+                await self.send({"type": "webtransport.close"})
+
+    async def receive(self) -> Dict:
+        return await self.queue.get()
+
+    async def send(self, message: Dict) -> None:
+        data = b""
+        end_stream = False
+
+        if message["type"] == "webtransport.accept":
+            self.accepted = True
+
+            headers = [
+                (b":status", b"200"),
+                (b"server", SERVER_NAME.encode()),
+                (b"date", formatdate(time.time(), usegmt=True).encode()),
+                (b"sec-webtransport-http3-draft", b"draft02"),
+            ]
+            self.connection.send_headers(stream_id=self.stream_id, headers=headers)
+
+            # consume backlog
+            while self.http_event_queue:
+                self.http_event_received(self.http_event_queue.popleft())
+        elif message["type"] == "webtransport.close":
+            if not self.accepted:
+                self.connection.send_headers(
+                    stream_id=self.stream_id, headers=[(b":status", b"403")]
+                )
+            end_stream = True
+        elif message["type"] == "webtransport.datagram.send":
+            self.connection.send_datagram(
+                stream_id=self.stream_id, data=message["data"]
+            )
+        elif message["type"] == "webtransport.stream.send":
+            self.connection._quic.send_stream_data(
+                stream_id=message["stream"], data=message["data"]
+            )
+
+        if data or end_stream:
+            self.connection.send_data(
+                stream_id=self.stream_id, data=data, end_stream=end_stream
+            )
+        if end_stream:
+            self.closed = True
+        self.transmit()
+
+
+Handler = Union[HttpRequestHandler, WebSocketHandler, WebTransportHandler]
+
+
+class HttpServerProtocol(QuicConnectionProtocol):
+    """
+    A QUIC connection protocol which serves an ASGI application over HTTP/3
+    or HTTP/0.9.
+
+    Messages received on each request are queued for the application. Once
+    `max_queue_size` bytes are queued for a stream, the stream's flow control
+    limit stops being raised until the application reads them.
+
+    When created with `batch_events=True`, the QUIC events resulting from
+    each datagram are passed to the HTTP layer at once, and consecutive data
+    received on the same stream is parsed in one go.
+    """
+
+    def __init__(
+        self,
+        *args,
+        application: AsgiApplication,
+        max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._application = application
+        self._handlers: Dict[int, Handler] = {}
+        self._http: Optional[HttpConnection] = None
+        self._max_queue_size = max_queue_size
+
+    def create_message_queue(self) -> MessageQueue:
+        """
+        Create a queue of ASGI messages bound to this connection's flow control.
+        """
+        return MessageQueue(
+            max_size=self._max_queue_size,
+            pause_reading=self._pause_reading,
+            resume_reading=self._resume_reading,
+        )
+
+    def http_event_received(self, event: H3Event) -> None:
+        if isinstance(event, HeadersReceived) and event.stream_id not in self._handlers:
+            authority = None
+            headers = []
+            http_version = "0.9" if isinstance(self._http, H0Connection) else "3"
+            raw_path = b""
+            method = ""
+            protocol = None
+            for header, value in event.headers:
+                if header == b":authority":
+                    authority = value
+                    headers.append((b"host", value))
+                elif header == b":method":
+                    method = value.decode()
+                elif header == b":path":
+                    raw_path = value
+                elif header == b":protocol":
+                    protocol = value.decode()
+                elif header and not header.startswith(b":"):
+                    headers.append((header, value))
+
+            if b"?" in raw_path:
+                path_bytes, query_string = raw_path.split(b"?", maxsplit=1)
+            else:
+                path_bytes, query_string = raw_path, b""
+            path = path_bytes.decode()
+            self._quic._logger.info("HTTP request %s %s", method, path)
+
+            # FIXME: add a public API to retrieve peer address
+            client_addr = self._http._quic._network_paths[0].addr
+            client = (client_addr[0], client_addr[1])
+
+            handler: Handler
+            scope: Dict
+            if method == "CONNECT" and protocol == "websocket":
+                if wsproto is None:
+                    self._http.send_headers(
+                        stream_id=event.stream_id,
+                        headers=[(b":status", b"501")],
+                        end_stream=True,
+                    )
+                    self.transmit()
+                    return
+
+                subprotocols: List[str] = []
+                for header, value in event.headers:
+                    if header == b"sec-websocket-protocol":
+                        subprotocols = [x.strip() for x in value.decode().split(",")]
+                scope = {
+                    "client": client,
+                    "headers": headers,
+                    "http_version": http_version,
+                    "method": method,
+                    "path": path,
+                    "query_string": query_string,
+                    "raw_path": raw_path,
+                    "root_path": "",
+                    "scheme": "wss",
+                    "subprotocols": subprotocols,
+                    "type": "websocket",
+                }
+                handler = WebSocketHandler(
+                    connection=self._http,
+                    protocol=self,
+                    scope=scope,
+                    stream_id=event.stream_id,
+                    transmit=self.transmit,
+                )
+            elif method == "CONNECT" and protocol == "webtransport":
+                scope = {
+                    "client": client,
+                    "headers": headers,
+                    "http_version": http_version,
+                    "method": method,
+                    "path": path,
+                    "query_string": query_string,
+                    "raw_path": raw_path,
+                    "root_path": "",
+                    "scheme": "https",
+                    "type": "webtransport",
+                }
+                handler = WebTransportHandler(
+                    connection=cast(H3Connection, self._http),
+                    protocol=self,
+                    scope=scope,
+                    stream_id=event.stream_id,
+                    transmit=self.transmit,
+                )
+            else:
+                extensions: Dict[str, Dict] = {}
+                if isinstance(self._http, H3Connection):
+                    extensions["http.response.push"] = {}
+                scope = {
+                    "client": client,
+                    "extensions": extensions,
+                    "headers": headers,
+                    "http_version": http_version,
+                    "method": method,
+                    "path": path,
+                    "query_string": query_string,
+                    "raw_path": raw_path,
+                    "root_path": "",
+                    "scheme": "https",
+                    "type": "http",
+                }
+                handler = HttpRequestHandler(
+                    authority=authority,
+                    connection=self._http,
+                    protocol=self,
+                    scope=scope,
+                    stream_ended=event.stream_ended,
+                    stream_id=event.stream_id,
+                    transmit=self.transmit,
+                )
+            self._handlers[event.stream_id] = handler
+            asyncio.ensure_future(handler.run_asgi(self._application))
+        elif (
+            isinstance(event, (DataReceived, HeadersReceived))
+            and event.stream_id in self._handlers
+        ):
+            handler = self._handlers[event.stream_id]
+            handler.http_event_received(event)
+        elif isinstance(event, DatagramReceived):
+            handler = self._handlers[event.stream_id]
+            handler.http_event_received(event)
+        elif isinstance(event, WebTransportStreamDataReceived):
+            handler = self._handlers[event.session_id]
+            handler.http_event_received(event)
+
+    def quic_event_received(self, event: QuicEvent) -> None:
+        if isinstance(event, ProtocolNegotiated):
+            self._create_http_connection(event.alpn_protocol)
+
+        #  pass event to the HTTP layer
+        if self._http is not None:
+            for http_event in self._http.handle_event(event):
+                self.http_event_received(http_event)
+
+    def quic_events_received(self, quic_events: List[QuicEvent]) -> None:
+        for event in quic_events:
+            if isinstance(event, ProtocolNegotiated):
+                self._create_http_connection(event.alpn_protocol)
+
+        #  pass events to the HTTP layer
+        if self._http is not None:
+            for http_event in self._http.handle_events(quic_events):
+                self.http_event_received(http_event)
+
+    def _create_http_connection(self, alpn_protocol: Optional[str]) -> None:
+        if alpn_protocol in H3_ALPN:
+            # WebTransport requires DATAGRAM frames
+            self._http = H3Connection(
+                self._quic,
+                enable_webtransport=(
+                    self._quic.configuration.max_datagram_frame_size is not None
+                ),
+            )
+        elif alpn_protocol in H0_ALPN:
+            self._http = H0Connection(self._quic)
+
+    def _pause_reading(self, stream_id: int) -> None:
+        self._quic.pause_receiving(stream_id)
+
+    def _resume_reading(self, stream_id: int) -> None:
+        self._quic.resume_receiving(stream_id)
+        self.transmit()
@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import socket
+from functools import partial
+from typing import Callable, Optional
+
+from ..asyncio import serve as quic_serve
+from ..asyncio.server import QuicServer, serve_metrics
+from ..quic.configuration import QuicConfiguration
+from ..quic.metrics import QuicServerMetrics
+from ..tls import SessionTicketFetcher, SessionTicketHandler
+from .protocol import DEFAULT_MAX_QUEUE_SIZE, AsgiApplication, HttpServerProtocol
+
+
+async def serve(
+    host: str,
+    port: int,
+    *,
+    application: AsgiApplication,
+    configuration: QuicConfiguration,
+    create_protocol: Callable = HttpServerProtocol,
+    max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+    metrics: Optional[QuicServerMetrics] = None,
+    retry: bool = False,
+    reuse_port: bool = False,
+    session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
+    session_ticket_handler: Optional[SessionTicketHandler] = None,
+) -> QuicServer:
+    """
+    Start an HTTP/3 server for an ASGI application at the given `host` and `port`.
+
+    :func:`serve` requires an ASGI ``application`` and a
+    :class:`~aioquic.quic.configuration.QuicConfiguration` containing TLS
+    certificate and private key as the ``configuration`` argument.
+
+    :func:`serve` also accepts the following optional arguments:
+
+    * ``create_protocol`` allows customizing the protocol which serves each
+      connection. It should be :class:`~aioquic.asgi.HttpServerProtocol` or a
+      subclass.
+    * ``max_queue_size`` is the number of bytes which may be queued for the
+      application on a single stream before the stream's flow control limit
+      stops being raised.
+    * ``metrics``, ``retry``, ``reuse_port``, ``session_ticket_fetcher`` and
+      ``session_ticket_handler`` are passed to :func:`aioquic.asyncio.serve`.
+    """
+    return await quic_serve(
+        host,
+        port,
+        configuration=configuration,
+        create_protocol=partial(
+            create_protocol,
+            application=application,
+            max_queue_size=max_queue_size,
+        ),
+        metrics=metrics,
+        retry=retry,
+        reuse_port=reuse_port,
+        session_ticket_fetcher=session_ticket_fetcher,
+        session_ticket_handler=session_ticket_handler,
+    )
+
+
+def run(
+    application: AsgiApplication,
+    host: str,
+    port: int,
+    *,
+    configuration: QuicConfiguration,
+    create_protocol: Callable = HttpServerProtocol,
+    max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+    metrics_port: Optional[int] = None,
+    retry: bool = False,
+    session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
+    session_ticket_handler: Optional[SessionTicketHandler] = None,
+    workers: int = 1,
+) -> None:
+    """
+    Run an HTTP/3 server for an ASGI application until it is interrupted.
+
+    When ``workers`` is greater than one, that many processes are forked and
+    each of them listens on the same address using ``SO_REUSEPORT``. The
+    kernel then spreads incoming datagrams across the workers based on the
+    client's address, so a client which changes address will lose its
+    connection. Each worker starts with a copy of the parent's state, so
+    session tickets stored in memory are only honoured by the worker which
+    issued them. This mode requires the ``fork`` start method.
+
+    When ``metrics_port`` is set, the server's metrics are served over HTTP on
+    localhost at that port, see :func:`aioquic.asyncio.serve_metrics`. Each
+    worker keeps its own metrics, the n-th worker serving them at
+    ``metrics_port + n``.
+
+    The other arguments are passed to :func:`serve`.
+    """
+    if workers < 1:
+        raise ValueError("The number of workers must be at least 1")
+
+    options = dict(
+        application=application,
+        host=host,
+        port=port,
+        configuration=configuration,
+        create_protocol=create_protocol,
+        max_queue_size=max_queue_size,
+        retry=retry,
+        reuse_port=workers > 1,
+        session_ticket_fetcher=session_ticket_fetcher,
+        session_ticket_handler=session_ticket_handler,
+    )
+    if workers == 1:
+        _run_worker(metrics_port=metrics_port, **options)
+        return
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise ValueError("Multiple workers require SO_REUSEPORT support")
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=_run_worker,
+            kwargs=dict(
+                options,
+                metrics_port=None if metrics_port is None else metrics_port + i,
+            ),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
+def _run_worker(metrics_port: Optional[int], **options) -> None:
+    async def main() -> None:
+        metrics = QuicServerMetrics()
+        await serve(metrics=metrics, **options)
+        if metrics_port is not None:
+            await serve_metrics(metrics, port=metrics_port)
+        await asyncio.Future()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
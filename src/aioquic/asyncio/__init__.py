@@ -1,3 +1,4 @@
 from .client import connect  # noqa
+from .pool import QuicConnectionPool  # noqa
 from .protocol import QuicConnectionProtocol  # noqa
-from .server import serve  # noqa
+from .server import serve, serve_metrics  # noqa
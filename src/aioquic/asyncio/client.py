@@ -34,7 +34,8 @@ async def connect(
     :func:`connect` also accepts the following optional arguments:
 
     * ``configuration`` is a :class:`~aioquic.quic.configuration.QuicConfiguration`
-      configuration object.
+      configuration object. If its ``session_cache`` is set, the connection
+      resumes the session from a ticket received in an earlier connection.
     * ``create_protocol`` allows customizing the :class:`~asyncio.Protocol` that
       manages the connection. It should be a callable or class accepting the same
       arguments as :class:`~aioquic.asyncio.QuicConnectionProtocol` and returning
@@ -44,6 +45,11 @@ async def connect(
     * ``stream_handler`` is a callback which is invoked whenever a stream is
       created. It must accept two arguments: a :class:`asyncio.StreamReader`
       and a :class:`asyncio.StreamWriter`.
+    * ``wait_connected`` controls whether to wait for the handshake to complete
+      before returning. If it is `False` and the session is resumed from a
+      ticket allowing early data, data sent on streams right away is sent as
+      0-RTT early data, see
+      :attr:`~aioquic.quic.connection.QuicConnection.early_data_available`.
     * ``local_port`` is the UDP port number that this client wants to bind.
     """
     loop = asyncio.get_event_loop()
@@ -0,0 +1,317 @@
+import asyncio
+import dataclasses
+import socket
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from ..quic.configuration import QuicConfiguration
+from .client import connect
+from .protocol import QuicConnectionProtocol
+
+__all__ = ["QuicConnectionPool"]
+
+
+class _ConfigurationKey:
+    """
+    A reference to a configuration, which compares equal to equal
+    configurations so that they share connections.
+    """
+
+    def __init__(self, configuration: QuicConfiguration) -> None:
+        self.configuration = configuration
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _ConfigurationKey) and (
+            other.configuration is self.configuration
+            or other.configuration == self.configuration
+        )
+
+    def __hash__(self) -> int:
+        # configurations are not hashable, the rest of the key spreads entries
+        return 0
+
+
+PoolKey = Tuple[str, int, Tuple[str, ...], _ConfigurationKey]
+
+
+class _PoolEntry:
+    def __init__(self, now: float) -> None:
+        self.exit_stack = AsyncExitStack()
+        self.checked_at = now
+        self.idle_since = now
+        self.leases = 0
+        self.leases_released = 0  # since the connection was last unused
+        self.protocol: Optional[QuicConnectionProtocol] = None
+        self.streams_base = 0  # streams created when it was last unused
+
+    @property
+    def is_closed(self) -> bool:
+        return self.protocol is not None and self.protocol.is_closed
+
+    @property
+    def pending_leases(self) -> int:
+        """
+        An upper bound of the leases which have not created their stream yet.
+
+        Each lease creates at most one stream, so at most `leases_released` of
+        the streams created since the connection was last unused belong to
+        leases which were released.
+        """
+        streams = self._streams_created() - self.streams_base
+        return max(0, self.leases - max(0, streams - self.leases_released))
+
+    def lease(self) -> None:
+        if not self.leases:
+            self.leases_released = 0
+            self.streams_base = self._streams_created()
+        self.leases += 1
+
+    def release(self) -> None:
+        self.leases -= 1
+        self.leases_released += 1
+
+    def _streams_created(self) -> int:
+        if self.protocol is None:
+            return 0
+        return self.protocol.get_next_available_stream_id() // 4
+
+
+class QuicConnectionPool:
+    """
+    A pool of client connections, which are reused across requests instead of
+    performing a handshake for every one of them.
+
+    Connections are keyed by host, port, ALPN protocols and configuration. A
+    connection is handed out again as long as fewer than
+    `max_streams_per_connection` leases are held on it and the server allows
+    opening another bidirectional stream. Otherwise a new connection is
+    opened, up to `max_connections_per_origin`, after which callers wait for a
+    lease to be released.
+
+    Connections which have been idle for `idle_timeout` seconds are closed.
+    Idle connections are sent a PING every `ping_interval` seconds, and those
+    which do not answer within that interval are discarded. Resolved
+    addresses are cached for `dns_ttl` seconds.
+
+    ``create_protocol`` is passed to :func:`~aioquic.asyncio.connect`, for
+    instance to pool HTTP/3 connections.
+    """
+
+    def __init__(
+        self,
+        *,
+        configuration: Optional[QuicConfiguration] = None,
+        create_protocol: Callable = QuicConnectionProtocol,
+        dns_ttl: float = 60.0,
+        idle_timeout: float = 30.0,
+        max_connections_per_origin: int = 4,
+        max_streams_per_connection: int = 100,
+        ping_interval: Optional[float] = 10.0,
+    ) -> None:
+        if configuration is None:
+            configuration = QuicConfiguration(is_client=True)
+
+        self._condition = asyncio.Condition()
+        self._configuration = configuration
+        self._create_protocol = create_protocol
+        self._dns_cache: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self._dns_ttl = dns_ttl
+        self._entries: Dict[PoolKey, List[_PoolEntry]] = {}
+        self._idle_timeout = idle_timeout
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._max_connections_per_origin = max_connections_per_origin
+        self._max_streams_per_connection = max_streams_per_connection
+        self._ping_interval = ping_interval
+
+    async def __aenter__(self) -> "QuicConnectionPool":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
+
+    def __len__(self) -> int:
+        return sum(
+            1
+            for entries in self._entries.values()
+            for entry in entries
+            if entry.protocol is not None
+        )
+
+    async def close(self) -> None:
+        """
+        Close all the connections in the pool.
+        """
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+
+        entries = [entry for entries in self._entries.values() for entry in entries]
+        self._entries.clear()
+        for entry in entries:
+            await entry.exit_stack.aclose()
+
+    @asynccontextmanager
+    async def connection(
+        self,
+        host: str,
+        port: int,
+        *,
+        configuration: Optional[QuicConfiguration] = None,
+    ) -> AsyncGenerator[QuicConnectionProtocol, None]:
+        """
+        Lease a connection to the QUIC server at the given `host` and `port`.
+
+        The connection should be used for a single request, and must not be
+        closed by the caller.
+
+        :param configuration: overrides the pool's configuration.
+        """
+        if configuration is None:
+            configuration = self._configuration
+        key = (
+            host,
+            port,
+            tuple(configuration.alpn_protocols or []),
+            _ConfigurationKey(configuration),
+        )
+
+        entry = await self._acquire(key, host, port, configuration)
+        try:
+            yield entry.protocol
+        finally:
+            entry.release()
+            entry.idle_since = asyncio.get_event_loop().time()
+            async with self._condition:
+                self._condition.notify_all()
+
+    async def _acquire(
+        self, key: PoolKey, host: str, port: int, configuration: QuicConfiguration
+    ) -> _PoolEntry:
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.ensure_future(self._maintain())
+
+        async with self._condition:
+            while True:
+                entries = self._entries.setdefault(key, [])
+                self._discard_closed(entries)
+
+                # reuse an established connection
+                for entry in entries:
+                    if self._is_available(entry):
+                        entry.lease()
+                        return entry
+
+                # open a new connection, unless one is already being opened
+                if len(entries) < self._max_connections_per_origin and all(
+                    entry.protocol is not None for entry in entries
+                ):
+                    break
+
+                await self._condition.wait()
+
+        entry = _PoolEntry(now=asyncio.get_event_loop().time())
+        entry.lease()
+        entries.append(entry)
+        try:
+            address = await self._resolve(host, port)
+            if configuration.server_name is None:
+                configuration = dataclasses.replace(configuration, server_name=host)
+            entry.protocol = await entry.exit_stack.enter_async_context(
+                connect(
+                    address,
+                    port,
+                    configuration=configuration,
+                    create_protocol=self._create_protocol,
+                )
+            )
+        except BaseException:
+            entries.remove(entry)
+            raise
+        finally:
+            async with self._condition:
+                self._condition.notify_all()
+        return entry
+
+    def _discard_closed(self, entries: List[_PoolEntry]) -> None:
+        for entry in [entry for entry in entries if entry.is_closed]:
+            entries.remove(entry)
+            asyncio.ensure_future(entry.exit_stack.aclose())
+
+    def _is_available(self, entry: _PoolEntry) -> bool:
+        if entry.protocol is None or entry.is_closed:
+            return False
+        if entry.leases >= self._max_streams_per_connection:
+            return False
+
+        # check the server lets us open a bidirectional stream for this lease,
+        # on top of those which leases already handed out are about to open
+        return entry.protocol.get_available_stream_count() > entry.pending_leases
+
+    async def _maintain(self) -> None:
+        intervals = [self._idle_timeout]
+        if self._ping_interval is not None:
+            intervals.append(self._ping_interval)
+        while True:
+            await asyncio.sleep(min(intervals) / 2)
+            await self._evict_and_ping()
+
+    async def _evict_and_ping(self) -> None:
+        now = asyncio.get_event_loop().time()
+        evicted = []
+        pinged = []
+        for entries in self._entries.values():
+            self._discard_closed(entries)
+            for entry in entries:
+                if entry.protocol is None or entry.leases:
+                    continue
+                idle = now - entry.idle_since
+                if idle >= self._idle_timeout:
+                    evicted.append(entry)
+                elif (
+                    self._ping_interval is not None
+                    and now - max(entry.idle_since, entry.checked_at)
+                    >= self._ping_interval
+                ):
+                    pinged.append(entry)
+        for entry in evicted:
+            self._remove(entry)
+
+        # send health-check PINGs
+        results = await asyncio.gather(
+            *[
+                asyncio.wait_for(entry.protocol.ping(), self._ping_interval)
+                for entry in pinged
+                if entry.protocol is not None
+            ],
+            return_exceptions=True,
+        )
+        for entry, result in zip(pinged, results):
+            if isinstance(result, Exception):
+                evicted.append(entry)
+                self._remove(entry)
+            else:
+                entry.checked_at = asyncio.get_event_loop().time()
+
+        for entry in evicted:
+            await entry.exit_stack.aclose()
+
+    def _remove(self, entry: _PoolEntry) -> None:
+        for entries in self._entries.values():
+            if entry in entries:
+                entries.remove(entry)
+
+    async def _resolve(self, host: str, port: int) -> str:
+        loop = asyncio.get_event_loop()
+        now = loop.time()
+        cached = self._dns_cache.get((host, port))
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        infos = await loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM)
+        address = str(infos[0][4][0])
+        self._dns_cache[(host, port)] = (address, now + self._dns_ttl)
+        return address
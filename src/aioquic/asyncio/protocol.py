@@ -1,8 +1,9 @@
 import asyncio
-from typing import Any, Callable, Dict, Optional, Text, Tuple, Union, cast
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Text, Tuple, Union, cast
 
 from ..quic import events
-from ..quic.connection import NetworkAddress, QuicConnection
+from ..quic.connection import NetworkAddress, QuicConnection, QuicConnectionStats
 
 QuicConnectionIdHandler = Callable[[bytes], None]
 QuicStreamHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], None]
@@ -10,14 +11,21 @@ QuicStreamHandler = Callable[[asyncio.StreamReader, asyncio.StreamWriter], None]
 
 class QuicConnectionProtocol(asyncio.DatagramProtocol):
     def __init__(
-        self, quic: QuicConnection, stream_handler: Optional[QuicStreamHandler] = None
+        self,
+        quic: QuicConnection,
+        stream_handler: Optional[QuicStreamHandler] = None,
+        *,
+        batch_events: bool = False,
     ):
         loop = asyncio.get_event_loop()
 
+        self._batch_events = batch_events
         self._closed = asyncio.Event()
         self._connected = False
         self._connected_waiter: Optional[asyncio.Future[None]] = None
+        self._early_data_accepted: Optional[bool] = None
         self._loop = loop
+        self._pending_signature: Optional[Future[bytes]] = None
         self._ping_waiters: Dict[int, asyncio.Future[None]] = {}
         self._quic = quic
         self._stream_readers: Dict[int, asyncio.StreamReader] = {}
@@ -30,11 +38,27 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self._connection_id_issued_handler: QuicConnectionIdHandler = lambda c: None
         self._connection_id_retired_handler: QuicConnectionIdHandler = lambda c: None
         self._connection_terminated_handler: Callable[[], None] = lambda: None
+        self._handshake_completed_handler: Callable[[], None] = lambda: None
         if stream_handler is not None:
             self._stream_handler = stream_handler
         else:
             self._stream_handler = lambda r, w: None
 
+    @property
+    def early_data_accepted(self) -> Optional[bool]:
+        """
+        Whether the server accepted the 0-RTT early data, or `None` until the
+        handshake completes.
+        """
+        return self._early_data_accepted
+
+    @property
+    def is_closed(self) -> bool:
+        """
+        Whether the connection is closed.
+        """
+        return self._closed.is_set()
+
     def change_connection_id(self) -> None:
         """
         Change the connection ID used to communicate with the peer.
@@ -74,6 +98,29 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         )
         return self._create_stream(stream_id)
 
+    def get_available_stream_count(self, is_unidirectional: bool = False) -> int:
+        """
+        Return the number of streams which can be created before reaching the
+        limit set by the peer.
+        """
+        return self._quic.get_available_stream_count(
+            is_unidirectional=is_unidirectional
+        )
+
+    def get_next_available_stream_id(self, is_unidirectional: bool = False) -> int:
+        """
+        Return the stream ID for the next stream created by this endpoint.
+        """
+        return self._quic.get_next_available_stream_id(
+            is_unidirectional=is_unidirectional
+        )
+
+    def get_stats(self) -> QuicConnectionStats:
+        """
+        Return a snapshot of the connection's transport statistics.
+        """
+        return self._quic.get_stats()
+
     def request_key_update(self) -> None:
         """
         Request an update of the encryption keys.
@@ -120,10 +167,13 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
     async def wait_connected(self) -> None:
         """
         Wait for the TLS handshake to complete.
+
+        Clients sending early data should wait for the handshake to complete
+        before sending requests which are not safe to replay.
         """
-        assert self._connected_waiter is None, "already awaiting connected"
         if not self._connected:
-            self._connected_waiter = self._loop.create_future()
+            if self._connected_waiter is None:
+                self._connected_waiter = self._loop.create_future()
             await asyncio.shield(self._connected_waiter)
 
     # asyncio.Transport
@@ -136,6 +186,14 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self._process_events()
         self.transmit()
 
+        # the handshake may be waiting for a signature computed elsewhere
+        signature = self._quic.pending_signature
+        if signature is not None and signature is not self._pending_signature:
+            self._pending_signature = signature
+            signature.add_done_callback(
+                lambda f: self._loop.call_soon_threadsafe(self._resume_handshake)
+            )
+
     # overridable
 
     def quic_event_received(self, event: events.QuicEvent) -> None:
@@ -157,6 +215,17 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
             if event.end_stream:
                 reader.feed_eof()
 
+    def quic_events_received(self, quic_events: List[events.QuicEvent]) -> None:
+        """
+        Called with all the QUIC events resulting from a datagram or a timer
+        when the protocol was created with `batch_events=True`.
+
+        The default implementation calls :meth:`quic_event_received` for each
+        event. Reimplement this in your subclass to handle the events at once.
+        """
+        for event in quic_events:
+            self.quic_event_received(event)
+
     # private
 
     def _create_stream(
@@ -177,39 +246,58 @@ class QuicConnectionProtocol(asyncio.DatagramProtocol):
         self.transmit()
 
     def _process_events(self) -> None:
-        event = self._quic.next_event()
-        while event is not None:
-            if isinstance(event, events.ConnectionIdIssued):
-                self._connection_id_issued_handler(event.connection_id)
-            elif isinstance(event, events.ConnectionIdRetired):
-                self._connection_id_retired_handler(event.connection_id)
-            elif isinstance(event, events.ConnectionTerminated):
-                self._connection_terminated_handler()
-
-                # abort connection waiter
-                if self._connected_waiter is not None:
-                    waiter = self._connected_waiter
-                    self._connected_waiter = None
-                    waiter.set_exception(ConnectionError)
-
-                # abort ping waiters
-                for waiter in self._ping_waiters.values():
-                    waiter.set_exception(ConnectionError)
-                self._ping_waiters.clear()
-
-                self._closed.set()
-            elif isinstance(event, events.HandshakeCompleted):
-                if self._connected_waiter is not None:
-                    waiter = self._connected_waiter
-                    self._connected = True
-                    self._connected_waiter = None
-                    waiter.set_result(None)
-            elif isinstance(event, events.PingAcknowledged):
-                waiter = self._ping_waiters.pop(event.uid, None)
-                if waiter is not None:
-                    waiter.set_result(None)
-            self.quic_event_received(event)
+        if self._batch_events:
+            batch = self._quic.drain_events()
+            while batch:
+                for event in batch:
+                    self._process_event(event)
+                self.quic_events_received(batch)
+                batch = self._quic.drain_events()
+        else:
             event = self._quic.next_event()
+            while event is not None:
+                self._process_event(event)
+                self.quic_event_received(event)
+                event = self._quic.next_event()
+
+    def _process_event(self, event: events.QuicEvent) -> None:
+        if isinstance(event, events.ConnectionIdIssued):
+            self._connection_id_issued_handler(event.connection_id)
+        elif isinstance(event, events.ConnectionIdRetired):
+            self._connection_id_retired_handler(event.connection_id)
+        elif isinstance(event, events.ConnectionTerminated):
+            self._connection_terminated_handler()
+
+            # abort connection waiter
+            if self._connected_waiter is not None:
+                waiter = self._connected_waiter
+                self._connected_waiter = None
+                waiter.set_exception(ConnectionError)
+
+            # abort ping waiters
+            for waiter in self._ping_waiters.values():
+                waiter.set_exception(ConnectionError)
+            self._ping_waiters.clear()
+
+            self._closed.set()
+        elif isinstance(event, events.HandshakeCompleted):
+            self._handshake_completed_handler()
+            self._connected = True
+            self._early_data_accepted = event.early_data_accepted
+            if self._connected_waiter is not None:
+                waiter = self._connected_waiter
+                self._connected_waiter = None
+                waiter.set_result(None)
+        elif isinstance(event, events.PingAcknowledged):
+            waiter = self._ping_waiters.pop(event.uid, None)
+            if waiter is not None:
+                waiter.set_result(None)
+
+    def _resume_handshake(self) -> None:
+        self._pending_signature = None
+        self._quic.resume_handshake()
+        self._process_events()
+        self.transmit()
 
     def _transmit_soon(self) -> None:
         if self._transmit_task is None:
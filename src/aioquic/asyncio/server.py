@@ -1,38 +1,61 @@
 import asyncio
 import os
 from functools import partial
-from typing import Callable, Dict, Optional, Text, Union, cast
+from typing import Callable, Dict, Optional, Set, Text, Union, cast
 
 from ..buffer import Buffer
 from ..quic.configuration import SMALLEST_MAX_DATAGRAM_SIZE, QuicConfiguration
 from ..quic.connection import NetworkAddress, QuicConnection
+from ..quic.metrics import (
+    DROP_INITIAL_TOO_SMALL,
+    DROP_INVALID_HEADER,
+    DROP_INVALID_RETRY_TOKEN,
+    DROP_RATE_LIMITED,
+    DROP_UNKNOWN_CONNECTION,
+    QuicServerMetrics,
+)
 from ..quic.packet import (
     PACKET_TYPE_INITIAL,
     encode_quic_retry,
     encode_quic_version_negotiation,
+    peek_quic_header,
     pull_quic_header,
 )
-from ..quic.retry import QuicRetryTokenHandler
+from ..quic.rate_limit import QuicRateLimiter
+from ..quic.retry import (
+    QuicAdaptiveRetry,
+    QuicNewTokenHandler,
+    QuicRetryTokenHandler,
+)
 from ..tls import SessionTicketFetcher, SessionTicketHandler
 from .protocol import QuicConnectionProtocol, QuicStreamHandler
 
-__all__ = ["serve"]
+__all__ = ["serve", "serve_metrics"]
 
 
 class QuicServer(asyncio.DatagramProtocol):
     def __init__(
         self,
         *,
+        adaptive_retry: Optional[QuicAdaptiveRetry] = None,
         configuration: QuicConfiguration,
         create_protocol: Callable = QuicConnectionProtocol,
+        metrics: Optional[QuicServerMetrics] = None,
+        new_token_handler: Optional[QuicNewTokenHandler] = None,
+        rate_limiter: Optional[QuicRateLimiter] = None,
         session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
         session_ticket_handler: Optional[SessionTicketHandler] = None,
         retry: bool = False,
         stream_handler: Optional[QuicStreamHandler] = None,
     ) -> None:
+        self.metrics = metrics if metrics is not None else QuicServerMetrics()
+        self.rate_limiter = rate_limiter
+        self._adaptive_retry: Optional[QuicAdaptiveRetry] = None
         self._configuration = configuration
         self._create_protocol = create_protocol
+        self._half_open: Set[QuicConnectionProtocol] = set()
         self._loop = asyncio.get_event_loop()
+        self._new_token_handler = new_token_handler
         self._protocols: Dict[bytes, QuicConnectionProtocol] = {}
         self._session_ticket_fetcher = session_ticket_fetcher
         self._session_ticket_handler = session_ticket_handler
@@ -42,12 +65,18 @@ class QuicServer(asyncio.DatagramProtocol):
 
         if retry:
             self._retry = QuicRetryTokenHandler()
+        elif adaptive_retry is not None:
+            self._adaptive_retry = adaptive_retry
+            self._retry = QuicRetryTokenHandler()
+            self.metrics.adaptive_retry = adaptive_retry
         else:
             self._retry = None
 
     def close(self):
         for protocol in set(self._protocols.values()):
             protocol.close()
+            self.metrics.connection_closed(protocol._quic)
+        self._half_open.clear()
         self._protocols.clear()
         self._transport.close()
 
@@ -56,13 +85,30 @@ class QuicServer(asyncio.DatagramProtocol):
 
     def datagram_received(self, data: Union[bytes, Text], addr: NetworkAddress) -> None:
         data = cast(bytes, data)
-        buf = Buffer(data=data)
+        self.metrics.datagrams_received += 1
 
+        # datagrams for known connections only need their destination CID
+        try:
+            _, version, destination_cid = peek_quic_header(
+                data, self._configuration.connection_id_length
+            )
+        except ValueError:
+            self.metrics.datagrams_dropped[DROP_INVALID_HEADER] += 1
+            return
+        protocol = self._protocols.get(destination_cid, None)
+        if protocol is not None and (
+            version is None or version in self._configuration.supported_versions
+        ):
+            protocol.datagram_received(data, addr)
+            return
+
+        buf = Buffer(data=data)
         try:
             header = pull_quic_header(
                 buf, host_cid_length=self._configuration.connection_id_length
             )
         except ValueError:
+            self.metrics.datagrams_dropped[DROP_INVALID_HEADER] += 1
             return
 
         # version negotiation
@@ -70,6 +116,11 @@ class QuicServer(asyncio.DatagramProtocol):
             header.version is not None
             and header.version not in self._configuration.supported_versions
         ):
+            if self.rate_limiter is not None and not self.rate_limiter.allow(
+                addr, self._loop.time()
+            ):
+                self.metrics.datagrams_dropped[DROP_RATE_LIMITED] += 1
+                return
             self._transport.sendto(
                 encode_quic_version_negotiation(
                     source_cid=header.destination_cid,
@@ -78,53 +129,86 @@ class QuicServer(asyncio.DatagramProtocol):
                 ),
                 addr,
             )
+            self.metrics.version_negotiations_sent += 1
             return
 
-        protocol = self._protocols.get(header.destination_cid, None)
         original_destination_connection_id: Optional[bytes] = None
         retry_source_connection_id: Optional[bytes] = None
         if (
-            protocol is None
-            and len(data) >= SMALLEST_MAX_DATAGRAM_SIZE
+            len(data) >= SMALLEST_MAX_DATAGRAM_SIZE
             and header.packet_type == PACKET_TYPE_INITIAL
         ):
+            # validate a token from a NEW_TOKEN frame, ignoring it if invalid
+            address_validated = False
+            retry_token = header.token
+            if self._new_token_handler is not None and (
+                self._new_token_handler.is_new_token(retry_token)
+            ):
+                try:
+                    self._new_token_handler.validate_token(addr, retry_token)
+                    address_validated = True
+                except ValueError:
+                    pass
+                retry_token = b""
+
             # retry
-            if self._retry is not None:
-                if not header.token:
-                    # create a retry token
-                    source_cid = os.urandom(8)
-                    self._transport.sendto(
-                        encode_quic_retry(
-                            version=header.version,
-                            source_cid=source_cid,
-                            destination_cid=header.source_cid,
-                            original_destination_cid=header.destination_cid,
-                            retry_token=self._retry.create_token(
-                                addr, header.destination_cid, source_cid
-                            ),
-                        ),
-                        addr,
-                    )
+            if address_validated:
+                original_destination_connection_id = header.destination_cid
+            elif self._retry is not None and retry_token:
+                # validate retry token
+                try:
+                    (
+                        original_destination_connection_id,
+                        retry_source_connection_id,
+                    ) = self._retry.validate_token(addr, retry_token)
+                except ValueError:
+                    self.metrics.datagrams_dropped[DROP_INVALID_RETRY_TOKEN] += 1
+                    return
+                address_validated = True
+            elif self._retry is not None and (
+                self._adaptive_retry is None
+                or self._adaptive_retry.on_initial(
+                    half_open=len(self._half_open), now=self._loop.time()
+                )
+            ):
+                if self.rate_limiter is not None and not self.rate_limiter.allow(
+                    addr, self._loop.time()
+                ):
+                    self.metrics.datagrams_dropped[DROP_RATE_LIMITED] += 1
                     return
-                else:
-                    # validate retry token
-                    try:
-                        (
-                            original_destination_connection_id,
-                            retry_source_connection_id,
-                        ) = self._retry.validate_token(addr, header.token)
-                    except ValueError:
-                        return
+
+                # create a retry token
+                source_cid = os.urandom(8)
+                self._transport.sendto(
+                    encode_quic_retry(
+                        version=header.version,
+                        source_cid=source_cid,
+                        destination_cid=header.source_cid,
+                        original_destination_cid=header.destination_cid,
+                        retry_token=self._retry.create_token(
+                            addr, header.destination_cid, source_cid
+                        ),
+                    ),
+                    addr,
+                )
+                self.metrics.retries_sent += 1
+                return
             else:
                 original_destination_connection_id = header.destination_cid
 
             # create new connection
             connection = QuicConnection(
+                address_validated=address_validated,
                 configuration=self._configuration,
                 original_destination_connection_id=original_destination_connection_id,
                 retry_source_connection_id=retry_source_connection_id,
                 session_ticket_fetcher=self._session_ticket_fetcher,
                 session_ticket_handler=self._session_ticket_handler,
+                token_issuer=(
+                    self._new_token_handler.create_token
+                    if self._new_token_handler is not None
+                    else None
+                ),
             )
             protocol = self._create_protocol(
                 connection, stream_handler=self._stream_handler
@@ -141,12 +225,21 @@ class QuicServer(asyncio.DatagramProtocol):
             protocol._connection_terminated_handler = partial(
                 self._connection_terminated, protocol=protocol
             )
+            protocol._handshake_completed_handler = partial(
+                self._half_open.discard, protocol
+            )
 
+            self._half_open.add(protocol)
             self._protocols[header.destination_cid] = protocol
             self._protocols[connection.host_cid] = protocol
+            self.metrics.connection_opened(connection)
 
         if protocol is not None:
             protocol.datagram_received(data, addr)
+        elif header.packet_type == PACKET_TYPE_INITIAL:
+            self.metrics.datagrams_dropped[DROP_INITIAL_TOO_SMALL] += 1
+        else:
+            self.metrics.datagrams_dropped[DROP_UNKNOWN_CONNECTION] += 1
 
     def _connection_id_issued(self, cid: bytes, protocol: QuicConnectionProtocol):
         self._protocols[cid] = protocol
@@ -161,17 +254,24 @@ class QuicServer(asyncio.DatagramProtocol):
         for cid, proto in list(self._protocols.items()):
             if proto == protocol:
                 del self._protocols[cid]
+        self._half_open.discard(protocol)
+        self.metrics.connection_closed(protocol._quic)
 
 
 async def serve(
     host: str,
     port: int,
     *,
+    adaptive_retry: Optional[QuicAdaptiveRetry] = None,
     configuration: QuicConfiguration,
     create_protocol: Callable = QuicConnectionProtocol,
+    metrics: Optional[QuicServerMetrics] = None,
+    new_token_handler: Optional[QuicNewTokenHandler] = None,
+    rate_limiter: Optional[QuicRateLimiter] = None,
     session_ticket_fetcher: Optional[SessionTicketFetcher] = None,
     session_ticket_handler: Optional[SessionTicketHandler] = None,
     retry: bool = False,
+    reuse_port: bool = False,
     stream_handler: QuicStreamHandler = None,
 ) -> QuicServer:
     """
@@ -186,6 +286,20 @@ async def serve(
       manages the connection. It should be a callable or class accepting the same
       arguments as :class:`~aioquic.asyncio.QuicConnectionProtocol` and returning
       an instance of :class:`~aioquic.asyncio.QuicConnectionProtocol` or a subclass.
+    * ``metrics`` is a :class:`~aioquic.quic.metrics.QuicServerMetrics` in which
+      the server records its metrics, which allows sharing it between servers.
+      By default the server creates its own, available as its ``metrics``
+      attribute.
+    * ``new_token_handler`` is a :class:`~aioquic.quic.retry.QuicNewTokenHandler`
+      which issues address validation tokens to clients in NEW_TOKEN frames
+      once their handshake completes. Clients presenting such a token on a
+      later connection skip the Retry and the anti-amplification limit.
+    * ``rate_limiter`` is a :class:`~aioquic.quic.rate_limit.QuicRateLimiter`
+      which limits the Retry and Version Negotiation packets the server sends,
+      globally and per source address prefix. By default these replies are
+      not limited. Enable limiting on servers exposed to spoofed floods, with
+      limits suited to how many clients share an address prefix, for instance
+      behind carrier-grade NATs.
     * ``session_ticket_fetcher`` is a callback which is invoked by the TLS
       engine when a session ticket is presented by the peer. It should return
       the session ticket with the specified ID or `None` if it is not found.
@@ -194,6 +308,11 @@ async def serve(
       ticket for future lookup.
     * ``retry`` specifies whether client addresses should be validated prior to
       the cryptographic handshake using a retry packet.
+    * ``adaptive_retry`` is a :class:`~aioquic.quic.retry.QuicAdaptiveRetry`
+      which only enables address validation while the server is under load,
+      when ``retry`` is not set.
+    * ``reuse_port`` allows several servers, typically in different processes,
+      to listen on the same address using ``SO_REUSEPORT``.
     * ``stream_handler`` is a callback which is invoked whenever a stream is
       created. It must accept two arguments: a :class:`asyncio.StreamReader`
       and a :class:`asyncio.StreamWriter`.
@@ -203,13 +322,53 @@ async def serve(
 
     _, protocol = await loop.create_datagram_endpoint(
         lambda: QuicServer(
+            adaptive_retry=adaptive_retry,
             configuration=configuration,
             create_protocol=create_protocol,
+            metrics=metrics,
+            new_token_handler=new_token_handler,
+            rate_limiter=rate_limiter,
             session_ticket_fetcher=session_ticket_fetcher,
             session_ticket_handler=session_ticket_handler,
             retry=retry,
             stream_handler=stream_handler,
         ),
         local_addr=(host, port),
+        reuse_port=reuse_port,
     )
     return protocol
+
+
+async def serve_metrics(
+    metrics: QuicServerMetrics, host: str = "127.0.0.1", port: int = 9100
+) -> asyncio.AbstractServer:
+    """
+    Serve the given metrics in the Prometheus text exposition format over
+    HTTP at the given `host` and `port`, under the ``/metrics`` path.
+
+    The returned server should be closed when it is no longer needed.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] == b"/metrics":
+                status = b"200 OK"
+                body = metrics.render().encode()
+            else:
+                status = b"404 Not Found"
+                body = b"Not Found\n"
+            writer.write(
+                b"HTTP/1.0 " + status + b"\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
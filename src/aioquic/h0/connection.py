@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
 from aioquic.h3.events import DataReceived, H3Event, Headers, HeadersReceived
 from aioquic.quic.connection import QuicConnection
@@ -54,6 +54,12 @@ class H0Connection:
 
         return http_events
 
+    def handle_events(self, events: Iterable[QuicEvent]) -> List[H3Event]:
+        http_events: List[H3Event] = []
+        for event in events:
+            http_events.extend(self.handle_event(event))
+        return http_events
+
     def send_data(self, stream_id: int, data: bytes, end_stream: bool) -> None:
         self._quic.send_stream_data(stream_id, data, end_stream)
 
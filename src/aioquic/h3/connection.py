@@ -1,7 +1,7 @@
 import logging
 import re
 from enum import Enum, IntEnum
-from typing import Dict, FrozenSet, List, Optional, Set
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
 import pylsqpack
 
@@ -23,6 +23,7 @@ from aioquic.quic.logger import QuicLoggerTrace
 logger = logging.getLogger("http3")
 
 H3_ALPN = ["h3", "h3-32", "h3-31", "h3-30", "h3-29"]
+MAX_PENDING_PRIORITY_UPDATES = 16
 RESERVED_SETTINGS = (0x0, 0x2, 0x3, 0x4, 0x5)
 UPPERCASE = re.compile(b"[A-Z]")
 
@@ -62,6 +63,8 @@ class FrameType(IntEnum):
     MAX_PUSH_ID = 0xD
     DUPLICATE_PUSH = 0xE
     WEBTRANSPORT_STREAM = 0x41
+    PRIORITY_UPDATE_REQUEST = 0xF0700
+    PRIORITY_UPDATE_PUSH = 0xF0701
 
 
 class HeadersState(Enum):
@@ -129,10 +132,18 @@ class DatagramError(ProtocolError):
     error_code = ErrorCode.H3_DATAGRAM_ERROR
 
 
+class FrameError(ProtocolError):
+    error_code = ErrorCode.H3_FRAME_ERROR
+
+
 class FrameUnexpected(ProtocolError):
     error_code = ErrorCode.H3_FRAME_UNEXPECTED
 
 
+class IdError(ProtocolError):
+    error_code = ErrorCode.H3_ID_ERROR
+
+
 class MessageError(ProtocolError):
     error_code = ErrorCode.H3_MESSAGE_ERROR
 
@@ -173,6 +184,36 @@ def parse_max_push_id(data: bytes) -> int:
     return max_push_id
 
 
+def encode_priority(urgency: int, incremental: bool) -> bytes:
+    """
+    Encode a Priority field value as defined in RFC 9218.
+    """
+    members = []
+    if urgency != 3:
+        members.append(b"u=%d" % urgency)
+    if incremental:
+        members.append(b"i")
+    return b", ".join(members)
+
+
+def parse_priority(value: bytes) -> Tuple[int, bool]:
+    """
+    Parse a Priority field value as defined in RFC 9218.
+
+    Returns the urgency and the incremental flag. Unknown or invalid members
+    are ignored, as required by the specification.
+    """
+    urgency = 3
+    incremental = False
+    for member in value.split(b","):
+        key, _, item = member.split(b";", 1)[0].strip().partition(b"=")
+        if key == b"u" and item.isdigit() and int(item) <= 7:
+            urgency = int(item)
+        elif key == b"i" and item in (b"", b"?0", b"?1"):
+            incremental = item != b"?0"
+    return urgency, incremental
+
+
 def parse_settings(data: bytes) -> Dict[int, int]:
     buf = Buffer(data=data)
     settings: Dict[int, int] = {}
@@ -286,6 +327,7 @@ class H3Stream:
         self.frame_type: Optional[int] = None
         self.headers_recv_state: HeadersState = HeadersState.INITIAL
         self.headers_send_state: HeadersState = HeadersState.INITIAL
+        self.priority_updated = False
         self.push_id: Optional[int] = None
         self.session_id: Optional[int] = None
         self.stream_id = stream_id
@@ -317,6 +359,7 @@ class H3Connection:
         self._encoder = pylsqpack.Encoder()
         self._encoder_bytes_received = 0
         self._encoder_bytes_sent = 0
+        self._priority_updates: Dict[int, bytes] = {}
         self._settings_received = False
         self._stream: Dict[int, H3Stream] = {}
 
@@ -389,6 +432,41 @@ class H3Connection:
 
         return []
 
+    def handle_events(self, events: Iterable[QuicEvent]) -> List[H3Event]:
+        """
+        Handle a batch of QUIC events and return a list of HTTP events.
+
+        Consecutive :class:`~aioquic.quic.events.StreamDataReceived` events for
+        the same stream are merged before being parsed.
+
+        :param events: The QUIC events to handle.
+        """
+        http_events: List[H3Event] = []
+        chunks: List[bytes] = []
+        pending: Optional[StreamDataReceived] = None
+        for event in events:
+            if isinstance(event, StreamDataReceived):
+                if (
+                    pending is not None
+                    and pending.stream_id == event.stream_id
+                    and not pending.end_stream
+                ):
+                    chunks.append(event.data)
+                    pending = event
+                    continue
+                if pending is not None:
+                    http_events.extend(self._handle_stream_data(pending, chunks))
+                chunks = [event.data]
+                pending = event
+            else:
+                if pending is not None:
+                    http_events.extend(self._handle_stream_data(pending, chunks))
+                    pending = None
+                http_events.extend(self.handle_event(event))
+        if pending is not None:
+            http_events.extend(self._handle_stream_data(pending, chunks))
+        return http_events
+
     def send_datagram(self, stream_id: int, data: bytes) -> None:
         """
         Send a datagram for the specified stream.
@@ -401,6 +479,25 @@ class H3Connection:
         ), "Datagrams can only be sent for client-initiated bidirectional streams"
         self._quic.send_datagram_frame(encode_uint_var(stream_id // 4) + data)
 
+    def send_priority_update(
+        self, stream_id: int, urgency: int = 3, incremental: bool = False
+    ) -> None:
+        """
+        Send a PRIORITY_UPDATE frame to change the priority of a request.
+
+        :param stream_id: The stream ID of the request.
+        :param urgency: The urgency, from 0 (highest) to 7 (lowest).
+        :param incremental: Whether the response can be processed incrementally.
+        """
+        assert self._is_client, "Only clients may send a priority update."
+        self._quic.send_stream_data(
+            self._local_control_stream_id,
+            encode_frame(
+                FrameType.PRIORITY_UPDATE_REQUEST,
+                encode_uint_var(stream_id) + encode_priority(urgency, incremental),
+            ),
+        )
+
     def send_push_promise(self, stream_id: int, headers: Headers) -> int:
         """
         Send a push promise related to the specified stream.
@@ -576,6 +673,22 @@ class H3Connection:
             settings[Setting.ENABLE_WEBTRANSPORT] = 1
         return settings
 
+    def _handle_stream_data(
+        self, last: StreamDataReceived, chunks: List[bytes]
+    ) -> List[H3Event]:
+        """
+        Handle the merged data of consecutive events ending with `last`.
+        """
+        if len(chunks) == 1:
+            return self.handle_event(last)
+        return self.handle_event(
+            StreamDataReceived(
+                data=b"".join(chunks),
+                end_stream=last.end_stream,
+                stream_id=last.stream_id,
+            )
+        )
+
     def _handle_control_frame(self, frame_type: int, frame_data: bytes) -> None:
         """
         Handle a frame received on the peer's control stream.
@@ -599,6 +712,21 @@ class H3Connection:
             if self._is_client:
                 raise FrameUnexpected("Servers must not send MAX_PUSH_ID")
             self._max_push_id = parse_max_push_id(frame_data)
+        elif frame_type in (
+            FrameType.PRIORITY_UPDATE_REQUEST,
+            FrameType.PRIORITY_UPDATE_PUSH,
+        ):
+            if self._is_client:
+                raise FrameUnexpected("Servers must not send PRIORITY_UPDATE")
+            buf = Buffer(data=frame_data)
+            try:
+                element_id = buf.pull_uint_var()
+            except BufferReadError:
+                raise FrameError("Malformed PRIORITY_UPDATE frame")
+            if frame_type == FrameType.PRIORITY_UPDATE_REQUEST:
+                if element_id % 4 != 0:
+                    raise IdError("PRIORITY_UPDATE must reference a request stream")
+                self._handle_priority_update(element_id, frame_data[buf.tell() :])
         elif frame_type in (
             FrameType.DATA,
             FrameType.HEADERS,
@@ -607,6 +735,19 @@ class H3Connection:
         ):
             raise FrameUnexpected("Invalid frame type on control stream")
 
+    def _handle_priority_update(self, stream_id: int, value: bytes) -> None:
+        """
+        Apply a PRIORITY_UPDATE, which takes precedence over the request's
+        priority header.
+        """
+        stream = self._stream.get(stream_id)
+        if stream is not None:
+            stream.priority_updated = True
+            self._set_stream_priority(stream_id, value)
+        elif len(self._priority_updates) < MAX_PENDING_PRIORITY_UPDATES:
+            # the request stream is not open yet
+            self._priority_updates[stream_id] = value
+
     def _handle_request_or_push_frame(
         self,
         frame_type: int,
@@ -647,6 +788,7 @@ class H3Connection:
                     validate_response_headers(headers)
                 else:
                     validate_request_headers(headers)
+                    self._set_request_priority(stream, headers)
             else:
                 validate_trailers(headers)
 
@@ -716,6 +858,8 @@ class H3Connection:
             FrameType.GOAWAY,
             FrameType.MAX_PUSH_ID,
             FrameType.DUPLICATE_PUSH,
+            FrameType.PRIORITY_UPDATE_REQUEST,
+            FrameType.PRIORITY_UPDATE_PUSH,
         ):
             raise FrameUnexpected(
                 "Invalid frame type on request stream"
@@ -747,6 +891,14 @@ class H3Connection:
             StreamType.QPACK_DECODER
         )
 
+        # critical streams are never delayed by requests
+        for stream_id in (
+            self._local_control_stream_id,
+            self._local_encoder_stream_id,
+            self._local_decoder_stream_id,
+        ):
+            self._quic.set_stream_priority(stream_id, urgency=0)
+
     def _log_stream_type(
         self, stream_id: int, stream_type: int, push_id: Optional[int] = None
     ) -> None:
@@ -1081,6 +1233,26 @@ class H3Connection:
 
         return http_events
 
+    def _set_request_priority(self, stream: H3Stream, headers: Headers) -> None:
+        """
+        Apply the priority of a request received by the server.
+        """
+        value = self._priority_updates.pop(stream.stream_id, None)
+        if value is not None:
+            stream.priority_updated = True
+        elif not stream.priority_updated:
+            for key, header_value in headers:
+                if key == b"priority":
+                    value = header_value
+        if value is not None:
+            self._set_stream_priority(stream.stream_id, value)
+
+    def _set_stream_priority(self, stream_id: int, value: bytes) -> None:
+        urgency, incremental = parse_priority(value)
+        self._quic.set_stream_priority(
+            stream_id, urgency=urgency, incremental=incremental
+        )
+
     def _validate_settings(self, settings: Dict[int, int]) -> None:
         for setting in [
             Setting.ENABLE_CONNECT_PROTOCOL,
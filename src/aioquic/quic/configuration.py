@@ -4,13 +4,19 @@ from re import split
 from typing import Any, List, Optional, TextIO, Union
 
 from ..tls import (
+    CertificateSigner,
     CipherSuite,
+    EphemeralKeyPool,
+    KeyShareCache,
     SessionTicket,
+    SessionTicketSealer,
+    TlsServerCredentials,
     load_pem_private_key,
     load_pem_x509_certificates,
 )
 from .logger import QuicLogger
 from .packet import QuicProtocolVersion
+from .session_cache import SessionCache
 
 SMALLEST_MAX_DATAGRAM_SIZE = 1200
 
@@ -21,11 +27,35 @@ class QuicConfiguration:
     A QUIC configuration.
     """
 
+    ack_frequency: bool = False
+    """
+    Whether to negotiate the ACK frequency extension
+    (draft-ietf-quic-ack-frequency).
+
+    If both endpoints enable it, the sender asks its peer to acknowledge
+    fewer packets once its congestion window is large, which reduces the cost
+    of sending and processing ACK frames on bulk transfers. The peer's
+    requests are honoured in turn.
+    """
+
     alpn_protocols: Optional[List[str]] = None
     """
     A list of supported ALPN protocols.
     """
 
+    certificate_signer: Optional[CertificateSigner] = None
+    """
+    A callable which computes the server's CertificateVerify signature.
+
+    It is called with the data to sign and the signature algorithm, and must
+    return a :class:`concurrent.futures.Future` resolving to the signature.
+    While the future is pending, the handshake is suspended and other
+    connections keep being served. Use :class:`~aioquic.tls.ExecutorSigner`
+    to sign in a thread pool, or provide your own to use a remote signer.
+
+    .. note:: This is only used by servers.
+    """
+
     congestion_control_algorithm: str = "reno"
     """
     The name of the congestion control algorithm to use.
@@ -38,6 +68,26 @@ class QuicConfiguration:
     The length in bytes of local connection IDs.
     """
 
+    ephemeral_key_pool: Optional[EphemeralKeyPool] = None
+    """
+    A pool of pre-generated ephemeral keys for the TLS key exchange.
+
+    Sharing a :class:`~aioquic.tls.EphemeralKeyPool` between connections
+    moves key generation off the handshake's critical path, at the cost of
+    keeping unused keys in memory until they are needed.
+    """
+
+    hystart: bool = False
+    """
+    Whether slow start uses HyStart++ (RFC 9406).
+
+    The minimum round-trip time is tracked from one round to the next. Once
+    it increases, the congestion window grows four times slower for a few
+    rounds, then slow start ends, unless the increase turns out to be
+    spurious. Otherwise slow start ends when the round-trip time of recent
+    packets increases by a quarter.
+    """
+
     idle_timeout: float = 60.0
     """
     The idle timeout in seconds.
@@ -50,14 +100,71 @@ class QuicConfiguration:
     Whether this is the client side of the QUIC connection.
     """
 
+    key_share_cache: Optional[KeyShareCache] = None
+    """
+    A cache of the key exchange group selected by each server.
+
+    Sharing a :class:`~aioquic.tls.KeyShareCache` between connections lets
+    the client send a single key share to servers it has talked to before.
+
+    .. note:: This is only used by clients.
+    """
+
+    key_share_groups: Optional[List[int]] = None
+    """
+    The groups for which the client sends key shares when the server's
+    choice is not known, for instance ``[aioquic.tls.Group.X25519]``.
+
+    If the server selects another supported group, it asks for a new key
+    share with a HelloRetryRequest. By default a key share is sent for every
+    supported group.
+
+    .. note:: This is only used by clients.
+    """
+
+    manual_flow_control: bool = False
+    """
+    Whether the application signals consumption of received stream data.
+
+    If `True`, received data only frees up flow control credit once the
+    application calls :meth:`~aioquic.quic.connection.QuicConnection.consume`.
+    Otherwise data is considered consumed as soon as it is delivered as a
+    :class:`~aioquic.quic.events.StreamDataReceived` event.
+    """
+
     max_data: int = 1048576
     """
     Connection-wide flow control limit.
     """
 
+    max_data_window: int = 16777216
+    """
+    The size up to which receive windows are auto-tuned, in bytes.
+
+    Connection and stream windows start at :attr:`max_data` and
+    :attr:`max_stream_data` respectively, and double whenever the application
+    consumes data faster than the window allows per round-trip. This bounds
+    the amount of received data which is buffered for the application.
+    """
+
     max_datagram_size: int = SMALLEST_MAX_DATAGRAM_SIZE
     """
     The maximum QUIC payload size in bytes to send, excluding UDP or IP overhead.
+
+    If :attr:`max_discovered_datagram_size` is set, this is the size which is
+    known to work and from which path MTU discovery starts.
+    """
+
+    max_discovered_datagram_size: Optional[int] = None
+    """
+    The largest QUIC payload size in bytes to probe for using path MTU
+    discovery (RFC 8899), for instance 1452 for Ethernet over IPv6.
+
+    Once the handshake is confirmed, padded PING packets are sent to search
+    for the largest size the path carries, which is then used instead of
+    :attr:`max_datagram_size`. The size never exceeds the peer's
+    `max_udp_payload_size` transport parameter. If `None`, path MTU discovery
+    is disabled.
     """
 
     max_stream_data: int = 1048576
@@ -65,6 +172,17 @@ class QuicConfiguration:
     Per-stream flow control limit.
     """
 
+    pacing_granularity: float = 0.0
+    """
+    The granularity in seconds of the timer which wakes up the connection to
+    send paced packets, for instance 0.001 for the asyncio event loop.
+
+    At high rates, packets are due more often than such a timer can fire.
+    When this is set, each wakeup sends the packets earned since the previous
+    one at the pacing rate as a single burst, and wakeups are spaced by at
+    least this duration. If 0, each packet is paced individually.
+    """
+
     quic_logger: Optional[QuicLogger] = None
     """
     The :class:`~aioquic.quic.logger.QuicLogger` instance to log events to.
@@ -77,6 +195,20 @@ class QuicConfiguration:
     This is useful to analyze traffic captures with Wireshark.
     """
 
+    server_credentials: Optional[TlsServerCredentials] = None
+    """
+    The server's certificate chain and private key, prepared once for all the
+    connections using this configuration.
+
+    If it is not set, it is derived from :attr:`certificate`,
+    :attr:`certificate_chain` and :attr:`private_key`, and derived again
+    whenever they are changed, see :meth:`get_server_credentials`. When it
+    is set, it takes precedence over those attributes for the server's side
+    of the handshake.
+
+    .. note:: This is only used by servers.
+    """
+
     server_name: Optional[str] = None
     """
     The server name to use when verifying the server's TLS certificate, which
@@ -88,11 +220,37 @@ class QuicConfiguration:
     .. note:: This is only used by clients.
     """
 
+    session_cache: Optional[SessionCache] = None
+    """
+    A cache of the session tickets and address validation tokens received
+    from servers.
+
+    When :attr:`session_ticket` or :attr:`token` are not set, they are taken
+    from the :class:`~aioquic.quic.session_cache.SessionCache`, and the
+    tickets and tokens the server sends are stored in it. Share the cache
+    between connections so that repeat connections resume their session.
+
+    .. note:: This is only used by clients.
+    """
+
     session_ticket: Optional[SessionTicket] = None
     """
     The TLS session ticket which should be used for session resumption.
     """
 
+    session_ticket_sealer: Optional[SessionTicketSealer] = None
+    """
+    Seals the resumption state into the session tickets the server issues,
+    instead of relying on a `session_ticket_fetcher` and
+    `session_ticket_handler` to store them.
+
+    Share the :class:`~aioquic.tls.SessionTicketSealer`, or its secret,
+    between all the server processes which should resume each other's
+    sessions.
+
+    .. note:: This is only used by servers.
+    """
+
     token: bytes = b""
     """
     The address validation token that can be used to validate future connections.
@@ -121,6 +279,43 @@ class QuicConfiguration:
     )
     verify_mode: Optional[int] = None
 
+    _derived_server_credentials: Optional[TlsServerCredentials] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def get_server_credentials(self) -> Optional[TlsServerCredentials]:
+        """
+        Return the credentials the server uses for its side of the handshake.
+
+        Unless :attr:`server_credentials` is set, they are derived from
+        :attr:`certificate`, :attr:`certificate_chain` and
+        :attr:`private_key`, and shared by all connections until one of these
+        attributes changes.
+        """
+        if self.server_credentials is not None:
+            return self.server_credentials
+        if self.certificate is None or self.private_key is None:
+            return None
+
+        credentials = self._derived_server_credentials
+        if (
+            credentials is None
+            or credentials.certificate is not self.certificate
+            or credentials.private_key is not self.private_key
+            or len(credentials.certificate_chain) != len(self.certificate_chain)
+            or any(
+                a is not b
+                for a, b in zip(credentials.certificate_chain, self.certificate_chain)
+            )
+        ):
+            credentials = TlsServerCredentials(
+                certificate=self.certificate,
+                certificate_chain=list(self.certificate_chain),
+                private_key=self.private_key,
+            )
+            self._derived_server_credentials = credentials
+        return credentials
+
     def load_cert_chain(
         self,
         certfile: PathLike,
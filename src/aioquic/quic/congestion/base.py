@@ -1,4 +1,5 @@
 import abc
+import math
 from typing import Any, Dict, Iterable, Optional, Protocol
 
 from ..packet_builder import QuicSentPacket
@@ -7,6 +8,14 @@ K_GRANULARITY = 0.001  # seconds
 K_INITIAL_WINDOW = 10
 K_MINIMUM_WINDOW = 2
 
+# HyStart++ (see https://www.rfc-editor.org/rfc/rfc9406.html#name-constants)
+K_HYSTART_CSS_GROWTH_DIVISOR = 4
+K_HYSTART_CSS_ROUNDS = 5
+K_HYSTART_MAX_RTT_THRESH = 0.016  # seconds
+K_HYSTART_MIN_RTT_DIVISOR = 8
+K_HYSTART_MIN_RTT_THRESH = 0.004  # seconds
+K_HYSTART_N_RTT_SAMPLE = 8
+
 
 class QuicCongestionControl(abc.ABC):
     """
@@ -17,7 +26,9 @@ class QuicCongestionControl(abc.ABC):
     congestion_window: int = 0
     ssthresh: Optional[int] = None
 
-    def __init__(self, *, max_datagram_size: int) -> None:
+    def __init__(self, *, max_datagram_size: int, hystart: bool = False) -> None:
+        self._hystart = QuicHyStart() if hystart else None
+        self._max_datagram_size = max_datagram_size
         self.congestion_window = K_INITIAL_WINDOW * max_datagram_size
 
     @abc.abstractmethod
@@ -40,6 +51,16 @@ class QuicCongestionControl(abc.ABC):
     def on_rtt_measurement(self, *, now: float, rtt: float) -> None:
         ...  # pragma: no cover
 
+    def set_max_datagram_size(self, max_datagram_size: int) -> None:
+        """
+        Change the maximum datagram size, for instance once path MTU
+        discovery found a larger one.
+        """
+        self._max_datagram_size = max_datagram_size
+        self.congestion_window = max(
+            self.congestion_window, K_MINIMUM_WINDOW * max_datagram_size
+        )
+
     def get_log_data(self) -> Dict[str, Any]:
         data = {"cwnd": self.congestion_window, "bytes_in_flight": self.bytes_in_flight}
         if self.ssthresh is not None:
@@ -48,10 +69,96 @@ class QuicCongestionControl(abc.ABC):
 
 
 class QuicCongestionControlFactory(Protocol):
-    def __call__(self, *, max_datagram_size: int) -> QuicCongestionControl:
+    def __call__(
+        self, *, max_datagram_size: int, hystart: bool = False
+    ) -> QuicCongestionControl:
         ...  # pragma: no cover
 
 
+class QuicHyStart:
+    """
+    HyStart++ slow start, as described in RFC 9406.
+
+    The minimum RTT is measured over rounds of one RTT each. Once it grows
+    noticeably from one round to the next, the window grows four times
+    slower in Conservative Slow Start (CSS). If the RTT goes back down, this
+    was a false alarm and slow start resumes, otherwise slow start is over
+    after `K_HYSTART_CSS_ROUNDS` rounds of CSS.
+
+    As packets are always paced, the window increase per ACK is not limited.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.css_baseline_min_rtt: Optional[float] = None
+        self.css_rounds = 0
+        self.slow_start_done = False
+
+        self._current_round_min_rtt = math.inf
+        self._last_round_min_rtt = math.inf
+        self._last_sent_time = 0.0
+        self._rtt_sample_count = 0
+        self._window_end: Optional[float] = None
+
+    @property
+    def in_css(self) -> bool:
+        """
+        Whether Conservative Slow Start is in progress.
+        """
+        return self.css_baseline_min_rtt is not None
+
+    def on_packet_acked(self, *, packet: QuicSentPacket) -> int:
+        """
+        Callback when a packet is acknowledged during slow start.
+
+        Returns the number of bytes by which to grow the congestion window.
+        """
+        # a round ends once a packet sent after its start is acknowledged
+        if self._window_end is None or packet.sent_time > self._window_end:
+            self._last_round_min_rtt = self._current_round_min_rtt
+            self._current_round_min_rtt = math.inf
+            self._rtt_sample_count = 0
+            self._window_end = self._last_sent_time
+            if self.in_css:
+                self.css_rounds += 1
+                if self.css_rounds >= K_HYSTART_CSS_ROUNDS:
+                    self.slow_start_done = True
+
+        if self.in_css:
+            return packet.sent_bytes // K_HYSTART_CSS_GROWTH_DIVISOR
+        return packet.sent_bytes
+
+    def on_packet_sent(self, *, packet: QuicSentPacket) -> None:
+        self._last_sent_time = packet.sent_time
+
+    def on_rtt_measurement(self, *, rtt: float) -> None:
+        self._current_round_min_rtt = min(self._current_round_min_rtt, rtt)
+        self._rtt_sample_count += 1
+        if self._rtt_sample_count < K_HYSTART_N_RTT_SAMPLE:
+            return
+
+        if self.css_baseline_min_rtt is None:
+            # enter CSS if the RTT increased
+            if self._last_round_min_rtt != math.inf:
+                rtt_thresh = max(
+                    K_HYSTART_MIN_RTT_THRESH,
+                    min(
+                        self._last_round_min_rtt / K_HYSTART_MIN_RTT_DIVISOR,
+                        K_HYSTART_MAX_RTT_THRESH,
+                    ),
+                )
+                if self._current_round_min_rtt >= (
+                    self._last_round_min_rtt + rtt_thresh
+                ):
+                    self.css_baseline_min_rtt = self._current_round_min_rtt
+                    self.css_rounds = 0
+        elif self._current_round_min_rtt < self.css_baseline_min_rtt:
+            # the RTT increase was spurious, resume slow start
+            self.css_baseline_min_rtt = None
+
+
 class QuicRttMonitor:
     """
     Roundtrip time monitor for HyStart.
@@ -111,16 +218,18 @@ _factories: Dict[str, QuicCongestionControlFactory] = {}
 
 
 def create_congestion_control(
-    name: str, *, max_datagram_size: int
+    name: str, *, max_datagram_size: int, hystart: bool = False
 ) -> QuicCongestionControl:
     """
     Create an instance of the `name` congestion control algorithm.
+
+    If `hystart` is `True`, slow start uses HyStart++.
     """
     try:
         factory = _factories[name]
     except KeyError:
         raise Exception(f"Unknown congestion control algorithm: {name}")
-    return factory(max_datagram_size=max_datagram_size)
+    return factory(max_datagram_size=max_datagram_size, hystart=hystart)
 
 
 def register_congestion_control(
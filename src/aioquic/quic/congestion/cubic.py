@@ -28,8 +28,8 @@ class CubicCongestionControl(QuicCongestionControl):
     Cubic congestion control implementation for aioquic
     """
 
-    def __init__(self, max_datagram_size: int) -> None:
-        super().__init__(max_datagram_size=max_datagram_size)
+    def __init__(self, max_datagram_size: int, *, hystart: bool = False) -> None:
+        super().__init__(max_datagram_size=max_datagram_size, hystart=hystart)
         # increase by one segment
         self.additive_increase_factor: int = max_datagram_size
         self._max_datagram_size: int = max_datagram_size
@@ -57,6 +57,8 @@ class CubicCongestionControl(QuicCongestionControl):
     def reset(self) -> None:
         self.congestion_window = K_INITIAL_WINDOW * self._max_datagram_size
         self.ssthresh = None
+        if self._hystart is not None:
+            self._hystart.reset()
 
         self._first_slow_start = True
         self._starting_congestion_avoidance = False
@@ -66,11 +68,20 @@ class CubicCongestionControl(QuicCongestionControl):
         self._t_epoch = 0.0
         self._W_max = self.congestion_window
 
+    def set_max_datagram_size(self, max_datagram_size: int) -> None:
+        super().set_max_datagram_size(max_datagram_size)
+        self.additive_increase_factor = max_datagram_size
+
     def on_packet_acked(self, *, now: float, packet: QuicSentPacket) -> None:
         self.bytes_in_flight -= packet.sent_bytes
         self.last_ack = packet.sent_time
 
-        if self.ssthresh is None or self.congestion_window < self.ssthresh:
+        if self.ssthresh is None and self._hystart is not None:
+            # slow start, moderated by HyStart++
+            self.congestion_window += self._hystart.on_packet_acked(packet=packet)
+            if self._hystart.slow_start_done:
+                self.ssthresh = self.congestion_window
+        elif self.ssthresh is None or self.congestion_window < self.ssthresh:
             # slow start
             self.congestion_window += packet.sent_bytes
         else:
@@ -147,11 +158,12 @@ class CubicCongestionControl(QuicCongestionControl):
 
     def on_packet_sent(self, *, packet: QuicSentPacket) -> None:
         self.bytes_in_flight += packet.sent_bytes
-        if self.last_ack == 0.0:
-            return
-        elapsed_idle = packet.sent_time - self.last_ack
-        if elapsed_idle >= K_CUBIC_MAX_IDLE_TIME:
-            self.reset()
+        if self.last_ack != 0.0:
+            elapsed_idle = packet.sent_time - self.last_ack
+            if elapsed_idle >= K_CUBIC_MAX_IDLE_TIME:
+                self.reset()
+        if self._hystart is not None:
+            self._hystart.on_packet_sent(packet=packet)
 
     def on_packets_expired(self, *, packets: Iterable[QuicSentPacket]) -> None:
         for packet in packets:
@@ -196,9 +208,11 @@ class CubicCongestionControl(QuicCongestionControl):
     def on_rtt_measurement(self, *, now: float, rtt: float) -> None:
         self.rtt = rtt
         # check whether we should exit slow start
-        if self.ssthresh is None and self._rtt_monitor.is_rtt_increasing(
-            rtt=rtt, now=now
-        ):
+        if self.ssthresh is not None:
+            return
+        if self._hystart is not None:
+            self._hystart.on_rtt_measurement(rtt=rtt)
+        elif self._rtt_monitor.is_rtt_increasing(rtt=rtt, now=now):
             self.ssthresh = self.congestion_window
 
     def get_log_data(self) -> Dict[str, Any]:
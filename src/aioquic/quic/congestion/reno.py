@@ -16,8 +16,8 @@ class RenoCongestionControl(QuicCongestionControl):
     New Reno congestion control.
     """
 
-    def __init__(self, *, max_datagram_size: int) -> None:
-        super().__init__(max_datagram_size=max_datagram_size)
+    def __init__(self, *, max_datagram_size: int, hystart: bool = False) -> None:
+        super().__init__(max_datagram_size=max_datagram_size, hystart=hystart)
         self._max_datagram_size = max_datagram_size
         self._congestion_recovery_start_time = 0.0
         self._congestion_stash = 0
@@ -30,7 +30,12 @@ class RenoCongestionControl(QuicCongestionControl):
         if packet.sent_time <= self._congestion_recovery_start_time:
             return
 
-        if self.ssthresh is None or self.congestion_window < self.ssthresh:
+        if self.ssthresh is None and self._hystart is not None:
+            # slow start, moderated by HyStart++
+            self.congestion_window += self._hystart.on_packet_acked(packet=packet)
+            if self._hystart.slow_start_done:
+                self.ssthresh = self.congestion_window
+        elif self.ssthresh is None or self.congestion_window < self.ssthresh:
             # slow start
             self.congestion_window += packet.sent_bytes
         else:
@@ -43,6 +48,8 @@ class RenoCongestionControl(QuicCongestionControl):
 
     def on_packet_sent(self, *, packet: QuicSentPacket) -> None:
         self.bytes_in_flight += packet.sent_bytes
+        if self._hystart is not None:
+            self._hystart.on_packet_sent(packet=packet)
 
     def on_packets_expired(self, *, packets: Iterable[QuicSentPacket]) -> None:
         for packet in packets:
@@ -68,9 +75,11 @@ class RenoCongestionControl(QuicCongestionControl):
 
     def on_rtt_measurement(self, *, now: float, rtt: float) -> None:
         # check whether we should exit slow start
-        if self.ssthresh is None and self._rtt_monitor.is_rtt_increasing(
-            now=now, rtt=rtt
-        ):
+        if self.ssthresh is not None:
+            return
+        if self._hystart is not None:
+            self._hystart.on_rtt_measurement(rtt=rtt)
+        elif self._rtt_monitor.is_rtt_increasing(now=now, rtt=rtt):
             self.ssthresh = self.congestion_window
 
 
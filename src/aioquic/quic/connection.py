@@ -1,10 +1,13 @@
 import binascii
+import bisect
 import logging
 import os
 from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass
 from enum import Enum
 from functools import partial
+from operator import attrgetter
 from typing import (
     Any,
     Callable,
@@ -47,6 +50,7 @@ from .packet import (
     QuicProtocolVersion,
     QuicStreamFrame,
     QuicTransportParameters,
+    encode_ack_ranges,
     get_retry_integrity_tag,
     get_spin_bit,
     is_draft_version,
@@ -54,16 +58,22 @@ from .packet import (
     pull_ack_frame,
     pull_quic_header,
     pull_quic_transport_parameters,
-    push_ack_frame,
     push_quic_transport_parameters,
 )
 from .packet_builder import (
     QuicDeliveryState,
     QuicPacketBuilder,
     QuicPacketBuilderStop,
+    QuicSentPacket,
+)
+from .pmtud import QuicPathMtuDiscovery
+from .recovery import K_PACKET_THRESHOLD, QuicPacketRecovery, QuicPacketSpace
+from .stream import (
+    FinalSizeError,
+    QuicReceiveWindow,
+    QuicStream,
+    StreamFinishedError,
 )
-from .recovery import QuicPacketRecovery, QuicPacketSpace
-from .stream import FinalSizeError, QuicStream, StreamFinishedError
 
 logger = logging.getLogger("quic")
 
@@ -95,11 +105,21 @@ UDP_HEADER_SIZE = 8
 
 NetworkAddress = Any
 
+# ACK frequency, the peer is asked to send one ACK per fraction of the
+# congestion window and per fraction of the RTT
+ACK_ELICITING_THRESHOLD_MAX = 255
+ACK_FREQUENCY_RTT_FRACTION = 4
+ACK_FREQUENCY_WINDOW_FRACTION = 8
+
+# ACK ranges, the oldest reported ones are dropped beyond this count
+ACK_RANGES_MAX = 32
+
 # frame sizes
-ACK_FRAME_CAPACITY = 64  # FIXME: this is arbitrary!
+ACK_FREQUENCY_FRAME_CAPACITY = 2 + 4 * UINT_VAR_MAX_SIZE
 APPLICATION_CLOSE_FRAME_CAPACITY = 1 + 2 * UINT_VAR_MAX_SIZE  # + reason length
 CONNECTION_LIMIT_FRAME_CAPACITY = 1 + UINT_VAR_MAX_SIZE
 HANDSHAKE_DONE_FRAME_CAPACITY = 1
+IMMEDIATE_ACK_FRAME_CAPACITY = 1
 MAX_STREAM_DATA_FRAME_CAPACITY = 1 + 2 * UINT_VAR_MAX_SIZE
 NEW_CONNECTION_ID_FRAME_CAPACITY = (
     1 + 2 * UINT_VAR_MAX_SIZE + 1 + CONNECTION_ID_MAX_SIZE + STATELESS_RESET_TOKEN_SIZE
@@ -210,6 +230,90 @@ class QuicNetworkPath:
         return self.is_validated or (self.bytes_sent + size) <= 3 * self.bytes_received
 
 
+@dataclass
+class QuicConnectionStats:
+    """
+    A snapshot of a connection's transport statistics.
+
+    Times are expressed in seconds.
+    """
+
+    bytes_acked: int
+    "The number of bytes in packets which were acknowledged by the peer."
+
+    bytes_in_flight: int
+    "The number of bytes in flight, as tracked by congestion control."
+
+    bytes_lost: int
+    "The number of bytes in packets which were declared lost."
+
+    bytes_received: int
+    "The number of bytes in datagrams which were received."
+
+    bytes_sent: int
+    "The number of bytes in datagrams which were sent."
+
+    congestion_window: int
+    "The congestion window in bytes."
+
+    data_blocked_time: float
+    "The time during which the connection flow control limit blocked sending."
+
+    datagrams_received: int
+    "The number of datagrams which were received."
+
+    datagrams_sent: int
+    "The number of datagrams which were sent."
+
+    handshake_duration: Optional[float]
+    "The time it took to complete the handshake, or `None`."
+
+    latest_rtt: float
+    "The latest RTT sample."
+
+    max_datagram_size: int
+    "The maximum datagram size, which grows if path MTU discovery is enabled."
+
+    min_rtt: Optional[float]
+    "The smallest RTT sample, or `None` if no sample was taken yet."
+
+    pacing_rate: Optional[int]
+    "The pacing rate in bytes per second, or `None` if pacing is not active."
+
+    pacing_wakeups: int
+    "The number of times the timer fired to send paced packets."
+
+    packets_acked: int
+    "The number of packets which were acknowledged by the peer."
+
+    packets_lost: int
+    "The number of packets which were declared lost."
+
+    packets_received: int
+    "The number of packets which were received and decrypted."
+
+    packets_sent: int
+    "The number of packets which were sent."
+
+    probe_timeouts: int
+    "The number of times the probe timeout (PTO) fired."
+
+    smoothed_rtt: float
+    "The smoothed RTT, or the initial RTT if no sample was taken yet."
+
+    spurious_losses: int
+    "The number of packets which were declared lost but reached the peer."
+
+    stream_data_blocked_time: float
+    "The time during which stream flow control limits blocked sending, summed."
+
+    streams_open: int
+    "The number of streams which are currently open."
+
+    streams_opened: int
+    "The number of streams which were opened by either endpoint."
+
+
 @dataclass
 class QuicReceiveContext:
     epoch: tls.Epoch
@@ -220,6 +324,7 @@ class QuicReceiveContext:
 
 
 QuicTokenHandler = Callable[[bytes], None]
+QuicTokenIssuer = Callable[[NetworkAddress], bytes]
 
 END_STATES = frozenset(
     [
@@ -249,11 +354,13 @@ class QuicConnection:
         self,
         *,
         configuration: QuicConfiguration,
+        address_validated: bool = False,
         original_destination_connection_id: Optional[bytes] = None,
         retry_source_connection_id: Optional[bytes] = None,
         session_ticket_fetcher: Optional[tls.SessionTicketFetcher] = None,
         session_ticket_handler: Optional[tls.SessionTicketHandler] = None,
         token_handler: Optional[QuicTokenHandler] = None,
+        token_issuer: Optional[QuicTokenIssuer] = None,
     ) -> None:
         assert configuration.max_datagram_size >= SMALLEST_MAX_DATAGRAM_SIZE, (
             "The smallest allowed maximum datagram size is "
@@ -266,6 +373,8 @@ class QuicConnection:
             assert (
                 retry_source_connection_id is None
             ), "Cannot set retry_source_connection_id for a client"
+            assert not address_validated, "Cannot set address_validated for a client"
+            assert token_issuer is None, "Cannot set `token_issuer` for a client"
         else:
             assert token_handler is None, "Cannot set `token_handler` for a server"
             assert (
@@ -286,16 +395,28 @@ class QuicConnection:
         self._is_client = configuration.is_client
 
         self._ack_delay = K_GRANULARITY
+        self._ack_eliciting_threshold: Optional[int] = None
+        self._ack_frequency_pending = False
+        self._ack_frequency_requested: Optional[int] = None
+        self._ack_frequency_requests = 0
+        self._ack_frequency_sequence_number = -1
+        self._ack_reordering_threshold = 0
+        self._address_validated = address_validated
         self._close_at: Optional[float] = None
         self._close_event: Optional[events.ConnectionTerminated] = None
         self._connect_called = False
         self._cryptos: Dict[tls.Epoch, CryptoPair] = {}
+        self._data_blocked_at: Optional[float] = None
+        self._data_blocked_pending = False
+        self._data_blocked_time = 0.0
         self._crypto_buffers: Dict[tls.Epoch, Buffer] = {}
         self._crypto_retransmitted = False
         self._crypto_streams: Dict[tls.Epoch, QuicStream] = {}
         self._events: Deque[events.QuicEvent] = deque()
         self._handshake_complete = False
+        self._handshake_completed_at: Optional[float] = None
         self._handshake_confirmed = False
+        self._handshake_started_at: Optional[float] = None
         self._host_cids = [
             QuicConnectionId(
                 cid=os.urandom(configuration.connection_id_length),
@@ -304,6 +425,7 @@ class QuicConnection:
                 was_sent=True,
             )
         ]
+        self._host_cids_by_cid = {self._host_cids[0].cid: self._host_cids[0]}
         self.host_cid = self._host_cids[0].cid
         self._host_cid_seq = 1
         self._local_ack_delay_exponent = 3
@@ -314,6 +436,9 @@ class QuicConnection:
             name="max_data",
             value=configuration.max_data,
         )
+        self._local_max_data_window = QuicReceiveWindow(
+            size=configuration.max_data, max_size=configuration.max_data_window
+        )
         self._local_max_stream_data_bidi_local = configuration.max_stream_data
         self._local_max_stream_data_bidi_remote = configuration.max_stream_data
         self._local_max_stream_data_uni = configuration.max_stream_data
@@ -329,8 +454,15 @@ class QuicConnection:
         self._local_next_stream_id_uni = 2 if self._is_client else 3
         self._loss_at: Optional[float] = None
         self._max_datagram_size = configuration.max_datagram_size
+        self._mtu_discovery: Optional[QuicPathMtuDiscovery] = None
+        if configuration.max_discovered_datagram_size is not None:
+            self._mtu_discovery = QuicPathMtuDiscovery(
+                base_size=configuration.max_datagram_size,
+                max_size=configuration.max_discovered_datagram_size,
+            )
         self._network_paths: List[QuicNetworkPath] = []
         self._pacing_at: Optional[float] = None
+        self._pacing_wakeups = 0
         self._packet_number = 0
         self._parameters_received = False
         self._peer_cid = QuicConnectionId(
@@ -339,6 +471,15 @@ class QuicConnection:
         self._peer_cid_available: List[QuicConnectionId] = []
         self._peer_cid_sequence_numbers: Set[int] = set([0])
         self._peer_token = configuration.token
+        if (
+            configuration.is_client
+            and not self._peer_token
+            and configuration.session_cache is not None
+            and configuration.server_name is not None
+        ):
+            self._peer_token = configuration.session_cache.pop_token(
+                configuration.server_name
+            )
         self._quic_logger: Optional[QuicLoggerTrace] = None
         self._remote_ack_delay_exponent = 3
         self._remote_active_connection_id_limit = 2
@@ -347,6 +488,7 @@ class QuicConnection:
         self._remote_max_data = 0
         self._remote_max_data_used = 0
         self._remote_max_datagram_frame_size: Optional[int] = None
+        self._remote_min_ack_delay: Optional[float] = None  # seconds
         self._remote_max_stream_data_bidi_local = 0
         self._remote_max_stream_data_bidi_remote = 0
         self._remote_max_stream_data_uni = 0
@@ -355,16 +497,28 @@ class QuicConnection:
         self._retry_count = 0
         self._retry_source_connection_id = retry_source_connection_id
         self._spaces: Dict[tls.Epoch, QuicPacketSpace] = {}
+        self._stream_data_blocked_time = 0.0
         self._spin_bit = False
         self._spin_highest_pn = 0
         self._state = QuicConnectionState.FIRSTFLIGHT
+        self._stream_send_sequence = 0
         self._streams: Dict[int, QuicStream] = {}
         self._streams_blocked_bidi: List[QuicStream] = []
         self._streams_blocked_uni: List[QuicStream] = []
         self._streams_finished: Set[int] = set()
+        self._streams_send_order: Optional[List[QuicStream]] = None
         self._version: Optional[int] = None
         self._version_negotiation_count = 0
 
+        # statistics
+        self._bytes_received = 0
+        self._bytes_sent = 0
+        self._datagrams_received = 0
+        self._datagrams_sent = 0
+        self._packets_received = 0
+        self._packets_sent = 0
+        self._streams_opened = 0
+
         if self._is_client:
             self._original_destination_connection_id = self._peer_cid.cid
         else:
@@ -385,8 +539,10 @@ class QuicConnection:
         # loss recovery
         self._loss = QuicPacketRecovery(
             congestion_control_algorithm=configuration.congestion_control_algorithm,
+            hystart=configuration.hystart,
             initial_rtt=configuration.initial_rtt,
             max_datagram_size=self._max_datagram_size,
+            pacing_granularity=configuration.pacing_granularity,
             peer_completed_address_validation=not self._is_client,
             quic_logger=self._quic_logger,
             send_probe=self._send_probe,
@@ -397,6 +553,7 @@ class QuicConnection:
         self._close_pending = False
         self._datagrams_pending: Deque[bytes] = deque()
         self._handshake_done_pending = False
+        self._new_token_pending = False
         self._ping_pending: List[int] = []
         self._probe_pending = False
         self._retire_connection_ids: List[int] = []
@@ -406,6 +563,7 @@ class QuicConnection:
         self._session_ticket_fetcher = session_ticket_fetcher
         self._session_ticket_handler = session_ticket_handler
         self._token_handler = token_handler
+        self._token_issuer = token_issuer
 
         # frame handlers
         self.__frame_handlers = {
@@ -443,15 +601,55 @@ class QuicConnection:
             0x30: (self._handle_datagram_frame, EPOCHS("01")),
             0x31: (self._handle_datagram_frame, EPOCHS("01")),
         }
+        if configuration.ack_frequency:
+            self.__frame_handlers[0x1F] = (
+                self._handle_immediate_ack_frame,
+                EPOCHS("01"),
+            )
+            self.__frame_handlers[0xAF] = (
+                self._handle_ack_frequency_frame,
+                EPOCHS("01"),
+            )
 
     @property
     def configuration(self) -> QuicConfiguration:
         return self._configuration
 
+    @property
+    def early_data_available(self) -> bool:
+        """
+        Whether data sent now is sent as 0-RTT early data.
+
+        This is the case for clients resuming a session from a ticket which
+        allows early data, until the handshake completes. Since early data can
+        be replayed by an attacker, only idempotent requests should be sent at
+        this stage. If the server rejects early data, it is retransmitted once
+        the handshake completes.
+        """
+        return (
+            self._is_client
+            and not self._handshake_complete
+            and tls.Epoch.ZERO_RTT in self._cryptos
+            and self._cryptos[tls.Epoch.ZERO_RTT].send.is_valid()
+        )
+
     @property
     def original_destination_connection_id(self) -> bytes:
         return self._original_destination_connection_id
 
+    @property
+    def pending_signature(self) -> Optional["Future[bytes]"]:
+        """
+        The CertificateVerify signature the handshake is waiting for, if any.
+
+        This is only set for servers using a
+        :attr:`~aioquic.quic.configuration.QuicConfiguration.certificate_signer`.
+        Once the future is done, call :meth:`resume_handshake`.
+        """
+        if not self._crypto_buffers:
+            return None
+        return self.tls.pending_signature
+
     def change_connection_id(self) -> None:
         """
         Switch to the next available connection ID and retire
@@ -505,11 +703,37 @@ class QuicConnection:
             self._is_client and not self._connect_called
         ), "connect() can only be called for clients and a single time"
         self._connect_called = True
+        self._handshake_started_at = now
 
         self._network_paths = [QuicNetworkPath(addr, is_validated=True)]
         self._version = self._configuration.supported_versions[0]
         self._connect(now=now)
 
+    def consume(self, stream_id: int, size: int) -> None:
+        """
+        Signal that the application has consumed data received on a stream.
+
+        This is only needed if
+        :attr:`~aioquic.quic.configuration.QuicConfiguration.manual_flow_control`
+        is set, in which case the flow control limits advertised to the peer
+        only grow as received data is consumed.
+
+        :param stream_id: The stream's ID.
+        :param size: The number of bytes which were consumed.
+        """
+        if not self._configuration.manual_flow_control:
+            raise ValueError("Received data is consumed automatically")
+
+        stream = self._get_stream_for_receive_control(stream_id)
+        if stream is not None:
+            if stream.receive_window.consumed + size > stream.receiver.delivered_offset:
+                raise ValueError("Cannot consume more data than was received")
+            stream.receive_window.consumed += size
+
+        # the stream may already have been discarded
+        window = self._local_max_data_window
+        window.consumed = min(window.consumed + size, self._local_max_data.used)
+
     def datagrams_to_send(self, now: float) -> List[Tuple[bytes, NetworkAddress]]:
         """
         Return a list of `(data, addr)` tuples of datagrams which need to be
@@ -589,14 +813,36 @@ class QuicConnection:
                 pass
 
         datagrams, packets = builder.flush()
+        packet_number = builder.packet_number
+
+        # probe the path MTU
+        if self._mtu_discovery is not None:
+            probe_datagrams, probe_packets = self._build_mtu_probe(
+                network_path=network_path,
+                now=now,
+                packet_number=packet_number,
+                packets=packets,
+            )
+            datagrams += probe_datagrams
+            packets += probe_packets
+            packet_number += len(probe_packets)
 
         if datagrams:
-            self._packet_number = builder.packet_number
+            self._packet_number = packet_number
 
             # register packets
             sent_handshake = False
+            self._packets_sent += len(packets)
             for packet in packets:
                 packet.sent_time = now
+                if (
+                    self._mtu_discovery is not None
+                    and packet.sent_bytes > self._mtu_discovery.base_size
+                    and not packet.is_mtu_probe
+                ):
+                    packet.delivery_handlers.append(
+                        (self._on_mtu_packet_delivery, (now,))
+                    )
                 self._loss.on_packet_sent(
                     packet=packet, space=self._spaces[packet.epoch]
                 )
@@ -634,6 +880,8 @@ class QuicConnection:
             payload_length = len(datagram)
             network_path.bytes_sent += payload_length
             ret.append((datagram, network_path.addr))
+            self._bytes_sent += payload_length
+            self._datagrams_sent += 1
 
             if self._quic_logger is not None:
                 self._quic_logger.log_event(
@@ -651,6 +899,20 @@ class QuicConnection:
                 )
         return ret
 
+    def get_available_stream_count(self, is_unidirectional=False) -> int:
+        """
+        Return the number of streams this endpoint can create before reaching
+        the limit set by the peer.
+        """
+        if is_unidirectional:
+            return max(
+                0, self._remote_max_streams_uni - self._local_next_stream_id_uni // 4
+            )
+        else:
+            return max(
+                0, self._remote_max_streams_bidi - self._local_next_stream_id_bidi // 4
+            )
+
     def get_next_available_stream_id(self, is_unidirectional=False) -> int:
         """
         Return the stream ID for the next stream created by this endpoint.
@@ -660,6 +922,54 @@ class QuicConnection:
         else:
             return self._local_next_stream_id_bidi
 
+    def get_stats(self) -> QuicConnectionStats:
+        """
+        Return a snapshot of the connection's transport statistics.
+
+        The statistics are always collected, and taking a snapshot is cheap
+        enough to be done periodically for metrics purposes.
+        """
+        loss = self._loss
+        handshake_duration = None
+        if (
+            self._handshake_started_at is not None
+            and self._handshake_completed_at is not None
+        ):
+            handshake_duration = (
+                self._handshake_completed_at - self._handshake_started_at
+            )
+        pacing_rate = None
+        if loss._pacer.packet_time is not None:
+            pacing_rate = int(self._max_datagram_size / loss._pacer.packet_time)
+
+        return QuicConnectionStats(
+            bytes_acked=loss.bytes_acked,
+            bytes_in_flight=loss.bytes_in_flight,
+            bytes_lost=loss.bytes_lost,
+            bytes_received=self._bytes_received,
+            bytes_sent=self._bytes_sent,
+            congestion_window=loss.congestion_window,
+            data_blocked_time=self._data_blocked_time,
+            datagrams_received=self._datagrams_received,
+            datagrams_sent=self._datagrams_sent,
+            handshake_duration=handshake_duration,
+            latest_rtt=loss._rtt_latest,
+            max_datagram_size=self._max_datagram_size,
+            min_rtt=loss._rtt_min if loss._rtt_initialized else None,
+            pacing_rate=pacing_rate,
+            pacing_wakeups=self._pacing_wakeups,
+            packets_acked=loss.packets_acked,
+            packets_lost=loss.packets_lost,
+            packets_received=self._packets_received,
+            packets_sent=self._packets_sent,
+            probe_timeouts=loss.probe_timeouts,
+            smoothed_rtt=loss.smoothed_rtt,
+            spurious_losses=loss.spurious_losses,
+            stream_data_blocked_time=self._stream_data_blocked_time,
+            streams_open=len(self._streams),
+            streams_opened=self._streams_opened,
+        )
+
     def get_timer(self) -> Optional[float]:
         """
         Return the time at which the timer should fire or None if no timer is needed.
@@ -707,6 +1017,20 @@ class QuicConnection:
             self._logger.debug("Loss detection triggered")
             self._loss.on_loss_detection_timeout(now=now)
 
+        # pacing timeout
+        if self._pacing_at is not None and now >= self._pacing_at:
+            self._pacing_wakeups += 1
+
+    def drain_events(self) -> List[events.QuicEvent]:
+        """
+        Retrieve all the events from the event buffer.
+
+        Returns an empty list if there are no buffered events.
+        """
+        buffered = list(self._events)
+        self._events.clear()
+        return buffered
+
     def next_event(self) -> Optional[events.QuicEvent]:
         """
         Retrieve the next event from the event buffer.
@@ -733,6 +1057,9 @@ class QuicConnection:
         if self._state in END_STATES:
             return
 
+        self._bytes_received += len(data)
+        self._datagrams_received += 1
+
         # log datagram
         if self._quic_logger is not None:
             payload_length = len(data)
@@ -774,11 +1101,10 @@ class QuicConnection:
                 return
 
             # check destination CID matches
+            host_connection_id = self._host_cids_by_cid.get(header.destination_cid)
             destination_cid_seq: Optional[int] = None
-            for connection_id in self._host_cids:
-                if header.destination_cid == connection_id.cid:
-                    destination_cid_seq = connection_id.sequence_number
-                    break
+            if host_connection_id is not None:
+                destination_cid_seq = host_connection_id.sequence_number
             if (
                 self._is_client or header.packet_type == PACKET_TYPE_HANDSHAKE
             ) and destination_cid_seq is None:
@@ -919,7 +1245,10 @@ class QuicConnection:
                     header.packet_type == PACKET_TYPE_INITIAL
                 ), "first packet must be INITIAL"
                 crypto_frame_required = True
+                self._handshake_started_at = now
                 self._network_paths = [network_path]
+                if self._address_validated:
+                    network_path.is_validated = True
                 self._version = QuicProtocolVersion(header.version)
                 self._initialize(header.destination_cid)
 
@@ -982,6 +1311,8 @@ class QuicConnection:
                 )
                 return
 
+            self._packets_received += 1
+
             # log packet
             quic_logger_frames: Optional[List[Dict]] = None
             if self._quic_logger is not None:
@@ -1092,12 +1423,41 @@ class QuicConnection:
 
             # record packet as received
             if not space.discarded:
+                is_reordered = self._ack_reordering_threshold > 0 and (
+                    packet_number < space.largest_received_packet
+                    or packet_number - space.largest_received_packet
+                    > self._ack_reordering_threshold
+                )
                 if packet_number > space.largest_received_packet:
                     space.largest_received_packet = packet_number
                     space.largest_received_time = now
                 space.ack_queue.add(packet_number)
-                if is_ack_eliciting and space.ack_at is None:
-                    space.ack_at = now + self._ack_delay
+                space.ack_unreported.add(packet_number)
+                self._trim_ack_queue(space)
+                space.ack_ranges = None
+                if is_ack_eliciting:
+                    space.ack_eliciting_received += 1
+                    if is_reordered or (
+                        self._ack_eliciting_threshold is not None
+                        and space.ack_eliciting_received > self._ack_eliciting_threshold
+                    ):
+                        space.ack_at = now
+                    elif space.ack_at is None:
+                        space.ack_at = now + self._ack_delay
+
+    def pause_receiving(self, stream_id: int) -> None:
+        """
+        Stop raising the flow control limit of the receiving part of a stream.
+
+        Data which the peer is already allowed to send is still delivered, but
+        no further MAX_STREAM_DATA frames are sent until :meth:`resume_receiving`
+        is called. Unknown or finished streams are ignored.
+
+        :param stream_id: The stream's ID.
+        """
+        stream = self._get_stream_for_receive_control(stream_id)
+        if stream is not None:
+            stream.receiver.is_paused = True
 
     def request_key_update(self) -> None:
         """
@@ -1116,6 +1476,39 @@ class QuicConnection:
         stream = self._get_or_create_stream_for_send(stream_id)
         stream.sender.reset(error_code)
 
+    def resume_handshake(self) -> None:
+        """
+        Resume a handshake once :attr:`pending_signature` is done.
+
+        After calling this method call :meth:`datagrams_to_send` to retrieve data
+        which needs to be sent.
+        """
+        if self._state in END_STATES or self.pending_signature is None:
+            return
+
+        try:
+            self.tls.resume(self._crypto_buffers)
+            self._push_crypto_data()
+        except tls.Alert as exc:
+            self._logger.warning(exc)
+            self.close(
+                error_code=QuicErrorCode.CRYPTO_ERROR + int(exc.description),
+                frame_type=QuicFrameType.CRYPTO,
+                reason_phrase=str(exc),
+            )
+
+    def resume_receiving(self, stream_id: int) -> None:
+        """
+        Resume raising the flow control limit of the receiving part of a stream.
+
+        Unknown or finished streams are ignored.
+
+        :param stream_id: The stream's ID.
+        """
+        stream = self._get_stream_for_receive_control(stream_id)
+        if stream is not None:
+            stream.receiver.is_paused = False
+
     def send_ping(self, uid: int) -> None:
         """
         Send a PING frame to the peer.
@@ -1145,6 +1538,30 @@ class QuicConnection:
         stream = self._get_or_create_stream_for_send(stream_id)
         stream.sender.write(data, end_stream=end_stream)
 
+    def set_stream_priority(
+        self, stream_id: int, urgency: int = 3, incremental: bool = False
+    ) -> None:
+        """
+        Set the priority with which data is sent on a stream.
+
+        Streams with a lower urgency are sent first. Among streams with the same
+        urgency, non-incremental streams are sent one after the other in the
+        order they were created, then incremental streams take turns.
+
+        :param stream_id: The stream's ID.
+        :param urgency: The urgency, from 0 (highest) to 7 (lowest).
+        :param incremental: Whether the peer can make use of partial data.
+        """
+        if urgency < 0 or urgency > 7:
+            raise ValueError("Urgency must be between 0 and 7")
+        if stream_id in self._streams_finished:
+            return
+
+        stream = self._get_or_create_stream_for_send(stream_id)
+        stream.incremental = incremental
+        stream.urgency = urgency
+        self._streams_send_order = None
+
     def stop_stream(self, stream_id: int, error_code: int) -> None:
         """
         Request termination of the receiving part of a stream.
@@ -1193,6 +1610,74 @@ class QuicConnection:
                 reason_phrase="Stream is receive-only",
             )
 
+    def _build_mtu_probe(
+        self,
+        *,
+        network_path: QuicNetworkPath,
+        now: float,
+        packet_number: int,
+        packets: List[QuicSentPacket],
+    ) -> Tuple[List[bytes], List[QuicSentPacket]]:
+        """
+        Build a PING packet padded to the size of the next path MTU probe, if
+        one is due and congestion control allows it.
+        """
+        crypto = self._cryptos[tls.Epoch.ONE_RTT]
+        if (
+            not self._handshake_confirmed
+            or self._state != QuicConnectionState.CONNECTED
+            or not network_path.is_validated
+            or not crypto.send.is_valid()
+        ):
+            return [], []
+
+        probe_size = self._mtu_discovery.get_probe_size(now)
+        if probe_size is None:
+            return [], []
+        bytes_in_flight = self._loss.bytes_in_flight + sum(
+            packet.sent_bytes for packet in packets if packet.in_flight
+        )
+        if self._loss.congestion_window - bytes_in_flight < probe_size:
+            return [], []
+
+        builder = QuicPacketBuilder(
+            host_cid=self.host_cid,
+            is_client=self._is_client,
+            max_datagram_size=probe_size,
+            packet_number=packet_number,
+            peer_cid=self._peer_cid.cid,
+            peer_token=self._peer_token,
+            quic_logger=self._quic_logger,
+            spin_bit=self._spin_bit,
+            version=self._version,
+        )
+        builder.start_packet(PACKET_TYPE_ONE_RTT, crypto)
+        builder.start_frame(
+            QuicFrameType.PING,
+            capacity=PING_FRAME_CAPACITY,
+            handler=self._on_mtu_probe_delivery,
+            handler_args=(probe_size, now),
+        )
+        padding_size = builder.remaining_flight_space
+        buf = builder.start_frame(QuicFrameType.PADDING, capacity=padding_size)
+        buf.push_bytes(bytes(padding_size - 1))
+        self._logger.debug(
+            "Sending path MTU probe of %d bytes in packet %d",
+            probe_size,
+            builder.packet_number,
+        )
+
+        # log frames
+        if self._quic_logger is not None:
+            builder.quic_logger_frames.append(self._quic_logger.encode_ping_frame())
+            builder.quic_logger_frames.append(self._quic_logger.encode_padding_frame())
+
+        datagrams, probe_packets = builder.flush()
+        for packet in probe_packets:
+            packet.is_mtu_probe = True
+        self._mtu_discovery.on_probe_sent(probe_size)
+        return datagrams, probe_packets
+
     def _consume_peer_cid(self) -> None:
         """
         Update the destination connection ID by taking the next
@@ -1276,6 +1761,21 @@ class QuicConnection:
         self._logger.debug("Network path %s discovered", network_path.addr)
         return network_path
 
+    def _get_ack_eliciting_threshold(self) -> int:
+        """
+        Return the ACK-eliciting threshold to request from the peer.
+
+        One ACK is requested per fraction of the congestion window, rounded
+        down to one less than a power of two so the request changes rarely.
+        """
+        packets = self._loss.congestion_window // (
+            self._max_datagram_size * ACK_FREQUENCY_WINDOW_FRACTION
+        )
+        threshold = 1
+        while threshold * 2 + 1 <= min(packets, ACK_ELICITING_THRESHOLD_MAX):
+            threshold = threshold * 2 + 1
+        return threshold
+
     def _get_or_create_stream(self, frame_type: int, stream_id: int) -> QuicStream:
         """
         Get or create a stream in response to a received frame.
@@ -1320,9 +1820,12 @@ class QuicConnection:
             stream = self._streams[stream_id] = QuicStream(
                 stream_id=stream_id,
                 max_stream_data_local=max_stream_data_local,
+                max_stream_data_local_window=self._configuration.max_data_window,
                 max_stream_data_remote=max_stream_data_remote,
                 writable=not stream_is_unidirectional(stream_id),
             )
+            self._streams_opened += 1
+            self._streams_send_order = None
         return stream
 
     def _get_or_create_stream_for_send(self, stream_id: int) -> QuicStream:
@@ -1357,9 +1860,12 @@ class QuicConnection:
             stream = self._streams[stream_id] = QuicStream(
                 stream_id=stream_id,
                 max_stream_data_local=max_stream_data_local,
+                max_stream_data_local_window=self._configuration.max_data_window,
                 max_stream_data_remote=max_stream_data_remote,
                 readable=not is_unidirectional,
             )
+            self._streams_opened += 1
+            self._streams_send_order = None
             if is_unidirectional:
                 self._local_next_stream_id_uni = stream_id + 4
             else:
@@ -1372,6 +1878,18 @@ class QuicConnection:
                 self._streams_blocked_pending = True
         return stream
 
+    def _get_stream_for_receive_control(self, stream_id: int) -> Optional[QuicStream]:
+        """
+        Get a QUIC stream in order to control its receiving part.
+
+        This always occurs as a result of an API call.
+        """
+        if not self._stream_can_receive(stream_id):
+            raise ValueError(
+                "Cannot control receiving on a local-initiated unidirectional stream"
+            )
+        return self._streams.get(stream_id, None)
+
     def _handle_session_ticket(self, session_ticket: tls.SessionTicket) -> None:
         if (
             session_ticket.max_early_data_size is not None
@@ -1383,7 +1901,18 @@ class QuicConnection:
                 reason_phrase="Invalid max_early_data value %s"
                 % session_ticket.max_early_data_size,
             )
-        self._session_ticket_handler(session_ticket)
+        if (
+            self._is_client
+            and self._configuration.session_cache is not None
+            and self._configuration.server_name is not None
+        ):
+            self._configuration.session_cache.add_ticket(
+                self._configuration.server_name,
+                self._configuration.alpn_protocols,
+                session_ticket,
+            )
+        if self._session_ticket_handler is not None:
+            self._session_ticket_handler(session_ticket)
 
     def _initialize(self, peer_cid: bytes) -> None:
         # TLS
@@ -1402,6 +1931,13 @@ class QuicConnection:
         self.tls.certificate = self._configuration.certificate
         self.tls.certificate_chain = self._configuration.certificate_chain
         self.tls.certificate_private_key = self._configuration.private_key
+        self.tls.certificate_signer = self._configuration.certificate_signer
+        self.tls.ephemeral_key_pool = self._configuration.ephemeral_key_pool
+        self.tls.key_share_cache = self._configuration.key_share_cache
+        self.tls.key_share_groups = self._configuration.key_share_groups
+        if not self._is_client:
+            self.tls.server_credentials = self._configuration.get_server_credentials()
+        self.tls.session_ticket_sealer = self._configuration.session_ticket_sealer
         self.tls.handshake_extensions = [
             (
                 get_transport_parameters_extension(self._version),
@@ -1411,13 +1947,22 @@ class QuicConnection:
 
         # TLS session resumption
         session_ticket = self._configuration.session_ticket
+        if (
+            self._is_client
+            and session_ticket is None
+            and self._configuration.session_cache is not None
+            and self._configuration.server_name is not None
+        ):
+            session_ticket = self._configuration.session_cache.pop_ticket(
+                self._configuration.server_name, self._configuration.alpn_protocols
+            )
         if (
             self._is_client
             and session_ticket is not None
             and session_ticket.is_valid
             and session_ticket.server_name == self._configuration.server_name
         ):
-            self.tls.session_ticket = self._configuration.session_ticket
+            self.tls.session_ticket = session_ticket
 
             # parse saved QUIC transport parameters - for 0-RTT
             if session_ticket.max_early_data_size == MAX_EARLY_DATA:
@@ -1432,7 +1977,9 @@ class QuicConnection:
         self.tls.alpn_cb = self._alpn_handler
         if self._session_ticket_fetcher is not None:
             self.tls.get_session_ticket_cb = self._session_ticket_fetcher
-        if self._session_ticket_handler is not None:
+        if self._session_ticket_handler is not None or (
+            self._is_client and self._configuration.session_cache is not None
+        ):
             self.tls.new_session_ticket_cb = self._handle_session_ticket
         self.tls.update_traffic_key_cb = self._update_traffic_key
 
@@ -1516,6 +2063,44 @@ class QuicConnection:
             space=self._spaces[context.epoch],
         )
 
+    def _handle_ack_frequency_frame(
+        self, context: QuicReceiveContext, frame_type: int, buf: Buffer
+    ) -> None:
+        """
+        Handle an ACK_FREQUENCY frame.
+        """
+        sequence_number = buf.pull_uint_var()
+        ack_eliciting_threshold = buf.pull_uint_var()
+        request_max_ack_delay = buf.pull_uint_var() / 1000000
+        reordering_threshold = buf.pull_uint_var()
+
+        # log frame
+        if self._quic_logger is not None:
+            context.quic_logger_frames.append(
+                self._quic_logger.encode_ack_frequency_frame(
+                    ack_eliciting_threshold=ack_eliciting_threshold,
+                    reordering_threshold=reordering_threshold,
+                    request_max_ack_delay=request_max_ack_delay,
+                    sequence_number=sequence_number,
+                )
+            )
+
+        if request_max_ack_delay < K_GRANULARITY:
+            raise QuicConnectionError(
+                error_code=QuicErrorCode.PROTOCOL_VIOLATION,
+                frame_type=frame_type,
+                reason_phrase="Requested max_ack_delay is lower than min_ack_delay",
+            )
+
+        # ignore frames which arrive out of order
+        if sequence_number <= self._ack_frequency_sequence_number:
+            return
+
+        self._ack_delay = request_max_ack_delay
+        self._ack_eliciting_threshold = ack_eliciting_threshold
+        self._ack_frequency_sequence_number = sequence_number
+        self._ack_reordering_threshold = reordering_threshold
+
     def _handle_connection_close_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -1616,12 +2201,23 @@ class QuicConnection:
                 tls.State.SERVER_POST_HANDSHAKE,
             ]:
                 self._handshake_complete = True
+                self._handshake_completed_at = context.time
 
                 # for servers, the handshake is now confirmed
                 if not self._is_client:
                     self._discard_epoch(tls.Epoch.HANDSHAKE)
                     self._handshake_confirmed = True
                     self._handshake_done_pending = True
+                    self._new_token_pending = self._token_issuer is not None
+
+                # if the server rejected early data, send it again
+                if (
+                    self._is_client
+                    and self._cryptos[tls.Epoch.ZERO_RTT].send.is_valid()
+                    and not self.tls.early_data_accepted
+                ):
+                    self._logger.info("0-RTT data rejected by the server")
+                    self._loss.discard_early_data(space=self._spaces[tls.Epoch.ONE_RTT])
 
                 self._replenish_connection_ids()
                 self._events.append(
@@ -1722,6 +2318,20 @@ class QuicConnection:
             self._handshake_confirmed = True
             self._loss.peer_completed_address_validation = True
 
+    def _handle_immediate_ack_frame(
+        self, context: QuicReceiveContext, frame_type: int, buf: Buffer
+    ) -> None:
+        """
+        Handle an IMMEDIATE_ACK frame.
+        """
+        # log frame
+        if self._quic_logger is not None:
+            context.quic_logger_frames.append(
+                self._quic_logger.encode_immediate_ack_frame()
+            )
+
+        self._spaces[tls.Epoch.ONE_RTT].ack_at = context.time
+
     def _handle_max_data_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -1744,6 +2354,12 @@ class QuicConnection:
             self._logger.debug("Remote max_data raised to %d", max_data)
             self._remote_max_data = max_data
 
+            # we are no longer blocked
+            if self._data_blocked_at is not None:
+                self._data_blocked_time += context.time - self._data_blocked_at
+                self._data_blocked_at = None
+                self._data_blocked_pending = False
+
     def _handle_max_stream_data_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -1775,6 +2391,14 @@ class QuicConnection:
             )
             stream.max_stream_data_remote = max_stream_data
 
+            # the stream is no longer blocked
+            if stream.data_blocked_at is not None:
+                elapsed = context.time - stream.data_blocked_at
+                stream.data_blocked_at = None
+                stream.data_blocked_pending = False
+                stream.data_blocked_time += elapsed
+                self._stream_data_blocked_time += elapsed
+
     def _handle_max_streams_bidi_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -1935,6 +2559,13 @@ class QuicConnection:
                 reason_phrase="Clients must not send NEW_TOKEN frames",
             )
 
+        if (
+            self._configuration.session_cache is not None
+            and self._configuration.server_name is not None
+        ):
+            self._configuration.session_cache.add_token(
+                self._configuration.server_name, token
+            )
         if self._token_handler is not None:
             self._token_handler(token)
 
@@ -2051,6 +2682,10 @@ class QuicConnection:
             error_code,
             final_size,
         )
+        if stream.receiver.is_finished:
+            discarded = 0
+        else:
+            discarded = final_size - stream.receiver.delivered_offset
         try:
             event = stream.receiver.handle_reset(
                 error_code=error_code, final_size=final_size
@@ -2065,6 +2700,9 @@ class QuicConnection:
             self._events.append(event)
         self._local_max_data.used += newly_received
 
+        # data which will never be delivered counts as consumed
+        self._local_max_data_window.consumed += discarded
+
     def _handle_retire_connection_id_frame(
         self, context: QuicReceiveContext, frame_type: int, buf: Buffer
     ) -> None:
@@ -2101,6 +2739,7 @@ class QuicConnection:
                     connection_id.sequence_number,
                 )
                 del self._host_cids[index]
+                del self._host_cids_by_cid[connection_id.cid]
                 self._events.append(
                     events.ConnectionIdRetired(connection_id=connection_id.cid)
                 )
@@ -2198,6 +2837,9 @@ class QuicConnection:
             )
         if event is not None:
             self._events.append(event)
+            if not self._configuration.manual_flow_control:
+                stream.receive_window.consumed += len(event.data)
+                self._local_max_data_window.consumed += len(event.data)
         self._local_max_data.used += newly_received
 
     def _handle_stream_data_blocked_frame(
@@ -2268,13 +2910,33 @@ class QuicConnection:
             )
 
     def _on_ack_delivery(
-        self, delivery: QuicDeliveryState, space: QuicPacketSpace, highest_acked: int
+        self,
+        delivery: QuicDeliveryState,
+        space: QuicPacketSpace,
+        lowest_acked: int,
+        highest_acked: int,
     ) -> None:
         """
         Callback when an ACK frame is acknowledged or lost.
+
+        Only the ranges the frame carried are removed, older ranges which
+        were left out of it still need to be reported.
         """
         if delivery == QuicDeliveryState.ACKED:
-            space.ack_queue.subtract(0, highest_acked + 1)
+            space.ack_queue.subtract(lowest_acked, highest_acked + 1)
+            space.ack_ranges = None
+
+    def _on_ack_frequency_delivery(
+        self, delivery: QuicDeliveryState, sequence_number: int
+    ) -> None:
+        """
+        Callback when an ACK_FREQUENCY frame is acknowledged or lost.
+        """
+        if (
+            delivery != QuicDeliveryState.ACKED
+            and sequence_number == self._ack_frequency_requests - 1
+        ):
+            self._ack_frequency_pending = True
 
     def _on_connection_limit_delivery(
         self, delivery: QuicDeliveryState, limit: Limit
@@ -2285,6 +2947,19 @@ class QuicConnection:
         if delivery != QuicDeliveryState.ACKED:
             limit.sent = 0
 
+    def _on_data_blocked_delivery(
+        self, delivery: QuicDeliveryState, limit: int
+    ) -> None:
+        """
+        Callback when a DATA_BLOCKED frame is acknowledged or lost.
+        """
+        if (
+            delivery != QuicDeliveryState.ACKED
+            and self._data_blocked_at is not None
+            and self._remote_max_data == limit
+        ):
+            self._data_blocked_pending = True
+
     def _on_handshake_done_delivery(self, delivery: QuicDeliveryState) -> None:
         """
         Callback when a HANDSHAKE_DONE frame is acknowledged or lost.
@@ -2292,6 +2967,13 @@ class QuicConnection:
         if delivery != QuicDeliveryState.ACKED:
             self._handshake_done_pending = True
 
+    def _on_new_token_delivery(self, delivery: QuicDeliveryState) -> None:
+        """
+        Callback when a NEW_TOKEN frame is acknowledged or lost.
+        """
+        if delivery != QuicDeliveryState.ACKED:
+            self._new_token_pending = True
+
     def _on_max_stream_data_delivery(
         self, delivery: QuicDeliveryState, stream: QuicStream
     ) -> None:
@@ -2301,6 +2983,39 @@ class QuicConnection:
         if delivery != QuicDeliveryState.ACKED:
             stream.max_stream_data_local_sent = 0
 
+    def _on_mtu_packet_delivery(
+        self, delivery: QuicDeliveryState, sent_time: float
+    ) -> None:
+        """
+        Callback when a packet larger than the base datagram size is
+        acknowledged or lost.
+        """
+        if delivery == QuicDeliveryState.ACKED:
+            self._mtu_discovery.on_packet_acked(sent_time)
+        elif delivery == QuicDeliveryState.LOST:
+            if self._mtu_discovery.on_packet_lost(sent_time):
+                self._update_max_datagram_size(
+                    self._mtu_discovery.current_size, trigger="black hole detected"
+                )
+
+    def _on_mtu_probe_delivery(
+        self, delivery: QuicDeliveryState, size: int, sent_time: float
+    ) -> None:
+        """
+        Callback when a path MTU probe is acknowledged or lost.
+        """
+        if delivery == QuicDeliveryState.ACKED:
+            self._mtu_discovery.on_probe_acked(size, sent_time)
+            if self._mtu_discovery.current_size > self._max_datagram_size:
+                self._update_max_datagram_size(
+                    self._mtu_discovery.current_size, trigger="probe acknowledged"
+                )
+        elif delivery == QuicDeliveryState.LOST:
+            self._logger.debug("Path MTU probe of %d bytes lost", size)
+            self._mtu_discovery.on_probe_lost(size)
+        else:
+            self._mtu_discovery.on_probe_expired()
+
     def _on_new_connection_id_delivery(
         self, delivery: QuicDeliveryState, connection_id: QuicConnectionId
     ) -> None:
@@ -2323,6 +3038,19 @@ class QuicConnection:
         else:
             self._ping_pending.extend(uids)
 
+    def _on_stream_data_blocked_delivery(
+        self, delivery: QuicDeliveryState, stream: QuicStream, limit: int
+    ) -> None:
+        """
+        Callback when a STREAM_DATA_BLOCKED frame is acknowledged or lost.
+        """
+        if (
+            delivery != QuicDeliveryState.ACKED
+            and stream.data_blocked_at is not None
+            and stream.max_stream_data_remote == limit
+        ):
+            stream.data_blocked_pending = True
+
     def _on_retire_connection_id_delivery(
         self, delivery: QuicDeliveryState, sequence_number: int
     ) -> None:
@@ -2426,13 +3154,13 @@ class QuicConnection:
         Generate new connection IDs.
         """
         while len(self._host_cids) < min(8, self._remote_active_connection_id_limit):
-            self._host_cids.append(
-                QuicConnectionId(
-                    cid=os.urandom(self._configuration.connection_id_length),
-                    sequence_number=self._host_cid_seq,
-                    stateless_reset_token=os.urandom(16),
-                )
+            connection_id = QuicConnectionId(
+                cid=os.urandom(self._configuration.connection_id_length),
+                sequence_number=self._host_cid_seq,
+                stateless_reset_token=os.urandom(16),
             )
+            self._host_cids.append(connection_id)
+            self._host_cids_by_cid[connection_id.cid] = connection_id
             self._host_cid_seq += 1
 
     def _retire_peer_cid(self, connection_id: QuicConnectionId) -> None:
@@ -2454,6 +3182,14 @@ class QuicConnection:
     def _send_probe(self) -> None:
         self._probe_pending = True
 
+        # repeated probe timeouts may mean large packets are dropped
+        if self._mtu_discovery is not None and self._mtu_discovery.on_probe_timeout(
+            self._loss._pto_count
+        ):
+            self._update_max_datagram_size(
+                self._mtu_discovery.current_size, trigger="black hole detected"
+            )
+
     def _parse_transport_parameters(
         self, data: bytes, from_session_ticket: bool = False
     ) -> None:
@@ -2555,6 +3291,20 @@ class QuicConnection:
                     frame_type=QuicFrameType.CRYPTO,
                     reason_phrase="max_ack_delay must be < 2^14",
                 )
+            if quic_transport_parameters.min_ack_delay is not None and (
+                quic_transport_parameters.min_ack_delay
+                > (
+                    25
+                    if quic_transport_parameters.max_ack_delay is None
+                    else quic_transport_parameters.max_ack_delay
+                )
+                * 1000
+            ):
+                raise QuicConnectionError(
+                    error_code=QuicErrorCode.TRANSPORT_PARAMETER_ERROR,
+                    frame_type=QuicFrameType.CRYPTO,
+                    reason_phrase="min_ack_delay must not exceed max_ack_delay",
+                )
             if quic_transport_parameters.max_udp_payload_size is not None and (
                 quic_transport_parameters.max_udp_payload_size
                 < SMALLEST_MAX_DATAGRAM_SIZE
@@ -2575,6 +3325,21 @@ class QuicConnection:
                 self._loss.max_ack_delay = (
                     quic_transport_parameters.max_ack_delay / 1000.0
                 )
+            if (
+                self._configuration.ack_frequency
+                and quic_transport_parameters.min_ack_delay is not None
+            ):
+                self._remote_min_ack_delay = (
+                    quic_transport_parameters.min_ack_delay / 1000000.0
+                )
+            if quic_transport_parameters.max_udp_payload_size is not None:
+                max_udp_payload_size = quic_transport_parameters.max_udp_payload_size
+                if self._mtu_discovery is not None:
+                    self._mtu_discovery.limit_max_size(max_udp_payload_size)
+                if max_udp_payload_size < self._max_datagram_size:
+                    self._update_max_datagram_size(
+                        max_udp_payload_size, trigger="peer max_udp_payload_size"
+                    )
             if (
                 self._is_client
                 and self._peer_cid.sequence_number == 0
@@ -2621,6 +3386,9 @@ class QuicConnection:
             initial_source_connection_id=self._local_initial_source_connection_id,
             max_ack_delay=25,
             max_datagram_frame_size=self._configuration.max_datagram_frame_size,
+            min_ack_delay=int(K_GRANULARITY * 1000000)
+            if self._configuration.ack_frequency
+            else None,
             quantum_readiness=b"Q" * SMALLEST_MAX_DATAGRAM_SIZE
             if self._configuration.quantum_readiness_test
             else None,
@@ -2662,6 +3430,21 @@ class QuicConnection:
             stream_id
         ) == self._is_client or not stream_is_unidirectional(stream_id)
 
+    def _trim_ack_queue(self, space: QuicPacketSpace) -> None:
+        """
+        Drop the oldest ACK ranges beyond ACK_RANGES_MAX.
+
+        A range is only dropped once it was reported in an ACK frame, as the
+        peer would otherwise declare its packets lost and retransmit them. If
+        that ACK frame itself is lost, the peer still does.
+        """
+        ack_queue = space.ack_queue
+        unreported = space.ack_unreported
+        while len(ack_queue) > ACK_RANGES_MAX and (
+            not len(unreported) or unreported[0].start >= ack_queue[0].stop
+        ):
+            ack_queue.shift()
+
     def _unblock_streams(self, is_unidirectional: bool) -> None:
         if is_unidirectional:
             max_stream_data_remote = self._remote_max_stream_data_uni
@@ -2680,6 +3463,13 @@ class QuicConnection:
         if not self._streams_blocked_bidi and not self._streams_blocked_uni:
             self._streams_blocked_pending = False
 
+    def _update_max_datagram_size(self, max_datagram_size: int, trigger: str) -> None:
+        self._logger.info(
+            "Maximum datagram size set to %d bytes (%s)", max_datagram_size, trigger
+        )
+        self._max_datagram_size = max_datagram_size
+        self._loss.update_max_datagram_size(max_datagram_size)
+
     def _update_traffic_key(
         self,
         direction: tls.Direction,
@@ -2743,6 +3533,13 @@ class QuicConnection:
                     self._write_handshake_done_frame(builder=builder)
                     self._handshake_done_pending = False
 
+                # NEW_TOKEN
+                if self._new_token_pending:
+                    self._write_new_token_frame(
+                        builder=builder, token=self._token_issuer(network_path.addr)
+                    )
+                    self._new_token_pending = False
+
                 # PATH CHALLENGE
                 if (
                     not network_path.is_validated
@@ -2791,21 +3588,38 @@ class QuicConnection:
                         )
                     self._streams_blocked_pending = False
 
+                # ACK_FREQUENCY
+                if self._remote_min_ack_delay is not None:
+                    threshold = self._get_ack_eliciting_threshold()
+                    if self._ack_frequency_pending or threshold != (
+                        1
+                        if self._ack_frequency_requested is None
+                        else self._ack_frequency_requested
+                    ):
+                        self._write_ack_frequency_frame(
+                            builder=builder, ack_eliciting_threshold=threshold
+                        )
+
                 # MAX_DATA and MAX_STREAMS
-                self._write_connection_limits(builder=builder, space=space)
+                self._write_connection_limits(builder=builder, space=space, now=now)
 
             # stream-level limits
             for stream in self._streams.values():
-                self._write_stream_limits(builder=builder, space=space, stream=stream)
+                self._write_stream_limits(
+                    builder=builder, space=space, stream=stream, now=now
+                )
 
             # PING (user-request)
             if self._ping_pending:
                 self._write_ping_frame(builder, self._ping_pending)
                 self._ping_pending.clear()
 
-            # PING (probe)
+            # PING or IMMEDIATE_ACK (probe)
             if self._probe_pending:
-                self._write_ping_frame(builder, comment="probe")
+                if self._handshake_complete and self._remote_min_ack_delay is not None:
+                    self._write_immediate_ack_frame(builder)
+                else:
+                    self._write_ping_frame(builder, comment="probe")
                 self._probe_pending = False
 
             # CRYPTO
@@ -2826,12 +3640,18 @@ class QuicConnection:
                 except QuicPacketBuilderStop:
                     break
 
-            for stream in list(self._streams.values()):
+            # the order is only computed again when streams or priorities change
+            if self._streams_send_order is None:
+                self._streams_send_order = sorted(
+                    self._streams.values(), key=attrgetter("send_order")
+                )
+            for stream in self._streams_send_order:
                 # if the stream is finished, discard it
                 if stream.is_finished:
                     self._logger.debug("Stream %d discarded", stream.stream_id)
                     self._streams.pop(stream.stream_id)
                     self._streams_finished.add(stream.stream_id)
+                    self._streams_send_order = None
                     continue
 
                 if stream.receiver.stop_pending:
@@ -2843,7 +3663,7 @@ class QuicConnection:
                     self._write_reset_stream_frame(builder=builder, stream=stream)
                 elif not stream.is_blocked and not stream.sender.buffer_is_empty:
                     # STREAM
-                    self._remote_max_data_used += self._write_stream_frame(
+                    sent = self._write_stream_frame(
                         builder=builder,
                         space=space,
                         stream=stream,
@@ -2854,6 +3674,18 @@ class QuicConnection:
                             stream.max_stream_data_remote,
                         ),
                     )
+                    self._remote_max_data_used += sent
+
+                    # DATA_BLOCKED, STREAM_DATA_BLOCKED
+                    self._write_data_blocked_frames(
+                        builder=builder, stream=stream, now=now
+                    )
+
+                    # incremental streams go to the back of the line
+                    if sent and stream.incremental:
+                        self._stream_send_sequence += 1
+                        stream.send_sequence = self._stream_send_sequence
+                        self._streams_send_order = None
 
             if builder.packet_is_empty:
                 break
@@ -2910,20 +3742,47 @@ class QuicConnection:
         ack_delay = now - space.largest_received_time
         ack_delay_encoded = int(ack_delay * 1000000) >> self._local_ack_delay_exponent
 
+        # the ranges are only encoded again once the queue changes
+        if space.ack_ranges is None:
+            space.ack_ranges = encode_ack_ranges(space.ack_queue)
+        ranges_data, ranges_ends = space.ack_ranges
+        largest_acked = space.ack_queue[-1].stop - 1
+
+        # leave out the oldest ranges which do not fit in the packet
+        frame_overhead = (
+            1
+            + size_uint_var(largest_acked)
+            + size_uint_var(ack_delay_encoded)
+            + size_uint_var(len(ranges_ends))
+        )
+        ranges = max(
+            1,
+            bisect.bisect_right(
+                ranges_ends, builder.remaining_buffer_space - frame_overhead
+            ),
+        )
+        ranges_size = ranges_ends[ranges - 1]
+        lowest_acked = space.ack_queue[-ranges].start
+
         buf = builder.start_frame(
             QuicFrameType.ACK,
-            capacity=ACK_FRAME_CAPACITY,
+            capacity=frame_overhead + ranges_size,
             handler=self._on_ack_delivery,
-            handler_args=(space, space.largest_received_packet),
+            handler_args=(space, lowest_acked, largest_acked),
         )
-        ranges = push_ack_frame(buf, space.ack_queue, ack_delay_encoded)
+        buf.push_uint_var(largest_acked)
+        buf.push_uint_var(ack_delay_encoded)
+        buf.push_uint_var(ranges - 1)
+        buf.push_bytes(ranges_data[:ranges_size])
         space.ack_at = None
+        space.ack_unreported.subtract(lowest_acked, largest_acked + 1)
+        space.ack_eliciting_received = 0
 
         # log frame
         if self._quic_logger is not None:
             builder.quic_logger_frames.append(
                 self._quic_logger.encode_ack_frame(
-                    ranges=space.ack_queue, delay=ack_delay
+                    ranges=list(space.ack_queue)[-ranges:], delay=ack_delay
                 )
             )
 
@@ -2931,6 +3790,47 @@ class QuicConnection:
         if ranges > 1 and builder.packet_number % 8 == 0:
             self._write_ping_frame(builder, comment="ACK-of-ACK trigger")
 
+    def _write_ack_frequency_frame(
+        self, builder: QuicPacketBuilder, ack_eliciting_threshold: int
+    ) -> None:
+        request_max_ack_delay = max(
+            min(
+                self._loss.smoothed_rtt / ACK_FREQUENCY_RTT_FRACTION,
+                self._loss.max_ack_delay,
+            ),
+            self._remote_min_ack_delay,
+        )
+        sequence_number = self._ack_frequency_requests
+
+        buf = builder.start_frame(
+            QuicFrameType.ACK_FREQUENCY,
+            capacity=ACK_FREQUENCY_FRAME_CAPACITY,
+            handler=self._on_ack_frequency_delivery,
+            handler_args=(sequence_number,),
+        )
+        buf.push_uint_var(sequence_number)
+        buf.push_uint_var(ack_eliciting_threshold)
+        buf.push_uint_var(int(request_max_ack_delay * 1000000))
+        buf.push_uint_var(K_PACKET_THRESHOLD)
+        self._ack_frequency_pending = False
+        self._ack_frequency_requested = ack_eliciting_threshold
+        self._ack_frequency_requests += 1
+        self._logger.debug(
+            "Requesting one ACK every %d ack-eliciting packets",
+            ack_eliciting_threshold + 1,
+        )
+
+        # log frame
+        if self._quic_logger is not None:
+            builder.quic_logger_frames.append(
+                self._quic_logger.encode_ack_frequency_frame(
+                    ack_eliciting_threshold=ack_eliciting_threshold,
+                    reordering_threshold=K_PACKET_THRESHOLD,
+                    request_max_ack_delay=request_max_ack_delay,
+                    sequence_number=sequence_number,
+                )
+            )
+
     def _write_connection_close_frame(
         self,
         builder: QuicPacketBuilder,
@@ -2977,19 +3877,30 @@ class QuicConnection:
             )
 
     def _write_connection_limits(
-        self, builder: QuicPacketBuilder, space: QuicPacketSpace
+        self, builder: QuicPacketBuilder, space: QuicPacketSpace, now: float
     ) -> None:
         """
         Raise MAX_DATA or MAX_STREAMS if needed.
+
+        MAX_DATA follows the data consumed by the application, see
+        :class:`~aioquic.quic.stream.QuicReceiveWindow`.
         """
+        max_data = self._local_max_data_window.update(
+            self._local_max_data.value, now=now, rtt=self._loss.smoothed_rtt
+        )
+        if max_data != self._local_max_data.value:
+            self._local_max_data.value = max_data
+            self._logger.debug("Local max_data raised to %d", max_data)
+        for limit in (self._local_max_streams_bidi, self._local_max_streams_uni):
+            if limit.used * 2 > limit.value:
+                limit.value *= 2
+                self._logger.debug("Local %s raised to %d", limit.name, limit.value)
+
         for limit in (
             self._local_max_data,
             self._local_max_streams_bidi,
             self._local_max_streams_uni,
         ):
-            if limit.used * 2 > limit.value:
-                limit.value *= 2
-                self._logger.debug("Local %s raised to %d", limit.name, limit.value)
             if limit.value != limit.sent:
                 buf = builder.start_frame(
                     limit.frame_type,
@@ -3034,6 +3945,75 @@ class QuicConnection:
 
         return False
 
+    def _write_data_blocked_frames(
+        self, builder: QuicPacketBuilder, stream: QuicStream, now: float
+    ) -> None:
+        """
+        Signal the peer if its flow control limits prevent sending the
+        stream's data, and account for the time spent blocked.
+
+        A frame is sent once for each limit, unless it is lost.
+        """
+        sender = stream.sender
+
+        # connection-level flow control
+        if self._remote_max_data_used >= self._remote_max_data and (
+            sender.is_flow_control_blocked(sender.highest_offset)
+        ):
+            if self._data_blocked_at is None:
+                self._data_blocked_pending = True
+            else:
+                self._data_blocked_time += now - self._data_blocked_at
+            self._data_blocked_at = now
+
+            if self._data_blocked_pending:
+                buf = builder.start_frame(
+                    QuicFrameType.DATA_BLOCKED,
+                    capacity=CONNECTION_LIMIT_FRAME_CAPACITY,
+                    handler=self._on_data_blocked_delivery,
+                    handler_args=(self._remote_max_data,),
+                )
+                buf.push_uint_var(self._remote_max_data)
+                self._data_blocked_pending = False
+
+                # log frame
+                if self._quic_logger is not None:
+                    builder.quic_logger_frames.append(
+                        self._quic_logger.encode_data_blocked_frame(
+                            limit=self._remote_max_data
+                        )
+                    )
+
+        # stream-level flow control
+        if sender.is_flow_control_blocked(stream.max_stream_data_remote):
+            if stream.data_blocked_at is None:
+                stream.data_blocked_pending = True
+            else:
+                elapsed = now - stream.data_blocked_at
+                stream.data_blocked_time += elapsed
+                self._stream_data_blocked_time += elapsed
+            stream.data_blocked_at = now
+
+            if stream.data_blocked_pending:
+                buf = builder.start_frame(
+                    QuicFrameType.STREAM_DATA_BLOCKED,
+                    capacity=MAX_STREAM_DATA_FRAME_CAPACITY,
+                    handler=self._on_stream_data_blocked_delivery,
+                    handler_args=(stream, stream.max_stream_data_remote),
+                )
+                buf.push_uint_var(stream.stream_id)
+                buf.push_uint_var(stream.max_stream_data_remote)
+                stream.data_blocked_pending = False
+
+                # log frame
+                if self._quic_logger is not None:
+                    builder.quic_logger_frames.append(
+                        self._quic_logger.encode_stream_data_blocked_frame(
+                            limit=stream.max_stream_data_remote,
+                            stream_id=stream.stream_id,
+                        )
+                    )
+
     def _write_datagram_frame(
         self, builder: QuicPacketBuilder, data: bytes, frame_type: QuicFrameType
     ) -> bool:
@@ -3071,6 +4051,20 @@ class QuicConnection:
                 self._quic_logger.encode_handshake_done_frame()
             )
 
+    def _write_immediate_ack_frame(self, builder: QuicPacketBuilder) -> None:
+        builder.start_frame(
+            QuicFrameType.IMMEDIATE_ACK, capacity=IMMEDIATE_ACK_FRAME_CAPACITY
+        )
+        self._logger.debug(
+            "Sending IMMEDIATE_ACK (probe) in packet %d", builder.packet_number
+        )
+
+        # log frame
+        if self._quic_logger is not None:
+            builder.quic_logger_frames.append(
+                self._quic_logger.encode_immediate_ack_frame()
+            )
+
     def _write_new_connection_id_frame(
         self, builder: QuicPacketBuilder, connection_id: QuicConnectionId
     ) -> None:
@@ -3102,6 +4096,21 @@ class QuicConnection:
                 )
             )
 
+    def _write_new_token_frame(self, builder: QuicPacketBuilder, token: bytes) -> None:
+        buf = builder.start_frame(
+            QuicFrameType.NEW_TOKEN,
+            capacity=1 + UINT_VAR_MAX_SIZE + len(token),
+            handler=self._on_new_token_delivery,
+        )
+        buf.push_uint_var(len(token))
+        buf.push_bytes(token)
+
+        # log frame
+        if self._quic_logger is not None:
+            builder.quic_logger_frames.append(
+                self._quic_logger.encode_new_token_frame(token=token)
+            )
+
     def _write_path_challenge_frame(
         self, builder: QuicPacketBuilder, challenge: bytes
     ) -> None:
@@ -3267,25 +4276,36 @@ class QuicConnection:
             return 0
 
     def _write_stream_limits(
-        self, builder: QuicPacketBuilder, space: QuicPacketSpace, stream: QuicStream
+        self,
+        builder: QuicPacketBuilder,
+        space: QuicPacketSpace,
+        stream: QuicStream,
+        now: float,
     ) -> None:
         """
         Raise MAX_STREAM_DATA if needed.
 
         The only case where `stream.max_stream_data_local` is zero is for
         locally created unidirectional streams. We skip such streams to avoid
-        spurious logging.
+        spurious logging. The limit is also left untouched while receiving is
+        paused by the application.
         """
-        if (
-            stream.max_stream_data_local
-            and stream.receiver.highest_offset * 2 > stream.max_stream_data_local
-        ):
-            stream.max_stream_data_local *= 2
-            self._logger.debug(
-                "Stream %d local max_stream_data raised to %d",
-                stream.stream_id,
-                stream.max_stream_data_local,
+        if stream.max_stream_data_local and not stream.receiver.is_paused:
+            max_stream_data_local = stream.receive_window.update(
+                stream.max_stream_data_local, now=now, rtt=self._loss.smoothed_rtt
             )
+            if max_stream_data_local != stream.max_stream_data_local:
+                stream.max_stream_data_local = max_stream_data_local
+                self._logger.debug(
+                    "Stream %d local max_stream_data raised to %d",
+                    stream.stream_id,
+                    stream.max_stream_data_local,
+                )
+
+                # keep the connection window ahead of the stream window
+                self._local_max_data_window.ensure_size(
+                    stream.receive_window.size * 3 // 2
+                )
         if stream.max_stream_data_local_sent != stream.max_stream_data_local:
             buf = builder.start_frame(
                 QuicFrameType.MAX_STREAM_DATA,
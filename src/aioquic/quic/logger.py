@@ -1,9 +1,11 @@
 import binascii
 import json
 import os
+import queue
+import threading
 import time
 from collections import deque
-from typing import Any, Deque, Dict, List, Optional
+from typing import Any, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, TextIO
 
 from ..h3.events import Headers
 from .packet import (
@@ -17,7 +19,6 @@ from .packet import (
     QuicStreamFrame,
     QuicTransportParameters,
 )
-from .rangeset import RangeSet
 
 PACKET_TYPE_NAMES = {
     PACKET_TYPE_INITIAL: "initial",
@@ -55,13 +56,28 @@ class QuicLoggerTrace:
 
     # QUIC
 
-    def encode_ack_frame(self, ranges: RangeSet, delay: float) -> Dict:
+    def encode_ack_frame(self, ranges: Iterable[range], delay: float) -> Dict:
         return {
             "ack_delay": self.encode_time(delay),
             "acked_ranges": [[x.start, x.stop - 1] for x in ranges],
             "frame_type": "ack",
         }
 
+    def encode_ack_frequency_frame(
+        self,
+        ack_eliciting_threshold: int,
+        reordering_threshold: int,
+        request_max_ack_delay: float,
+        sequence_number: int,
+    ) -> Dict:
+        return {
+            "ack_eliciting_threshold": ack_eliciting_threshold,
+            "frame_type": "ack_frequency",
+            "reordering_threshold": reordering_threshold,
+            "request_max_ack_delay": self.encode_time(request_max_ack_delay),
+            "sequence_number": sequence_number,
+        }
+
     def encode_connection_close_frame(
         self, error_code: int, frame_type: Optional[int], reason_phrase: str
     ) -> Dict:
@@ -105,6 +121,9 @@ class QuicLoggerTrace:
     def encode_handshake_done_frame(self) -> Dict:
         return {"frame_type": "handshake_done"}
 
+    def encode_immediate_ack_frame(self) -> Dict:
+        return {"frame_type": "immediate_ack"}
+
     def encode_max_stream_data_frame(self, maximum: int, stream_id: int) -> Dict:
         return {
             "frame_type": "max_stream_data",
@@ -331,3 +350,177 @@ class QuicFileLogger(QuicLogger):
                 logger_fp,
             )
         self._traces.remove(trace)
+
+
+class QuicStreamingLoggerTrace(QuicLoggerTrace):
+    """
+    A QUIC event trace which hands its events to a
+    :class:`QuicStreamingLogger` instead of storing them.
+
+    The frames of a received packet are only filled in once it has been
+    handled, so a `packet_received` event and the events which follow it
+    are held back until the next packet is received or sent, or the trace
+    ends.
+    """
+
+    def __init__(
+        self, *, is_client: bool, odcid: bytes, logger: "QuicStreamingLogger"
+    ) -> None:
+        super().__init__(is_client=is_client, odcid=odcid)
+        self._categories = logger.categories
+        self._deferred: List[Dict[str, Any]] = []
+        self._group_id = hexdump(odcid)
+        self._logger = logger
+
+    def flush(self) -> None:
+        """
+        Hand the events which were held back to the logger.
+        """
+        for record in self._deferred:
+            self._logger._write(record)
+        self._deferred.clear()
+        self._logger._deferred_traces.discard(self)
+
+    def log_event(self, *, category: str, event: str, data: Dict) -> None:
+        if self._categories is not None and category not in self._categories:
+            return
+
+        record = {
+            "data": data,
+            "group_id": self._group_id,
+            "name": category + ":" + event,
+            "time": self.encode_time(time.time()),
+        }
+        if category == "transport" and event in ("packet_received", "packet_sent"):
+            self.flush()
+            if event == "packet_received":
+                self._deferred.append(record)
+                self._logger._deferred_traces.add(self)
+                return
+        if self._deferred:
+            self._deferred.append(record)
+        else:
+            self._logger._write(record)
+
+
+class QuicStreamingLogger(QuicLogger):
+    """
+    A QUIC event logger which streams the events of all traces to files in
+    the JSON-SEQ format, without keeping them in memory.
+
+    Events are serialized when they are logged, and written by a background
+    thread. If more than `max_queue_size` events are waiting to be written,
+    new events are dropped and counted in :attr:`dropped_events` rather than
+    slowing down the connections.
+
+    Once a file reaches `max_file_size` bytes a new one is started. If
+    `max_files` is set, the oldest files are deleted to keep at most that
+    many. If `categories` is set, only events in those categories (for
+    instance ``"transport"`` or ``"recovery"``) are logged.
+
+    Call :meth:`close` to write the pending events before exiting.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        categories: Optional[Iterable[str]] = None,
+        max_file_size: int = 100 * 1024 * 1024,
+        max_files: Optional[int] = None,
+        max_queue_size: int = 65536,
+    ) -> None:
+        if not os.path.isdir(path):
+            raise ValueError("QUIC log output directory '%s' does not exist" % path)
+        super().__init__()
+        self.categories: Optional[FrozenSet[str]] = (
+            frozenset(categories) if categories is not None else None
+        )
+        self.dropped_events = 0
+        self.path = path
+
+        self._deferred_traces: Set[QuicStreamingLoggerTrace] = set()
+        self._file_paths: Deque[str] = deque()
+        self._file_prefix = ""
+        self._max_file_size = max_file_size
+        self._max_files = max_files
+        self._queue: queue.Queue[Optional[str]] = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._vantage_point = {"name": "aioquic", "type": "unknown"}
+
+    def start_trace(self, is_client: bool, odcid: bytes) -> QuicLoggerTrace:
+        if self._thread is None:
+            # the thread is started lazily so the logger survives a fork
+            self._file_prefix = "aioquic-%d-%d" % (time.time(), os.getpid())
+            self._vantage_point["type"] = "client" if is_client else "server"
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return QuicStreamingLoggerTrace(is_client=is_client, odcid=odcid, logger=self)
+
+    def end_trace(self, trace: QuicLoggerTrace) -> None:
+        assert isinstance(trace, QuicStreamingLoggerTrace)
+        trace.flush()
+
+    def close(self) -> None:
+        """
+        Write the pending events and stop the background thread.
+        """
+        for trace in list(self._deferred_traces):
+            trace.flush()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _open_file(self, index: int) -> TextIO:
+        file_path = os.path.join(self.path, "%s-%d.sqlog" % (self._file_prefix, index))
+        self._file_paths.append(file_path)
+        if self._max_files is not None:
+            while len(self._file_paths) > self._max_files:
+                os.unlink(self._file_paths.popleft())
+        return open(file_path, "w")
+
+    def _run(self) -> None:
+        header = self._serialize(
+            {
+                "qlog_format": "JSON-SEQ",
+                "qlog_version": QLOG_VERSION,
+                "trace": {
+                    "common_fields": {"time_format": "absolute"},
+                    "vantage_point": self._vantage_point,
+                },
+            }
+        )
+        index = 0
+        fp = self._open_file(index)
+        fp.write(header)
+        size = len(header)
+        try:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    break
+
+                if size + len(line) > self._max_file_size:
+                    fp.close()
+                    index += 1
+                    fp = self._open_file(index)
+                    fp.write(header)
+                    size = len(header)
+                fp.write(line)
+                size += len(line)
+                if self._queue.empty():
+                    fp.flush()
+        finally:
+            fp.close()
+
+    def _serialize(self, record: Dict[str, Any]) -> str:
+        # the output is ASCII, so its length is its size in bytes
+        return "\x1e" + json.dumps(record) + "\n"
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        # serialize now, as the caller may modify the record's data later
+        try:
+            self._queue.put_nowait(self._serialize(record))
+        except queue.Full:
+            self.dropped_events += 1
@@ -0,0 +1,199 @@
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from .connection import QuicConnection
+from .retry import QuicAdaptiveRetry
+
+# reasons for which a server drops a datagram before it reaches a connection
+DROP_INITIAL_TOO_SMALL = "initial_too_small"
+DROP_INVALID_HEADER = "invalid_header"
+DROP_INVALID_RETRY_TOKEN = "invalid_retry_token"
+DROP_RATE_LIMITED = "rate_limited"
+DROP_UNKNOWN_CONNECTION = "unknown_connection"
+DROP_REASONS = (
+    DROP_INITIAL_TOO_SMALL,
+    DROP_INVALID_HEADER,
+    DROP_INVALID_RETRY_TOKEN,
+    DROP_RATE_LIMITED,
+    DROP_UNKNOWN_CONNECTION,
+)
+
+# per-connection counters which are aggregated across connections
+CONNECTION_COUNTERS = (
+    ("bytes_received", "Bytes received by connections."),
+    ("bytes_sent", "Bytes sent by connections."),
+    ("datagrams_received", "Datagrams received by connections."),
+    ("datagrams_sent", "Datagrams sent by connections."),
+    ("pacing_wakeups", "Wakeups of the pacing timer."),
+    ("packets_lost", "Packets declared lost."),
+    ("packets_received", "Packets received and decrypted."),
+    ("packets_sent", "Packets sent."),
+    ("probe_timeouts", "Probe timeouts (PTO)."),
+    ("spurious_losses", "Packets declared lost which reached the peer."),
+    ("streams_opened", "Streams opened."),
+)
+
+MetricValue = Union[int, float, Dict[str, int]]
+
+
+class QuicServerMetrics:
+    """
+    Server-wide metrics, aggregated across connections.
+
+    The server increments a few integer counters for each datagram it
+    receives. Per-connection statistics are only collected when the metrics
+    are read, and folded into the totals when a connection closes.
+
+    Counters only ever increase, rates such as handshakes or bytes per second
+    are obtained by sampling them periodically.
+    """
+
+    def __init__(self, namespace: str = "aioquic_server") -> None:
+        self.adaptive_retry: Optional[QuicAdaptiveRetry] = None
+        self.connections_accepted = 0
+        self.datagrams_dropped = dict((reason, 0) for reason in DROP_REASONS)
+        self.datagrams_received = 0
+        self.retries_sent = 0
+        self.version_negotiations_sent = 0
+
+        self._closed_totals = dict((name, 0) for name, _ in CONNECTION_COUNTERS)
+        self._closed_handshake_duration = 0.0
+        self._closed_handshakes = 0
+        self._connections: Set[QuicConnection] = set()
+        self._namespace = namespace
+
+    def connection_opened(self, connection: QuicConnection) -> None:
+        """
+        Start tracking a connection accepted by the server.
+        """
+        self.connections_accepted += 1
+        self._connections.add(connection)
+
+    def connection_closed(self, connection: QuicConnection) -> None:
+        """
+        Stop tracking a connection, keeping its statistics in the totals.
+        """
+        if connection not in self._connections:
+            return
+        self._connections.discard(connection)
+
+        stats = connection.get_stats()
+        for name, _ in CONNECTION_COUNTERS:
+            self._closed_totals[name] += getattr(stats, name)
+        if stats.handshake_duration is not None:
+            self._closed_handshake_duration += stats.handshake_duration
+            self._closed_handshakes += 1
+
+    def collect(self) -> List[Tuple[str, str, str, MetricValue]]:
+        """
+        Return the current metrics as a list of
+        `(name, type, description, value)` tuples.
+
+        The value of a metric with labels is a dictionary mapping the label
+        value to the metric value.
+        """
+        totals = dict(self._closed_totals)
+        handshake_duration = self._closed_handshake_duration
+        handshakes = self._closed_handshakes
+        half_open = 0
+        for connection in self._connections:
+            stats = connection.get_stats()
+            for name, _ in CONNECTION_COUNTERS:
+                totals[name] += getattr(stats, name)
+            if stats.handshake_duration is not None:
+                handshake_duration += stats.handshake_duration
+                handshakes += 1
+            else:
+                half_open += 1
+
+        metrics: List[Tuple[str, str, str, MetricValue]] = [
+            ("connections", "gauge", "Open connections.", len(self._connections)),
+            (
+                "connections_half_open",
+                "gauge",
+                "Open connections which have not completed the handshake.",
+                half_open,
+            ),
+            (
+                "connections_accepted_total",
+                "counter",
+                "Connections accepted.",
+                self.connections_accepted,
+            ),
+            (
+                "datagrams_dropped_total",
+                "counter",
+                "Datagrams dropped before reaching a connection.",
+                dict(self.datagrams_dropped),
+            ),
+            (
+                "udp_datagrams_received_total",
+                "counter",
+                "Datagrams received on the server's socket.",
+                self.datagrams_received,
+            ),
+            (
+                "handshakes_completed_total",
+                "counter",
+                "Handshakes completed.",
+                handshakes,
+            ),
+            (
+                "handshake_duration_seconds_total",
+                "counter",
+                "Time spent completing handshakes.",
+                handshake_duration,
+            ),
+            ("retries_sent_total", "counter", "Retry packets sent.", self.retries_sent),
+            (
+                "version_negotiations_sent_total",
+                "counter",
+                "Version Negotiation packets sent.",
+                self.version_negotiations_sent,
+            ),
+        ]
+        for name, description in CONNECTION_COUNTERS:
+            metrics.append((name + "_total", "counter", description, totals[name]))
+        if self.adaptive_retry is not None:
+            metrics += [
+                (
+                    "retry_active",
+                    "gauge",
+                    "Whether client addresses are validated with Retry packets.",
+                    int(self.adaptive_retry.active),
+                ),
+                (
+                    "retry_initial_rate",
+                    "gauge",
+                    "New connection attempts per second.",
+                    self.adaptive_retry.initial_rate,
+                ),
+                (
+                    "retry_max_half_open",
+                    "gauge",
+                    "Half-open connections above which Retry is enabled.",
+                    self.adaptive_retry.max_half_open,
+                ),
+                (
+                    "retry_max_initial_rate",
+                    "gauge",
+                    "Connection attempts per second above which Retry is enabled.",
+                    self.adaptive_retry.max_initial_rate,
+                ),
+            ]
+        return metrics
+
+    def render(self) -> str:
+        """
+        Return the current metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for name, metric_type, description, value in self.collect():
+            full_name = "%s_%s" % (self._namespace, name)
+            lines.append("# HELP %s %s" % (full_name, description))
+            lines.append("# TYPE %s %s" % (full_name, metric_type))
+            if isinstance(value, dict):
+                for label, label_value in value.items():
+                    lines.append('%s{reason="%s"} %s' % (full_name, label, label_value))
+            else:
+                lines.append("%s %s" % (full_name, value))
+        return "\n".join(lines) + "\n"
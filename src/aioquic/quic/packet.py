@@ -1,13 +1,16 @@
 import binascii
 import ipaddress
 import os
+import struct
 from dataclasses import dataclass
 from enum import IntEnum
+from functools import lru_cache
 from typing import List, Optional, Tuple
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from ..buffer import Buffer
+from .._buffer import peek_quic_header  # noqa
+from ..buffer import UINT_VAR_MAX_SIZE, Buffer
 from .rangeset import RangeSet
 
 PACKET_LONG_HEADER = 0x80
@@ -238,21 +241,20 @@ def encode_quic_retry(
 def encode_quic_version_negotiation(
     source_cid: bytes, destination_cid: bytes, supported_versions: List[int]
 ) -> bytes:
-    buf = Buffer(
-        capacity=7
-        + len(destination_cid)
-        + len(source_cid)
-        + 4 * len(supported_versions)
+    first_byte = os.urandom(1)[0] | PACKET_LONG_HEADER
+    return (
+        bytes((first_byte, 0, 0, 0, 0, len(destination_cid)))  # version is 0
+        + destination_cid
+        + bytes((len(source_cid),))
+        + source_cid
+        + _encode_supported_versions(tuple(supported_versions))
     )
-    buf.push_uint8(os.urandom(1)[0] | PACKET_LONG_HEADER)
-    buf.push_uint32(QuicProtocolVersion.NEGOTIATION)
-    buf.push_uint8(len(destination_cid))
-    buf.push_bytes(destination_cid)
-    buf.push_uint8(len(source_cid))
-    buf.push_bytes(source_cid)
-    for version in supported_versions:
-        buf.push_uint32(version)
-    return buf.data
+
+
+@lru_cache(maxsize=16)
+def _encode_supported_versions(supported_versions: Tuple[int, ...]) -> bytes:
+    # the list of versions is the same for every Version Negotiation packet
+    return struct.pack("!%dL" % len(supported_versions), *supported_versions)
 
 
 # TLS EXTENSION
@@ -286,6 +288,7 @@ class QuicTransportParameters:
     initial_source_connection_id: Optional[bytes] = None
     retry_source_connection_id: Optional[bytes] = None
     max_datagram_frame_size: Optional[int] = None
+    min_ack_delay: Optional[int] = None
     quantum_readiness: Optional[bytes] = None
 
 
@@ -310,6 +313,7 @@ PARAMS = {
     # extensions
     0x0020: ("max_datagram_frame_size", int),
     0x0C37: ("quantum_readiness", bytes),
+    0xFF04DE1B: ("min_ack_delay", int),
 }
 
 
@@ -429,8 +433,10 @@ class QuicFrameType(IntEnum):
     TRANSPORT_CLOSE = 0x1C
     APPLICATION_CLOSE = 0x1D
     HANDSHAKE_DONE = 0x1E
+    IMMEDIATE_ACK = 0x1F
     DATAGRAM = 0x30
     DATAGRAM_WITH_LENGTH = 0x31
+    ACK_FREQUENCY = 0xAF
 
 
 NON_ACK_ELICITING_FRAME_TYPES = frozenset(
@@ -513,3 +519,26 @@ def push_ack_frame(buf: Buffer, rangeset: RangeSet, delay: int) -> int:
         buf.push_uint_var(r.stop - r.start - 1)
         start = r.start
     return ranges
+
+
+def encode_ack_ranges(rangeset: RangeSet) -> Tuple[bytes, List[int]]:
+    """
+    Encode the ranges of an ACK frame, starting from the most recent one.
+
+    Returns the encoded ranges and the offset at which each of them ends, so
+    that a frame can leave out the oldest ranges.
+    """
+    buf = Buffer(capacity=2 * UINT_VAR_MAX_SIZE * len(rangeset))
+    index = len(rangeset) - 1
+    r = rangeset[index]
+    buf.push_uint_var(r.stop - 1 - r.start)
+    ends = [buf.tell()]
+    start = r.start
+    while index > 0:
+        index -= 1
+        r = rangeset[index]
+        buf.push_uint_var(start - r.stop - 1)
+        buf.push_uint_var(r.stop - r.start - 1)
+        ends.append(buf.tell())
+        start = r.start
+    return buf.data, ends
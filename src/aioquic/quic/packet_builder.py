@@ -40,6 +40,7 @@ class QuicSentPacket:
     packet_type: int
     sent_time: Optional[float] = None
     sent_bytes: int = 0
+    is_mtu_probe: bool = False
 
     delivery_handlers: List[Tuple[QuicDeliveryHandler, Any]] = field(
         default_factory=list
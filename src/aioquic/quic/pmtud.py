@@ -0,0 +1,142 @@
+from typing import Optional
+
+# path MTU discovery (see RFC 8899)
+K_BLACK_HOLE_LOSSES = 3  # lost packets larger than the base size
+K_BLACK_HOLE_TIMEOUTS = 2  # consecutive probe timeouts
+K_MAX_PROBES = 3  # probes of the same size lost before giving up on it
+K_PMTU_RAISE_TIMER = 600.0  # seconds before searching for a larger size again
+K_SEARCH_THRESHOLD = 20  # stop searching once the interval is this small
+
+
+class QuicPathMtuDiscovery:
+    """
+    Datagram Packetization Layer Path MTU Discovery (RFC 8899).
+
+    Starting from `base_size`, which is known to work, probe packets are used
+    to binary search the largest datagram size the path carries, up to
+    `max_size`. Losing probes is not a sign of congestion.
+
+    A black hole is detected when several packets larger than `base_size`
+    are lost while no such packet is acknowledged, or when several probe
+    timeouts occur in a row. The size then falls back to `base_size` and the search
+    starts over.
+    """
+
+    def __init__(self, *, base_size: int, max_size: int) -> None:
+        self.base_size = base_size
+        self.black_holes = 0
+        self.current_size = base_size
+        self.max_size = max(base_size, max_size)
+
+        self._last_acked_time: Optional[float] = None
+        self._losses = 0
+        self._probe_count = 0
+        self._probe_size: Optional[int] = None
+        self._raise_at: Optional[float] = None
+        self._search_high = self.max_size
+        self._search_low = base_size
+
+    def get_probe_size(self, now: float) -> Optional[int]:
+        """
+        Return the size of the probe packet to send, if any.
+        """
+        if self._probe_size is not None:
+            return None
+
+        # search again once the raise timer fires
+        if self._raise_at is not None:
+            if now < self._raise_at:
+                return None
+            self._raise_at = None
+            self._search_high = self.max_size
+
+        if self._search_high - self._search_low < K_SEARCH_THRESHOLD:
+            self._raise_at = now + K_PMTU_RAISE_TIMER
+            return None
+        return (self._search_low + self._search_high + 1) // 2
+
+    def limit_max_size(self, max_size: int) -> None:
+        """
+        Honour the peer's `max_udp_payload_size` transport parameter.
+        """
+        self.base_size = min(self.base_size, max_size)
+        self.current_size = min(self.current_size, max_size)
+        self.max_size = min(self.max_size, max_size)
+        self._search_high = min(self._search_high, max_size)
+        self._search_low = min(self._search_low, max_size)
+
+    def on_packet_acked(self, sent_time: float) -> None:
+        """
+        Callback when a packet larger than the base size is acknowledged.
+        """
+        if self._last_acked_time is None or sent_time > self._last_acked_time:
+            self._last_acked_time = sent_time
+        self._losses = 0
+
+    def on_packet_lost(self, sent_time: float) -> bool:
+        """
+        Callback when a packet larger than the base size is lost.
+
+        Returns `True` if a black hole was detected.
+        """
+        # a larger packet sent after this one went through
+        if self._last_acked_time is not None and sent_time <= self._last_acked_time:
+            return False
+
+        self._losses += 1
+        return self._losses >= K_BLACK_HOLE_LOSSES and self._on_black_hole()
+
+    def on_probe_acked(self, size: int, sent_time: float) -> None:
+        """
+        Callback when a probe packet is acknowledged.
+        """
+        self._probe_count = 0
+        self._probe_size = None
+        self._search_low = max(self._search_low, size)
+        if size > self.current_size:
+            self.current_size = size
+        self.on_packet_acked(sent_time)
+
+    def on_probe_expired(self) -> None:
+        """
+        Callback when a probe packet is neither acknowledged nor lost.
+        """
+        self._probe_size = None
+
+    def on_probe_lost(self, size: int) -> None:
+        """
+        Callback when a probe packet is lost.
+        """
+        self._probe_size = None
+        self._probe_count += 1
+        if self._probe_count >= K_MAX_PROBES:
+            self._probe_count = 0
+            self._search_high = min(self._search_high, size - 1)
+
+    def on_probe_sent(self, size: int) -> None:
+        """
+        Callback when a probe packet is sent.
+        """
+        self._probe_size = size
+
+    def on_probe_timeout(self, pto_count: int) -> bool:
+        """
+        Callback when the loss recovery probe timer fires for the
+        `pto_count`-th consecutive time.
+
+        Returns `True` if a black hole was detected.
+        """
+        return pto_count >= K_BLACK_HOLE_TIMEOUTS and self._on_black_hole()
+
+    def _on_black_hole(self) -> bool:
+        if self.current_size <= self.base_size:
+            return False
+
+        self.black_holes += 1
+        self._losses = 0
+        self._probe_count = 0
+        self._raise_at = None
+        self._search_high = self.current_size - 1
+        self._search_low = self.base_size
+        self.current_size = self.base_size
+        return True
@@ -0,0 +1,93 @@
+import ipaddress
+from collections import OrderedDict
+from typing import Tuple
+
+from .connection import NetworkAddress
+
+
+class QuicTokenBucket:
+    """
+    A token bucket which refills at `rate` tokens per second, up to `burst`
+    tokens.
+    """
+
+    def __init__(self, *, rate: float, burst: float, now: float) -> None:
+        self.burst = burst
+        self.rate = rate
+        self.tokens = burst
+        self._updated_at = now
+
+    def refill(self, now: float) -> None:
+        """
+        Add the tokens accumulated since the last refill.
+        """
+        if now > self._updated_at:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated_at) * self.rate
+            )
+        self._updated_at = now
+
+
+class QuicRateLimiter:
+    """
+    Limits the stateless responses a server sends, such as Retry and Version
+    Negotiation packets.
+
+    Each response consumes a token from a server-wide bucket and from the
+    bucket of the source address prefix, so that spoofed floods cannot make
+    the server spend unbounded CPU time and bandwidth, and a single network
+    cannot use up the whole budget. The buckets of the least recently seen
+    prefixes are forgotten beyond `max_prefixes`.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float = 1000.0,
+        burst: float = 1000.0,
+        prefix_rate: float = 100.0,
+        prefix_burst: float = 100.0,
+        ipv4_prefix_length: int = 24,
+        ipv6_prefix_length: int = 48,
+        max_prefixes: int = 10000,
+    ) -> None:
+        self._bucket = QuicTokenBucket(rate=rate, burst=burst, now=0.0)
+        self._ipv4_shift = 32 - ipv4_prefix_length
+        self._ipv6_shift = 128 - ipv6_prefix_length
+        self._max_prefixes = max_prefixes
+        self._prefix_burst = prefix_burst
+        self._prefix_rate = prefix_rate
+        self._prefixes: OrderedDict[Tuple[int, int], QuicTokenBucket] = OrderedDict()
+
+    def allow(self, addr: NetworkAddress, now: float) -> bool:
+        """
+        Return whether a response can be sent to the given address, consuming
+        a token if it can.
+        """
+        prefix = self._get_prefix(addr)
+        bucket = self._prefixes.get(prefix)
+        if bucket is None:
+            bucket = QuicTokenBucket(
+                rate=self._prefix_rate, burst=self._prefix_burst, now=now
+            )
+            self._prefixes[prefix] = bucket
+            if len(self._prefixes) > self._max_prefixes:
+                self._prefixes.popitem(last=False)
+        else:
+            self._prefixes.move_to_end(prefix)
+            bucket.refill(now)
+        self._bucket.refill(now)
+
+        if bucket.tokens < 1 or self._bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        self._bucket.tokens -= 1
+        return True
+
+    def _get_prefix(self, addr: NetworkAddress) -> Tuple[int, int]:
+        ip = ipaddress.ip_address(addr[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        if ip.version == 4:
+            return (4, int(ip) >> self._ipv4_shift)
+        return (6, int(ip) >> self._ipv6_shift)
@@ -1,10 +1,11 @@
 import logging
 import math
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from .congestion import cubic, reno  # noqa
 from .congestion.base import K_GRANULARITY, create_congestion_control
 from .logger import QuicLoggerTrace
+from .packet import PACKET_TYPE_ZERO_RTT
 from .packet_builder import QuicDeliveryState, QuicSentPacket
 from .rangeset import RangeSet
 
@@ -14,11 +15,17 @@ K_TIME_THRESHOLD = 9 / 8
 K_MICRO_SECOND = 0.000001
 K_SECOND = 1.0
 
+# pacing
+K_PACING_QUANTUM = 2  # minimum number of packets per pacing wakeup
+
 
 class QuicPacketSpace:
     def __init__(self) -> None:
         self.ack_at: Optional[float] = None
+        self.ack_eliciting_received = 0  # since the last ACK was sent
         self.ack_queue = RangeSet()
+        self.ack_ranges: Optional[Tuple[bytes, List[int]]] = None  # encoded ack_queue
+        self.ack_unreported = RangeSet()  # received, not yet in an ACK frame
         self.discarded = False
         self.expected_packet_number = 0
         self.largest_received_packet = -1
@@ -28,11 +35,23 @@ class QuicPacketSpace:
         self.ack_eliciting_in_flight = 0
         self.largest_acked_packet = 0
         self.loss_time: Optional[float] = None
+        self.lost_packets = RangeSet()
         self.sent_packets: Dict[int, QuicSentPacket] = {}
 
 
 class QuicPacketPacer:
-    def __init__(self, *, max_datagram_size: int) -> None:
+    """
+    Spaces out packets over the round-trip time using a token bucket, in
+    which time is accumulated at the pacing rate.
+
+    If `granularity` is set, the pacer is woken up by a timer which cannot
+    fire more often than that, such as the asyncio event loop's. Each wakeup
+    then sends the packets earned since the previous one as a burst, of at
+    least `K_PACING_QUANTUM` packets, instead of waking up for each packet.
+    """
+
+    def __init__(self, *, max_datagram_size: int, granularity: float = 0.0) -> None:
+        self._granularity = granularity
         self._max_datagram_size = max_datagram_size
         self.bucket_max: float = 0.0
         self.bucket_time: float = 0.0
@@ -43,6 +62,10 @@ class QuicPacketPacer:
         if self.packet_time is not None:
             self.update_bucket(now=now)
             if self.bucket_time <= 0:
+                if self._granularity:
+                    return now + max(
+                        self._granularity, K_PACING_QUANTUM * self.packet_time
+                    )
                 return now + self.packet_time
         return None
 
@@ -74,6 +97,12 @@ class QuicPacketPacer:
             )
             / pacing_rate
         )
+
+        # keep what is earned between two wakeups of a coarse timer
+        if self._granularity:
+            self.bucket_max += max(
+                self._granularity, K_PACING_QUANTUM * self.packet_time
+            )
         if self.bucket_time > self.bucket_max:
             self.bucket_time = self.bucket_max
 
@@ -87,8 +116,10 @@ class QuicPacketRecovery:
         self,
         *,
         congestion_control_algorithm: str,
+        hystart: bool = False,
         initial_rtt: float,
         max_datagram_size: int,
+        pacing_granularity: float = 0.0,
         peer_completed_address_validation: bool,
         send_probe: Callable[[], None],
         logger: Optional[logging.LoggerAdapter] = None,
@@ -98,6 +129,14 @@ class QuicPacketRecovery:
         self.peer_completed_address_validation = peer_completed_address_validation
         self.spaces: List[QuicPacketSpace] = []
 
+        # statistics
+        self.bytes_acked = 0
+        self.bytes_lost = 0
+        self.packets_acked = 0
+        self.packets_lost = 0
+        self.probe_timeouts = 0
+        self.spurious_losses = 0
+
         # callbacks
         self._logger = logger
         self._quic_logger = quic_logger
@@ -115,9 +154,13 @@ class QuicPacketRecovery:
 
         # congestion control
         self._cc = create_congestion_control(
-            congestion_control_algorithm, max_datagram_size=max_datagram_size
+            congestion_control_algorithm,
+            hystart=hystart,
+            max_datagram_size=max_datagram_size,
+        )
+        self._pacer = QuicPacketPacer(
+            granularity=pacing_granularity, max_datagram_size=max_datagram_size
         )
-        self._pacer = QuicPacketPacer(max_datagram_size=max_datagram_size)
 
     @property
     def bytes_in_flight(self) -> int:
@@ -127,6 +170,15 @@ class QuicPacketRecovery:
     def congestion_window(self) -> int:
         return self._cc.congestion_window
 
+    @property
+    def smoothed_rtt(self) -> float:
+        """
+        The smoothed RTT, or the initial RTT if no sample has been taken yet.
+        """
+        if not self._rtt_initialized:
+            return self._rtt_initial
+        return self._rtt_smoothed
+
     def discard_space(self, space: QuicPacketSpace) -> None:
         assert space in self.spaces
 
@@ -145,6 +197,34 @@ class QuicPacketRecovery:
         if self._quic_logger is not None:
             self._log_metrics_updated()
 
+    def discard_early_data(self, *, space: QuicPacketSpace) -> None:
+        """
+        Schedule the data sent in 0-RTT packets which the peer rejected for
+        retransmission.
+
+        The packets are removed from bytes in flight without being considered
+        lost, so the congestion window is left untouched.
+        """
+        packets = [
+            packet
+            for packet in space.sent_packets.values()
+            if packet.packet_type == PACKET_TYPE_ZERO_RTT
+        ]
+        self._cc.on_packets_expired(packets=filter(lambda x: x.in_flight, packets))
+        for packet in packets:
+            del space.sent_packets[packet.packet_number]
+            if packet.is_ack_eliciting:
+                space.ack_eliciting_in_flight -= 1
+
+            # trigger callbacks
+            for handler, args in packet.delivery_handlers:
+                handler(QuicDeliveryState.LOST, *args)
+
+        if packets and self._logger is not None:
+            self._logger.debug("Scheduled 0-RTT data for retransmission")
+        if self._quic_logger is not None:
+            self._log_metrics_updated()
+
     def get_loss_detection_time(self) -> float:
         # loss timer
         loss_space = self._get_loss_space()
@@ -195,6 +275,8 @@ class QuicPacketRecovery:
             if packet_number in ack_rangeset:
                 # remove packet and update counters
                 packet = space.sent_packets.pop(packet_number)
+                self.bytes_acked += packet.sent_bytes
+                self.packets_acked += 1
                 if packet.is_ack_eliciting:
                     is_ack_eliciting = True
                     space.ack_eliciting_in_flight -= 1
@@ -207,6 +289,10 @@ class QuicPacketRecovery:
                 for handler, args in packet.delivery_handlers:
                     handler(QuicDeliveryState.ACKED, *args)
 
+        # detect packets which were declared lost but reached the peer
+        if len(space.lost_packets):
+            self._detect_spurious_losses(ack_rangeset=ack_rangeset, space=space)
+
         # nothing to do if there are no newly acked packets
         if largest_newly_acked is None:
             return
@@ -261,6 +347,7 @@ class QuicPacketRecovery:
             self._detect_loss(now=now, space=loss_space)
         else:
             self._pto_count += 1
+            self.probe_timeouts += 1
             self.reschedule_data(now=now)
 
     def on_packet_sent(self, *, packet: QuicSentPacket, space: QuicPacketSpace) -> None:
@@ -278,6 +365,18 @@ class QuicPacketRecovery:
             if self._quic_logger is not None:
                 self._log_metrics_updated()
 
+    def update_max_datagram_size(self, max_datagram_size: int) -> None:
+        """
+        Change the maximum datagram size used by congestion control and pacing.
+        """
+        self._cc.set_max_datagram_size(max_datagram_size)
+        self._pacer._max_datagram_size = max_datagram_size
+        if self._rtt_initialized:
+            self._pacer.update_rate(
+                congestion_window=self._cc.congestion_window,
+                smoothed_rtt=self._rtt_smoothed,
+            )
+
     def reschedule_data(self, *, now: float) -> None:
         """
         Schedule some data for retransmission.
@@ -324,6 +423,22 @@ class QuicPacketRecovery:
 
         self._on_packets_lost(now=now, packets=lost_packets, space=space)
 
+    def _detect_spurious_losses(
+        self, *, ack_rangeset: RangeSet, space: QuicPacketSpace
+    ) -> None:
+        for lost in list(space.lost_packets):
+            for acked in ack_rangeset:
+                start = max(lost.start, acked.start)
+                stop = min(lost.stop, acked.stop)
+                if start < stop:
+                    self.spurious_losses += stop - start
+                    space.lost_packets.subtract(start, stop)
+
+        # forget packets which are older than those the peer acknowledges
+        lowest_acked = ack_rangeset.bounds().start
+        if len(space.lost_packets) and space.lost_packets.bounds().start < lowest_acked:
+            space.lost_packets.subtract(0, lowest_acked)
+
     def _get_loss_space(self) -> Optional[QuicPacketSpace]:
         loss_space = None
         for space in self.spaces:
@@ -353,12 +468,20 @@ class QuicPacketRecovery:
     def _on_packets_lost(
         self, *, now: float, packets: Iterable[QuicSentPacket], space: QuicPacketSpace
     ) -> None:
+        expired_packets_cc = []
         lost_packets_cc = []
         for packet in packets:
             del space.sent_packets[packet.packet_number]
+            space.lost_packets.add(packet.packet_number)
+            self.bytes_lost += packet.sent_bytes
+            self.packets_lost += 1
 
+            # losing a path MTU probe is not a congestion signal
             if packet.in_flight:
-                lost_packets_cc.append(packet)
+                if packet.is_mtu_probe:
+                    expired_packets_cc.append(packet)
+                else:
+                    lost_packets_cc.append(packet)
 
             if packet.is_ack_eliciting:
                 space.ack_eliciting_in_flight -= 1
@@ -379,6 +502,8 @@ class QuicPacketRecovery:
                 handler(QuicDeliveryState.LOST, *args)
 
         # inform congestion controller
+        if expired_packets_cc:
+            self._cc.on_packets_expired(packets=expired_packets_cc)
         if lost_packets_cc:
             self._cc.on_packets_lost(now=now, packets=lost_packets_cc)
             self._pacer.update_rate(
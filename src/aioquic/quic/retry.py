@@ -1,18 +1,35 @@
 import ipaddress
-from typing import Tuple
+import os
+import struct
+import time
+from typing import Optional, Tuple
 
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 from ..buffer import Buffer
 from ..tls import pull_opaque, push_opaque
 from .connection import NetworkAddress
 
+NEW_TOKEN_AAD = b"aioquic new token"
+NEW_TOKEN_NONCE_SIZE = 12
+NEW_TOKEN_SIZE = NEW_TOKEN_NONCE_SIZE + 8 + 16 + 16  # time, address, AEAD tag
+
 
 def encode_address(addr: NetworkAddress) -> bytes:
     return ipaddress.ip_address(addr[0]).packed + bytes([addr[1] >> 8, addr[1] & 0xFF])
 
 
+def _packed_ip_address(addr: NetworkAddress) -> bytes:
+    # the port usually changes between connections, IPv4 addresses are mapped
+    ip = ipaddress.ip_address(addr[0])
+    if isinstance(ip, ipaddress.IPv4Address):
+        return b"\x00" * 10 + b"\xff\xff" + ip.packed
+    return ip.packed
+
+
 class QuicRetryTokenHandler:
     def __init__(self) -> None:
         self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
@@ -51,3 +68,101 @@ class QuicRetryTokenHandler:
         if encoded_addr != encode_address(addr):
             raise ValueError("Remote address does not match.")
         return original_destination_connection_id, retry_source_connection_id
+
+
+class QuicNewTokenHandler:
+    """
+    Issues the tokens a server sends in NEW_TOKEN frames, and validates them
+    when clients present them to open a later connection.
+
+    A valid token lets the server skip the Retry round trip and the
+    anti-amplification limit. Tokens bind the client's IP address, expire
+    after `lifetime` seconds and are sealed with AES-GCM, so that validating
+    them is cheap. Share the `secret` between the server processes which
+    should accept each other's tokens.
+    """
+
+    def __init__(
+        self, secret: Optional[bytes] = None, lifetime: float = 86400.0
+    ) -> None:
+        self._aead = AESGCM(secret if secret is not None else os.urandom(16))
+        self._lifetime = lifetime
+
+    def create_token(self, addr: NetworkAddress) -> bytes:
+        """
+        Create a token for the client at the given address.
+        """
+        nonce = os.urandom(NEW_TOKEN_NONCE_SIZE)
+        plaintext = struct.pack("!d", time.time()) + _packed_ip_address(addr)
+        return nonce + self._aead.encrypt(nonce, plaintext, NEW_TOKEN_AAD)
+
+    def is_new_token(self, token: bytes) -> bool:
+        """
+        Return whether the token was issued in a NEW_TOKEN frame, rather
+        than in a Retry packet.
+        """
+        return len(token) == NEW_TOKEN_SIZE
+
+    def validate_token(self, addr: NetworkAddress, token: bytes) -> None:
+        """
+        Check a token presented by the client at the given address, raising
+        a `ValueError` if it cannot be accepted.
+        """
+        try:
+            plaintext = self._aead.decrypt(
+                token[:NEW_TOKEN_NONCE_SIZE],
+                token[NEW_TOKEN_NONCE_SIZE:],
+                NEW_TOKEN_AAD,
+            )
+        except InvalidTag:
+            raise ValueError("Token is invalid.")
+        issued_at = struct.unpack("!d", plaintext[:8])[0]
+        if plaintext[8:] != _packed_ip_address(addr):
+            raise ValueError("Remote address does not match.")
+        if time.time() > issued_at + self._lifetime:
+            raise ValueError("Token has expired.")
+
+
+class QuicAdaptiveRetry:
+    """
+    Decides when a server validates client addresses with Retry packets.
+
+    Retry is enabled once the number of half-open connections reaches
+    `max_half_open`, or once new connection attempts arrive at
+    `max_initial_rate` per second. It is disabled again once both fall below
+    half of these thresholds, so that clients keep a 1-RTT handshake while the
+    server is not under load.
+    """
+
+    def __init__(
+        self, *, max_half_open: int = 100, max_initial_rate: float = 100.0
+    ) -> None:
+        self.active = False
+        self.initial_rate = 0.0
+        self.max_half_open = max_half_open
+        self.max_initial_rate = max_initial_rate
+
+        self._window_count = 0
+        self._window_start: Optional[float] = None
+
+    def on_initial(self, half_open: int, now: float) -> bool:
+        """
+        Callback when a new connection attempt without a token is received.
+
+        Returns `True` if it should be answered with a Retry.
+        """
+        # count the attempts over windows of one second
+        if self._window_start is None or now >= self._window_start + 1.0:
+            if self._window_start is not None:
+                self.initial_rate = self._window_count / (now - self._window_start)
+            self._window_count = 0
+            self._window_start = now
+        self._window_count += 1
+        rate = max(self.initial_rate, self._window_count)
+
+        if self.active:
+            if half_open < self.max_half_open / 2 and rate < self.max_initial_rate / 2:
+                self.active = False
+        elif half_open >= self.max_half_open or rate >= self.max_initial_rate:
+            self.active = True
+        return self.active
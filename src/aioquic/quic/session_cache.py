@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from ..tls import SessionTicket
+
+SessionKey = Tuple[str, Tuple[str, ...]]
+
+
+class SessionCache:
+    """
+    A cache of the session tickets and address validation tokens received
+    from servers, so that later connections to the same servers can resume
+    the TLS session, send 0-RTT data and skip address validation.
+
+    Tickets are looked up by server name and ALPN protocols, tokens by server
+    name. Each of them is only handed out once, as recommended by RFC 8446
+    and RFC 9000, since reusing them lets observers link connections
+    together.
+
+    At most `max_size` tickets and `max_size` tokens are kept, the least
+    recently used ones being forgotten first. The cache can be shared
+    between threads.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._tickets: OrderedDict[SessionKey, SessionTicket] = OrderedDict()
+        self._tokens: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tickets) + len(self._tokens)
+
+    def add_ticket(
+        self,
+        server_name: str,
+        alpn_protocols: Optional[List[str]],
+        ticket: SessionTicket,
+    ) -> None:
+        """
+        Store a session ticket received from a server.
+        """
+        key = (server_name, tuple(alpn_protocols or []))
+        with self._lock:
+            self._tickets[key] = ticket
+            self._tickets.move_to_end(key)
+            while len(self._tickets) > self._max_size:
+                self._tickets.popitem(last=False)
+
+    def add_token(self, server_name: str, token: bytes) -> None:
+        """
+        Store an address validation token received from a server.
+        """
+        with self._lock:
+            self._tokens[server_name] = token
+            self._tokens.move_to_end(server_name)
+            while len(self._tokens) > self._max_size:
+                self._tokens.popitem(last=False)
+
+    def pop_ticket(
+        self, server_name: str, alpn_protocols: Optional[List[str]]
+    ) -> Optional[SessionTicket]:
+        """
+        Remove and return a valid session ticket for the server, if any.
+        """
+        key = (server_name, tuple(alpn_protocols or []))
+        with self._lock:
+            ticket = self._tickets.pop(key, None)
+        if ticket is not None and ticket.is_valid:
+            return ticket
+        return None
+
+    def pop_token(self, server_name: str) -> bytes:
+        """
+        Remove and return an address validation token for the server, or an
+        empty token if there is none.
+        """
+        with self._lock:
+            return self._tokens.pop(server_name, b"")
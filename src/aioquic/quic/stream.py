@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 from . import events
 from .packet import (
@@ -19,6 +19,43 @@ class StreamFinishedError(Exception):
     pass
 
 
+class QuicReceiveWindow:
+    """
+    An auto-tuned flow control window for received data.
+
+    The limit advertised to the peer is raised once the application has
+    consumed more than half of the window. If the previous raise happened
+    less than two round-trips earlier, the application consumes data faster
+    than the window allows per round-trip, so the window is doubled, up to
+    `max_size`.
+    """
+
+    def __init__(self, size: int, max_size: int) -> None:
+        self.consumed = 0
+        self.max_size = max(size, max_size)
+        self.size = size
+
+        self._updated_at: Optional[float] = None
+
+    def ensure_size(self, size: int) -> None:
+        """
+        Grow the window to at least `size` bytes, within `max_size`.
+        """
+        self.size = max(self.size, min(size, self.max_size))
+
+    def update(self, limit: int, now: float, rtt: float) -> int:
+        """
+        Return the limit to advertise to the peer, given the current `limit`.
+        """
+        if limit - self.consumed >= self.size // 2:
+            return limit
+
+        if self._updated_at is not None and now - self._updated_at < 2 * rtt:
+            self.size = min(self.size * 2, self.max_size)
+        self._updated_at = now
+        return self.consumed + self.size
+
+
 class QuicStreamReceiver:
     """
     The receive part of a QUIC stream.
@@ -32,6 +69,7 @@ class QuicStreamReceiver:
     def __init__(self, stream_id: Optional[int], readable: bool) -> None:
         self.highest_offset = 0  # the highest offset ever seen
         self.is_finished = False
+        self.is_paused = False  # whether flow control credit is held back
         self.stop_pending = False
 
         self._buffer = bytearray()
@@ -41,6 +79,13 @@ class QuicStreamReceiver:
         self._stream_id = stream_id
         self._stop_error_code: Optional[int] = None
 
+    @property
+    def delivered_offset(self) -> int:
+        """
+        The offset up to which data has been delivered to the application.
+        """
+        return self._buffer_start
+
     def get_stop_frame(self) -> QuicStopSendingFrame:
         self.stop_pending = False
         return QuicStopSendingFrame(
@@ -194,6 +239,13 @@ class QuicStreamSender:
         except IndexError:
             return self._buffer_stop
 
+    def is_flow_control_blocked(self, max_offset: int) -> bool:
+        """
+        Whether data is waiting to be sent, but none of it lies below
+        `max_offset`.
+        """
+        return len(self._pending) > 0 and self._pending[0].start >= max_offset
+
     def get_frame(
         self, max_size: int, max_offset: Optional[int] = None
     ) -> Optional[QuicStreamFrame]:
@@ -317,18 +369,42 @@ class QuicStream:
         self,
         stream_id: Optional[int] = None,
         max_stream_data_local: int = 0,
+        max_stream_data_local_window: int = 0,
         max_stream_data_remote: int = 0,
         readable: bool = True,
         writable: bool = True,
     ) -> None:
+        self.data_blocked_at: Optional[float] = None
+        self.data_blocked_pending = False
+        self.data_blocked_time = 0.0
+        self.incremental = False
         self.is_blocked = False
         self.max_stream_data_local = max_stream_data_local
         self.max_stream_data_local_sent = max_stream_data_local
         self.max_stream_data_remote = max_stream_data_remote
+        self.receive_window = QuicReceiveWindow(
+            size=max_stream_data_local, max_size=max_stream_data_local_window
+        )
         self.receiver = QuicStreamReceiver(stream_id=stream_id, readable=readable)
+        self.send_sequence = 0  # used to take turns among incremental streams
         self.sender = QuicStreamSender(stream_id=stream_id, writable=writable)
         self.stream_id = stream_id
+        self.urgency = 3
 
     @property
     def is_finished(self) -> bool:
         return self.receiver.is_finished and self.sender.is_finished
+
+    @property
+    def send_order(self) -> Tuple[int, bool, int]:
+        """
+        The key by which streams are ordered when sending data.
+
+        Streams with a lower urgency come first. Within an urgency level,
+        non-incremental streams are served one at a time in the order they
+        were created, then incremental streams take turns. Callers rely on
+        the sort being stable to preserve the creation order.
+        """
+        if self.incremental:
+            return (self.urgency, True, self.send_sequence)
+        return (self.urgency, False, 0)
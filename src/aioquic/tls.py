@@ -4,6 +4,9 @@ import logging
 import os
 import ssl
 import struct
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future
 from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum, IntEnum
@@ -11,6 +14,7 @@ from functools import partial
 from typing import (
     Any,
     Callable,
+    Deque,
     Dict,
     Generator,
     List,
@@ -19,12 +23,13 @@ from typing import (
     Tuple,
     TypeVar,
     Union,
+    cast,
 )
 
 import certifi
 import service_identity
 from cryptography import x509
-from cryptography.exceptions import InvalidSignature
+from cryptography.exceptions import InvalidSignature, InvalidTag
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes, hmac, serialization
 from cryptography.hazmat.primitives.asymmetric import (
@@ -37,11 +42,12 @@ from cryptography.hazmat.primitives.asymmetric import (
     x448,
     x25519,
 )
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.kdf.hkdf import HKDFExpand
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
 from OpenSSL import crypto
 
-from .buffer import Buffer
+from .buffer import Buffer, BufferReadError
 
 TLS_VERSION_1_2 = 0x0303
 TLS_VERSION_1_3 = 0x0304
@@ -52,6 +58,11 @@ TLS_VERSION_1_3_DRAFT_26 = 0x7F1A
 CLIENT_CONTEXT_STRING = b"TLS 1.3, client CertificateVerify"
 SERVER_CONTEXT_STRING = b"TLS 1.3, server CertificateVerify"
 
+# the random value which identifies a HelloRetryRequest
+HELLO_RETRY_REQUEST_RANDOM = bytes.fromhex(
+    "cf21ad74e59a6111be1d8c021e65b891c2a211167abb8c5e079e09e2c8a8339c"
+)
+
 T = TypeVar("T")
 
 # facilitate mocking for the test suite
@@ -151,6 +162,7 @@ class State(Enum):
     SERVER_EXPECT_CERTIFICATE_VERIFY = 10
     SERVER_EXPECT_FINISHED = 11
     SERVER_POST_HANDSHAKE = 12
+    SERVER_EXPECT_SIGNATURE = 13
 
 
 def hkdf_label(label: bytes, hash_value: bytes, length: int) -> bytes:
@@ -672,7 +684,11 @@ def pull_server_hello(buf: Buffer) -> ServerHello:
             if extension_type == ExtensionType.SUPPORTED_VERSIONS:
                 hello.supported_version = buf.pull_uint16()
             elif extension_type == ExtensionType.KEY_SHARE:
-                hello.key_share = pull_key_share(buf)
+                if hello.random == HELLO_RETRY_REQUEST_RANDOM:
+                    # a HelloRetryRequest only carries the selected group
+                    hello.key_share = (buf.pull_uint16(), b"")
+                else:
+                    hello.key_share = pull_key_share(buf)
             elif extension_type == ExtensionType.PRE_SHARED_KEY:
                 hello.pre_shared_key = buf.pull_uint16()
             else:
@@ -703,7 +719,10 @@ def push_server_hello(buf: Buffer, hello: ServerHello) -> None:
 
             if hello.key_share is not None:
                 with push_extension(buf, ExtensionType.KEY_SHARE):
-                    push_key_share(buf, hello.key_share)
+                    if hello.random == HELLO_RETRY_REQUEST_RANDOM:
+                        buf.push_uint16(hello.key_share[0])
+                    else:
+                        push_key_share(buf, hello.key_share)
 
             if hello.pre_shared_key is not None:
                 with push_extension(buf, ExtensionType.PRE_SHARED_KEY):
@@ -1057,6 +1076,24 @@ GROUP_TO_CURVE: Dict = {
 }
 CURVE_TO_GROUP = dict((v, k) for k, v in GROUP_TO_CURVE.items())
 
+# signature algorithms and groups we offer, depending on backend support
+DEFAULT_SIGNATURE_ALGORITHMS: List[int] = [
+    SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
+    SignatureAlgorithm.ECDSA_SECP256R1_SHA256,
+    SignatureAlgorithm.RSA_PKCS1_SHA256,
+    SignatureAlgorithm.RSA_PKCS1_SHA1,
+]
+if default_backend().ed25519_supported():
+    DEFAULT_SIGNATURE_ALGORITHMS.append(SignatureAlgorithm.ED25519)
+if default_backend().ed448_supported():
+    DEFAULT_SIGNATURE_ALGORITHMS.append(SignatureAlgorithm.ED448)
+
+DEFAULT_SUPPORTED_GROUPS: List[int] = [Group.SECP256R1]
+if default_backend().x25519_supported():
+    DEFAULT_SUPPORTED_GROUPS.append(Group.X25519)
+if default_backend().x448_supported():
+    DEFAULT_SUPPORTED_GROUPS.append(Group.X448)
+
 
 def cipher_suite_hash(cipher_suite: CipherSuite) -> hashes.HashAlgorithm:
     return CIPHER_SUITES[cipher_suite]()
@@ -1092,6 +1129,23 @@ def encode_public_key(
     )
 
 
+EphemeralPrivateKey = Union[
+    ec.EllipticCurvePrivateKey, x25519.X25519PrivateKey, x448.X448PrivateKey
+]
+
+
+def generate_private_key(group: int) -> EphemeralPrivateKey:
+    """
+    Generate an ephemeral private key for the given key exchange group.
+    """
+    if group == Group.X25519:
+        return x25519.X25519PrivateKey.generate()
+    elif group == Group.X448:
+        return x448.X448PrivateKey.generate()
+    else:
+        return ec.generate_private_key(GROUP_TO_CURVE[group]())
+
+
 def negotiate(
     supported: List[T], offered: Optional[List[Any]], exc: Optional[Alert] = None
 ) -> T:
@@ -1122,6 +1176,27 @@ def signature_algorithm_params(signature_algorithm: int) -> Tuple:
     return padding_obj, algorithm
 
 
+def signature_algorithms_for_private_key(
+    private_key: Any,
+) -> List[SignatureAlgorithm]:
+    signature_algorithms: List[SignatureAlgorithm] = []
+    if isinstance(private_key, rsa.RSAPrivateKey):
+        signature_algorithms = [
+            SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
+            SignatureAlgorithm.RSA_PKCS1_SHA256,
+            SignatureAlgorithm.RSA_PKCS1_SHA1,
+        ]
+    elif isinstance(private_key, ec.EllipticCurvePrivateKey) and isinstance(
+        private_key.curve, ec.SECP256R1
+    ):
+        signature_algorithms = [SignatureAlgorithm.ECDSA_SECP256R1_SHA256]
+    elif isinstance(private_key, ed25519.Ed25519PrivateKey):
+        signature_algorithms = [SignatureAlgorithm.ED25519]
+    elif isinstance(private_key, ed448.Ed448PrivateKey):
+        signature_algorithms = [SignatureAlgorithm.ED448]
+    return signature_algorithms
+
+
 @contextmanager
 def push_message(
     key_schedule: Union[KeySchedule, KeyScheduleProxy], buf: Buffer
@@ -1131,6 +1206,14 @@ def push_message(
     key_schedule.update_hash(buf.data_slice(hash_start, buf.tell()))
 
 
+def message_hash(digest: bytes) -> bytes:
+    """
+    Return the message which replaces a ClientHello in the transcript after
+    a HelloRetryRequest.
+    """
+    return bytes([HandshakeType.MESSAGE_HASH, 0, 0, len(digest)]) + digest
+
+
 # callback types
 
 
@@ -1162,7 +1245,318 @@ class SessionTicket:
         return (age + self.age_add) % (1 << 32)
 
 
+def _milliseconds(timestamp: datetime.datetime) -> int:
+    return int((timestamp - datetime.datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+class SessionTicketSealer:
+    """
+    Seals the server's resumption state into the session tickets it issues,
+    so that the server does not need to store them.
+
+    Tickets are encrypted with AES-GCM under a key which changes every
+    `rotation_interval` seconds. Keys are derived from `secret`, so all the
+    processes or hosts sharing the secret can resume each other's sessions
+    without coordinating rotations, as long as their clocks agree. Tickets
+    sealed more than `lifetime` seconds ago are rejected.
+
+    Early data is only accepted from ClientHellos whose ticket age is within
+    `replay_window` seconds of the real age. Each such ClientHello is then
+    remembered until it is no longer fresh, and any replay of it is refused.
+    This memory is local to the process: with several processes sharing the
+    secret, make sure a given client always reaches the same process, or
+    disable early data.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[bytes] = None,
+        lifetime: int = 86400,
+        rotation_interval: int = 3600,
+        replay_window: float = 10.0,
+        max_replay_entries: int = 65536,
+    ) -> None:
+        if secret is None:
+            secret = os.urandom(32)
+        self.lifetime = lifetime
+        self._keys: Dict[int, AESGCM] = {}
+        self._max_replay_entries = max_replay_entries
+        self._replay_window = replay_window
+        self._rotation_interval = rotation_interval
+        self._secret = secret
+        self._seen: OrderedDict[bytes, int] = OrderedDict()
+
+    def accept_early_data(
+        self, ticket: SessionTicket, obfuscated_age: int, binder: bytes
+    ) -> bool:
+        """
+        Return whether early data can be accepted from a ClientHello which
+        resumes `ticket`.
+        """
+        now = _milliseconds(utcnow())
+        window = int(self._replay_window * 1000)
+
+        # forget ClientHellos which are no longer fresh
+        while self._seen and next(iter(self._seen.values())) < now:
+            self._seen.popitem(last=False)
+
+        # check the ClientHello is fresh
+        age = (obfuscated_age - ticket.age_add) % (1 << 32)
+        expected_age = now - _milliseconds(ticket.not_valid_before)
+        if abs(age - expected_age) > window:
+            return False
+
+        # check the ClientHello is not a replay
+        if binder in self._seen or len(self._seen) >= self._max_replay_entries:
+            return False
+        self._seen[binder] = now + 2 * window
+        return True
+
+    def seal(self, ticket: SessionTicket) -> bytes:
+        """
+        Return the opaque ticket which carries the given resumption state.
+        """
+        buf = Buffer(capacity=1024)
+        buf.push_uint16(ticket.cipher_suite)
+        buf.push_uint32(ticket.age_add)
+        buf.push_uint64(_milliseconds(ticket.not_valid_before))
+        buf.push_uint64(_milliseconds(ticket.not_valid_after))
+        if ticket.max_early_data_size is not None:
+            buf.push_uint8(1)
+            buf.push_uint32(ticket.max_early_data_size)
+        else:
+            buf.push_uint8(0)
+        push_opaque(buf, 1, ticket.resumption_secret)
+        push_opaque(buf, 2, (ticket.server_name or "").encode("utf8"))
+
+        epoch = self._epoch()
+        header = struct.pack("!L", epoch) + os.urandom(12)
+        return header + self._key(epoch).encrypt(header[4:], buf.data, header[:4])
+
+    def unseal(self, data: bytes) -> Optional[SessionTicket]:
+        """
+        Return the resumption state carried by an opaque ticket, or `None` if
+        the ticket is invalid or sealed with a key which has expired.
+        """
+        if len(data) < 32:
+            return None
+        epoch = struct.unpack("!L", data[:4])[0]
+        current_epoch = self._epoch()
+        if epoch > current_epoch or (
+            (current_epoch - epoch - 1) * self._rotation_interval > self.lifetime
+        ):
+            return None
+
+        try:
+            buf = Buffer(data=self._key(epoch).decrypt(data[4:16], data[16:], data[:4]))
+            cipher_suite = CipherSuite(buf.pull_uint16())
+            age_add = buf.pull_uint32()
+            not_valid_before = buf.pull_uint64()
+            not_valid_after = buf.pull_uint64()
+            max_early_data_size = buf.pull_uint32() if buf.pull_uint8() else None
+            resumption_secret = pull_opaque(buf, 1)
+            server_name = pull_opaque(buf, 2).decode("utf8")
+        except (BufferReadError, InvalidTag, ValueError):
+            return None
+
+        epoch_start = datetime.datetime(1970, 1, 1)
+        return SessionTicket(
+            age_add=age_add,
+            cipher_suite=cipher_suite,
+            max_early_data_size=max_early_data_size,
+            not_valid_after=epoch_start
+            + datetime.timedelta(milliseconds=not_valid_after),
+            not_valid_before=epoch_start
+            + datetime.timedelta(milliseconds=not_valid_before),
+            resumption_secret=resumption_secret,
+            server_name=server_name,
+            ticket=data,
+        )
+
+    def _epoch(self) -> int:
+        return _milliseconds(utcnow()) // (self._rotation_interval * 1000)
+
+    def _key(self, epoch: int) -> AESGCM:
+        key = self._keys.get(epoch)
+        if key is None:
+            # forget keys which can no longer open valid tickets
+            oldest = epoch - self.lifetime // self._rotation_interval - 1
+            for stale in [x for x in self._keys if x < oldest]:
+                del self._keys[stale]
+
+            key = AESGCM(
+                HKDFExpand(
+                    algorithm=hashes.SHA256(),
+                    length=32,
+                    info=b"aioquic session ticket " + struct.pack("!L", epoch),
+                ).derive(self._secret)
+            )
+            self._keys[epoch] = key
+        return key
+
+
+class KeyShareCache:
+    """
+    Remembers the key exchange group selected by each server, so that later
+    handshakes with the same server only send a key share for that group.
+
+    At most `max_size` servers are remembered, the least recently used ones
+    being forgotten first.
+    """
+
+    def __init__(self, max_size: int = 1024) -> None:
+        self._groups: OrderedDict[str, int] = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, server_name: str) -> Optional[int]:
+        """
+        Return the group last selected by the server, if known.
+        """
+        group = self._groups.get(server_name)
+        if group is not None:
+            self._groups.move_to_end(server_name)
+        return group
+
+    def set(self, server_name: str, group: int) -> None:
+        """
+        Record the group selected by the server.
+        """
+        self._groups[server_name] = group
+        self._groups.move_to_end(server_name)
+        while len(self._groups) > self._max_size:
+            self._groups.popitem(last=False)
+
+
+class EphemeralKeyPool:
+    """
+    A pool of ephemeral private keys for the TLS key exchange, which a
+    background thread generates ahead of time.
+
+    Each key is still used for a single handshake, so forward secrecy is
+    preserved. The tradeoff is that up to `size` keys per group sit in memory
+    before they are used, so anyone able to read the process's memory can
+    recover the keys of upcoming handshakes, not only of current ones.
+
+    If the pool for a group is empty, a key is generated on the spot. The
+    pool notices when the process forks and discards the keys inherited from
+    its parent, so two processes never use the same key.
+    """
+
+    def __init__(self, groups: Optional[List[int]] = None, size: int = 16) -> None:
+        if groups is None:
+            groups = [Group.SECP256R1, Group.X25519]
+        self._groups = groups
+        self._keys: Dict[int, Deque[EphemeralPrivateKey]] = {}
+        self._pid = 0
+        self._size = size
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._start()
+
+    def close(self) -> None:
+        """
+        Stop the background thread.
+        """
+        if self._thread is not None:
+            thread = self._thread
+            self._thread = None
+            self._wakeup.set()
+            thread.join()
+
+    def get(self, group: int) -> EphemeralPrivateKey:
+        """
+        Return a private key for the given group, which must only be used once.
+        """
+        if self._pid != os.getpid():
+            self._start()
+
+        try:
+            key = self._keys[group].popleft()
+        except (IndexError, KeyError):
+            key = generate_private_key(group)
+        self._wakeup.set()
+        return key
+
+    def _run(self) -> None:
+        thread = self._thread
+        while self._thread is thread:
+            for group, keys in self._keys.items():
+                while len(keys) < self._size and self._thread is thread:
+                    keys.append(generate_private_key(group))
+            self._wakeup.wait()
+            self._wakeup.clear()
+
+    def _start(self) -> None:
+        self._keys = dict((group, deque()) for group in self._groups)
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+class TlsServerCredentials:
+    """
+    A server's certificate chain and private key, along with what the TLS
+    handshake derives from them: the encoded Certificate message and the
+    signature algorithms the key supports.
+
+    Building this once and sharing it between connections saves encoding the
+    certificates and inspecting the key during every handshake.
+    """
+
+    def __init__(
+        self,
+        certificate: x509.Certificate,
+        certificate_chain: List[x509.Certificate],
+        private_key: Any,
+    ) -> None:
+        self.certificate = certificate
+        self.certificate_chain = certificate_chain
+        self.private_key = private_key
+        self.signature_algorithms = signature_algorithms_for_private_key(private_key)
+
+        certificates = [
+            (x.public_bytes(Encoding.DER), b"")
+            for x in [certificate] + certificate_chain
+        ]
+        buf = Buffer(capacity=8 + sum(len(x[0]) + 5 for x in certificates))
+        push_certificate(
+            buf, Certificate(request_context=b"", certificates=certificates)
+        )
+        self.certificate_message = buf.data
+
+
+class ExecutorSigner:
+    """
+    A certificate signer which computes CertificateVerify signatures in an
+    :class:`~concurrent.futures.Executor`, keeping expensive signing
+    operations such as RSA off the thread which drives the handshake.
+
+    Private keys cannot be pickled, so the executor should be a
+    :class:`~concurrent.futures.ThreadPoolExecutor`. The cryptography library
+    releases the GIL while signing, so signatures computed by several threads
+    do run in parallel.
+    """
+
+    def __init__(
+        self,
+        private_key: Union[
+            dsa.DSAPrivateKey, ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey
+        ],
+        executor: Executor,
+    ) -> None:
+        self._executor = executor
+        self._private_key = private_key
+
+    def __call__(self, data: bytes, signature_algorithm: int) -> "Future[bytes]":
+        return self._executor.submit(
+            self._private_key.sign,
+            data,
+            *signature_algorithm_params(signature_algorithm),
+        )
+
+
 AlpnHandler = Callable[[str], None]
+CertificateSigner = Callable[[bytes, int], "Future[bytes]"]
 SessionTicketFetcher = Callable[[bytes], Optional[SessionTicket]]
 SessionTicketHandler = Callable[[SessionTicket], None]
 
@@ -1191,10 +1585,16 @@ class Context:
         self.certificate_private_key: Optional[
             Union[dsa.DSAPrivateKey, ec.EllipticCurvePrivateKey, rsa.RSAPrivateKey]
         ] = None
+        self.certificate_signer: Optional[CertificateSigner] = None
+        self.ephemeral_key_pool: Optional[EphemeralKeyPool] = None
         self.handshake_extensions: List[Extension] = []
+        self.key_share_cache: Optional[KeyShareCache] = None
+        self.key_share_groups: Optional[List[int]] = None
+        self.server_credentials: Optional[TlsServerCredentials] = None
         self._is_client = is_client
         self._max_early_data = max_early_data
         self.session_ticket: Optional[SessionTicket] = None
+        self.session_ticket_sealer: Optional[SessionTicketSealer] = None
         self._request_client_certificate = False  # For test purposes only
         self._server_name = server_name
         if verify_mode is not None:
@@ -1221,21 +1621,8 @@ class Context:
             ]
         self._legacy_compression_methods: List[int] = [CompressionMethod.NULL]
         self._psk_key_exchange_modes: List[int] = [PskKeyExchangeMode.PSK_DHE_KE]
-        self._signature_algorithms: List[int] = [
-            SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
-            SignatureAlgorithm.ECDSA_SECP256R1_SHA256,
-            SignatureAlgorithm.RSA_PKCS1_SHA256,
-            SignatureAlgorithm.RSA_PKCS1_SHA1,
-        ]
-        if default_backend().ed25519_supported():
-            self._signature_algorithms.append(SignatureAlgorithm.ED25519)
-        if default_backend().ed448_supported():
-            self._signature_algorithms.append(SignatureAlgorithm.ED448)
-        self._supported_groups = [Group.SECP256R1]
-        if default_backend().x25519_supported():
-            self._supported_groups.append(Group.X25519)
-        if default_backend().x448_supported():
-            self._supported_groups.append(Group.X448)
+        self._signature_algorithms = list(DEFAULT_SIGNATURE_ALGORITHMS)
+        self._supported_groups = list(DEFAULT_SUPPORTED_GROUPS)
         self._supported_versions = [TLS_VERSION_1_3]
 
         # state
@@ -1244,11 +1631,15 @@ class Context:
         self.key_schedule: Optional[KeySchedule] = None
         self.received_extensions: Optional[List[Extension]] = None
         self._certificate_request: Optional[CertificateRequest] = None
+        self._hello_retry_request: Optional[ServerHello] = None
+        self._hello_retry_transcript: Optional[bytes] = None
         self._key_schedule_psk: Optional[KeySchedule] = None
         self._key_schedule_proxy: Optional[KeyScheduleProxy] = None
         self._new_session_ticket: Optional[NewSessionTicket] = None
+        self._offered_key_share_groups: List[int] = []
         self._peer_certificate: Optional[x509.Certificate] = None
         self._peer_certificate_chain: List[x509.Certificate] = []
+        self._pending_signature: Optional[Tuple["Future[bytes]", int]] = None
         self._psk_key_exchange_mode: Optional[int] = None
         self._receive_buffer = b""
         self._session_resumed = False
@@ -1276,6 +1667,17 @@ class Context:
         """
         return self._session_resumed
 
+    @property
+    def pending_signature(self) -> Optional["Future[bytes]"]:
+        """
+        The CertificateVerify signature the handshake is waiting for, if any.
+
+        Once it is done, call :meth:`resume` to continue the handshake.
+        """
+        if self._pending_signature is None:
+            return None
+        return self._pending_signature[0]
+
     def handle_message(
         self, input_data: bytes, output_buf: Dict[Epoch, Buffer]
     ) -> None:
@@ -1370,11 +1772,35 @@ class Context:
                     self._server_handle_finished(input_buf, output_buf[Epoch.ONE_RTT])
                 else:
                     raise AlertUnexpectedMessage
-            elif self.state == State.SERVER_POST_HANDSHAKE:
+            elif self.state in (
+                State.SERVER_EXPECT_SIGNATURE,
+                State.SERVER_POST_HANDSHAKE,
+            ):
                 raise AlertUnexpectedMessage
 
             assert input_buf.eof()
 
+    def resume(self, output_buf: Dict[Epoch, Buffer]) -> None:
+        """
+        Continue a handshake which was waiting for :attr:`pending_signature`.
+        """
+        assert self._pending_signature is not None
+        future, signature_algorithm = self._pending_signature
+        assert future.done()
+        self._pending_signature = None
+
+        try:
+            signature = future.result()
+        except Exception as exc:
+            raise AlertInternalError("Signing CertificateVerify failed: %s" % exc)
+
+        self._server_send_certificate_verify(
+            output_buf[Epoch.HANDSHAKE], signature_algorithm, signature
+        )
+        self._server_send_finished(
+            output_buf[Epoch.HANDSHAKE], output_buf[Epoch.ONE_RTT]
+        )
+
     def _build_session_ticket(
         self, new_session_ticket: NewSessionTicket, other_extensions: List[Extension]
     ) -> SessionTicket:
@@ -1415,32 +1841,64 @@ class Context:
         except InvalidSignature:
             raise AlertDecryptError
 
-    def _client_send_hello(self, output_buf: Buffer) -> None:
+    def _client_key_share_groups(self) -> List[int]:
+        """
+        Return the groups for which the first ClientHello carries key shares.
+        """
+        # if we know which group the server picks, only send that one
+        if self.key_share_cache is not None and self._server_name is not None:
+            group = self.key_share_cache.get(self._server_name)
+            if group in self._supported_groups:
+                return [group]
+
+        if self.key_share_groups is not None:
+            groups = [g for g in self._supported_groups if g in self.key_share_groups]
+            if groups:
+                return groups
+
+        return self._supported_groups
+
+    def _client_send_hello(
+        self,
+        output_buf: Buffer,
+        key_share_groups: Optional[List[int]] = None,
+        cookie: Optional[bytes] = None,
+    ) -> None:
         key_share: List[KeyShareEntry] = []
         supported_groups: List[int] = []
 
+        if key_share_groups is None:
+            key_share_groups = self._client_key_share_groups()
         for group in self._supported_groups:
-            if group == Group.SECP256R1:
-                self._ec_private_key = ec.generate_private_key(
-                    GROUP_TO_CURVE[Group.SECP256R1]()
+            if group not in key_share_groups:
+                pass
+            elif group == Group.SECP256R1:
+                self._ec_private_key = cast(
+                    ec.EllipticCurvePrivateKey, self._generate_private_key(group)
                 )
                 key_share.append(encode_public_key(self._ec_private_key.public_key()))
-                supported_groups.append(Group.SECP256R1)
             elif group == Group.X25519:
-                self._x25519_private_key = x25519.X25519PrivateKey.generate()
+                self._x25519_private_key = cast(
+                    x25519.X25519PrivateKey, self._generate_private_key(group)
+                )
                 key_share.append(
                     encode_public_key(self._x25519_private_key.public_key())
                 )
-                supported_groups.append(Group.X25519)
             elif group == Group.X448:
-                self._x448_private_key = x448.X448PrivateKey.generate()
+                self._x448_private_key = cast(
+                    x448.X448PrivateKey, self._generate_private_key(group)
+                )
                 key_share.append(encode_public_key(self._x448_private_key.public_key()))
-                supported_groups.append(Group.X448)
             elif group == Group.GREASE:
                 key_share.append((Group.GREASE, b"\x00"))
-                supported_groups.append(Group.GREASE)
+            supported_groups.append(group)
 
         assert len(key_share), "no key share entries"
+        self._offered_key_share_groups = [entry[0] for entry in key_share]
+
+        other_extensions = self.handshake_extensions
+        if cookie is not None:
+            other_extensions = other_extensions + [(ExtensionType.COOKIE, cookie)]
 
         # Literal IPv4 and IPv6 addresses are not permitted in
         # Server Name Indication (SNI) hostname.
@@ -1465,11 +1923,15 @@ class Context:
             signature_algorithms=self._signature_algorithms,
             supported_groups=supported_groups,
             supported_versions=self._supported_versions,
-            other_extensions=self.handshake_extensions,
+            other_extensions=other_extensions,
         )
 
-        # PSK
-        if self.session_ticket and self.session_ticket.is_valid:
+        # PSK, which is not offered again after a HelloRetryRequest
+        if (
+            self.session_ticket
+            and self.session_ticket.is_valid
+            and self._hello_retry_transcript is None
+        ):
             self._key_schedule_psk = KeySchedule(self.session_ticket.cipher_suite)
             self._key_schedule_psk.extract(self.session_ticket.resumption_secret)
             binder_key = self._key_schedule_psk.derive_secret(b"res binder")
@@ -1508,8 +1970,9 @@ class Context:
                     early_key,
                 )
 
-        self._key_schedule_proxy = KeyScheduleProxy(self._cipher_suites)
-        self._key_schedule_proxy.extract(None)
+        if self._hello_retry_transcript is None:
+            self._key_schedule_proxy = KeyScheduleProxy(self._cipher_suites)
+            self._key_schedule_proxy.extract(None)
 
         with push_message(self._key_schedule_proxy, output_buf):
             push_client_hello(output_buf, hello)
@@ -1527,6 +1990,21 @@ class Context:
         assert peer_hello.compression_method in self._legacy_compression_methods
         assert peer_hello.supported_version in self._supported_versions
 
+        if peer_hello.random == HELLO_RETRY_REQUEST_RANDOM:
+            self._client_handle_hello_retry_request(
+                peer_hello, cipher_suite, input_buf, output_buf
+            )
+            return
+
+        # the server must pick a group we sent a key share for
+        if (
+            peer_hello.key_share is None
+            or peer_hello.key_share[0] not in self._offered_key_share_groups
+        ):
+            raise AlertIllegalParameter("ServerHello has an unexpected key share")
+        if self.key_share_cache is not None and self._server_name is not None:
+            self.key_share_cache.set(self._server_name, peer_hello.key_share[0])
+
         # select key schedule
         if peer_hello.pre_shared_key is not None:
             if (
@@ -1538,7 +2016,12 @@ class Context:
             self.key_schedule = self._key_schedule_psk
             self._session_resumed = True
         else:
-            self.key_schedule = self._key_schedule_proxy.select(cipher_suite)
+            try:
+                self.key_schedule = self._key_schedule_proxy.select(cipher_suite)
+            except KeyError:
+                raise AlertIllegalParameter(
+                    "ServerHello cipher suite differs from HelloRetryRequest"
+                )
         self._key_schedule_psk = None
         self._key_schedule_proxy = None
 
@@ -1573,6 +2056,43 @@ class Context:
 
         self._set_state(State.CLIENT_EXPECT_ENCRYPTED_EXTENSIONS)
 
+    def _client_handle_hello_retry_request(
+        self,
+        peer_hello: ServerHello,
+        cipher_suite: CipherSuite,
+        input_buf: Buffer,
+        output_buf: Buffer,
+    ) -> None:
+        # only one HelloRetryRequest is allowed, for a group we did not send
+        if self._hello_retry_transcript is not None:
+            raise AlertUnexpectedMessage
+        if (
+            peer_hello.key_share is None
+            or peer_hello.key_share[0] not in self._supported_groups
+            or peer_hello.key_share[0] in self._offered_key_share_groups
+        ):
+            raise AlertIllegalParameter("HelloRetryRequest has an unexpected group")
+
+        # the first ClientHello is replaced by its hash in the transcript
+        key_schedule = self._key_schedule_proxy.select(cipher_suite)
+        self._hello_retry_transcript = (
+            message_hash(key_schedule.hash.copy().finalize()) + input_buf.data
+        )
+        self._key_schedule_proxy = KeyScheduleProxy([cipher_suite])
+        self._key_schedule_proxy.extract(None)
+        self._key_schedule_proxy.update_hash(self._hello_retry_transcript)
+        self._key_schedule_psk = None
+
+        # the cookie, if any, is sent back verbatim
+        cookie: Optional[bytes] = None
+        for extension_type, extension_value in peer_hello.other_extensions:
+            if extension_type == ExtensionType.COOKIE:
+                cookie = extension_value
+
+        self._client_send_hello(
+            output_buf, key_share_groups=[peer_hello.key_share[0]], cookie=cookie
+        )
+
     def _client_handle_encrypted_extensions(self, input_buf: Buffer) -> None:
         encrypted_extensions = pull_encrypted_extensions(input_buf)
 
@@ -1726,8 +2246,8 @@ class Context:
         # create a new session ticket
         if (
             self.new_session_ticket_cb is not None
-            and self._psk_key_exchange_mode is not None
-        ):
+            or self.session_ticket_sealer is not None
+        ) and self._psk_key_exchange_mode is not None:
             self._new_session_ticket = NewSessionTicket(
                 ticket_lifetime=86400,
                 ticket_age_add=struct.unpack("I", os.urandom(4))[0],
@@ -1735,18 +2255,34 @@ class Context:
                 ticket=os.urandom(64),
                 max_early_data_size=self._max_early_data,
             )
+            if self.session_ticket_sealer is not None:
+                self._new_session_ticket.ticket_lifetime = min(
+                    86400, self.session_ticket_sealer.lifetime
+                )
+            ticket = self._build_session_ticket(
+                self._new_session_ticket, self.handshake_extensions
+            )
+
+            # seal the resumption state into the ticket
+            if self.session_ticket_sealer is not None:
+                ticket.ticket = self._new_session_ticket.ticket = (
+                    self.session_ticket_sealer.seal(ticket)
+                )
 
             # send message
             push_new_session_ticket(onertt_buf, self._new_session_ticket)
 
             # notify application
-            ticket = self._build_session_ticket(
-                self._new_session_ticket, self.handshake_extensions
-            )
-            self.new_session_ticket_cb(ticket)
+            if self.new_session_ticket_cb is not None:
+                self.new_session_ticket_cb(ticket)
 
         self._set_state(State.SERVER_EXPECT_FINISHED)
 
+    def _generate_private_key(self, group: int) -> EphemeralPrivateKey:
+        if self.ephemeral_key_pool is not None:
+            return self.ephemeral_key_pool.get(group)
+        return generate_private_key(group)
+
     def _server_handle_hello(
         self,
         input_buf: Buffer,
@@ -1781,6 +2317,43 @@ class Context:
             AlertProtocolVersion("No supported protocol version"),
         )
 
+        # find a key share we can use, otherwise ask for one
+        peer_key_share: Optional[KeyShareEntry] = None
+        peer_public_key = None
+        for key_share in peer_hello.key_share:
+            peer_public_key = decode_public_key(key_share)
+            if peer_public_key is not None:
+                peer_key_share = key_share
+                break
+        if self._hello_retry_request is not None:
+            if (
+                cipher_suite != self._hello_retry_request.cipher_suite
+                or peer_key_share is None
+                or peer_key_share[0] != self._hello_retry_request.key_share[0]
+            ):
+                raise AlertIllegalParameter(
+                    "ClientHello does not match HelloRetryRequest"
+                )
+        elif peer_key_share is None:
+            group = negotiate(
+                [g for g in self._supported_groups if g != Group.GREASE],
+                peer_hello.supported_groups,
+                AlertHandshakeFailure("No supported groups"),
+            )
+            self._server_send_hello_retry_request(
+                ServerHello(
+                    random=HELLO_RETRY_REQUEST_RANDOM,
+                    legacy_session_id=peer_hello.legacy_session_id,
+                    cipher_suite=cipher_suite,
+                    compression_method=compression_method,
+                    key_share=(group, b""),
+                    supported_version=supported_version,
+                ),
+                input_buf,
+                initial_buf,
+            )
+            return
+
         # negotiate ALPN
         if self._alpn_protocols is not None:
             self.alpn_negotiated = negotiate(
@@ -1799,15 +2372,21 @@ class Context:
         # select key schedule
         pre_shared_key = None
         if (
-            self.get_session_ticket_cb is not None
+            (
+                self.get_session_ticket_cb is not None
+                or self.session_ticket_sealer is not None
+            )
             and psk_key_exchange_mode is not None
             and peer_hello.pre_shared_key is not None
             and len(peer_hello.pre_shared_key.identities) == 1
             and len(peer_hello.pre_shared_key.binders) == 1
         ):
-            # ask application to find session ticket
+            # unseal session ticket or ask application to find it
             identity = peer_hello.pre_shared_key.identities[0]
-            session_ticket = self.get_session_ticket_cb(identity[0])
+            if self.session_ticket_sealer is not None:
+                session_ticket = self.session_ticket_sealer.unseal(identity[0])
+            else:
+                session_ticket = self.get_session_ticket_cb(identity[0])
 
             # validate session ticket
             if (
@@ -1826,6 +2405,8 @@ class Context:
                     hash_offset + 3, hash_offset + 3 + binder_length
                 )
 
+                if self._hello_retry_transcript is not None:
+                    self.key_schedule.update_hash(self._hello_retry_transcript)
                 self.key_schedule.update_hash(input_buf.data_slice(0, hash_offset))
                 expected_binder = self.key_schedule.finished_verify_data(binder_key)
 
@@ -1837,8 +2418,18 @@ class Context:
                 )
                 self._session_resumed = True
 
-                # calculate early data key
-                if peer_hello.early_data:
+                # calculate early data key, which is refused after a retry
+                # or when it may be a replay
+                if (
+                    peer_hello.early_data
+                    and self._hello_retry_request is None
+                    and (
+                        self.session_ticket_sealer is None
+                        or self.session_ticket_sealer.accept_early_data(
+                            session_ticket, identity[1], binder
+                        )
+                    )
+                ):
                     early_key = self.key_schedule.derive_secret(b"c e traffic")
                     self.early_data_accepted = True
                     self.update_traffic_key_cb(
@@ -1854,6 +2445,8 @@ class Context:
         if pre_shared_key is None:
             self.key_schedule = KeySchedule(cipher_suite)
             self.key_schedule.extract(None)
+            if self._hello_retry_transcript is not None:
+                self.key_schedule.update_hash(self._hello_retry_transcript)
             self.key_schedule.update_hash(input_buf.data)
 
         # perform key exchange
@@ -1861,25 +2454,25 @@ class Context:
             ec.EllipticCurvePublicKey, x25519.X25519PublicKey, x448.X448PublicKey
         ]
         shared_key: Optional[bytes] = None
-        for key_share in peer_hello.key_share:
-            peer_public_key = decode_public_key(key_share)
-            if isinstance(peer_public_key, x25519.X25519PublicKey):
-                self._x25519_private_key = x25519.X25519PrivateKey.generate()
-                public_key = self._x25519_private_key.public_key()
-                shared_key = self._x25519_private_key.exchange(peer_public_key)
-                break
-            elif isinstance(peer_public_key, x448.X448PublicKey):
-                self._x448_private_key = x448.X448PrivateKey.generate()
-                public_key = self._x448_private_key.public_key()
-                shared_key = self._x448_private_key.exchange(peer_public_key)
-                break
-            elif isinstance(peer_public_key, ec.EllipticCurvePublicKey):
-                self._ec_private_key = ec.generate_private_key(
-                    GROUP_TO_CURVE[key_share[0]]()
-                )
-                public_key = self._ec_private_key.public_key()
-                shared_key = self._ec_private_key.exchange(ec.ECDH(), peer_public_key)
-                break
+        if isinstance(peer_public_key, x25519.X25519PublicKey):
+            self._x25519_private_key = cast(
+                x25519.X25519PrivateKey, self._generate_private_key(Group.X25519)
+            )
+            public_key = self._x25519_private_key.public_key()
+            shared_key = self._x25519_private_key.exchange(peer_public_key)
+        elif isinstance(peer_public_key, x448.X448PublicKey):
+            self._x448_private_key = cast(
+                x448.X448PrivateKey, self._generate_private_key(Group.X448)
+            )
+            public_key = self._x448_private_key.public_key()
+            shared_key = self._x448_private_key.exchange(peer_public_key)
+        elif isinstance(peer_public_key, ec.EllipticCurvePublicKey):
+            self._ec_private_key = cast(
+                ec.EllipticCurvePrivateKey,
+                self._generate_private_key(peer_key_share[0]),
+            )
+            public_key = self._ec_private_key.public_key()
+            shared_key = self._ec_private_key.exchange(ec.ECDH(), peer_public_key)
         assert shared_key is not None
 
         # send hello
@@ -1914,6 +2507,7 @@ class Context:
                 ),
             )
 
+        self._psk_key_exchange_mode = psk_key_exchange_mode
         if pre_shared_key is None:
             # send certificate request
             if self._request_client_certificate:
@@ -1928,30 +2522,56 @@ class Context:
 
             # send certificate
             with push_message(self.key_schedule, handshake_buf):
-                push_certificate(
-                    handshake_buf,
-                    Certificate(
-                        request_context=b"",
-                        certificates=[
-                            (x.public_bytes(Encoding.DER), b"")
-                            for x in [self.certificate] + self.certificate_chain
-                        ],
-                    ),
-                )
+                if self.server_credentials is not None:
+                    handshake_buf.push_bytes(
+                        self.server_credentials.certificate_message
+                    )
+                else:
+                    push_certificate(
+                        handshake_buf,
+                        Certificate(
+                            request_context=b"",
+                            certificates=[
+                                (x.public_bytes(Encoding.DER), b"")
+                                for x in [self.certificate] + self.certificate_chain
+                            ],
+                        ),
+                    )
 
-            # send certificate verify
-            signature = self.certificate_private_key.sign(
-                self.key_schedule.certificate_verify_data(SERVER_CONTEXT_STRING),
-                *signature_algorithm_params(signature_algorithm),
+            # send certificate verify, possibly waiting for the signer
+            verify_data = self.key_schedule.certificate_verify_data(
+                SERVER_CONTEXT_STRING
             )
-            with push_message(self.key_schedule, handshake_buf):
-                push_certificate_verify(
-                    handshake_buf,
-                    CertificateVerify(
-                        algorithm=signature_algorithm, signature=signature
-                    ),
+            if self.certificate_signer is not None:
+                self._pending_signature = (
+                    self.certificate_signer(verify_data, signature_algorithm),
+                    signature_algorithm,
                 )
+                self._set_state(State.SERVER_EXPECT_SIGNATURE)
+                return
+            if self.server_credentials is not None:
+                private_key = self.server_credentials.private_key
+            else:
+                private_key = self.certificate_private_key
+            signature = private_key.sign(
+                verify_data, *signature_algorithm_params(signature_algorithm)
+            )
+            self._server_send_certificate_verify(
+                handshake_buf, signature_algorithm, signature
+            )
 
+        self._server_send_finished(handshake_buf, onertt_buf)
+
+    def _server_send_certificate_verify(
+        self, output_buf: Buffer, signature_algorithm: int, signature: bytes
+    ) -> None:
+        with push_message(self.key_schedule, output_buf):
+            push_certificate_verify(
+                output_buf,
+                CertificateVerify(algorithm=signature_algorithm, signature=signature),
+            )
+
+    def _server_send_finished(self, handshake_buf: Buffer, onertt_buf: Buffer) -> None:
         # send finished
         with push_message(self.key_schedule, handshake_buf):
             push_finished(
@@ -1969,7 +2589,6 @@ class Context:
         )
         self._next_dec_key = self.key_schedule.derive_secret(b"c ap traffic")
 
-        self._psk_key_exchange_mode = psk_key_exchange_mode
         if self._request_client_certificate:
             self._set_state(State.SERVER_EXPECT_CERTIFICATE)
         else:
@@ -2015,6 +2634,20 @@ class Context:
 
         self._set_state(State.SERVER_POST_HANDSHAKE)
 
+    def _server_send_hello_retry_request(
+        self, hello: ServerHello, input_buf: Buffer, output_buf: Buffer
+    ) -> None:
+        # the ClientHello is replaced by its hash in the transcript
+        digest = hashes.Hash(cipher_suite_hash(CipherSuite(hello.cipher_suite)))
+        digest.update(input_buf.data)
+
+        start = output_buf.tell()
+        push_server_hello(output_buf, hello)
+        self._hello_retry_request = hello
+        self._hello_retry_transcript = message_hash(
+            digest.finalize()
+        ) + output_buf.data_slice(start, output_buf.tell())
+
     def _setup_traffic_protection(
         self, direction: Direction, epoch: Epoch, label: bytes
     ) -> None:
@@ -2044,19 +2677,6 @@ class Context:
         self.state = state
 
     def _signature_algorithms_for_private_key(self) -> List[SignatureAlgorithm]:
-        signature_algorithms: List[SignatureAlgorithm] = []
-        if isinstance(self.certificate_private_key, rsa.RSAPrivateKey):
-            signature_algorithms = [
-                SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
-                SignatureAlgorithm.RSA_PKCS1_SHA256,
-                SignatureAlgorithm.RSA_PKCS1_SHA1,
-            ]
-        elif isinstance(
-            self.certificate_private_key, ec.EllipticCurvePrivateKey
-        ) and isinstance(self.certificate_private_key.curve, ec.SECP256R1):
-            signature_algorithms = [SignatureAlgorithm.ECDSA_SECP256R1_SHA256]
-        elif isinstance(self.certificate_private_key, ed25519.Ed25519PrivateKey):
-            signature_algorithms = [SignatureAlgorithm.ED25519]
-        elif isinstance(self.certificate_private_key, ed448.Ed448PrivateKey):
-            signature_algorithms = [SignatureAlgorithm.ED448]
-        return signature_algorithms
+        if self.server_credentials is not None:
+            return self.server_credentials.signature_algorithms
+        return signature_algorithms_for_private_key(self.certificate_private_key)
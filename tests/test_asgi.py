@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import functools
+from unittest import TestCase
+
+from aioquic.asgi import HttpServerProtocol, serve
+from aioquic.asgi.protocol import MessageQueue
+from aioquic.asyncio.client import connect
+from aioquic.asyncio.protocol import QuicConnectionProtocol
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import DataReceived, HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+
+from .utils import SERVER_CACERTFILE, SERVER_CERTFILE, SERVER_KEYFILE, asynctest
+
+
+async def echo_app(scope, receive, send):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-length", str(len(body)).encode())],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class H3Client(QuicConnectionProtocol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._responses = {}
+        self._waiters = {}
+
+    async def request(self, method, path, body=b""):
+        stream_id = self._quic.get_next_available_stream_id()
+        self._http.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b":method", method.encode()),
+                (b":scheme", b"https"),
+                (b":authority", b"localhost"),
+                (b":path", path.encode()),
+            ],
+            end_stream=not body,
+        )
+        if body:
+            self._http.send_data(stream_id=stream_id, data=body, end_stream=True)
+        waiter = self._loop.create_future()
+        self._responses[stream_id] = []
+        self._waiters[stream_id] = waiter
+        self.transmit()
+        return await asyncio.shield(waiter)
+
+    def quic_event_received(self, event):
+        for http_event in self._http.handle_event(event):
+            if isinstance(http_event, (DataReceived, HeadersReceived)):
+                events = self._responses[http_event.stream_id]
+                events.append(http_event)
+                if http_event.stream_ended:
+                    self._waiters.pop(http_event.stream_id).set_result(events)
+
+
+class AsgiTest(TestCase):
+    @contextlib.asynccontextmanager
+    async def run_server(self, application, **kwargs):
+        configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host="::",
+            port=0,
+            application=application,
+            configuration=configuration,
+            **kwargs,
+        )
+        try:
+            yield server
+        finally:
+            server.close()
+
+    @contextlib.asynccontextmanager
+    async def run_client(self, server):
+        configuration = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=True)
+        configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+        async with connect(
+            "localhost",
+            server._transport.get_extra_info("sockname")[1],
+            configuration=configuration,
+            create_protocol=H3Client,
+        ) as client:
+            yield client
+
+    @asynctest
+    async def test_request(self):
+        async with self.run_server(echo_app) as server:
+            async with self.run_client(server) as client:
+                events = await client.request("GET", "/")
+
+        self.assertIn((b":status", b"200"), events[0].headers)
+        self.assertIn((b"content-length", b"0"), events[0].headers)
+        self.assertTrue(events[-1].stream_ended)
+
+    @asynctest
+    async def test_request_with_body(self):
+        body = b"Z" * 100000
+
+        async with self.run_server(echo_app) as server:
+            async with self.run_client(server) as client:
+                events = await client.request("POST", "/", body=body)
+
+        self.assertEqual(
+            b"".join(e.data for e in events if isinstance(e, DataReceived)), body
+        )
+
+    @asynctest
+    async def test_request_with_body_and_batch_events(self):
+        body = b"Z" * 100000
+
+        async with self.run_server(
+            echo_app,
+            create_protocol=functools.partial(HttpServerProtocol, batch_events=True),
+        ) as server:
+            async with self.run_client(server) as client:
+                events = await client.request("POST", "/", body=body)
+
+        self.assertEqual(
+            b"".join(e.data for e in events if isinstance(e, DataReceived)), body
+        )
+
+    @asynctest
+    async def test_request_with_body_and_slow_application(self):
+        body = b"Z" * 3000000
+        application_ready = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await application_ready.wait()
+            await echo_app(scope, receive, send)
+
+        async with self.run_server(slow_app, max_queue_size=4096) as server:
+            async with self.run_client(server) as client:
+                request = asyncio.ensure_future(client.request("POST", "/", body=body))
+                await asyncio.sleep(0.5)
+
+                # the peer cannot send beyond the initial flow control limit
+                protocol = list(server._protocols.values())[0]
+                self.assertIsInstance(protocol, HttpServerProtocol)
+                stream = protocol._quic._streams[0]
+                self.assertTrue(stream.receiver.is_paused)
+                self.assertEqual(stream.max_stream_data_local, 1048576)
+                self.assertEqual(stream.receiver.highest_offset, 1048576)
+                self.assertFalse(request.done())
+
+                # once the application reads, the transfer completes
+                application_ready.set()
+                events = await request
+
+        self.assertEqual(
+            b"".join(e.data for e in events if isinstance(e, DataReceived)), body
+        )
+
+
+class MessageQueueTest(TestCase):
+    @asynctest
+    async def test_pause_and_resume(self):
+        calls = []
+        queue = MessageQueue(
+            max_size=10,
+            pause_reading=lambda stream_id: calls.append(("pause", stream_id)),
+            resume_reading=lambda stream_id: calls.append(("resume", stream_id)),
+        )
+
+        queue.put_nowait({"type": "a"}, stream_id=0, size=6)
+        queue.put_nowait({"type": "b"}, stream_id=4, size=6)
+        self.assertEqual(calls, [])
+
+        # stream 0 reaches the limit
+        queue.put_nowait({"type": "c"}, stream_id=0, size=4)
+        self.assertEqual(calls, [("pause", 0)])
+        self.assertEqual(queue.buffered_size(0), 10)
+
+        # more data does not pause again
+        queue.put_nowait({"type": "d"}, stream_id=0, size=1)
+        self.assertEqual(calls, [("pause", 0)])
+
+        # consuming the first message resumes stream 0
+        self.assertEqual(await queue.get(), {"type": "a"})
+        self.assertEqual(calls, [("pause", 0), ("resume", 0)])
+        self.assertEqual(queue.buffered_size(0), 5)
+
+        self.assertEqual(await queue.get(), {"type": "b"})
+        self.assertEqual(await queue.get(), {"type": "c"})
+        self.assertEqual(await queue.get(), {"type": "d"})
+        self.assertEqual(calls, [("pause", 0), ("resume", 0)])
+        self.assertEqual(queue.buffered_size(0), 0)
+        self.assertEqual(queue.buffered_size(4), 0)
@@ -1,16 +1,24 @@
 import asyncio
 import binascii
 import contextlib
+import dataclasses
+import functools
 import random
 import socket
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, skipIf
 from unittest.mock import patch
 
 from aioquic.asyncio.client import connect
+from aioquic.asyncio.pool import QuicConnectionPool
 from aioquic.asyncio.protocol import QuicConnectionProtocol
-from aioquic.asyncio.server import serve
+from aioquic.asyncio.server import serve, serve_metrics
 from aioquic.quic.configuration import QuicConfiguration
 from aioquic.quic.logger import QuicLogger
+from aioquic.quic.metrics import DROP_RATE_LIMITED
+from aioquic.quic.rate_limit import QuicRateLimiter
+from aioquic.quic.retry import QuicAdaptiveRetry, QuicNewTokenHandler
+from aioquic.tls import ExecutorSigner
 from cryptography.hazmat.primitives import serialization
 
 from .utils import (
@@ -219,6 +227,36 @@ class HighLevelTest(TestCase):
             response = await self.run_client(port=server_port, request=data)
             self.assertEqual(response, data)
 
+    @asynctest
+    async def test_connect_and_serve_with_batch_events(self):
+        batches = []
+
+        class BatchProtocol(QuicConnectionProtocol):
+            def quic_events_received(self, quic_events):
+                batches.append(quic_events)
+                super().quic_events_received(quic_events)
+
+        data = b"Z" * 2097152
+        create_protocol = functools.partial(BatchProtocol, batch_events=True)
+        async with self.run_server(create_protocol=create_protocol) as server_port:
+            response = await self.run_client(
+                port=server_port, request=data, create_protocol=create_protocol
+            )
+            self.assertEqual(response, data)
+        self.assertTrue(any(len(batch) > 1 for batch in batches))
+
+    @asynctest
+    async def test_connect_and_serve_with_certificate_signer(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            configuration.certificate_signer = ExecutorSigner(
+                configuration.private_key, executor
+            )
+            async with self.run_server(configuration=configuration) as server_port:
+                response = await self.run_client(port=server_port)
+                self.assertEqual(response, b"gnip")
+
     @asynctest
     async def test_connect_and_serve_without_client_configuration(self):
         async with self.run_server() as server_port:
@@ -296,12 +334,125 @@ class HighLevelTest(TestCase):
             )
             self.assertEqual(response, b"gnip")
 
+    async def _test_connect_and_serve_with_early_data(self, accepted):
+        client_ticket = None
+        store = SessionTicketStore()
+
+        def save_ticket(t):
+            nonlocal client_ticket
+            client_ticket = t
+
+        async with self.run_server(
+            session_ticket_fetcher=store.pop if accepted else lambda label: None,
+            session_ticket_handler=store.add,
+        ) as server_port:
+            # first request
+            await self.run_client(port=server_port, session_ticket_handler=save_ticket)
+
+            # second request, sent as early data
+            configuration = QuicConfiguration(
+                is_client=True, session_ticket=client_ticket
+            )
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host,
+                server_port,
+                configuration=configuration,
+                wait_connected=False,
+            ) as client:
+                self.assertTrue(client._quic.early_data_available)
+                self.assertIsNone(client.early_data_accepted)
+
+                reader, writer = await client.create_stream()
+                writer.write(b"ping")
+                writer.write_eof()
+                self.assertEqual(await reader.read(), b"gnip")
+
+                await asyncio.gather(client.wait_connected(), client.wait_connected())
+                self.assertEqual(client.early_data_accepted, accepted)
+
+    @asynctest
+    async def test_connect_and_serve_with_early_data(self):
+        await self._test_connect_and_serve_with_early_data(accepted=True)
+
+    @asynctest
+    async def test_connect_and_serve_with_early_data_rejected(self):
+        await self._test_connect_and_serve_with_early_data(accepted=False)
+
     @asynctest
     async def test_connect_and_serve_with_retry(self):
         async with self.run_server(retry=True) as server_port:
             response = await self.run_client(port=server_port)
             self.assertEqual(response, b"gnip")
 
+    @asynctest
+    async def test_connect_and_serve_with_new_token(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host=self.server_host,
+            port=0,
+            configuration=configuration,
+            new_token_handler=QuicNewTokenHandler(),
+            retry=True,
+            stream_handler=handle_stream,
+        )
+        server_port = server._transport.get_extra_info("sockname")[1]
+        try:
+            # the first connection is validated with a retry
+            new_tokens = []
+            response = await self.run_client(
+                port=server_port, token_handler=new_tokens.append
+            )
+            self.assertEqual(response, b"gnip")
+            self.assertEqual(len(new_tokens), 1)
+            self.assertEqual(server.metrics.retries_sent, 1)
+
+            # the next connection presents its token instead
+            response = await self.run_client(
+                configuration=QuicConfiguration(is_client=True, token=new_tokens[0]),
+                port=server_port,
+            )
+            self.assertEqual(response, b"gnip")
+            self.assertEqual(server.metrics.retries_sent, 1)
+        finally:
+            server.close()
+
+    @asynctest
+    async def test_connect_and_serve_with_adaptive_retry(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        adaptive_retry = QuicAdaptiveRetry(max_half_open=1)
+        server = await serve(
+            host=self.server_host,
+            port=0,
+            adaptive_retry=adaptive_retry,
+            configuration=configuration,
+            stream_handler=handle_stream,
+        )
+        server_port = server._transport.get_extra_info("sockname")[1]
+        try:
+            # no connection is half-open, no retry is sent
+            response = await self.run_client(port=server_port)
+            self.assertEqual(response, b"gnip")
+            self.assertEqual(server.metrics.retries_sent, 0)
+            self.assertFalse(adaptive_retry.active)
+
+            # a connection is half-open, a retry is sent
+            server._half_open.add(None)
+            response = await self.run_client(port=server_port)
+            self.assertEqual(response, b"gnip")
+            self.assertEqual(server.metrics.retries_sent, 1)
+            self.assertTrue(adaptive_retry.active)
+
+            values = dict(
+                (name, value) for name, _, _, value in server.metrics.collect()
+            )
+            self.assertEqual(values["retry_active"], 1)
+            self.assertEqual(values["retry_max_half_open"], 1)
+        finally:
+            server.close()
+
     @asynctest
     async def test_connect_and_serve_with_retry_bad_original_destination_connection_id(
         self,
@@ -408,6 +559,157 @@ class HighLevelTest(TestCase):
                 client.change_connection_id()
                 await client.ping()
 
+    def create_pool(self, **kwargs):
+        configuration = QuicConfiguration(is_client=True)
+        configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+        return QuicConnectionPool(configuration=configuration, **kwargs)
+
+    async def pool_request(self, client, request=b"ping"):
+        reader, writer = await client.create_stream()
+        writer.write(request)
+        writer.write_eof()
+        return await reader.read()
+
+    @asynctest
+    async def test_connection_pool(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool() as pool:
+                async with pool.connection(self.server_host, server_port) as client1:
+                    self.assertEqual(await self.pool_request(client1), b"gnip")
+                async with pool.connection(self.server_host, server_port) as client2:
+                    self.assertEqual(await self.pool_request(client2), b"gnip")
+
+                # the connection was reused
+                self.assertIs(client2, client1)
+                self.assertEqual(len(pool), 1)
+                self.assertIn((self.server_host, server_port), pool._dns_cache)
+
+            # closing the pool closes the connections
+            self.assertEqual(len(pool), 0)
+            await asyncio.wait_for(client1.wait_closed(), 1)
+
+    @asynctest
+    async def test_connection_pool_saturated(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool(max_streams_per_connection=1) as pool:
+                async with pool.connection(self.server_host, server_port) as client1:
+                    async with pool.connection(
+                        self.server_host, server_port
+                    ) as client2:
+                        self.assertIsNot(client2, client1)
+                        self.assertEqual(
+                            await asyncio.gather(
+                                self.pool_request(client1),
+                                self.pool_request(client2),
+                            ),
+                            [b"gnip", b"gnip"],
+                        )
+                self.assertEqual(len(pool), 2)
+
+    @asynctest
+    async def test_connection_pool_saturated_by_stream_limit(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool() as pool:
+                async with pool.connection(self.server_host, server_port) as client1:
+                    # the server does not allow opening any more streams
+                    client1._quic._remote_max_streams_bidi = 0
+                async with pool.connection(self.server_host, server_port) as client2:
+                    self.assertIsNot(client2, client1)
+
+    @asynctest
+    async def test_connection_pool_saturated_by_pending_leases(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool() as pool:
+                async with pool.connection(self.server_host, server_port) as client1:
+                    # the server allows a single stream, which this lease will use
+                    client1._quic._remote_max_streams_bidi = (
+                        client1.get_next_available_stream_id() // 4 + 1
+                    )
+                    self.assertEqual(client1.get_available_stream_count(), 1)
+                    async with pool.connection(
+                        self.server_host, server_port
+                    ) as client2:
+                        self.assertIsNot(client2, client1)
+                    self.assertEqual(await self.pool_request(client1), b"gnip")
+                self.assertEqual(client1.get_available_stream_count(), 0)
+                self.assertEqual(len(pool), 2)
+
+    @asynctest
+    async def test_connection_pool_equal_configurations(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool() as pool:
+                configuration = QuicConfiguration(is_client=True)
+                configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+                async with pool.connection(
+                    self.server_host, server_port, configuration=configuration
+                ) as client1:
+                    pass
+                async with pool.connection(
+                    self.server_host,
+                    server_port,
+                    configuration=dataclasses.replace(configuration),
+                ) as client2:
+                    self.assertIs(client2, client1)
+                self.assertEqual(len(pool), 1)
+
+                # a different configuration gets its own connection
+                async with pool.connection(
+                    self.server_host,
+                    server_port,
+                    configuration=dataclasses.replace(configuration, idle_timeout=30),
+                ) as client3:
+                    self.assertIsNot(client3, client1)
+                self.assertEqual(len(pool), 2)
+                self.assertFalse(client1.is_closed)
+            await asyncio.wait_for(client1.wait_closed(), 1)
+            self.assertTrue(client1.is_closed)
+
+    @asynctest
+    async def test_connection_pool_wait(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool(
+                max_connections_per_origin=1, max_streams_per_connection=1
+            ) as pool:
+
+                async def request():
+                    async with pool.connection(self.server_host, server_port) as client:
+                        return client, await self.pool_request(client)
+
+                results = await asyncio.gather(request(), request(), request())
+
+                # requests waited for the connection to be released
+                self.assertEqual([response for _, response in results], [b"gnip"] * 3)
+                self.assertEqual(len(set(client for client, _ in results)), 1)
+                self.assertEqual(len(pool), 1)
+
+    @asynctest
+    async def test_connection_pool_idle_timeout(self):
+        async with self.run_server() as server_port:
+            async with self.create_pool(idle_timeout=0.2, ping_interval=None) as pool:
+                async with pool.connection(self.server_host, server_port) as client:
+                    await self.pool_request(client)
+                self.assertEqual(len(pool), 1)
+
+                # the idle connection is closed
+                await asyncio.sleep(0.5)
+                self.assertEqual(len(pool), 0)
+                await asyncio.wait_for(client.wait_closed(), 1)
+
+    @asynctest
+    async def test_connection_pool_ping(self):
+        async with self.create_pool(idle_timeout=10, ping_interval=0.2) as pool:
+            async with self.run_server() as server_port:
+                async with pool.connection(self.server_host, server_port) as client:
+                    await self.pool_request(client)
+
+                # the connection answers PINGs
+                await asyncio.sleep(0.5)
+                self.assertEqual(len(pool), 1)
+
+            # once the server is gone, the connection is discarded
+            await asyncio.sleep(1)
+            self.assertEqual(len(pool), 0)
+
     @asynctest
     async def test_key_update(self):
         async with self.run_server() as server_port:
@@ -431,6 +733,20 @@ class HighLevelTest(TestCase):
                 await client.ping()
                 await client.ping()
 
+    @asynctest
+    async def test_get_stats(self):
+        async with self.run_server() as server_port:
+            configuration = QuicConfiguration(is_client=True)
+            configuration.load_verify_locations(cafile=SERVER_CACERTFILE)
+            async with connect(
+                self.server_host, server_port, configuration=configuration
+            ) as client:
+                await client.ping()
+                stats = client.get_stats()
+                self.assertGreater(stats.bytes_sent, 0)
+                self.assertGreater(stats.packets_acked, 0)
+                self.assertIsNotNone(stats.handshake_duration)
+
     @asynctest
     async def test_ping_parallel(self):
         async with self.run_server() as server_port:
@@ -454,6 +770,96 @@ class HighLevelTest(TestCase):
         server.datagram_received(binascii.unhexlify("c00000000080"), ("1.2.3.4", 1234))
         server.close()
 
+    @asynctest
+    async def test_server_rate_limits_version_negotiation(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host=self.server_host,
+            port=0,
+            configuration=configuration,
+            rate_limiter=QuicRateLimiter(prefix_burst=2),
+        )
+        datagram = (
+            binascii.unhexlify("c01a2a3a4a08") + bytes(8) + b"\x08" + bytes(8)
+        ).ljust(1200, b"\x00")
+
+        try:
+            with patch.object(server._transport, "sendto") as mock_sendto:
+                for i in range(5):
+                    server.datagram_received(datagram, ("1.2.3.4", 1234))
+                server.datagram_received(datagram, ("1.2.4.4", 1234))
+            self.assertEqual(mock_sendto.call_count, 3)
+            self.assertEqual(server.metrics.version_negotiations_sent, 3)
+            self.assertEqual(server.metrics.datagrams_dropped[DROP_RATE_LIMITED], 3)
+        finally:
+            server.close()
+
+    @asynctest
+    async def test_server_does_not_rate_limit_by_default(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host=self.server_host,
+            port=0,
+            configuration=configuration,
+        )
+        datagram = (
+            binascii.unhexlify("c01a2a3a4a08") + bytes(8) + b"\x08" + bytes(8)
+        ).ljust(1200, b"\x00")
+
+        try:
+            self.assertIsNone(server.rate_limiter)
+            with patch.object(server._transport, "sendto") as mock_sendto:
+                for i in range(200):
+                    server.datagram_received(datagram, ("1.2.3.4", 1234))
+            self.assertEqual(mock_sendto.call_count, 200)
+            self.assertEqual(server.metrics.datagrams_dropped[DROP_RATE_LIMITED], 0)
+        finally:
+            server.close()
+
+    @asynctest
+    async def test_server_metrics(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        server = await serve(
+            host="::",
+            port=0,
+            configuration=configuration,
+            stream_handler=handle_stream,
+        )
+        server_port = server._transport.get_extra_info("sockname")[1]
+        metrics_server = await serve_metrics(server.metrics, port=0)
+        metrics_port = metrics_server.sockets[0].getsockname()[1]
+
+        async def http_get(path):
+            reader, writer = await asyncio.open_connection("127.0.0.1", metrics_port)
+            writer.write(b"GET " + path + b" HTTP/1.0\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            return response
+
+        try:
+            response = await self.run_client(port=server_port)
+            self.assertEqual(response, b"gnip")
+            server.datagram_received(binascii.unhexlify("c00000000080"), ("::1", 1234))
+
+            response = await http_get(b"/metrics")
+            self.assertTrue(response.startswith(b"HTTP/1.0 200 OK\r\n"))
+            self.assertIn(b"\naioquic_server_connections_accepted_total 1\n", response)
+            self.assertIn(b"\naioquic_server_handshakes_completed_total 1\n", response)
+            self.assertIn(
+                b"\naioquic_server_datagrams_dropped_total"
+                b'{reason="invalid_header"} 1\n',
+                response,
+            )
+
+            response = await http_get(b"/")
+            self.assertTrue(response.startswith(b"HTTP/1.0 404 Not Found\r\n"))
+        finally:
+            metrics_server.close()
+            server.close()
+
     @asynctest
     async def test_combined_key(self):
         config1 = QuicConfiguration()
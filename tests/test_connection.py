@@ -2,6 +2,7 @@ import binascii
 import contextlib
 import io
 import time
+from concurrent.futures import Future
 from typing import List, Tuple
 from unittest import TestCase, skipIf
 
@@ -21,6 +22,7 @@ from aioquic.quic.crypto import CryptoPair
 from aioquic.quic.logger import QuicLogger
 from aioquic.quic.packet import (
     PACKET_TYPE_INITIAL,
+    PACKET_TYPE_ONE_RTT,
     QuicErrorCode,
     QuicFrameType,
     QuicProtocolVersion,
@@ -34,6 +36,7 @@ from aioquic.quic.packet_builder import (
     QuicPacketBuilder,
 )
 from aioquic.quic.recovery import QuicPacketPacer
+from aioquic.quic.session_cache import SessionCache
 
 from .utils import (
     SERVER_CACERTFILE,
@@ -157,6 +160,25 @@ def disable_packet_pacing(connection):
     connection._loss._pacer = DummyPacketPacer()
 
 
+def exchange_with_mtu(client, server, mtu, now, rounds=20):
+    """
+    Exchange datagrams and fire timers for a number of rounds, dropping
+    datagrams larger than `mtu`. Returns the current time.
+    """
+    for i in range(rounds):
+        now += 0.01
+        for connection in (client, server):
+            timer = connection.get_timer()
+            if timer is not None and timer <= now:
+                connection.handle_timer(now=timer)
+        for sender, receiver in ((client, server), (server, client)):
+            from_addr = CLIENT_ADDR if sender._is_client else SERVER_ADDR
+            for data, addr in sender.datagrams_to_send(now=now):
+                if len(data) <= mtu:
+                    receiver.receive_datagram(data, from_addr, now=now)
+    return now
+
+
 def encode_transport_parameters(parameters: QuicTransportParameters) -> bytes:
     buf = Buffer(capacity=512)
     push_quic_transport_parameters(buf, parameters)
@@ -167,6 +189,19 @@ def sequence_numbers(connection_ids):
     return list(map(lambda x: x.sequence_number, connection_ids))
 
 
+def sent_frames(connection, frame_type):
+    """
+    Return the logged frames of the given type sent by `connection`.
+    """
+    return [
+        frame
+        for event in connection._quic_logger._events
+        if event["name"] == "transport:packet_sent"
+        for frame in event["data"]["frames"]
+        if frame["frame_type"] == frame_type
+    ]
+
+
 def drop(sender):
     """
     Drop datagrams from `sender`.
@@ -306,6 +341,74 @@ class QuicConnectionTest(TestCase):
             # check handshake completed
             self.check_handshake(client=client, server=server)
 
+    def test_connect_with_certificate_signer(self):
+        requests = []
+
+        def signer(data, signature_algorithm):
+            future = Future()
+            requests.append((future, data, signature_algorithm))
+            return future
+
+        with client_and_server(
+            handshake=False, server_options={"certificate_signer": signer}
+        ) as (client, server):
+            self.assertIsNone(server.pending_signature)
+
+            # the server suspends the handshake until the signature is ready
+            client.connect(SERVER_ADDR, now=time.time())
+            for i in range(3):
+                roundtrip(client, server)
+            self.assertEqual(len(requests), 1)
+            self.assertIsNotNone(server.pending_signature)
+            self.assertEqual(
+                client.tls.state, tls.State.CLIENT_EXPECT_CERTIFICATE_VERIFY
+            )
+
+            # sign and resume
+            future, data, signature_algorithm = requests[0]
+            future.set_result(
+                server.configuration.private_key.sign(
+                    data, *tls.signature_algorithm_params(signature_algorithm)
+                )
+            )
+            server.resume_handshake()
+            self.assertIsNone(server.pending_signature)
+            for i in range(3):
+                roundtrip(client, server)
+
+            # check handshake completed
+            self.check_handshake(client=client, server=server)
+
+    def test_connect_with_certificate_signer_failure(self):
+        def signer(data, signature_algorithm):
+            future = Future()
+            future.set_exception(Exception("signer unavailable"))
+            return future
+
+        with client_and_server(
+            handshake=False, server_options={"certificate_signer": signer}
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            roundtrip(client, server)
+            server.resume_handshake()
+            self.assertIsNone(server.pending_signature)
+
+            # the server closes the connection
+            roundtrip(client, server)
+            event = client.next_event()
+            self.assertEqual(type(event), events.ProtocolNegotiated)
+            client.handle_timer(client.get_timer())
+            event = client.next_event()
+            self.assertEqual(type(event), events.ConnectionTerminated)
+            self.assertEqual(
+                event.error_code,
+                QuicErrorCode.CRYPTO_ERROR + tls.AlertDescription.internal_error,
+            )
+            self.assertEqual(
+                event.reason_phrase,
+                "Signing CertificateVerify failed: signer unavailable",
+            )
+
     def test_connect_with_cipher_suite_aes128(self):
         with client_and_server(
             client_options={"cipher_suites": [tls.CipherSuite.AES_128_GCM_SHA256]}
@@ -370,6 +473,20 @@ class QuicConnectionTest(TestCase):
         items = client.datagrams_to_send(now=now)
         self.assertEqual(datagram_sizes(items), [1480])
 
+    def test_connect_with_key_share_cache(self):
+        cache = tls.KeyShareCache()
+        client_options = {"key_share_cache": cache, "server_name": "localhost"}
+
+        with client_and_server(client_options=client_options) as (client, server):
+            self.assertEqual(cache.get("localhost"), tls.Group.SECP256R1)
+
+        # the second connection sends a single key share
+        with client_and_server(client_options=client_options) as (client, server):
+            self.assertEqual(
+                client.tls._offered_key_share_groups, [tls.Group.SECP256R1]
+            )
+            self.assertEqual(client.tls.state, tls.State.CLIENT_POST_HANDSHAKE)
+
     def test_connect_with_loss_1(self):
         """
         Check connection is established even in the client's INITIAL is lost.
@@ -878,6 +995,114 @@ class QuicConnectionTest(TestCase):
             self.assertEqual(type(event), events.StreamDataReceived)
             self.assertEqual(event.data, b"hello")
 
+    def test_connect_with_0rtt_and_session_ticket_sealer(self):
+        client_ticket = None
+        sealer = tls.SessionTicketSealer()
+
+        def save_session_ticket(ticket):
+            nonlocal client_ticket
+            client_ticket = ticket
+
+        with client_and_server(
+            client_kwargs={"session_ticket_handler": save_session_ticket},
+            server_options={"session_ticket_sealer": sealer},
+        ) as (client, server):
+            pass
+
+        with client_and_server(
+            client_options={"session_ticket": client_ticket},
+            server_options={"session_ticket_sealer": sealer},
+            handshake=False,
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+
+            self.assertEqual(roundtrip(client, server), (2, 1))
+
+            event = server.next_event()
+            self.assertEqual(type(event), events.ProtocolNegotiated)
+
+            event = server.next_event()
+            self.assertEqual(type(event), events.StreamDataReceived)
+            self.assertEqual(event.data, b"hello")
+
+    def test_connect_with_0rtt_and_session_cache(self):
+        cache = SessionCache()
+        ticket_store = SessionTicketStore()
+        client_options = {"server_name": "localhost", "session_cache": cache}
+
+        with client_and_server(
+            client_options=client_options,
+            server_kwargs={"session_ticket_handler": ticket_store.add},
+        ) as (client, server):
+            pass
+        self.assertEqual(len(cache), 1)
+
+        with client_and_server(
+            client_options=client_options,
+            server_kwargs={"session_ticket_fetcher": ticket_store.pop},
+            handshake=False,
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            self.assertEqual(len(cache), 0)
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+
+            self.assertEqual(roundtrip(client, server), (2, 1))
+
+            event = server.next_event()
+            self.assertEqual(type(event), events.ProtocolNegotiated)
+
+            event = server.next_event()
+            self.assertEqual(type(event), events.StreamDataReceived)
+            self.assertEqual(event.data, b"hello")
+
+    def test_connect_with_0rtt_rejected(self):
+        client_ticket = None
+        ticket_store = SessionTicketStore()
+
+        def save_session_ticket(ticket):
+            nonlocal client_ticket
+            client_ticket = ticket
+
+        with client_and_server(
+            client_kwargs={"session_ticket_handler": save_session_ticket},
+            server_kwargs={"session_ticket_handler": ticket_store.add},
+        ) as (client, server):
+            pass
+
+        # the server has forgotten the ticket
+        with client_and_server(
+            client_options={"session_ticket": client_ticket},
+            server_kwargs={"session_ticket_fetcher": lambda label: None},
+            handshake=False,
+        ) as (client, server):
+            self.assertFalse(client.early_data_available)
+            client.connect(SERVER_ADDR, now=time.time())
+            self.assertTrue(client.early_data_available)
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello", end_stream=True)
+
+            self.assertEqual(roundtrip(client, server), (2, 2))
+            self.assertFalse(client.early_data_available)
+            event = client.next_event()
+            self.assertEqual(type(event), events.ProtocolNegotiated)
+            event = client.next_event()
+            self.assertEqual(type(event), events.HandshakeCompleted)
+            self.assertFalse(event.early_data_accepted)
+
+            # the early data is sent again right away
+            self.assertEqual(transfer(client, server), 1)
+            event = server.next_event()
+            self.assertEqual(type(event), events.ProtocolNegotiated)
+            event = server.next_event()
+            self.assertEqual(type(event), events.HandshakeCompleted)
+            event = server.next_event()
+            self.assertEqual(type(event), events.StreamDataReceived)
+            self.assertEqual(event.data, b"hello")
+            self.assertTrue(event.end_stream)
+
     def test_connect_with_0rtt_bad_max_early_data(self):
         client_ticket = None
         ticket_store = SessionTicketStore()
@@ -1014,6 +1239,44 @@ class QuicConnectionTest(TestCase):
             self.assertEqual(stream_id, 7)
             server.send_stream_data(stream_id, b"hello")
 
+    def test_consume(self):
+        with client_and_server(server_options={"manual_flow_control": True}) as (
+            client,
+            server,
+        ):
+            # client sends more than half the window
+            client.send_stream_data(0, b"Z" * 600000)
+            for i in range(10):
+                roundtrip(client, server)
+            stream = server._streams[0]
+            self.assertEqual(stream.receiver.delivered_offset, 600000)
+            self.assertEqual(stream.max_stream_data_local, 1048576)
+            self.assertEqual(server._local_max_data.value, 1048576)
+
+            # server consumes the data
+            server.consume(0, 600000)
+            roundtrip(server, client)
+            self.assertEqual(stream.max_stream_data_local, 1648576)
+            self.assertEqual(server._local_max_data.value, 1648576)
+
+            # server cannot consume more than was received
+            with self.assertRaises(ValueError) as cm:
+                server.consume(0, 1)
+            self.assertEqual(
+                str(cm.exception), "Cannot consume more data than was received"
+            )
+
+    def test_consume_without_manual_flow_control(self):
+        with client_and_server() as (client, server):
+            client.send_stream_data(0, b"hello")
+            roundtrip(client, server)
+
+            with self.assertRaises(ValueError) as cm:
+                server.consume(0, 5)
+            self.assertEqual(
+                str(cm.exception), "Received data is consumed automatically"
+            )
+
     def test_datagram_frame(self):
         with client_and_server(
             client_options={"max_datagram_frame_size": 65536},
@@ -1218,6 +1481,281 @@ class QuicConnectionTest(TestCase):
         )
         self.assertEqual(drop(client), 0)
 
+    def test_ack_ranges(self):
+        with client_and_server() as (client, server):
+            space = client._spaces[tls.Epoch.ONE_RTT]
+            now = time.time()
+
+            # every other packet from the server is lost
+            for i in range(80):
+                server.send_ping(i)
+                for data, addr in server.datagrams_to_send(now=now):
+                    if i % 2:
+                        client.receive_datagram(data, SERVER_ADDR, now=now)
+
+            # ranges which were never reported are kept
+            self.assertEqual(len(space.ack_queue), 40)
+            self.assertEqual(
+                space.ack_queue[-1].stop - 1, space.largest_received_packet
+            )
+            self.assertIsNone(space.ack_ranges)
+
+            # the ranges are encoded when sending an ACK
+            self.assertEqual(len(client.datagrams_to_send(now=now)), 1)
+            ack_ranges = space.ack_ranges
+            self.assertIsNotNone(ack_ranges)
+
+            # and encoded again only once the queue changes
+            space.ack_at = now
+            self.assertEqual(len(client.datagrams_to_send(now=now)), 1)
+            self.assertIs(space.ack_ranges, ack_ranges)
+
+            # once reported, only the most recent ranges are kept
+            server.send_ping(80)
+            for data, addr in server.datagrams_to_send(now=now):
+                client.receive_datagram(data, SERVER_ADDR, now=now)
+            self.assertIsNone(space.ack_ranges)
+            self.assertEqual(len(space.ack_queue), 32)
+
+    def test_ack_ranges_reported_before_dropped(self):
+        with client_and_server() as (client, server):
+            space = client._spaces[tls.Epoch.ONE_RTT]
+            now = time.time()
+
+            # every other packet from the server is lost, the client's ACKs too
+            for i in range(80):
+                server.send_ping(i)
+                for data, addr in server.datagrams_to_send(now=now):
+                    if i % 2:
+                        client.receive_datagram(data, SERVER_ADDR, now=now)
+                        space.ack_at = now
+                        self.assertEqual(drop(client), 1)
+
+            # the dropped ranges were all reported
+            self.assertEqual(len(space.ack_queue), 32)
+            self.assertEqual(list(space.ack_unreported), [])
+
+            # a range which was never reported is not dropped
+            space.ack_unreported.add(space.ack_queue[0].start)
+            server.send_ping(80)
+            self.assertEqual(drop(server), 1)
+            server.send_ping(81)
+            for data, addr in server.datagrams_to_send(now=now):
+                client.receive_datagram(data, SERVER_ADDR, now=now)
+            self.assertEqual(len(space.ack_queue), 33)
+
+    def test_ack_ranges_truncated(self):
+        with client_and_server() as (client, server):
+            space = client._spaces[tls.Epoch.ONE_RTT]
+            now = time.time()
+
+            # every other packet from the server is lost
+            for i in range(20):
+                server.send_ping(i)
+                for data, addr in server.datagrams_to_send(now=now):
+                    if i % 2:
+                        client.receive_datagram(data, SERVER_ADDR, now=now)
+            self.assertEqual(len(space.ack_queue), 11)
+
+            # the oldest ranges are left out when the packet is almost full
+            builder = QuicPacketBuilder(
+                host_cid=client.host_cid,
+                is_client=True,
+                max_datagram_size=SMALLEST_MAX_DATAGRAM_SIZE,
+                peer_cid=client._peer_cid.cid,
+                quic_logger=client._quic_logger,
+                version=client._version,
+            )
+            builder.start_packet(
+                PACKET_TYPE_ONE_RTT, client._cryptos[tls.Epoch.ONE_RTT]
+            )
+            buf = builder.start_frame(QuicFrameType.PADDING)
+            buf.push_bytes(bytes(builder.remaining_buffer_space - 12))
+            client._write_ack_frame(builder, space, now)
+            self.assertEqual(
+                builder.quic_logger_frames[0]["acked_ranges"],
+                [[x.start, x.stop - 1] for x in space.ack_queue[-4:]],
+            )
+
+            # once the ACK is acknowledged, the ranges left out remain
+            ack_queue = list(space.ack_queue)
+            datagrams, packets = builder.flush()
+            for handler, args in packets[0].delivery_handlers:
+                handler(QuicDeliveryState.ACKED, *args)
+            self.assertEqual(list(space.ack_queue), ack_queue[:-4])
+
+    def test_ack_frequency(self):
+        with client_and_server(
+            client_options={"ack_frequency": True},
+            server_options={"ack_frequency": True},
+        ) as (client, server):
+            self.assertEqual(client._remote_min_ack_delay, 0.001)
+            self.assertEqual(server._remote_min_ack_delay, 0.001)
+
+            # a small congestion window does not call for fewer ACKs
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertIsNone(server._ack_eliciting_threshold)
+
+            # the client asks the server to ACK less often
+            client._loss._cc.congestion_window = 64 * 8 * client._max_datagram_size
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 0))
+            self.assertEqual(server._ack_eliciting_threshold, 63)
+            self.assertEqual(server._ack_frequency_sequence_number, 0)
+            self.assertEqual(server._ack_reordering_threshold, 3)
+            self.assertGreaterEqual(server._ack_delay, 0.001)
+            self.assertLessEqual(server._ack_delay, 0.025)
+
+            # the request is only sent again when the window changes
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 0))
+            self.assertEqual(server._ack_frequency_sequence_number, 0)
+
+            client._loss._cc.congestion_window = 10 * client._max_datagram_size
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(transfer(client, server), 1)
+            self.assertEqual(server._ack_eliciting_threshold, 1)
+            self.assertEqual(server._ack_frequency_sequence_number, 1)
+
+    def test_ack_frequency_lost(self):
+        with client_and_server(
+            client_options={"ack_frequency": True},
+            server_options={"ack_frequency": True},
+        ) as (client, server):
+            client._loss._cc.congestion_window = 64 * 8 * client._max_datagram_size
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(drop(client), 1)
+            self.assertEqual(client._ack_frequency_requested, 63)
+
+            # the frame is sent again once it is declared lost
+            client._on_ack_frequency_delivery(QuicDeliveryState.LOST, 0)
+            self.assertTrue(client._ack_frequency_pending)
+            self.assertEqual(roundtrip(client, server), (1, 0))
+            self.assertEqual(server._ack_eliciting_threshold, 63)
+            self.assertEqual(server._ack_frequency_sequence_number, 1)
+
+    def test_ack_frequency_not_negotiated(self):
+        with client_and_server(client_options={"ack_frequency": True}) as (
+            client,
+            server,
+        ):
+            self.assertIsNone(client._remote_min_ack_delay)
+            self.assertIsNone(server._remote_min_ack_delay)
+
+            # no request is sent
+            client._loss._cc.congestion_window = 64 * 8 * client._max_datagram_size
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertIsNone(client._ack_frequency_requested)
+
+    def test_ack_frequency_threshold(self):
+        with client_and_server(
+            client_options={"ack_frequency": True},
+            server_options={"ack_frequency": True},
+        ) as (client, server):
+            client._handle_ack_frequency_frame(
+                client_receive_context(client),
+                QuicFrameType.ACK_FREQUENCY,
+                Buffer(data=b"\x00\x02" + encode_uint_var(10000) + b"\x00"),
+            )
+            space = client._spaces[tls.Epoch.ONE_RTT]
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            transfer(client, server)
+
+            # the first two packets are acknowledged after the delay
+            now = time.time()
+            for i in range(3):
+                server.send_stream_data(stream_id, b"hello")
+                for data, addr in server.datagrams_to_send(now=now):
+                    client.receive_datagram(data, SERVER_ADDR, now=now)
+                if i < 2:
+                    self.assertAlmostEqual(space.ack_at, now + 0.01)
+                else:
+                    self.assertEqual(space.ack_at, now)
+
+            # sending an ACK resets the count
+            client.datagrams_to_send(now=now)
+            self.assertIsNone(space.ack_at)
+            self.assertEqual(space.ack_eliciting_received, 0)
+
+    def test_ack_frequency_reordering(self):
+        with client_and_server(
+            client_options={"ack_frequency": True},
+            server_options={"ack_frequency": True},
+        ) as (client, server):
+            client._handle_ack_frequency_frame(
+                client_receive_context(client),
+                QuicFrameType.ACK_FREQUENCY,
+                Buffer(data=b"\x00\x09" + encode_uint_var(10000) + b"\x01"),
+            )
+            space = client._spaces[tls.Epoch.ONE_RTT]
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            transfer(client, server)
+
+            # the server sends two packets, which are reordered
+            now = time.time()
+            items = []
+            for i in range(2):
+                server.send_stream_data(stream_id, b"hello")
+                items += server.datagrams_to_send(now=now)
+            client.receive_datagram(items[1][0], SERVER_ADDR, now=now)
+            self.assertEqual(space.ack_at, now)
+            client.datagrams_to_send(now=now)
+            client.receive_datagram(items[0][0], SERVER_ADDR, now=now)
+            self.assertEqual(space.ack_at, now)
+
+    def test_ack_frequency_probe(self):
+        with client_and_server(
+            client_options={"ack_frequency": True},
+            server_options={"ack_frequency": True},
+        ) as (client, server):
+            # the client sends a probe, which asks for an immediate ACK
+            client._send_probe()
+            now = time.time()
+            items = client.datagrams_to_send(now=now)
+            self.assertEqual(len(items), 1)
+            server.receive_datagram(items[0][0], CLIENT_ADDR, now=now)
+            self.assertEqual(server._spaces[tls.Epoch.ONE_RTT].ack_at, now)
+
+    def test_handle_ack_frequency_frame_stale(self):
+        client = create_standalone_client(self, ack_frequency=True)
+
+        client._handle_ack_frequency_frame(
+            client_receive_context(client),
+            QuicFrameType.ACK_FREQUENCY,
+            Buffer(data=b"\x01\x03" + encode_uint_var(10000) + b"\x01"),
+        )
+        client._handle_ack_frequency_frame(
+            client_receive_context(client),
+            QuicFrameType.ACK_FREQUENCY,
+            Buffer(data=b"\x00\x07" + encode_uint_var(20000) + b"\x00"),
+        )
+        self.assertEqual(client._ack_delay, 0.01)
+        self.assertEqual(client._ack_eliciting_threshold, 3)
+        self.assertEqual(client._ack_reordering_threshold, 1)
+
+    def test_handle_ack_frequency_frame_too_small_delay(self):
+        client = create_standalone_client(self, ack_frequency=True)
+
+        with self.assertRaises(QuicConnectionError) as cm:
+            client._handle_ack_frequency_frame(
+                client_receive_context(client),
+                QuicFrameType.ACK_FREQUENCY,
+                Buffer(data=b"\x00\x01" + encode_uint_var(999) + b"\x01"),
+            )
+        self.assertEqual(cm.exception.error_code, QuicErrorCode.PROTOCOL_VIOLATION)
+        self.assertEqual(cm.exception.frame_type, QuicFrameType.ACK_FREQUENCY)
+        self.assertEqual(
+            cm.exception.reason_phrase,
+            "Requested max_ack_delay is lower than min_ack_delay",
+        )
+
     def test_handle_ack_frame_ecn(self):
         client = create_standalone_client(self)
 
@@ -1662,6 +2200,56 @@ class QuicConnectionTest(TestCase):
 
         self.assertEqual(new_token, binascii.unhexlify("0102030405060708"))
 
+    def test_handle_new_token_frame_with_session_cache(self):
+        cache = SessionCache()
+
+        with client_and_server(
+            client_options={"server_name": "localhost", "session_cache": cache}
+        ) as (client, server):
+            # client receives NEW_TOKEN
+            client._handle_new_token_frame(
+                client_receive_context(client),
+                QuicFrameType.NEW_TOKEN,
+                Buffer(data=binascii.unhexlify("080102030405060708")),
+            )
+
+        # the next connection uses the token
+        client = QuicConnection(
+            configuration=QuicConfiguration(
+                is_client=True, server_name="localhost", session_cache=cache
+            )
+        )
+        self.assertEqual(client._peer_token, binascii.unhexlify("0102030405060708"))
+        self.assertEqual(cache.pop_token("localhost"), b"")
+
+    def test_new_token(self):
+        new_tokens = []
+
+        with client_and_server(
+            client_kwargs={"token_handler": new_tokens.append},
+            server_kwargs={"token_issuer": lambda addr: addr[0].encode()},
+        ) as (client, server):
+            self.assertEqual(new_tokens, [b"1.2.3.4"])
+
+            # the frame is only sent once
+            self.assertEqual(roundtrip(server, client), (0, 0))
+
+            # the frame is sent again if it is lost
+            server._on_new_token_delivery(QuicDeliveryState.LOST)
+            self.assertEqual(roundtrip(server, client), (1, 1))
+            self.assertEqual(new_tokens, [b"1.2.3.4"] * 2)
+
+    def test_new_token_address_validated(self):
+        with client_and_server(
+            handshake=False, server_kwargs={"address_validated": True}
+        ) as (client, server):
+            client.connect(SERVER_ADDR, now=time.time())
+            for data, addr in client.datagrams_to_send(now=time.time()):
+                server.receive_datagram(data, CLIENT_ADDR, now=time.time())
+
+            # the server is not limited to three times the data it received
+            self.assertTrue(server._network_paths[0].is_validated)
+
     def test_handle_new_token_frame_from_client(self):
         with client_and_server() as (client, server):
             # server receives NEW_TOKEN
@@ -1762,6 +2350,28 @@ class QuicConnectionTest(TestCase):
             self.assertEqual(event.error_code, QuicErrorCode.INTERNAL_ERROR)
             self.assertEqual(event.stream_id, stream_id)
 
+    def test_handle_reset_stream_frame_consumes_data(self):
+        stream_id = 0
+        with client_and_server() as (client, server):
+            # client creates bidirectional stream
+            client.send_stream_data(stream_id=stream_id, data=b"hello")
+            consume_events(client)
+
+            # client receives RESET_STREAM at offset 1000
+            client._handle_reset_stream_frame(
+                client_receive_context(client),
+                QuicFrameType.RESET_STREAM,
+                Buffer(
+                    data=encode_uint_var(stream_id)
+                    + encode_uint_var(QuicErrorCode.INTERNAL_ERROR)
+                    + encode_uint_var(1000)
+                ),
+            )
+
+            # data which will never be delivered counts as consumed
+            self.assertEqual(client._local_max_data.used, 1000)
+            self.assertEqual(client._local_max_data_window.consumed, 1000)
+
     def test_handle_reset_stream_frame_final_size_error(self):
         stream_id = 0
         with client_and_server() as (client, server):
@@ -1807,8 +2417,9 @@ class QuicConnectionTest(TestCase):
             client.send_stream_data(stream_id=stream_id, data=b"hello")
             consume_events(client)
 
-            # artificially raise received data counter
+            # artificially raise received and consumed data counters
             client._local_max_data.used = client._local_max_data.value
+            client._local_max_data_window.consumed = client._local_max_data.value
 
             # client receives RESET_STREAM frame
             with self.assertRaises(QuicConnectionError) as cm:
@@ -2055,8 +2666,9 @@ class QuicConnectionTest(TestCase):
 
     def test_handle_stream_frame_over_max_data(self):
         with client_and_server() as (client, server):
-            # artificially raise received data counter
+            # artificially raise received and consumed data counters
             client._local_max_data.used = client._local_max_data.value
+            client._local_max_data_window.consumed = client._local_max_data.value
 
             # client receives STREAM frame
             frame_type = QuicFrameType.STREAM_BASE | 4
@@ -2264,6 +2876,41 @@ class QuicConnectionTest(TestCase):
         self.assertEqual(cm.exception.frame_type, QuicFrameType.CRYPTO)
         self.assertEqual(cm.exception.reason_phrase, "max_ack_delay must be < 2^14")
 
+    def test_parse_transport_parameters_with_max_udp_payload_size(self):
+        client = create_standalone_client(
+            self, max_datagram_size=1400, max_discovered_datagram_size=1452
+        )
+
+        data = encode_transport_parameters(
+            QuicTransportParameters(
+                max_udp_payload_size=1300,
+                original_destination_connection_id=client.original_destination_connection_id,
+            )
+        )
+        client._parse_transport_parameters(data)
+        self.assertEqual(client.get_stats().max_datagram_size, 1300)
+        self.assertEqual(client._mtu_discovery.max_size, 1300)
+
+    def test_parse_transport_parameters_with_bad_min_ack_delay(self):
+        client = create_standalone_client(self, ack_frequency=True)
+
+        data = encode_transport_parameters(
+            QuicTransportParameters(
+                max_ack_delay=10,
+                min_ack_delay=10001,
+                original_destination_connection_id=client.original_destination_connection_id,
+            )
+        )
+        with self.assertRaises(QuicConnectionError) as cm:
+            client._parse_transport_parameters(data)
+        self.assertEqual(
+            cm.exception.error_code, QuicErrorCode.TRANSPORT_PARAMETER_ERROR
+        )
+        self.assertEqual(cm.exception.frame_type, QuicFrameType.CRYPTO)
+        self.assertEqual(
+            cm.exception.reason_phrase, "min_ack_delay must not exceed max_ack_delay"
+        )
+
     def test_parse_transport_parameters_with_bad_max_udp_payload_size(self):
         client = create_standalone_client(self)
 
@@ -2331,6 +2978,118 @@ class QuicConnectionTest(TestCase):
                 "original_destination_connection_id is not allowed for clients",
             )
 
+    def test_pause_receiving(self):
+        with client_and_server() as (client, server):
+            # client creates bidirectional stream 0
+            client.send_stream_data(0, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            stream = server._streams[0]
+
+            # server pauses receiving, client sends more than half the window
+            server.pause_receiving(0)
+            client.send_stream_data(0, b"Z" * 600000)
+            for i in range(10):
+                roundtrip(client, server)
+            self.assertEqual(stream.max_stream_data_local, 1048576)
+            self.assertEqual(stream.max_stream_data_local_sent, 1048576)
+
+            # server resumes receiving, MAX_STREAM_DATA is raised
+            server.resume_receiving(0)
+            roundtrip(server, client)
+            self.assertEqual(stream.max_stream_data_local, 1648581)  # 600005 + 1048576
+            self.assertEqual(stream.max_stream_data_local_sent, 1648581)
+
+            # unknown streams are ignored
+            server.pause_receiving(4)
+            server.resume_receiving(4)
+
+    def test_pause_receiving_local_uni_stream(self):
+        with client_and_server() as (client, server):
+            with self.assertRaises(ValueError) as cm:
+                client.pause_receiving(2)
+            self.assertEqual(
+                str(cm.exception),
+                "Cannot control receiving on a local-initiated unidirectional stream",
+            )
+
+    def test_set_stream_priority(self):
+        with client_and_server() as (client, server):
+            # stream 4 is more urgent than stream 0
+            client.send_stream_data(0, b"Z" * 10000, end_stream=True)
+            client.send_stream_data(4, b"hello", end_stream=True)
+            client.set_stream_priority(4, urgency=0)
+            transfer(client, server)
+
+            stream_ids = []
+            event = server.next_event()
+            while event is not None:
+                if isinstance(event, events.StreamDataReceived):
+                    stream_ids.append(event.stream_id)
+                event = server.next_event()
+            self.assertEqual(stream_ids[0], 4)
+            self.assertEqual(stream_ids[1:], [0] * (len(stream_ids) - 1))
+
+    def test_set_stream_priority_incremental(self):
+        with client_and_server() as (client, server):
+            # both streams are incremental, so they take turns
+            client.send_stream_data(0, b"Z" * 10000, end_stream=True)
+            client.send_stream_data(4, b"Z" * 10000, end_stream=True)
+            client.set_stream_priority(0, incremental=True)
+            client.set_stream_priority(4, incremental=True)
+            transfer(client, server)
+
+            stream_ids = []
+            event = server.next_event()
+            while event is not None:
+                if isinstance(event, events.StreamDataReceived):
+                    stream_ids.append(event.stream_id)
+                event = server.next_event()
+            self.assertEqual(stream_ids[:4], [0, 4, 0, 4])
+
+    def test_set_stream_priority_order_cached(self):
+        with client_and_server() as (client, server):
+            client.send_stream_data(0, b"Z" * 100000)
+            client.send_stream_data(4, b"Z" * 100000)
+
+            # the order is computed once, not for every packet
+            self.assertGreater(drop(client), 1)
+            order = client._streams_send_order
+            self.assertEqual([stream.stream_id for stream in order], [0, 4])
+            client._loss._cc.bytes_in_flight = 0
+            self.assertGreater(drop(client), 1)
+            self.assertIs(client._streams_send_order, order)
+
+            # changing a priority computes it again
+            client.set_stream_priority(4, urgency=0)
+            self.assertIsNone(client._streams_send_order)
+            client._loss._cc.bytes_in_flight = 0
+            self.assertGreater(drop(client), 1)
+            self.assertEqual(
+                [stream.stream_id for stream in client._streams_send_order], [4, 0]
+            )
+
+    def test_set_stream_priority_invalid_urgency(self):
+        with client_and_server() as (client, server):
+            with self.assertRaises(ValueError) as cm:
+                client.set_stream_priority(0, urgency=8)
+            self.assertEqual(str(cm.exception), "Urgency must be between 0 and 7")
+
+    def test_drain_events(self):
+        with client_and_server() as (client, server):
+            consume_events(server)
+            client.send_stream_data(0, b"hello")
+            client.send_stream_data(4, b"world")
+            roundtrip(client, server)
+
+            # all the events are returned at once
+            drained = server.drain_events()
+            self.assertEqual(
+                [type(event) for event in drained],
+                [events.StreamDataReceived, events.StreamDataReceived],
+            )
+            self.assertEqual(server.drain_events(), [])
+            self.assertIsNone(server.next_event())
+
     def test_payload_received_empty(self):
         with client_and_server() as (client, server):
             # client receives empty payload
@@ -2395,6 +3154,95 @@ class QuicConnectionTest(TestCase):
             self.assertEqual(cm.exception.frame_type, 0x1C)
             self.assertEqual(cm.exception.reason_phrase, "Failed to parse frame")
 
+    def test_send_data_blocked(self):
+        with client_and_server(server_options={"max_data": 1000}) as (
+            client,
+            server,
+        ):
+            # the client is blocked by the connection limit
+            now = time.time()
+            client.send_stream_data(0, b"Z" * 3000)
+            for data, addr in client.datagrams_to_send(now=now):
+                server.receive_datagram(data, CLIENT_ADDR, now=now)
+            self.assertEqual(client._remote_max_data_used, 1000)
+            self.assertEqual(client._data_blocked_at, now)
+            self.assertEqual(
+                sent_frames(client, "data_blocked"),
+                [{"frame_type": "data_blocked", "limit": 1000}],
+            )
+
+            # DATA_BLOCKED is only sent once for a given limit
+            self.assertEqual(drop(client), 0)
+
+            # the server raises the limit
+            for data, addr in server.datagrams_to_send(now=now):
+                client.receive_datagram(data, SERVER_ADDR, now=now + 0.125)
+            self.assertGreater(client._remote_max_data, 1000)
+            self.assertIsNone(client._data_blocked_at)
+
+            stats = client.get_stats()
+            self.assertAlmostEqual(stats.data_blocked_time, 0.125)
+            self.assertEqual(stats.stream_data_blocked_time, 0.0)
+
+    def test_send_data_blocked_retransmit(self):
+        with client_and_server(server_options={"max_data": 1000}) as (
+            client,
+            server,
+        ):
+            # DATA_BLOCKED is sent and lost
+            client.send_stream_data(0, b"Z" * 3000)
+            self.assertEqual(drop(client), 1)
+            self.assertEqual(len(sent_frames(client, "data_blocked")), 1)
+
+            # DATA_BLOCKED loss is detected
+            client._on_data_blocked_delivery(QuicDeliveryState.LOST, 1000)
+            self.assertTrue(client._data_blocked_pending)
+
+            # DATA_BLOCKED is retransmitted
+            self.assertEqual(drop(client), 1)
+            self.assertFalse(client._data_blocked_pending)
+            self.assertEqual(len(sent_frames(client, "data_blocked")), 2)
+
+            # the loss of a DATA_BLOCKED for an older limit is ignored
+            client._remote_max_data = 2000
+            client._on_data_blocked_delivery(QuicDeliveryState.LOST, 1000)
+            self.assertFalse(client._data_blocked_pending)
+
+    def test_send_stream_data_blocked(self):
+        with client_and_server(server_options={"max_stream_data": 1000}) as (
+            client,
+            server,
+        ):
+            # the client is blocked by the stream limit
+            now = time.time()
+            client.send_stream_data(0, b"Z" * 3000)
+            for data, addr in client.datagrams_to_send(now=now):
+                server.receive_datagram(data, CLIENT_ADDR, now=now)
+            stream = client._streams[0]
+            self.assertEqual(stream.data_blocked_at, now)
+            self.assertEqual(
+                sent_frames(client, "stream_data_blocked"),
+                [{"frame_type": "stream_data_blocked", "limit": 1000, "stream_id": 0}],
+            )
+            self.assertEqual(sent_frames(client, "data_blocked"), [])
+
+            # the server raises the limit
+            for data, addr in server.datagrams_to_send(now=now):
+                client.receive_datagram(data, SERVER_ADDR, now=now + 0.125)
+            self.assertGreater(stream.max_stream_data_remote, 1000)
+            self.assertIsNone(stream.data_blocked_at)
+            self.assertAlmostEqual(stream.data_blocked_time, 0.125)
+
+            stats = client.get_stats()
+            self.assertEqual(stats.data_blocked_time, 0.0)
+            self.assertAlmostEqual(stats.stream_data_blocked_time, 0.125)
+
+            # STREAM_DATA_BLOCKED loss is ignored once the stream is unblocked
+            client._on_stream_data_blocked_delivery(
+                QuicDeliveryState.LOST, stream, 1000
+            )
+            self.assertFalse(stream.data_blocked_pending)
+
     def test_send_max_data_blocked_by_cc(self):
         with client_and_server() as (client, server):
             # check congestion control
@@ -2413,8 +3261,9 @@ class QuicConnectionTest(TestCase):
 
     def test_send_max_data_retransmit(self):
         with client_and_server() as (client, server):
-            # artificially raise received data counter
+            # artificially raise received and consumed data counters
             client._local_max_data.used = client._local_max_data.value
+            client._local_max_data_window.consumed = client._local_max_data.value
             self.assertEqual(client._local_max_data.sent, 1048576)
             self.assertEqual(client._local_max_data.used, 1048576)
             self.assertEqual(client._local_max_data.value, 1048576)
@@ -2464,16 +3313,16 @@ class QuicConnectionTest(TestCase):
 
             # MAX_STREAM_DATA is sent and lost
             self.assertEqual(drop(client), 1)
-            self.assertEqual(stream.max_stream_data_local, 2097152)
-            self.assertEqual(stream.max_stream_data_local_sent, 2097152)
+            self.assertEqual(stream.max_stream_data_local, 1572865)  # 524289 + 1048576
+            self.assertEqual(stream.max_stream_data_local_sent, 1572865)
             client._on_max_stream_data_delivery(QuicDeliveryState.LOST, stream)
-            self.assertEqual(stream.max_stream_data_local, 2097152)
+            self.assertEqual(stream.max_stream_data_local, 1572865)
             self.assertEqual(stream.max_stream_data_local_sent, 0)
 
             # MAX_DATA is retransmitted and acked
             self.assertEqual(roundtrip(client, server), (1, 1))
-            self.assertEqual(stream.max_stream_data_local, 2097152)
-            self.assertEqual(stream.max_stream_data_local_sent, 2097152)
+            self.assertEqual(stream.max_stream_data_local, 1572865)
+            self.assertEqual(stream.max_stream_data_local_sent, 1572865)
 
     def test_send_max_streams_retransmit(self):
         with client_and_server() as (client, server):
@@ -2508,6 +3357,127 @@ class QuicConnectionTest(TestCase):
             self.assertEqual(server._local_max_streams_bidi.used, 65)
             self.assertEqual(server._local_max_streams_bidi.value, 256)
 
+    def test_get_stats(self):
+        with client_and_server() as (client, server):
+            client_stats = client.get_stats()
+            server_stats = server.get_stats()
+
+            # every datagram was received by the peer
+            self.assertEqual(client_stats.bytes_sent, server_stats.bytes_received)
+            self.assertEqual(client_stats.bytes_received, server_stats.bytes_sent)
+            self.assertEqual(
+                client_stats.datagrams_sent, server_stats.datagrams_received
+            )
+            self.assertEqual(
+                client_stats.datagrams_received, server_stats.datagrams_sent
+            )
+            self.assertEqual(client_stats.packets_sent, server_stats.packets_received)
+            self.assertEqual(client_stats.packets_lost, 0)
+            self.assertEqual(client_stats.probe_timeouts, 0)
+            self.assertEqual(client_stats.spurious_losses, 0)
+            self.assertGreater(client_stats.packets_acked, 0)
+            self.assertGreaterEqual(client_stats.handshake_duration, 0)
+            self.assertIsNotNone(client_stats.min_rtt)
+            self.assertEqual(client_stats.streams_open, 0)
+
+            # the client opens a stream
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, b"hello")
+            self.assertEqual(roundtrip(client, server), (1, 1))
+            self.assertEqual(client.get_stats().streams_open, 1)
+            self.assertEqual(client.get_stats().streams_opened, 1)
+            self.assertEqual(server.get_stats().streams_opened, 1)
+
+    def test_pacing_with_granularity(self):
+        with client_and_server(
+            client_options={"pacing_granularity": 0.001},
+            client_patch=lambda client: setattr(
+                client._loss,
+                "_pacer",
+                QuicPacketPacer(granularity=0.001, max_datagram_size=1200),
+            ),
+        ) as (client, server):
+            # one packet every 50 us
+            client._loss._cc.congestion_window = 2400000
+            client._loss._pacer.update_rate(congestion_window=2400000, smoothed_rtt=0.1)
+            client.send_stream_data(0, b"Z" * 200000)
+
+            # the first burst empties the bucket
+            now = time.time()
+            self.assertAlmostEqual(len(client.datagrams_to_send(now=now)), 36, delta=1)
+            self.assertAlmostEqual(client.get_timer(), now + 0.001)
+            self.assertEqual(client.get_stats().pacing_wakeups, 0)
+
+            # the timer fires, the next burst is sent
+            client.handle_timer(now=now + 0.001)
+            self.assertAlmostEqual(
+                len(client.datagrams_to_send(now=now + 0.001)), 20, delta=1
+            )
+            self.assertEqual(client.get_stats().pacing_wakeups, 1)
+
+    def test_mtu_discovery(self):
+        with client_and_server(
+            client_options={"max_discovered_datagram_size": 1452}
+        ) as (client, server):
+            now = exchange_with_mtu(client, server, mtu=1500, now=time.time())
+
+            # the client found a larger size, the server did not search
+            size = client.get_stats().max_datagram_size
+            self.assertGreater(size, 1432)
+            self.assertLessEqual(size, 1452)
+            self.assertEqual(client._loss._cc._max_datagram_size, size)
+            self.assertEqual(server.get_stats().max_datagram_size, 1200)
+
+            # data is sent using the discovered size
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, bytes(4000))
+            self.assertEqual(datagram_sizes(client.datagrams_to_send(now=now))[0], size)
+
+    def test_mtu_discovery_black_hole(self):
+        with client_and_server(
+            client_options={"max_discovered_datagram_size": 1452}
+        ) as (client, server):
+            now = exchange_with_mtu(client, server, mtu=1500, now=time.time())
+            self.assertGreater(client.get_stats().max_datagram_size, 1300)
+            consume_events(server)
+
+            # the path MTU shrinks while the client sends data
+            stream_id = client.get_next_available_stream_id()
+            client.send_stream_data(stream_id, bytes(100000), end_stream=True)
+            exchange_with_mtu(client, server, mtu=1300, now=now, rounds=60)
+            self.assertEqual(client._mtu_discovery.black_holes, 1)
+            self.assertGreater(client.get_stats().max_datagram_size, 1200)
+            self.assertLessEqual(client.get_stats().max_datagram_size, 1300)
+
+            # all the data was received
+            received = 0
+            while True:
+                event = server.next_event()
+                if event is None:
+                    break
+                if isinstance(event, events.StreamDataReceived):
+                    received += len(event.data)
+            self.assertEqual(received, 100000)
+
+    def test_mtu_discovery_disabled(self):
+        with client_and_server() as (client, server):
+            exchange_with_mtu(client, server, mtu=1500, now=time.time())
+            self.assertEqual(client.get_stats().max_datagram_size, 1200)
+            self.assertEqual(client.get_stats().packets_lost, 0)
+
+    def test_mtu_discovery_with_smaller_path_mtu(self):
+        with client_and_server(
+            client_options={"max_discovered_datagram_size": 1452}
+        ) as (client, server):
+            exchange_with_mtu(client, server, mtu=1400, now=time.time())
+            size = client.get_stats().max_datagram_size
+            self.assertGreater(size, 1380)
+            self.assertLessEqual(size, 1400)
+
+            # lost probes are not a sign of congestion
+            self.assertGreater(client.get_stats().packets_lost, 0)
+            self.assertIsNone(client._loss._cc.ssthresh)
+
     def test_send_ping(self):
         with client_and_server() as (client, server):
             consume_events(client)
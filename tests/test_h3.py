@@ -15,7 +15,9 @@ from aioquic.h3.connection import (
     SettingsError,
     StreamType,
     encode_frame,
+    encode_priority,
     encode_settings,
+    parse_priority,
     parse_settings,
     validate_push_promise_headers,
     validate_request_headers,
@@ -86,6 +88,7 @@ class FakeQuicConnection:
     def __init__(self, configuration):
         self.closed = None
         self.configuration = configuration
+        self.priorities = {}
         self.stream_queue = []
         self._events = []
         self._next_stream_bidi = 0 if configuration.is_client else 1
@@ -113,6 +116,9 @@ class FakeQuicConnection:
         except IndexError:
             return None
 
+    def set_stream_priority(self, stream_id, urgency=3, incremental=False):
+        self.priorities[stream_id] = (urgency, incremental)
+
     def send_stream_data(self, stream_id, data, end_stream=False):
         # chop up data into individual bytes
         for c in data:
@@ -298,6 +304,67 @@ class H3ConnectionTest(TestCase):
             (ErrorCode.H3_FRAME_UNEXPECTED, "Servers must not send MAX_PUSH_ID"),
         )
 
+    def test_handle_control_frame_priority_update_from_server(self):
+        """
+        A client should not receive PRIORITY_UPDATE on the control stream.
+        """
+        quic_client = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=True)
+        )
+        h3_client = H3Connection(quic_client)
+
+        # receive SETTINGS
+        h3_client.handle_event(
+            StreamDataReceived(
+                stream_id=3,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS)),
+                end_stream=False,
+            )
+        )
+        self.assertIsNone(quic_client.closed)
+
+        # receive unexpected PRIORITY_UPDATE
+        h3_client.handle_event(
+            StreamDataReceived(
+                stream_id=3,
+                data=encode_frame(
+                    FrameType.PRIORITY_UPDATE_REQUEST, encode_uint_var(0) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertEqual(
+            quic_client.closed,
+            (ErrorCode.H3_FRAME_UNEXPECTED, "Servers must not send PRIORITY_UPDATE"),
+        )
+
+    def test_handle_control_frame_priority_update_wrong_stream(self):
+        """
+        A PRIORITY_UPDATE must reference a request stream.
+        """
+        quic_server = FakeQuicConnection(
+            configuration=QuicConfiguration(is_client=False)
+        )
+        h3_server = H3Connection(quic_server)
+
+        # receive SETTINGS, then PRIORITY_UPDATE for a unidirectional stream
+        h3_server.handle_event(
+            StreamDataReceived(
+                stream_id=2,
+                data=encode_uint_var(StreamType.CONTROL)
+                + encode_frame(FrameType.SETTINGS, encode_settings(DUMMY_SETTINGS))
+                + encode_frame(
+                    FrameType.PRIORITY_UPDATE_REQUEST, encode_uint_var(2) + b"u=1"
+                ),
+                end_stream=False,
+            )
+        )
+        self.assertEqual(
+            quic_server.closed,
+            (ErrorCode.H3_ID_ERROR, "PRIORITY_UPDATE must reference a request stream"),
+        )
+
     def test_handle_control_settings_twice(self):
         """
         We should not receive HEADERS on the control stream.
@@ -721,6 +788,115 @@ class H3ConnectionTest(TestCase):
                 ],
             )
 
+    def test_handle_events(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            # send request
+            h3_client.send_headers(
+                stream_id=0,
+                headers=[
+                    (b":method", b"POST"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                ],
+            )
+            h3_client.send_data(stream_id=0, data=b"hello world", end_stream=True)
+
+            # split the stream data into single bytes
+            quic_events = []
+            for event in quic_client.stream_queue:
+                for i in range(len(event.data)):
+                    quic_events.append(
+                        StreamDataReceived(
+                            data=event.data[i : i + 1],
+                            end_stream=False,
+                            stream_id=event.stream_id,
+                        )
+                    )
+                if event.end_stream:
+                    quic_events.append(
+                        StreamDataReceived(
+                            data=b"", end_stream=True, stream_id=event.stream_id
+                        )
+                    )
+            quic_client.stream_queue.clear()
+
+            # consecutive data is merged
+            self.assertEqual(
+                h3_server.handle_events(quic_events),
+                [
+                    HeadersReceived(
+                        headers=[
+                            (b":method", b"POST"),
+                            (b":scheme", b"https"),
+                            (b":authority", b"localhost"),
+                            (b":path", b"/"),
+                        ],
+                        stream_id=0,
+                        stream_ended=False,
+                    ),
+                    DataReceived(data=b"hello world", stream_id=0, stream_ended=True),
+                ],
+            )
+
+    def test_request_with_priority(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            # critical streams are sent first
+            self.assertEqual(
+                quic_client.priorities, {2: (0, False), 6: (0, False), 10: (0, False)}
+            )
+
+            # send request with a priority header
+            h3_client.send_headers(
+                stream_id=0,
+                headers=[
+                    (b":method", b"GET"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                    (b"priority", b"u=5, i"),
+                ],
+                end_stream=True,
+            )
+            h3_transfer(quic_client, h3_server)
+            self.assertEqual(quic_server.priorities[0], (5, True))
+
+            # send a priority update
+            h3_client.send_priority_update(0, urgency=1)
+            h3_transfer(quic_client, h3_server)
+            self.assertEqual(quic_server.priorities[0], (1, False))
+
+    def test_request_with_priority_update_before_headers(self):
+        with h3_fake_client_and_server() as (quic_client, quic_server):
+            h3_client = H3Connection(quic_client)
+            h3_server = H3Connection(quic_server)
+
+            # the priority update arrives before the request
+            h3_client.send_priority_update(4, urgency=0, incremental=True)
+            h3_transfer(quic_client, h3_server)
+            self.assertNotIn(4, quic_server.priorities)
+
+            # the priority update takes precedence over the header
+            h3_client.send_headers(
+                stream_id=4,
+                headers=[
+                    (b":method", b"GET"),
+                    (b":scheme", b"https"),
+                    (b":authority", b"localhost"),
+                    (b":path", b"/"),
+                    (b"priority", b"u=5"),
+                ],
+                end_stream=True,
+            )
+            h3_transfer(quic_client, h3_server)
+            self.assertEqual(quic_server.priorities[4], (0, True))
+
     def test_request_fragmented_frame(self):
         with h3_fake_client_and_server() as (quic_client, quic_server):
             h3_client = H3Connection(quic_client)
@@ -1572,6 +1748,25 @@ class H3ConnectionTest(TestCase):
 
 
 class H3ParserTest(TestCase):
+    def test_encode_priority(self):
+        self.assertEqual(encode_priority(3, False), b"")
+        self.assertEqual(encode_priority(0, False), b"u=0")
+        self.assertEqual(encode_priority(3, True), b"i")
+        self.assertEqual(encode_priority(7, True), b"u=7, i")
+
+    def test_parse_priority(self):
+        self.assertEqual(parse_priority(b""), (3, False))
+        self.assertEqual(parse_priority(b"u=0"), (0, False))
+        self.assertEqual(parse_priority(b"i"), (3, True))
+        self.assertEqual(parse_priority(b"u=7, i"), (7, True))
+        self.assertEqual(parse_priority(b"u=2,i=?1"), (2, True))
+        self.assertEqual(parse_priority(b"i=?0, u=1"), (1, False))
+        self.assertEqual(parse_priority(b"u=1;foo=bar, x=1"), (1, False))
+
+        # invalid members are ignored
+        self.assertEqual(parse_priority(b"u=8, i=1"), (3, False))
+        self.assertEqual(parse_priority(b"u=-1"), (3, False))
+
     def test_parse_settings_duplicate_identifier(self):
         buf = Buffer(capacity=1024)
         buf.push_uint_var(1)
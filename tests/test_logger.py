@@ -3,7 +3,12 @@ import os
 import tempfile
 from unittest import TestCase
 
-from aioquic.quic.logger import QuicFileLogger, QuicLogger
+from aioquic.quic.logger import (
+    QuicFileLogger,
+    QuicLogger,
+    QuicStreamingLogger,
+    QuicStreamingLoggerTrace,
+)
 
 SINGLE_TRACE = {
     "qlog_format": "JSON",
@@ -56,3 +61,177 @@ class QuicFileLoggerTest(TestCase):
             with open(filepath, "r") as fp:
                 data = json.load(fp)
             self.assertEqual(data, SINGLE_TRACE)
+
+
+def read_json_seq(path):
+    with open(path, "r") as fp:
+        data = fp.read()
+    records = data.split("\x1e")
+    assert records[0] == ""
+    return [json.loads(record) for record in records[1:]]
+
+
+class QuicStreamingLoggerTest(TestCase):
+    def test_invalid_path(self):
+        with self.assertRaises(ValueError) as cm:
+            QuicStreamingLogger("this_path_should_not_exist")
+        self.assertEqual(
+            str(cm.exception),
+            "QUIC log output directory 'this_path_should_not_exist' does not exist",
+        )
+
+    def test_single_trace(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath)
+            trace = logger.start_trace(is_client=True, odcid=bytes(8))
+            trace.log_event(category="transport", event="foo", data={"bar": 1})
+            logger.end_trace(trace)
+            logger.close()
+
+            filenames = os.listdir(dirpath)
+            self.assertEqual(len(filenames), 1)
+            self.assertTrue(filenames[0].endswith("-0.sqlog"))
+
+            records = read_json_seq(os.path.join(dirpath, filenames[0]))
+            self.assertEqual(
+                records[0],
+                {
+                    "qlog_format": "JSON-SEQ",
+                    "qlog_version": "0.3",
+                    "trace": {
+                        "common_fields": {"time_format": "absolute"},
+                        "vantage_point": {"name": "aioquic", "type": "client"},
+                    },
+                },
+            )
+            self.assertEqual(len(records), 2)
+            self.assertEqual(records[1]["data"], {"bar": 1})
+            self.assertEqual(records[1]["group_id"], "0000000000000000")
+            self.assertEqual(records[1]["name"], "transport:foo")
+
+            # the trace does not keep events in memory
+            self.assertEqual(trace.to_dict()["events"], [])
+
+    def test_categories(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath, categories=["recovery"])
+            trace = logger.start_trace(is_client=False, odcid=bytes(8))
+            trace.log_event(category="transport", event="foo", data={})
+            trace.log_event(category="recovery", event="bar", data={})
+            logger.close()
+
+            filenames = os.listdir(dirpath)
+            records = read_json_seq(os.path.join(dirpath, filenames[0]))
+            self.assertEqual(
+                [record.get("name") for record in records[1:]], ["recovery:bar"]
+            )
+
+    def test_rotation(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath, max_file_size=1000, max_files=2)
+            trace = logger.start_trace(is_client=False, odcid=bytes(8))
+            for i in range(50):
+                trace.log_event(category="transport", event="foo", data={"i": i})
+            logger.close()
+
+            # only the most recent files are kept
+            filenames = sorted(
+                os.listdir(dirpath), key=lambda x: int(x.split("-")[-1][:-6])
+            )
+            self.assertEqual(len(filenames), 2)
+            for filename in filenames:
+                self.assertLessEqual(
+                    os.path.getsize(os.path.join(dirpath, filename)), 1000
+                )
+
+            records = read_json_seq(os.path.join(dirpath, filenames[-1]))
+            self.assertEqual(records[0]["qlog_format"], "JSON-SEQ")
+            self.assertEqual(records[-1]["data"], {"i": 49})
+
+    def test_queue_full(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath, max_queue_size=1)
+
+            # without a running writer, the queue fills up
+            trace = QuicStreamingLoggerTrace(
+                is_client=True, odcid=bytes(8), logger=logger
+            )
+            trace.log_event(category="transport", event="foo", data={})
+            trace.log_event(category="transport", event="foo", data={})
+            self.assertEqual(logger.dropped_events, 1)
+
+    def test_data_modified_after_logging(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath)
+
+            # the event is logged before the writer runs, then modified
+            trace = QuicStreamingLoggerTrace(
+                is_client=True, odcid=bytes(8), logger=logger
+            )
+            frames = []
+            trace.log_event(category="transport", event="foo", data={"frames": frames})
+            frames.append({"frame_type": "ping"})
+
+            logger.start_trace(is_client=True, odcid=bytes(8))
+            logger.close()
+
+            filenames = os.listdir(dirpath)
+            records = read_json_seq(os.path.join(dirpath, filenames[0]))
+            self.assertEqual(len(records), 2)
+            self.assertEqual(records[1]["data"], {"frames": []})
+
+    def test_packet_received_frames(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath)
+            trace = logger.start_trace(is_client=True, odcid=bytes(8))
+
+            # the frames of a received packet are filled in once it is handled
+            frames = []
+            trace.log_event(
+                category="transport", event="packet_received", data={"frames": frames}
+            )
+            trace.log_event(category="recovery", event="foo", data={})
+            frames.append({"frame_type": "ping"})
+
+            # the next packet completes the previous one
+            trace.log_event(
+                category="transport", event="packet_sent", data={"frames": []}
+            )
+
+            # the trace ends before the frames of this packet are filled in
+            trace.log_event(
+                category="transport", event="packet_received", data={"frames": []}
+            )
+            logger.end_trace(trace)
+            logger.close()
+
+            filenames = os.listdir(dirpath)
+            records = read_json_seq(os.path.join(dirpath, filenames[0]))
+            self.assertEqual(
+                [(record["name"], record["data"]) for record in records[1:]],
+                [
+                    (
+                        "transport:packet_received",
+                        {"frames": [{"frame_type": "ping"}]},
+                    ),
+                    ("recovery:foo", {}),
+                    ("transport:packet_sent", {"frames": []}),
+                    ("transport:packet_received", {"frames": []}),
+                ],
+            )
+
+    def test_close_writes_deferred_events(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            logger = QuicStreamingLogger(dirpath)
+            trace = logger.start_trace(is_client=True, odcid=bytes(8))
+            trace.log_event(
+                category="transport", event="packet_received", data={"frames": []}
+            )
+            logger.close()
+
+            filenames = os.listdir(dirpath)
+            records = read_json_seq(os.path.join(dirpath, filenames[0]))
+            self.assertEqual(
+                [record["name"] for record in records[1:]],
+                ["transport:packet_received"],
+            )
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from aioquic.quic.metrics import DROP_INVALID_HEADER, QuicServerMetrics
+
+from .test_connection import client_and_server
+
+
+class QuicServerMetricsTest(TestCase):
+    def test_connections(self):
+        metrics = QuicServerMetrics()
+        with client_and_server() as (client, server):
+            metrics.connection_opened(server)
+            stats = server.get_stats()
+            values = dict((name, value) for name, _, _, value in metrics.collect())
+            self.assertEqual(values["connections"], 1)
+            self.assertEqual(values["connections_accepted_total"], 1)
+            self.assertEqual(values["connections_half_open"], 0)
+            self.assertEqual(values["handshakes_completed_total"], 1)
+            self.assertEqual(values["bytes_received_total"], stats.bytes_received)
+            self.assertEqual(values["packets_sent_total"], stats.packets_sent)
+            self.assertNotIn("retry_active", values)
+
+            # the statistics of closed connections are kept
+            metrics.connection_closed(server)
+            metrics.connection_closed(server)
+            values = dict((name, value) for name, _, _, value in metrics.collect())
+            self.assertEqual(values["connections"], 0)
+            self.assertEqual(values["connections_accepted_total"], 1)
+            self.assertEqual(values["handshakes_completed_total"], 1)
+            self.assertEqual(values["bytes_received_total"], stats.bytes_received)
+            self.assertEqual(values["packets_sent_total"], stats.packets_sent)
+
+    def test_render(self):
+        metrics = QuicServerMetrics(namespace="test")
+        metrics.datagrams_dropped[DROP_INVALID_HEADER] += 2
+        metrics.retries_sent += 1
+
+        lines = metrics.render().splitlines()
+        self.assertEqual(
+            lines[0:3],
+            [
+                "# HELP test_connections Open connections.",
+                "# TYPE test_connections gauge",
+                "test_connections 0",
+            ],
+        )
+        self.assertIn("# TYPE test_datagrams_dropped_total counter", lines)
+        self.assertIn('test_datagrams_dropped_total{reason="invalid_header"} 2', lines)
+        self.assertIn(
+            'test_datagrams_dropped_total{reason="unknown_connection"} 0', lines
+        )
+        self.assertIn("test_retries_sent_total 1", lines)
@@ -13,12 +13,14 @@ from aioquic.quic.packet import (
     encode_quic_retry,
     encode_quic_version_negotiation,
     get_retry_integrity_tag,
+    peek_quic_header,
     pull_quic_header,
     pull_quic_preferred_address,
     pull_quic_transport_parameters,
     push_quic_preferred_address,
     push_quic_transport_parameters,
 )
+from aioquic.quic.rangeset import RangeSet
 
 from .utils import load
 
@@ -250,6 +252,45 @@ class PacketTest(TestCase):
             pull_quic_header(buf, host_cid_length=8)
         self.assertEqual(str(cm.exception), "Packet fixed bit is zero")
 
+    def test_peek_empty(self):
+        with self.assertRaises(BufferReadError):
+            peek_quic_header(b"", 8)
+
+    def test_peek_initial_client(self):
+        self.assertEqual(
+            peek_quic_header(load("initial_client.bin"), 8),
+            (
+                True,
+                QuicProtocolVersion.VERSION_1,
+                binascii.unhexlify("858b39368b8e3c6e"),
+            ),
+        )
+
+    def test_peek_long_header_dcid_too_long(self):
+        data = binascii.unhexlify(
+            "c6ff0000161500000000000000000000000000000000000000000000004"
+            "01c514f99ec4bbf1f7a30f9b0c94fef717f1c1d07fec24c99a864da7ede"
+        )
+        with self.assertRaises(ValueError) as cm:
+            peek_quic_header(data, 8)
+        self.assertEqual(str(cm.exception), "Destination CID is too long (21 bytes)")
+
+    def test_peek_long_header_too_short(self):
+        with self.assertRaises(BufferReadError):
+            peek_quic_header(b"\xc0\x00", 8)
+        with self.assertRaises(BufferReadError):
+            peek_quic_header(b"\xc0\x00\x00\x00\x01\x08\x00", 8)
+
+    def test_peek_short_header(self):
+        self.assertEqual(
+            peek_quic_header(load("short_header.bin"), 8),
+            (False, None, binascii.unhexlify("f45aa7b59c0e1ad6")),
+        )
+
+    def test_peek_short_header_too_short(self):
+        with self.assertRaises(BufferReadError):
+            peek_quic_header(b"\x40\x00", 8)
+
     def test_encode_quic_version_negotiation(self):
         data = encode_quic_version_negotiation(
             destination_cid=binascii.unhexlify("9aac5a49ba87a849"),
@@ -446,6 +487,15 @@ class FrameTest(TestCase):
         packet.push_ack_frame(buf, rangeset, delay)
         self.assertEqual(buf.data, data)
 
+    def test_encode_ack_ranges(self):
+        rangeset = RangeSet([range(0, 1), range(2, 3), range(4, 5)])
+        self.assertEqual(packet.encode_ack_ranges(rangeset), (bytes(5), [1, 3, 5]))
+
+        # the ranges match those written by push_ack_frame
+        buf = Buffer(capacity=16)
+        packet.push_ack_frame(buf, rangeset, 2)
+        self.assertEqual(buf.data, b"\x04\x02\x02" + bytes(5))
+
     def test_ack_frame_with_two_ranges(self):
         data = b"\x04\x02\x02\x00\x00\x00\x00\x00"
 
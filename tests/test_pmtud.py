@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from aioquic.quic.pmtud import K_PMTU_RAISE_TIMER, QuicPathMtuDiscovery
+
+
+class QuicPathMtuDiscoveryTest(TestCase):
+    def search(self, discovery, path_mtu, now=0.0):
+        sizes = []
+        while True:
+            size = discovery.get_probe_size(now)
+            if size is None:
+                return sizes
+            sizes.append(size)
+            discovery.on_probe_sent(size)
+            if size <= path_mtu:
+                discovery.on_probe_acked(size, sent_time=now)
+            else:
+                discovery.on_probe_lost(size)
+
+    def test_search(self):
+        discovery = QuicPathMtuDiscovery(base_size=1200, max_size=1452)
+        self.assertEqual(
+            self.search(discovery, path_mtu=1500), [1326, 1389, 1421, 1437]
+        )
+        self.assertEqual(discovery.current_size, 1437)
+
+    def test_search_with_lost_probes(self):
+        discovery = QuicPathMtuDiscovery(base_size=1200, max_size=1452)
+        self.assertEqual(
+            self.search(discovery, path_mtu=1300),
+            [1326, 1326, 1326, 1263, 1294, 1310, 1310, 1310],
+        )
+        self.assertEqual(discovery.current_size, 1294)
+
+        # larger sizes are tried again once the raise timer fires
+        self.assertIsNone(discovery.get_probe_size(1.0))
+        self.assertEqual(discovery.get_probe_size(K_PMTU_RAISE_TIMER), 1373)
+
+    def test_one_probe_at_a_time(self):
+        discovery = QuicPathMtuDiscovery(base_size=1200, max_size=1452)
+        discovery.on_probe_sent(discovery.get_probe_size(0.0))
+        self.assertIsNone(discovery.get_probe_size(0.0))
+
+        discovery.on_probe_expired()
+        self.assertEqual(discovery.get_probe_size(0.0), 1326)
+
+    def test_black_hole_losses(self):
+        discovery = QuicPathMtuDiscovery(base_size=1200, max_size=1452)
+        self.search(discovery, path_mtu=1500, now=1.0)
+
+        # packets sent before the last acknowledged one do not count
+        for i in range(3):
+            self.assertFalse(discovery.on_packet_lost(sent_time=1.0))
+
+        # an acknowledgement resets the count
+        self.assertFalse(discovery.on_packet_lost(sent_time=2.0))
+        self.assertFalse(discovery.on_packet_lost(sent_time=2.0))
+        discovery.on_packet_acked(sent_time=2.0)
+        self.assertFalse(discovery.on_packet_lost(sent_time=3.0))
+        self.assertFalse(discovery.on_packet_lost(sent_time=3.0))
+        self.assertTrue(discovery.on_packet_lost(sent_time=3.0))
+        self.assertEqual(discovery.black_holes, 1)
+        self.assertEqual(discovery.current_size, 1200)
+
+        # the search starts over, below the size which failed
+        self.assertEqual(discovery.get_probe_size(3.0), 1318)
+
+    def test_black_hole_timeouts(self):
+        discovery = QuicPathMtuDiscovery(base_size=1200, max_size=1452)
+        self.assertFalse(discovery.on_probe_timeout(pto_count=2))
+
+        self.search(discovery, path_mtu=1500)
+        self.assertFalse(discovery.on_probe_timeout(pto_count=1))
+        self.assertTrue(discovery.on_probe_timeout(pto_count=2))
+        self.assertEqual(discovery.current_size, 1200)
+
+    def test_limit_max_size(self):
+        discovery = QuicPathMtuDiscovery(base_size=1400, max_size=1452)
+        discovery.limit_max_size(1300)
+        self.assertEqual(discovery.base_size, 1300)
+        self.assertEqual(discovery.current_size, 1300)
+        self.assertEqual(discovery.max_size, 1300)
+        self.assertIsNone(discovery.get_probe_size(0.0))
@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+from aioquic.quic.rate_limit import QuicRateLimiter, QuicTokenBucket
+
+
+class QuicTokenBucketTest(TestCase):
+    def test_refill(self):
+        bucket = QuicTokenBucket(rate=10.0, burst=5.0, now=0.0)
+        self.assertEqual(bucket.tokens, 5.0)
+
+        bucket.tokens = 0.0
+        bucket.refill(0.2)
+        self.assertAlmostEqual(bucket.tokens, 2.0)
+
+        # the bucket never holds more than the burst
+        bucket.refill(10.0)
+        self.assertEqual(bucket.tokens, 5.0)
+
+        # time going backwards does not remove tokens
+        bucket.refill(5.0)
+        self.assertEqual(bucket.tokens, 5.0)
+
+
+class QuicRateLimiterTest(TestCase):
+    def test_global_limit(self):
+        limiter = QuicRateLimiter(rate=10.0, burst=3.0)
+        allowed = [limiter.allow(("10.0.%d.1" % i, 1234), now=1.0) for i in range(5)]
+        self.assertEqual(allowed, [True, True, True, False, False])
+
+        # tokens are added over time
+        self.assertTrue(limiter.allow(("10.0.5.1", 1234), now=1.1))
+        self.assertFalse(limiter.allow(("10.0.6.1", 1234), now=1.1))
+
+    def test_prefix_limit(self):
+        limiter = QuicRateLimiter(prefix_rate=1.0, prefix_burst=2.0)
+        self.assertTrue(limiter.allow(("10.0.0.1", 1234), now=1.0))
+        self.assertTrue(limiter.allow(("10.0.0.2", 1234), now=1.0))
+        self.assertFalse(limiter.allow(("10.0.0.3", 1234), now=1.0))
+
+        # other prefixes are not affected
+        self.assertTrue(limiter.allow(("10.0.1.1", 1234), now=1.0))
+        self.assertTrue(limiter.allow(("::ffff:10.0.2.1", 1234, 0, 0), now=1.0))
+        self.assertFalse(limiter.allow(("::ffff:10.0.0.4", 1234, 0, 0), now=1.0))
+
+        # tokens are added over time
+        self.assertTrue(limiter.allow(("10.0.0.1", 1234), now=2.0))
+        self.assertFalse(limiter.allow(("10.0.0.1", 1234), now=2.0))
+
+    def test_prefix_limit_ipv6(self):
+        limiter = QuicRateLimiter(prefix_rate=1.0, prefix_burst=1.0)
+        self.assertTrue(limiter.allow(("2001:db8:1:2::1", 1234, 0, 0), now=1.0))
+        self.assertFalse(limiter.allow(("2001:db8:1:3::1", 1234, 0, 0), now=1.0))
+        self.assertTrue(limiter.allow(("2001:db8:2:2::1", 1234, 0, 0), now=1.0))
+
+    def test_max_prefixes(self):
+        limiter = QuicRateLimiter(prefix_rate=1.0, prefix_burst=1.0, max_prefixes=2)
+        self.assertTrue(limiter.allow(("10.0.0.1", 1234), now=1.0))
+        self.assertTrue(limiter.allow(("10.0.1.1", 1234), now=1.0))
+        self.assertFalse(limiter.allow(("10.0.0.1", 1234), now=1.0))
+
+        # the least recently seen prefix is forgotten
+        self.assertTrue(limiter.allow(("10.0.2.1", 1234), now=1.0))
+        self.assertFalse(limiter.allow(("10.0.0.1", 1234), now=1.0))
+        self.assertTrue(limiter.allow(("10.0.1.1", 1234), now=1.0))
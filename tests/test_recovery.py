@@ -1,7 +1,104 @@
+import heapq
+from typing import List, Tuple
 from unittest import TestCase
 
-from aioquic.quic.congestion.base import QuicRttMonitor, create_congestion_control
-from aioquic.quic.recovery import QuicPacketPacer
+from aioquic import tls
+from aioquic.quic.congestion.base import (
+    QuicHyStart,
+    QuicRttMonitor,
+    create_congestion_control,
+)
+from aioquic.quic.packet import PACKET_TYPE_ONE_RTT
+from aioquic.quic.packet_builder import QuicSentPacket
+from aioquic.quic.rangeset import RangeSet
+from aioquic.quic.recovery import QuicPacketPacer, QuicPacketRecovery, QuicPacketSpace
+
+
+def create_packet(packet_number: int, sent_time: float) -> QuicSentPacket:
+    return QuicSentPacket(
+        epoch=tls.Epoch.ONE_RTT,
+        in_flight=True,
+        is_ack_eliciting=True,
+        is_crypto_packet=False,
+        packet_number=packet_number,
+        packet_type=PACKET_TYPE_ONE_RTT,
+        sent_bytes=1200,
+        sent_time=sent_time,
+    )
+
+
+def simulate(
+    algorithm: str, *, buffer: int, hystart: bool, bandwidth=1250000, rtt=0.04
+):
+    """
+    Simulate a two second transfer over a bottleneck of `bandwidth` bytes per
+    second with a drop-tail buffer of `buffer` packets.
+
+    Returns the congestion window when slow start ended, and the recovery.
+    """
+    recovery = QuicPacketRecovery(
+        congestion_control_algorithm=algorithm,
+        hystart=hystart,
+        initial_rtt=rtt,
+        max_datagram_size=1200,
+        peer_completed_address_validation=True,
+        send_probe=lambda: None,
+    )
+    space = QuicPacketSpace()
+    recovery.spaces = [space]
+
+    acks: List[Tuple[float, int]] = []
+    departures: List[float] = []
+    link_free_at = 0.0
+    now = 0.0
+    packet_number = 0
+    slow_start_window = None
+    while now < 2.0:
+        # send packets as allowed by the congestion window and pacing
+        timers = []
+        while recovery.bytes_in_flight + 1200 <= recovery.congestion_window:
+            pacing_at = recovery._pacer.next_send_time(now=now)
+            if pacing_at is not None:
+                timers.append(pacing_at)
+                break
+            packet = create_packet(packet_number, now)
+            packet_number += 1
+            recovery.on_packet_sent(packet=packet, space=space)
+            recovery._pacer.update_after_send(now=now)
+
+            # the bottleneck drops packets once its buffer is full
+            while departures and departures[0] <= now:
+                heapq.heappop(departures)
+            if len(departures) < buffer:
+                link_free_at = max(now, link_free_at) + 1200 / bandwidth
+                heapq.heappush(departures, link_free_at)
+                heapq.heappush(acks, (link_free_at + rtt, packet.packet_number))
+
+        # advance to the next event
+        if acks:
+            timers.append(acks[0][0])
+        loss_at = recovery.get_loss_detection_time()
+        if loss_at is not None:
+            timers.append(loss_at)
+        now = min(timers)
+
+        while acks and acks[0][0] <= now:
+            _, packet_number_acked = heapq.heappop(acks)
+            recovery.on_ack_received(
+                ack_rangeset=RangeSet(
+                    [range(packet_number_acked, packet_number_acked + 1)]
+                ),
+                ack_delay=0.0,
+                now=now,
+                space=space,
+            )
+        loss_at = recovery.get_loss_detection_time()
+        if loss_at is not None and loss_at <= now:
+            recovery.on_loss_detection_timeout(now=now)
+
+        if slow_start_window is None and recovery._cc.ssthresh is not None:
+            slow_start_window = recovery.congestion_window
+    return slow_start_window, recovery
 
 
 class QuicCongestionControlTest(TestCase):
@@ -13,6 +110,102 @@ class QuicCongestionControlTest(TestCase):
         )
 
 
+class QuicHyStartTest(TestCase):
+    def run_round(self, hystart, now, rtt):
+        """
+        Send eight packets, then acknowledge them with the given RTT.
+
+        Returns the congestion window increase.
+        """
+        packets = [create_packet(i, now) for i in range(8)]
+        for packet in packets:
+            hystart.on_packet_sent(packet=packet)
+        increase = 0
+        for packet in packets:
+            increase += hystart.on_packet_acked(packet=packet)
+            hystart.on_rtt_measurement(rtt=rtt)
+        return increase
+
+    def test_conservative_slow_start(self):
+        hystart = QuicHyStart()
+        self.assertEqual(self.run_round(hystart, 0.0, rtt=0.04), 9600)
+        self.assertEqual(self.run_round(hystart, 1.0, rtt=0.04), 9600)
+
+        # small RTT increases are ignored
+        self.assertEqual(self.run_round(hystart, 2.0, rtt=0.044), 9600)
+        self.assertFalse(hystart.in_css)
+
+        # a larger RTT increase starts conservative slow start
+        self.assertEqual(self.run_round(hystart, 3.0, rtt=0.06), 9600)
+        self.assertTrue(hystart.in_css)
+        self.assertEqual(hystart.css_baseline_min_rtt, 0.06)
+
+        # the window grows four times slower
+        self.assertEqual(self.run_round(hystart, 4.0, rtt=0.06), 2400)
+        self.assertEqual(hystart.css_rounds, 1)
+
+        # slow start ends after five rounds
+        for i in range(5, 8):
+            self.run_round(hystart, float(i), rtt=0.06)
+        self.assertFalse(hystart.slow_start_done)
+        self.run_round(hystart, 8.0, rtt=0.06)
+        self.assertTrue(hystart.slow_start_done)
+
+        # reset
+        hystart.reset()
+        self.assertFalse(hystart.in_css)
+        self.assertFalse(hystart.slow_start_done)
+
+    def test_spurious_rtt_increase(self):
+        hystart = QuicHyStart()
+        self.run_round(hystart, 0.0, rtt=0.04)
+        self.run_round(hystart, 1.0, rtt=0.06)
+        self.assertTrue(hystart.in_css)
+
+        # the RTT goes back down, slow start resumes
+        self.run_round(hystart, 2.0, rtt=0.04)
+        self.assertFalse(hystart.in_css)
+        self.assertEqual(self.run_round(hystart, 3.0, rtt=0.04), 9600)
+
+    def test_few_samples(self):
+        hystart = QuicHyStart()
+        self.run_round(hystart, 0.0, rtt=0.04)
+
+        # fewer than eight samples are not enough
+        packet = create_packet(0, 1.0)
+        hystart.on_packet_sent(packet=packet)
+        hystart.on_packet_acked(packet=packet)
+        hystart.on_rtt_measurement(rtt=0.1)
+        self.assertFalse(hystart.in_css)
+
+
+class QuicHyStartSimulationTest(TestCase):
+    def _test_deep_buffer(self, algorithm):
+        # the path holds 42 packets and its buffer 1000 more, slow start ends
+        # before the buffer overflows
+        window, recovery = simulate(algorithm, buffer=1000, hystart=True)
+        self.assertEqual(window, 603300)
+        self.assertEqual(recovery.packets_lost, 0)
+
+    def test_deep_buffer_cubic(self):
+        self._test_deep_buffer("cubic")
+
+    def test_deep_buffer_reno(self):
+        self._test_deep_buffer("reno")
+
+    def _test_shallow_buffer(self, algorithm):
+        # the buffer overflows during conservative slow start, which ends it
+        window, recovery = simulate(algorithm, buffer=200, hystart=True)
+        self.assertLess(window, 603300)
+        self.assertGreater(recovery.packets_lost, 0)
+
+    def test_shallow_buffer_cubic(self):
+        self._test_shallow_buffer("cubic")
+
+    def test_shallow_buffer_reno(self):
+        self._test_shallow_buffer("reno")
+
+
 class QuicPacketPacerTest(TestCase):
     def setUp(self):
         self.pacer = QuicPacketPacer(max_datagram_size=1280)
@@ -57,6 +250,58 @@ class QuicPacketPacerTest(TestCase):
         self.assertAlmostEqual(self.pacer.next_send_time(now=1.00015), 1.0002)
 
 
+class QuicPacketPacerWithGranularityTest(TestCase):
+    # times are powers of two, to avoid rounding errors
+    GRANULARITY = 1 / 1024
+
+    def setUp(self):
+        self.pacer = QuicPacketPacer(
+            granularity=self.GRANULARITY, max_datagram_size=1280
+        )
+
+    def send_burst(self, now):
+        count = 0
+        while self.pacer.next_send_time(now=now) is None:
+            self.pacer.update_after_send(now=now)
+            count += 1
+        return count
+
+    def test_high_rate(self):
+        # 32 packets per wakeup
+        self.pacer.update_rate(congestion_window=5242880, smoothed_rtt=0.125)
+        self.assertEqual(self.pacer.packet_time, 1 / 32768)
+        self.assertEqual(self.pacer.bucket_max, 3 / 2048)
+
+        # the first burst empties the bucket
+        self.assertEqual(self.send_burst(now=1.0), 48)
+        self.assertEqual(self.pacer.next_send_time(now=1.0), 1.0 + self.GRANULARITY)
+
+        # each wakeup sends what was earned since the previous one
+        for i in range(1, 5):
+            self.assertEqual(self.send_burst(now=1.0 + i * self.GRANULARITY), 32)
+
+        # a late wakeup sends more
+        self.assertEqual(self.send_burst(now=1.0 + 6 * self.GRANULARITY), 48)
+
+    def test_high_rate_without_granularity(self):
+        self.pacer = QuicPacketPacer(max_datagram_size=1280)
+        self.pacer.update_rate(congestion_window=5242880, smoothed_rtt=0.125)
+        self.assertEqual(self.send_burst(now=1.0), 16)
+
+        # the rate cannot be achieved with a coarse timer
+        for i in range(1, 5):
+            self.assertEqual(self.send_burst(now=1.0 + i * self.GRANULARITY), 16)
+
+    def test_low_rate(self):
+        # one packet every 8 ms, wakeups send at least two packets
+        self.pacer.update_rate(congestion_window=20480, smoothed_rtt=0.125)
+        self.assertEqual(self.pacer.packet_time, 1 / 128)
+        self.assertEqual(self.send_burst(now=1.0), 6)
+        self.assertEqual(self.pacer.next_send_time(now=1.0), 1.0 + 1 / 64)
+        for i in range(1, 5):
+            self.assertEqual(self.send_burst(now=1.0 + i / 64), 2)
+
+
 class QuicRttMonitorTest(TestCase):
     def test_monitor(self):
         monitor = QuicRttMonitor()
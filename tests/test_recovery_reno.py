@@ -128,3 +128,45 @@ class QuicPacketRecoveryRenoTest(TestCase):
         self.assertEqual(self.recovery.bytes_in_flight, 0)
         self.assertEqual(space.ack_eliciting_in_flight, 0)
         self.assertEqual(len(space.sent_packets), 0)
+
+    def test_on_packet_lost_spurious(self):
+        space = self.ONE_RTT_SPACE
+        for packet_number in range(5):
+            self.recovery.on_packet_sent(
+                packet=QuicSentPacket(
+                    epoch=tls.Epoch.ONE_RTT,
+                    in_flight=True,
+                    is_ack_eliciting=True,
+                    is_crypto_packet=False,
+                    packet_number=packet_number,
+                    packet_type=PACKET_TYPE_ONE_RTT,
+                    sent_bytes=1280,
+                    sent_time=0.0,
+                ),
+                space=space,
+            )
+
+        # the last packet is ack'd, the first two are declared lost
+        self.recovery.on_ack_received(
+            ack_rangeset=RangeSet([range(4, 5)]),
+            ack_delay=0.0,
+            now=0.05,
+            space=space,
+        )
+        self.assertEqual(self.recovery.bytes_acked, 1280)
+        self.assertEqual(self.recovery.bytes_lost, 2560)
+        self.assertEqual(self.recovery.packets_acked, 1)
+        self.assertEqual(self.recovery.packets_lost, 2)
+        self.assertEqual(self.recovery.spurious_losses, 0)
+
+        # the lost packets had in fact been received
+        self.recovery.on_ack_received(
+            ack_rangeset=RangeSet([range(0, 5)]),
+            ack_delay=0.0,
+            now=0.06,
+            space=space,
+        )
+        self.assertEqual(self.recovery.packets_acked, 3)
+        self.assertEqual(self.recovery.packets_lost, 2)
+        self.assertEqual(self.recovery.spurious_losses, 2)
+        self.assertEqual(space.lost_packets, RangeSet())
@@ -1,6 +1,79 @@
 from unittest import TestCase
+from unittest.mock import patch
 
-from aioquic.quic.retry import QuicRetryTokenHandler
+from aioquic.quic.retry import (
+    QuicAdaptiveRetry,
+    QuicNewTokenHandler,
+    QuicRetryTokenHandler,
+)
+
+
+class QuicAdaptiveRetryTest(TestCase):
+    def test_half_open(self):
+        retry = QuicAdaptiveRetry(max_half_open=10, max_initial_rate=100.0)
+        self.assertFalse(retry.on_initial(half_open=9, now=1.0))
+        self.assertTrue(retry.on_initial(half_open=10, now=2.0))
+        self.assertTrue(retry.active)
+
+        # retry stays enabled until the load drops well below the threshold
+        self.assertTrue(retry.on_initial(half_open=5, now=3.0))
+        self.assertFalse(retry.on_initial(half_open=4, now=4.0))
+        self.assertFalse(retry.active)
+
+    def test_initial_rate(self):
+        retry = QuicAdaptiveRetry(max_half_open=10, max_initial_rate=100.0)
+        decisions = [
+            retry.on_initial(half_open=0, now=1.0 + i / 200) for i in range(200)
+        ]
+        self.assertEqual(decisions.index(True), 99)
+        self.assertTrue(all(decisions[99:]))
+
+        # the rate is measured over the last second
+        self.assertTrue(retry.on_initial(half_open=0, now=2.0))
+        self.assertEqual(retry.initial_rate, 200.0)
+
+        # retry is disabled once the rate drops
+        self.assertFalse(retry.on_initial(half_open=0, now=12.0))
+        self.assertEqual(retry.initial_rate, 0.1)
+
+
+class QuicNewTokenHandlerTest(TestCase):
+    def test_new_token(self):
+        addr = ("1.2.3.4", 1234)
+        handler = QuicNewTokenHandler(lifetime=60.0)
+
+        # create token
+        token = handler.create_token(addr)
+        self.assertEqual(len(token), 52)
+        self.assertTrue(handler.is_new_token(token))
+        self.assertFalse(handler.is_new_token(b""))
+
+        # validate token - ok, even from another port
+        handler.validate_token(addr, token)
+        handler.validate_token(("1.2.3.4", 4321), token)
+        handler.validate_token(("::ffff:1.2.3.4", 4321), token)
+
+        # validate token - wrong address
+        with self.assertRaises(ValueError) as cm:
+            handler.validate_token(("1.2.3.5", 1234), token)
+        self.assertEqual(str(cm.exception), "Remote address does not match.")
+
+        # validate token - issued by another server
+        with self.assertRaises(ValueError) as cm:
+            QuicNewTokenHandler().validate_token(addr, token)
+        self.assertEqual(str(cm.exception), "Token is invalid.")
+
+        # validate token - expired
+        with patch("aioquic.quic.retry.time.time") as mock_time:
+            mock_time.return_value = 1e10
+            with self.assertRaises(ValueError) as cm:
+                handler.validate_token(addr, token)
+        self.assertEqual(str(cm.exception), "Token has expired.")
+
+    def test_new_token_shared_secret(self):
+        addr = ("::1", 1234)
+        token = QuicNewTokenHandler(secret=b"0" * 16).create_token(addr)
+        QuicNewTokenHandler(secret=b"0" * 16).validate_token(addr, token)
 
 
 class QuicRetryTokenHandlerTest(TestCase):
@@ -0,0 +1,61 @@
+import datetime
+from unittest import TestCase
+
+from aioquic import tls
+from aioquic.quic.session_cache import SessionCache
+
+
+def create_ticket(server_name="example.com", lifetime=86400):
+    timestamp = tls.utcnow()
+    return tls.SessionTicket(
+        age_add=0,
+        cipher_suite=tls.CipherSuite.AES_128_GCM_SHA256,
+        not_valid_after=timestamp + datetime.timedelta(seconds=lifetime),
+        not_valid_before=timestamp,
+        resumption_secret=bytes(32),
+        server_name=server_name,
+        ticket=b"ticket",
+    )
+
+
+class SessionCacheTest(TestCase):
+    def test_ticket(self):
+        cache = SessionCache()
+        ticket = create_ticket()
+        cache.add_ticket("example.com", ["h3"], ticket)
+
+        # tickets are looked up by server name and ALPN protocols
+        self.assertIsNone(cache.pop_ticket("example.org", ["h3"]))
+        self.assertIsNone(cache.pop_ticket("example.com", None))
+
+        # tickets are only used once
+        self.assertIs(cache.pop_ticket("example.com", ["h3"]), ticket)
+        self.assertIsNone(cache.pop_ticket("example.com", ["h3"]))
+
+    def test_ticket_expired(self):
+        cache = SessionCache()
+        cache.add_ticket("example.com", None, create_ticket(lifetime=-1))
+        self.assertIsNone(cache.pop_ticket("example.com", None))
+        self.assertEqual(len(cache), 0)
+
+    def test_ticket_max_size(self):
+        cache = SessionCache(max_size=2)
+        cache.add_ticket("a.example.com", None, create_ticket("a.example.com"))
+        cache.add_ticket("b.example.com", None, create_ticket("b.example.com"))
+        cache.add_ticket("a.example.com", None, create_ticket("a.example.com"))
+
+        # the least recently stored server is forgotten
+        cache.add_ticket("c.example.com", None, create_ticket("c.example.com"))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.pop_ticket("a.example.com", None))
+        self.assertIsNone(cache.pop_ticket("b.example.com", None))
+        self.assertIsNotNone(cache.pop_ticket("c.example.com", None))
+
+    def test_token(self):
+        cache = SessionCache(max_size=1)
+        cache.add_token("a.example.com", b"token-a")
+        cache.add_token("b.example.com", b"token-b")
+
+        self.assertEqual(cache.pop_token("a.example.com"), b"")
+        self.assertEqual(cache.pop_token("b.example.com"), b"token-b")
+        self.assertEqual(cache.pop_token("b.example.com"), b"")
@@ -3,7 +3,52 @@ from unittest import TestCase
 from aioquic.quic.events import StreamDataReceived, StreamReset
 from aioquic.quic.packet import QuicErrorCode, QuicStreamFrame
 from aioquic.quic.packet_builder import QuicDeliveryState
-from aioquic.quic.stream import FinalSizeError, QuicStream
+from aioquic.quic.stream import FinalSizeError, QuicReceiveWindow, QuicStream
+
+
+class QuicReceiveWindowTest(TestCase):
+    def test_update(self):
+        window = QuicReceiveWindow(size=1000, max_size=4000)
+
+        # less than half the window is consumed
+        window.consumed = 500
+        self.assertEqual(window.update(1000, now=0.0, rtt=0.1), 1000)
+
+        # more than half the window is consumed
+        window.consumed = 501
+        self.assertEqual(window.update(1000, now=0.0, rtt=0.1), 1501)
+        self.assertEqual(window.size, 1000)
+
+        # consumption is slower than the window per round-trip
+        window.consumed = 1100
+        self.assertEqual(window.update(1501, now=1.0, rtt=0.1), 2100)
+        self.assertEqual(window.size, 1000)
+
+        # consumption is faster than the window per round-trip
+        window.consumed = 1700
+        self.assertEqual(window.update(2100, now=1.1, rtt=0.1), 3700)
+        self.assertEqual(window.size, 2000)
+
+        window.consumed = 2800
+        self.assertEqual(window.update(3700, now=1.2, rtt=0.1), 6800)
+        self.assertEqual(window.size, 4000)
+
+        # the window does not grow past its maximum size
+        window.consumed = 4900
+        self.assertEqual(window.update(6800, now=1.3, rtt=0.1), 8900)
+        self.assertEqual(window.size, 4000)
+
+    def test_ensure_size(self):
+        window = QuicReceiveWindow(size=1000, max_size=4000)
+
+        window.ensure_size(500)
+        self.assertEqual(window.size, 1000)
+
+        window.ensure_size(1500)
+        self.assertEqual(window.size, 1500)
+
+        window.ensure_size(5000)
+        self.assertEqual(window.size, 4000)
 
 
 class QuicStreamTest(TestCase):
@@ -560,6 +605,7 @@ class QuicStreamTest(TestCase):
         self.assertIsNone(frame)
         self.assertEqual(list(stream.sender._pending), [])
         self.assertEqual(stream.sender.next_offset, 0)
+        self.assertFalse(stream.sender.is_flow_control_blocked(max_offset))
 
         # write data, send a chunk
         stream.sender.write(b"0123456789012345")
@@ -583,6 +629,7 @@ class QuicStreamTest(TestCase):
         self.assertIsNone(frame)
         self.assertEqual(list(stream.sender._pending), [range(12, 16)])
         self.assertEqual(stream.sender.next_offset, 12)
+        self.assertTrue(stream.sender.is_flow_control_blocked(max_offset))
 
         # write more data, still blocked
         stream.sender.write(b"abcdefgh")
@@ -593,6 +640,7 @@ class QuicStreamTest(TestCase):
 
         # peer raises limit, send some data
         max_offset += 8
+        self.assertFalse(stream.sender.is_flow_control_blocked(max_offset))
         frame = stream.sender.get_frame(8, max_offset)
         self.assertEqual(frame.data, b"2345abcd")
         self.assertFalse(frame.fin)
@@ -612,6 +660,7 @@ class QuicStreamTest(TestCase):
         # nothing more to send
         frame = stream.sender.get_frame(8, max_offset)
         self.assertIsNone(frame)
+        self.assertFalse(stream.sender.is_flow_control_blocked(max_offset))
 
     def test_sender_fin_only(self):
         stream = QuicStream()
@@ -1,6 +1,8 @@
 import binascii
 import datetime
 import ssl
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -40,10 +42,12 @@ from aioquic.tls import (
 )
 from cryptography.exceptions import UnsupportedAlgorithm
 from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
 
 from .utils import (
     SERVER_CACERTFILE,
     SERVER_CERTFILE,
+    SERVER_CERTFILE_WITH_CHAIN,
     SERVER_KEYFILE,
     generate_ec_certificate,
     generate_ed448_certificate,
@@ -257,6 +261,10 @@ class ContextTest(TestCase):
         with self.assertRaises(tls.AlertUnexpectedMessage):
             server.handle_message(b"\x00\x00\x00\x00", create_buffers())
 
+        server.state = State.SERVER_EXPECT_SIGNATURE
+        with self.assertRaises(tls.AlertUnexpectedMessage):
+            server.handle_message(b"\x00\x00\x00\x00", create_buffers())
+
     def _server_fail_hello(self, client, server):
         # Send client hello.
         client_buf = create_buffers()
@@ -581,6 +589,108 @@ class ContextTest(TestCase):
 
         self._handshake(client, server)
 
+    def test_handshake_with_certificate_signer(self):
+        client = self.create_client()
+        server = self.create_server()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            server.certificate_signer = tls.ExecutorSigner(
+                server.certificate_private_key, executor
+            )
+
+            # Send client hello.
+            client_buf = create_buffers()
+            client.handle_message(b"", client_buf)
+            server_input = merge_buffers(client_buf)
+            reset_buffers(client_buf)
+
+            # Handle client hello.
+            #
+            # Send server hello, encrypted extensions, certificate.
+            server_buf = create_buffers()
+            server.handle_message(server_input, server_buf)
+            self.assertEqual(server.state, State.SERVER_EXPECT_SIGNATURE)
+            self.assertIsNotNone(server.pending_signature)
+            client_input = merge_buffers(server_buf)
+            reset_buffers(server_buf)
+
+            # Handle server hello, encrypted extensions, certificate.
+            client.handle_message(client_input, client_buf)
+            self.assertEqual(client.state, State.CLIENT_EXPECT_CERTIFICATE_VERIFY)
+            self.assertEqual(merge_buffers(client_buf), b"")
+
+            # Send certificate verify, finished.
+            server.pending_signature.result()
+            server.resume(server_buf)
+            self.assertEqual(server.state, State.SERVER_EXPECT_FINISHED)
+            self.assertIsNone(server.pending_signature)
+            client_input = merge_buffers(server_buf)
+            reset_buffers(server_buf)
+
+        # Handle certificate verify, finished.
+        #
+        # Send finished.
+        client.handle_message(client_input, client_buf)
+        self.assertEqual(client.state, State.CLIENT_POST_HANDSHAKE)
+        server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        # Handle finished.
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_POST_HANDSHAKE)
+
+        # check keys match
+        self.assertEqual(client._dec_key, server._enc_key)
+        self.assertEqual(client._enc_key, server._dec_key)
+
+    def test_handshake_with_certificate_signer_failure(self):
+        def signer(data, signature_algorithm):
+            future = Future()
+            future.set_exception(Exception("signer unavailable"))
+            return future
+
+        client = self.create_client()
+        server = self.create_server()
+        server.certificate_signer = signer
+
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+
+        server_buf = create_buffers()
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_SIGNATURE)
+
+        with self.assertRaises(tls.AlertInternalError) as cm:
+            server.resume(server_buf)
+        self.assertEqual(
+            str(cm.exception), "Signing CertificateVerify failed: signer unavailable"
+        )
+
+    def test_handshake_with_server_credentials(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+
+        client = self.create_client()
+        server = self.create_server()
+        server.certificate = None
+        server.certificate_private_key = None
+        server.server_credentials = configuration.get_server_credentials()
+
+        self._handshake(client, server)
+        self.assertEqual(client._peer_certificate, configuration.certificate)
+
+    def test_handshake_with_ephemeral_key_pool(self):
+        pool = tls.EphemeralKeyPool(size=2)
+        try:
+            client = self.create_client()
+            client.ephemeral_key_pool = pool
+            server = self.create_server()
+            server.ephemeral_key_pool = pool
+
+            self._handshake(client, server)
+        finally:
+            pool.close()
+
     def test_handshake_with_grease_group(self):
         client = self.create_client()
         client._supported_groups = [tls.Group.GREASE, tls.Group.SECP256R1]
@@ -608,6 +718,125 @@ class ContextTest(TestCase):
         except UnsupportedAlgorithm as exc:
             self.skipTest(str(exc))
 
+    def test_handshake_with_hello_retry_request(self):
+        client = self.create_client()
+        client._supported_groups = [tls.Group.GREASE, tls.Group.SECP256R1]
+        client.key_share_groups = [tls.Group.GREASE]
+        server = self.create_server()
+
+        # Send client hello with an unusable key share.
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        self.assertEqual(client._offered_key_share_groups, [tls.Group.GREASE])
+        server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        # Handle client hello, send hello retry request.
+        server_buf = create_buffers()
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_CLIENT_HELLO)
+        client_input = merge_buffers(server_buf)
+        reset_buffers(server_buf)
+
+        # Handle hello retry request, send a new client hello.
+        client.handle_message(client_input, client_buf)
+        self.assertEqual(client.state, State.CLIENT_EXPECT_SERVER_HELLO)
+        self.assertEqual(client._offered_key_share_groups, [tls.Group.SECP256R1])
+        server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        # Complete the handshake.
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_FINISHED)
+        client_input = merge_buffers(server_buf)
+        reset_buffers(server_buf)
+
+        client.handle_message(client_input, client_buf)
+        self.assertEqual(client.state, State.CLIENT_POST_HANDSHAKE)
+        server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_POST_HANDSHAKE)
+
+        # check keys match
+        self.assertEqual(client._dec_key, server._enc_key)
+        self.assertEqual(client._enc_key, server._dec_key)
+
+    def test_handshake_with_hello_retry_request_bad_group(self):
+        client = self.create_client()
+        client._supported_groups = [tls.Group.SECP256R1]
+
+        # Send client hello.
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+
+        # Receive a hello retry request for a group we sent.
+        buf = Buffer(capacity=1024)
+        push_server_hello(
+            buf,
+            ServerHello(
+                random=tls.HELLO_RETRY_REQUEST_RANDOM,
+                legacy_session_id=b"",
+                cipher_suite=tls.CipherSuite.AES_256_GCM_SHA384,
+                compression_method=tls.CompressionMethod.NULL,
+                key_share=(tls.Group.SECP256R1, b""),
+                supported_version=tls.TLS_VERSION_1_3,
+            ),
+        )
+        with self.assertRaises(tls.AlertIllegalParameter) as cm:
+            client.handle_message(buf.data, client_buf)
+        self.assertEqual(str(cm.exception), "HelloRetryRequest has an unexpected group")
+
+    def test_handshake_with_hello_retry_request_mismatch(self):
+        client = self.create_client()
+        client._supported_groups = [tls.Group.GREASE, tls.Group.SECP256R1]
+        client.key_share_groups = [tls.Group.GREASE]
+        server = self.create_server()
+
+        # Send client hello with an unusable key share.
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        server_input = merge_buffers(client_buf)
+
+        # Handle client hello, send hello retry request.
+        server_buf = create_buffers()
+        server.handle_message(server_input, server_buf)
+        reset_buffers(server_buf)
+
+        # Receive the same client hello again.
+        with self.assertRaises(tls.AlertIllegalParameter) as cm:
+            server.handle_message(server_input, server_buf)
+        self.assertEqual(
+            str(cm.exception), "ClientHello does not match HelloRetryRequest"
+        )
+
+    def test_handshake_with_key_share_cache(self):
+        cache = tls.KeyShareCache()
+
+        # the first handshake sends a key share for every group
+        client = self.create_client(server_name="localhost")
+        client.key_share_cache = cache
+        server = self.create_server()
+        self._handshake(client, server)
+        self.assertEqual(client._offered_key_share_groups, client._supported_groups)
+        self.assertEqual(cache.get("localhost"), tls.Group.SECP256R1)
+
+        # the second handshake only sends the group the server picked
+        client = self.create_client(server_name="localhost")
+        client.key_share_cache = cache
+        server = self.create_server()
+        self._handshake(client, server)
+        self.assertEqual(client._offered_key_share_groups, [tls.Group.SECP256R1])
+
+    def test_handshake_with_key_share_groups(self):
+        client = self.create_client()
+        client.key_share_groups = [tls.Group.X25519]
+        server = self.create_server()
+
+        self._handshake(client, server)
+        self.assertEqual(client._offered_key_share_groups, [tls.Group.X25519])
+
     def test_session_ticket(self):
         client_tickets = []
         server_tickets = []
@@ -763,6 +992,71 @@ class ContextTest(TestCase):
         second_handshake_bad_binder()
         second_handshake_bad_pre_shared_key()
 
+    def _handshake_with_input(self, client, server, server_input=None):
+        # Send client hello with pre_shared_key.
+        client_buf = create_buffers()
+        client.handle_message(b"", client_buf)
+        if server_input is None:
+            server_input = merge_buffers(client_buf)
+        reset_buffers(client_buf)
+
+        # Handle client hello, send server hello ... finished.
+        server_buf = create_buffers()
+        server.handle_message(server_input, server_buf)
+        self.assertEqual(server.state, State.SERVER_EXPECT_FINISHED)
+        client_input = merge_buffers(server_buf)
+        reset_buffers(server_buf)
+
+        # Handle server hello ... finished, send finished.
+        client.handle_message(client_input, client_buf)
+        self.assertEqual(client.state, State.CLIENT_POST_HANDSHAKE)
+        server.handle_message(merge_buffers(client_buf), server_buf)
+        self.assertEqual(server.state, State.SERVER_POST_HANDSHAKE)
+        return server_input
+
+    def test_session_ticket_sealer(self):
+        client_tickets = []
+        secret = bytes(32)
+
+        # the first server seals the ticket
+        client = self.create_client()
+        client.new_session_ticket_cb = client_tickets.append
+        server = self.create_server()
+        server.session_ticket_sealer = tls.SessionTicketSealer(secret)
+        self._handshake_with_input(client, server)
+        self.assertEqual(len(client_tickets), 1)
+        self.assertEqual(len(client_tickets[0].ticket), 110)
+
+        # another server sharing the secret resumes the session with early data
+        client = self.create_client()
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_sealer = tls.SessionTicketSealer(secret)
+        client_hello = self._handshake_with_input(client, server)
+        self.assertTrue(client.session_resumed)
+        self.assertTrue(server.session_resumed)
+        self.assertTrue(server.early_data_accepted)
+
+        # a replay of the ClientHello is resumed, but early data is refused
+        sealer = server.session_ticket_sealer
+        client = self.create_client()
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_sealer = sealer
+        with self.assertRaises(tls.AlertDecryptError):
+            self._handshake_with_input(client, server, server_input=client_hello)
+        self.assertTrue(server.session_resumed)
+        self.assertFalse(server.early_data_accepted)
+
+        # a server with another secret performs a full handshake
+        client = self.create_client()
+        client.session_ticket = client_tickets[0]
+        server = self.create_server()
+        server.session_ticket_sealer = tls.SessionTicketSealer(bytes(31) + b"x")
+        self._handshake_with_input(client, server)
+        self.assertFalse(client.session_resumed)
+        self.assertFalse(server.session_resumed)
+
 
 class TlsTest(TestCase):
     def test_pull_client_hello(self):
@@ -1434,6 +1728,229 @@ class TlsTest(TestCase):
         self.assertEqual(buf.data, load("tls_finished.bin"))
 
 
+class EphemeralKeyPoolTest(TestCase):
+    def wait_full(self, pool, group):
+        for i in range(100):
+            if len(pool._keys[group]) == pool._size:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(pool._keys[group]), pool._size)
+
+    def test_get(self):
+        pool = tls.EphemeralKeyPool(groups=[tls.Group.X25519], size=2)
+        try:
+            self.wait_full(pool, tls.Group.X25519)
+            ready = list(pool._keys[tls.Group.X25519])
+
+            # ready keys are handed out once
+            key = pool.get(tls.Group.X25519)
+            self.assertIs(key, ready[0])
+            self.assertIs(pool.get(tls.Group.X25519), ready[1])
+
+            # the pool is refilled
+            self.wait_full(pool, tls.Group.X25519)
+            self.assertNotIn(key, pool._keys[tls.Group.X25519])
+
+            # other groups are generated on demand
+            self.assertIsInstance(
+                pool.get(tls.Group.SECP256R1), ec.EllipticCurvePrivateKey
+            )
+        finally:
+            pool.close()
+
+    def test_get_after_fork(self):
+        pool = tls.EphemeralKeyPool(groups=[tls.Group.X25519], size=2)
+        try:
+            self.wait_full(pool, tls.Group.X25519)
+            inherited = list(pool._keys[tls.Group.X25519])
+
+            # keys inherited from the parent process are discarded
+            with patch("aioquic.tls.os.getpid", return_value=pool._pid + 1):
+                key = pool.get(tls.Group.X25519)
+                self.assertNotIn(key, inherited)
+        finally:
+            pool.close()
+
+
+class SessionTicketSealerTest(TestCase):
+    def create_ticket(self, **kwargs):
+        timestamp = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        return tls.SessionTicket(
+            age_add=1234,
+            cipher_suite=tls.CipherSuite.AES_128_GCM_SHA256,
+            max_early_data_size=0xFFFFFFFF,
+            not_valid_after=timestamp + datetime.timedelta(days=1),
+            not_valid_before=timestamp,
+            resumption_secret=bytes(range(32)),
+            server_name="example.com",
+            ticket=b"",
+            **kwargs,
+        )
+
+    def test_seal_and_unseal(self):
+        ticket = self.create_ticket()
+        sealer = tls.SessionTicketSealer(bytes(32))
+        with patch("aioquic.tls.utcnow", return_value=ticket.not_valid_before):
+            data = sealer.seal(ticket)
+
+            # the ticket is opened by any sealer sharing the secret
+            restored = tls.SessionTicketSealer(bytes(32)).unseal(data)
+            ticket.ticket = data
+            self.assertEqual(restored, ticket)
+
+            # the ticket cannot be opened with another secret or tampered with
+            self.assertIsNone(tls.SessionTicketSealer(bytes(31) + b"x").unseal(data))
+            self.assertIsNone(sealer.unseal(data[:-1] + bytes([data[-1] ^ 1])))
+            self.assertIsNone(sealer.unseal(b"short"))
+
+        # the ticket is opened after several key rotations
+        with patch(
+            "aioquic.tls.utcnow",
+            return_value=ticket.not_valid_before + datetime.timedelta(hours=23),
+        ):
+            self.assertIsNotNone(sealer.unseal(data))
+
+        # the key expires with the ticket lifetime
+        with patch(
+            "aioquic.tls.utcnow",
+            return_value=ticket.not_valid_before + datetime.timedelta(days=2),
+        ):
+            self.assertIsNone(sealer.unseal(data))
+
+    def test_accept_early_data(self):
+        ticket = self.create_ticket()
+        sealer = tls.SessionTicketSealer(bytes(32), replay_window=10)
+        age = 5000
+        obfuscated_age = (age + ticket.age_add) % (1 << 32)
+
+        with patch(
+            "aioquic.tls.utcnow",
+            return_value=ticket.not_valid_before + datetime.timedelta(seconds=5),
+        ):
+            # a fresh ClientHello is accepted once
+            self.assertTrue(sealer.accept_early_data(ticket, obfuscated_age, b"a"))
+            self.assertFalse(sealer.accept_early_data(ticket, obfuscated_age, b"a"))
+            self.assertTrue(sealer.accept_early_data(ticket, obfuscated_age, b"b"))
+
+        with patch(
+            "aioquic.tls.utcnow",
+            return_value=ticket.not_valid_before + datetime.timedelta(seconds=20),
+        ):
+            # a ClientHello which is not fresh is refused
+            self.assertFalse(sealer.accept_early_data(ticket, obfuscated_age, b"c"))
+
+        with patch(
+            "aioquic.tls.utcnow",
+            return_value=ticket.not_valid_before + datetime.timedelta(seconds=60),
+        ):
+            # remembered ClientHellos are forgotten once they are stale
+            self.assertFalse(sealer.accept_early_data(ticket, obfuscated_age, b"a"))
+            self.assertEqual(len(sealer._seen), 0)
+
+    def test_accept_early_data_when_full(self):
+        ticket = self.create_ticket()
+        sealer = tls.SessionTicketSealer(bytes(32), max_replay_entries=1)
+        obfuscated_age = ticket.age_add
+        with patch("aioquic.tls.utcnow", return_value=ticket.not_valid_before):
+            self.assertTrue(sealer.accept_early_data(ticket, obfuscated_age, b"a"))
+            self.assertFalse(sealer.accept_early_data(ticket, obfuscated_age, b"b"))
+
+
+class TlsServerCredentialsTest(TestCase):
+    def test_credentials(self):
+        configuration = QuicConfiguration(is_client=False)
+        configuration.load_cert_chain(SERVER_CERTFILE_WITH_CHAIN, SERVER_KEYFILE)
+        credentials = configuration.get_server_credentials()
+        self.assertEqual(len(credentials.certificate_chain), 1)
+
+        # the Certificate message is encoded once
+        buf = Buffer(capacity=4096)
+        push_certificate(
+            buf,
+            Certificate(
+                request_context=b"",
+                certificates=[
+                    (x.public_bytes(serialization.Encoding.DER), b"")
+                    for x in [configuration.certificate]
+                    + configuration.certificate_chain
+                ],
+            ),
+        )
+        self.assertEqual(credentials.certificate_message, buf.data)
+
+        # signature algorithms match the RSA key
+        self.assertEqual(
+            credentials.signature_algorithms,
+            [
+                tls.SignatureAlgorithm.RSA_PSS_RSAE_SHA256,
+                tls.SignatureAlgorithm.RSA_PKCS1_SHA256,
+                tls.SignatureAlgorithm.RSA_PKCS1_SHA1,
+            ],
+        )
+
+    def test_credentials_with_ec_key(self):
+        certificate, private_key = generate_ec_certificate(
+            common_name="example.com", curve=ec.SECP256R1
+        )
+        credentials = tls.TlsServerCredentials(
+            certificate=certificate, certificate_chain=[], private_key=private_key
+        )
+        self.assertEqual(
+            credentials.signature_algorithms,
+            [tls.SignatureAlgorithm.ECDSA_SECP256R1_SHA256],
+        )
+
+    def test_credentials_follow_configuration(self):
+        configuration = QuicConfiguration(is_client=False)
+        self.assertIsNone(configuration.get_server_credentials())
+
+        # the credentials are shared while the configuration is unchanged
+        configuration.load_cert_chain(SERVER_CERTFILE, SERVER_KEYFILE)
+        credentials = configuration.get_server_credentials()
+        self.assertIs(configuration.get_server_credentials(), credentials)
+
+        # the certificate and key are rotated
+        certificate, private_key = generate_ec_certificate(
+            common_name="example.com", curve=ec.SECP256R1
+        )
+        configuration.certificate = certificate
+        configuration.private_key = private_key
+        credentials = configuration.get_server_credentials()
+        self.assertIs(credentials.certificate, certificate)
+        self.assertIs(credentials.private_key, private_key)
+        self.assertEqual(
+            credentials.signature_algorithms,
+            [tls.SignatureAlgorithm.ECDSA_SECP256R1_SHA256],
+        )
+
+        # the chain is modified in place
+        configuration.certificate_chain.append(certificate)
+        credentials = configuration.get_server_credentials()
+        self.assertEqual(credentials.certificate_chain, [certificate])
+
+        # explicit credentials take precedence
+        configuration.server_credentials = tls.TlsServerCredentials(
+            certificate=certificate, certificate_chain=[], private_key=private_key
+        )
+        self.assertIs(
+            configuration.get_server_credentials(), configuration.server_credentials
+        )
+
+
+class KeyShareCacheTest(TestCase):
+    def test_max_size(self):
+        cache = tls.KeyShareCache(max_size=2)
+        cache.set("a.example.com", tls.Group.X25519)
+        cache.set("b.example.com", tls.Group.SECP256R1)
+        self.assertEqual(cache.get("a.example.com"), tls.Group.X25519)
+
+        # the least recently used server is forgotten
+        cache.set("c.example.com", tls.Group.X448)
+        self.assertEqual(cache.get("a.example.com"), tls.Group.X25519)
+        self.assertIsNone(cache.get("b.example.com"))
+        self.assertEqual(cache.get("c.example.com"), tls.Group.X448)
+
+
 class VerifyCertificateTest(TestCase):
     def test_verify_certificate_chain(self):
         with open(SERVER_CERTFILE, "rb") as fp: